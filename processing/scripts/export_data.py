@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Export Script
+=============
+
+Publish every complete book (all hadiths have PCAP and HMSTS rows) not yet
+in the version's manifest, e.g. after a multi-node work-queue run (see
+src/processors/publisher.py).
+
+Books are written to {EXPORT_DIR}/published/{version}/book_{book_id}.jsonl
+and listed in manifest.json next to them.
+
+Examples:
+    python scripts/export_data.py
+    python scripts/export_data.py --book 1 --book 2 --validate
+    python scripts/export_data.py --book 1 --force      # republish
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from config.settings import get_settings
+from src.llm.factory import create_client
+from src.processors import PCAPProcessor
+from src.processors.publisher import BookPublisher
+from src.storage.postgres import PostgresStorage
+from src.validation import CrossModelValidator
+
+
+async def run(args) -> None:
+    settings = get_settings()
+    storage = PostgresStorage()
+    validator, client = None, None
+    if args.validate:
+        client = create_client(settings.cross_validation_model or settings.llm_secondary_model, settings)
+        validator = CrossModelValidator(
+            PCAPProcessor(client=client, storage=None, version=args.version, settings=settings),
+            storage,
+            version=args.version,
+            max_cost_usd=settings.cross_validation_max_cost_usd,
+        )
+    publisher = BookPublisher.from_settings(storage, settings, args.version, validator)
+    try:
+        published = await publisher.sweep(args.book, force=args.force)
+    finally:
+        if client:
+            await client.close()
+    logger.info(f"Published books {published or 'none'}; {publisher.summary()}")
+
+
+def main():
+    """Main entry point for the export script."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Publish complete books (PCAP + HMSTS) as JSONL")
+    parser.add_argument("--version", default="v1.0", help="Processing version")
+    parser.add_argument("--book", type=int, action="append", help="Only this book_id (repeatable)")
+    parser.add_argument("--validate", action="store_true", help="Cross-check risky PCAP assignments first")
+    parser.add_argument("--force", action="store_true", help="Republish books already in the manifest")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Prompt Compaction Measurement
+=============================
+
+Measure how much each PROMPT_COMPACTION level shrinks per-hadith user
+prompts, and check that compaction does not change the answers.
+
+Steps:
+1. Token reduction: build user prompts at every level for pending hadiths
+   and compare token counts (local estimate, or exact counts from the
+   Anthropic token-counting endpoint with --api-count)
+2. Quality A/B (--ab N): run N sampled hadiths through the live client
+   uncompacted and at --ab-level; report agreement on the stage's key label
+   (PCAP era, HMSTS functional role), mean confidence and cost per arm.
+   Nothing is written to the database.
+
+The report is written to processed/prompt_compaction_{stage}_{version}.json.
+
+Examples:
+    python scripts/measure_prompt_compaction.py --stage pcap --limit 5000
+    python scripts/measure_prompt_compaction.py --stage hmsts --ab 100 --ab-level standard
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import sys
+from pathlib import Path
+from typing import Dict, List, Any
+
+from loguru import logger
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from config.settings import get_settings
+from src.llm.compaction import Compaction, estimate_tokens
+from src.llm.factory import create_live_client
+from src.llm.prompt_builder import PromptBuilder
+from src.processors import PCAPProcessor, HMSTSProcessor
+from src.storage.postgres import PostgresStorage
+
+
+PROCESSORS = {
+    "pcap": PCAPProcessor,
+    "hmsts": HMSTSProcessor,
+}
+
+
+def make_builder(settings, level: Compaction) -> PromptBuilder:
+    return PromptBuilder(
+        prompts_dir=settings.prompts_dir,
+        methodology_dir=settings.methodology_dir,
+        markers_file=settings.markers_file,
+        compaction=level,
+    )
+
+
+async def count_tokens(prompts: List[str], settings, api: bool) -> List[int]:
+    """Token counts for user prompts (estimated, or via the Anthropic API)."""
+    if not api:
+        return [estimate_tokens(prompt) for prompt in prompts]
+    import anthropic
+
+    client = anthropic.AsyncAnthropic(api_key=settings.anthropic_api_key)
+    try:
+        counts = []
+        for prompt in prompts:
+            result = await client.messages.count_tokens(
+                model=settings.llm_primary_model,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            counts.append(result.input_tokens)
+        return counts
+    finally:
+        await client.close()
+
+
+async def measure_reduction(processor, items, settings, api: bool) -> Dict[str, Any]:
+    """Mean/total user prompt tokens per compaction level."""
+    await processor.prepare(items)
+    report: Dict[str, Any] = {}
+    baseline = None
+    for level in Compaction:
+        processor.prompt_builder = make_builder(settings, level)
+        prompts = [processor.build_user_prompt(hadith, pre) for hadith, pre in items]
+        counts = await count_tokens(prompts, settings, api)
+        total = sum(counts)
+        baseline = baseline or total
+        report[level.name.lower()] = {
+            "mean_tokens": round(total / max(1, len(counts)), 1),
+            "p95_tokens": sorted(counts)[int(0.95 * (len(counts) - 1))] if counts else 0,
+            "total_tokens": total,
+            "reduction": round(1 - total / baseline, 4) if baseline else 0.0,
+        }
+        logger.info(
+            f"{level.name.lower():>10}: {report[level.name.lower()]['mean_tokens']:>8} tokens/hadith "
+            f"({report[level.name.lower()]['reduction']:.1%} fewer)"
+        )
+    return report
+
+
+async def run_arm(stage: str, settings, storage, level: Compaction, client, items, version: str):
+    """Process items at one compaction level without storing results."""
+    processor = PROCESSORS[stage](
+        client=client,
+        storage=storage,
+        prompt_builder=make_builder(settings, level),
+        version=version,
+        settings=settings,
+    )
+    await processor.prepare(items)
+    processor.storage = None  # read context only; never write A/B rows
+    assignments, progress = await processor.process_batch(items)
+    return processor, {a.hadith_id: a for a in assignments}, progress
+
+
+async def quality_ab(stage, items, settings, storage, level: Compaction, version: str) -> Dict[str, Any]:
+    """Compare uncompacted and compacted prompts on the same hadiths."""
+    # Every hadith must reach the LLM in both arms
+    settings = settings.model_copy(update={"enable_pcap_rules": False})
+    client = create_live_client(settings)
+    try:
+        processor, base, base_progress = await run_arm(stage, settings, storage, Compaction.NONE, client, items, version)
+        _, compact, compact_progress = await run_arm(stage, settings, storage, level, client, items, version)
+    finally:
+        await client.close()
+
+    both = sorted(set(base) & set(compact))
+    agreed = sum(processor.agrees(base[i], compact[i]) for i in both)
+
+    def arm(results, progress) -> Dict[str, Any]:
+        scores = [s for s in (processor.confidence(a) for a in results.values()) if s is not None]
+        return {
+            "succeeded": len(results),
+            "failed": progress.failed_items,
+            "mean_confidence": round(statistics.mean(scores), 4) if scores else None,
+            "cost_usd": float(sum(a.llm_cost_usd or 0 for a in results.values())),
+        }
+
+    report = {
+        "sample": len(items),
+        "level": level.name.lower(),
+        "compared": len(both),
+        "agreement": round(agreed / len(both), 4) if both else None,
+        "baseline": arm(base, base_progress),
+        "compacted": arm(compact, compact_progress),
+    }
+    logger.info(
+        f"A/B none vs {level.name.lower()} on {len(both)} hadiths: agreement "
+        f"{report['agreement']:.1%}" if both else "A/B: no hadith succeeded in both arms"
+    )
+    return report
+
+
+async def run(args) -> None:
+    settings = get_settings()
+    storage = PostgresStorage()
+    processor = PROCESSORS[args.stage](storage=storage, version=args.version, settings=settings)
+    items = storage.fetch_pending_hadiths(processor.stage, args.version, limit=args.limit)
+    logger.info(f"Measuring prompt compaction on {len(items)} hadiths ({processor.stage.value})")
+
+    report: Dict[str, Any] = {
+        "stage": processor.stage.value,
+        "version": args.version,
+        "hadiths": len(items),
+        "token_counts": "anthropic_api" if args.api_count else "estimate",
+        "levels": await measure_reduction(processor, items, settings, args.api_count),
+    }
+
+    if args.ab:
+        sample = random.Random(args.seed).sample(items, min(args.ab, len(items)))
+        report["ab"] = await quality_ab(
+            args.stage, sample, settings, storage, Compaction.parse(args.ab_level), args.version
+        )
+
+    output = Path(args.output or settings.processed_dir / f"prompt_compaction_{args.stage}_{args.version}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logger.info(f"Report written to {output}")
+
+
+def main():
+    """Main entry point for the measurement script."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure prompt compaction token savings and quality")
+    parser.add_argument("--stage", choices=sorted(PROCESSORS), required=True, help="Stage whose prompts to measure")
+    parser.add_argument("--version", default="v1.0", help="Processing version (pending hadiths are measured)")
+    parser.add_argument("--limit", type=int, help="Measure at most N hadiths")
+    parser.add_argument("--api-count", action="store_true", help="Count tokens with the Anthropic API instead of estimating")
+    parser.add_argument("--ab", type=int, default=0, metavar="N", help="Run a quality A/B on N sampled hadiths (live LLM calls)")
+    parser.add_argument(
+        "--ab-level",
+        choices=[level.name.lower() for level in Compaction if level],
+        default="standard",
+        help="Compaction level compared against uncompacted prompts in the A/B"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the A/B sample")
+    parser.add_argument("--output", help="Report path (JSON)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
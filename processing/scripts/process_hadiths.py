@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+Hadith Processing Script
+========================
+
+Run the PCAP or HMSTS LLM stage over pending hadiths: live requests by
+default (hedged to the secondary model), offline provider batch jobs with
+--batch-mode. Distributed, handoff, retry, publish and simulate modes are
+listed in --help and described on the functions that run them.
+
+Examples:
+    python scripts/process_hadiths.py --stage pcap --limit 100
+    python scripts/process_hadiths.py --stage hmsts --batch-mode
+    python scripts/process_hadiths.py --stage pcap --resume-batch batch_jobs/pcap_processing_....job.json
+    python scripts/process_hadiths.py --stage pcap --enqueue        # once
+    python scripts/process_hadiths.py --stage pcap --from-queue     # on every node
+    python scripts/process_hadiths.py --stage pcap --handoff        # and, alongside:
+    python scripts/process_hadiths.py --stage hmsts --handoff
+    python scripts/process_hadiths.py --stage pcap --retry-failed --error-class RateLimitError
+    BOOK_PRIORITIES='{"1": 0, "2": 0}' python scripts/process_hadiths.py --stage hmsts --publish --validate
+    RATE_LIMIT_TPM=800000 python scripts/process_hadiths.py --stage all --simulate --fit-cassette runs/pilot.cassette
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from config.settings import get_settings
+from src.llm.factory import create_client, create_live_client
+from src.llm.batch import BatchRunner, AnthropicBatchEndpoint
+from src.llm.cost_tracker import CostTracker
+from src.llm.cassette import CassetteClient
+from src.models.processing import ProcessingStage, ProcessingStatus
+from src.processors import PCAPProcessor, HMSTSProcessor
+from src.processors.dead_letters import plan_retries
+from src.processors.hmsts_processor import EraContext
+from src.processors.publisher import BookPublisher
+from src.processors.simulator import CapacitySimulator, Workload, fit_profiles, summarize
+from src.storage.postgres import PostgresStorage
+from src.storage.redis_cache import RedisWorkQueue
+from src.storage.writer import WriteBehindWriter
+from src.utils.progress_tracker import ProcessedSet
+from src.validation import CrossModelValidator
+
+
+PROCESSORS = {
+    "pcap": PCAPProcessor,
+    "hmsts": HMSTSProcessor,
+}
+
+
+def load_items(processor, storage: PostgresStorage, args, limit=None):
+    """Fetch pending hadiths, collapsing near-duplicates if requested."""
+    items = storage.fetch_pending_hadiths(processor.stage, args.version, limit=limit)
+    logger.info(f"{len(items)} hadiths pending for {processor.stage.value} ({args.version})")
+    if processor.processed is not None:
+        # Checkpointed as stored but without a row: deleted for reprocessing
+        forgotten = processor.processed.discard(hadith.id for hadith, _ in items)
+        if forgotten:
+            logger.info(f"{forgotten} checkpointed hadiths have no stored row any more; reprocessing them")
+    if args.collapse_duplicates:
+        items = processor.collapse_duplicates(items, storage.fetch_duplicate_clusters(args.version))
+    if args.group_by_chapter:
+        items = processor.group_by_chapter(items)
+    items = processor.prioritize(items)
+    if processor.cost_tracker:
+        # Project spend over what this run still has to do
+        processor.cost_tracker.total_hadiths = processor.cost_tracker.totals.hadiths + len(items)
+    return items
+
+
+async def renew_leases(queue: RedisWorkQueue, leases, interval: float) -> None:
+    """Keep a batch's leases alive while it is being processed."""
+    while True:
+        await asyncio.sleep(interval)
+        queue.renew(leases)
+
+
+async def keep_registered(queue: RedisWorkQueue, ttl: float) -> None:
+    """Keep this run registered as a live handoff producer."""
+    while True:
+        queue.register_producer(ttl)
+        await asyncio.sleep(ttl / 3)
+
+
+async def consume_queue(
+    processor,
+    storage: PostgresStorage,
+    queue: RedisWorkQueue,
+    args,
+    batch_size: int,
+    follow: bool = False,
+) -> None:
+    """
+    Lease, process, store and acknowledge batches until the queue is drained.
+
+    With `follow` (HMSTS handoff), keep waiting for new entries while a PCAP
+    producer is alive, and use the era context carried by each entry.
+    """
+    settings = processor.settings
+    batch = 0
+    while True:
+        leases = queue.claim(batch_size, block_ms=int(settings.queue_poll_seconds * 1000) if follow else None)
+        if not leases:
+            if queue.is_drained() and not (follow and queue.producers_alive()):
+                break
+            if not follow:
+                # Other nodes hold the remaining leases; reclaimed here if they expire
+                await asyncio.sleep(settings.queue_poll_seconds)
+            continue
+        if follow:
+            for lease in leases:
+                if lease.context:
+                    processor.remember(lease.hadith_id, EraContext.loads(lease.context))
+            # Queued without a PCAP row (plain --enqueue): dropped here and
+            # queued again, with context, when the row is committed
+            orphans = processor.load_context(lease.hadith_id for lease in leases)
+            if orphans:
+                queue.drop([lease for lease in leases if lease.hadith_id in orphans])
+                leases = [lease for lease in leases if lease.hadith_id not in orphans]
+                if not leases:
+                    continue
+        if processor.processed is not None:
+            # Redelivered after a node stored the batch but died before acknowledging it
+            queue.ack([lease for lease in leases if lease.hadith_id in processor.processed])
+            leases = [lease for lease in leases if lease.hadith_id not in processor.processed]
+            if not leases:
+                continue
+        items = storage.fetch_hadiths([lease.hadith_id for lease in leases])
+        if args.group_by_chapter:
+            items = processor.group_by_chapter(items)
+        renewer = asyncio.create_task(
+            renew_leases(queue, leases, settings.queue_visibility_timeout_seconds / 3)
+        )
+        try:
+            assignments, progress = await processor.process_batch(items)
+        finally:
+            renewer.cancel()
+        unwritten = set()
+        if processor.writer:
+            # Acknowledge only committed rows; rows a failed flush kept go back to the queue
+            await processor.writer.flush()
+            unwritten = set(processor.writer.buffers.get(processor.stage, {}))
+        stored = {a.hadith_id for a in assignments} - unwritten
+        retry = processor.undispatched_ids | unwritten
+        queue.ack([lease for lease in leases if lease.hadith_id in stored])
+        queue.release([lease for lease in leases if lease.hadith_id in retry])
+        queue.drop([
+            lease for lease in leases
+            if lease.hadith_id not in stored and lease.hadith_id not in retry
+        ])
+        batch += 1
+        logger.info(
+            f"Queue batch {batch}: {progress.processed_items - progress.failed_items}"
+            f"/{progress.processed_items} succeeded"
+        )
+        if progress.status == ProcessingStatus.PAUSED:
+            logger.warning("Stopping: cost budget reached (leases released to other nodes)")
+            break
+    logger.info(f"Queue: {queue.summary()}; {queue.status()}")
+
+
+async def follow_pcap(processor, storage: PostgresStorage, queue: RedisWorkQueue, args, batch_size: int) -> None:
+    """
+    HMSTS handoff: queue hadiths whose PCAP rows exist, then follow PCAP commits.
+
+    A PCAP run with --handoff queues each hadith on the HMSTS work queue as
+    soon as its PCAP row is committed, with its era context in the entry.
+    This side drains the queue until it is empty and no PCAP run with
+    --handoff is alive, so start the PCAP run(s) first.
+    """
+    limit = args.limit or (processor.settings.test_hadith_limit if processor.settings.test_mode else None)
+    pending = [
+        hadith.id
+        for hadith, _ in processor.prioritize(storage.fetch_pending_hadiths(processor.stage, args.version, limit=limit))
+    ]
+    contexts = {
+        hadith_id: EraContext.from_pcap(assignment).dumps()
+        for hadith_id, assignment in storage.fetch_pcap_assignments(pending, args.version).items()
+    }
+    queue.enqueue([hadith_id for hadith_id in pending if hadith_id in contexts], contexts)
+    if not queue.producers_alive():
+        logger.warning("No PCAP run with --handoff is alive; processing hadiths with PCAP rows only")
+    await consume_queue(processor, storage, queue, args, batch_size, follow=True)
+
+
+async def retry_failed(processor, storage: PostgresStorage, args, batch_size: int, publisher=None) -> None:
+    """Replay dead-lettered hadiths, grouped by their error class's attempt limit."""
+    letters = storage.fetch_dead_letters(processor.stage, args.version, args.error_class)
+    if args.limit:
+        letters = letters[:args.limit]
+    items = {hadith.id: (hadith, pre) for hadith, pre in storage.fetch_hadiths([d.hadith_id for d in letters])}
+    groups, skipped = plan_retries(processor, letters, items, force=args.force)
+    if publisher:
+        for group in groups.values():
+            publisher.track(processor.stage, group)
+    logger.info(
+        f"{len(letters)} dead letters for {processor.stage.value} ({args.version}): "
+        f"retrying {sum(len(group) for group in groups.values())}, skipped {skipped}"
+    )
+    if processor.cost_tracker:
+        processor.cost_tracker.total_hadiths = (
+            processor.cost_tracker.totals.hadiths + sum(len(group) for group in groups.values())
+        )
+
+    default_attempts = processor.max_attempts
+    stored = set()
+    try:
+        for attempts, group in sorted(groups.items()):
+            processor.max_attempts = attempts
+            if args.group_by_chapter:
+                group = processor.group_by_chapter(group)
+            for start in range(0, len(group), batch_size):
+                assignments, progress = await processor.process_batch(group[start:start + batch_size])
+                stored.update(a.hadith_id for a in assignments)
+                logger.info(
+                    f"Retry ({attempts} attempts) batch {start // batch_size + 1}: "
+                    f"{progress.processed_items - progress.failed_items}/{progress.processed_items} succeeded"
+                )
+                if progress.status == ProcessingStatus.PAUSED:
+                    logger.warning("Stopping: cost budget reached (raise COST_BUDGET_USD to continue)")
+                    return
+    finally:
+        processor.max_attempts = default_attempts
+        if processor.writer:
+            # Resolve only committed rows
+            await processor.writer.flush()
+            stored -= set(processor.writer.buffers.get(processor.stage, {}))
+        resolved = storage.resolve_dead_letters(processor.stage, sorted(stored), args.version)
+        logger.info(f"Resolved {resolved} dead letters")
+
+
+async def simulate(args, settings, storage: PostgresStorage) -> None:
+    """
+    Project makespan, cost and bottleneck of a live run without calling the LLM.
+
+    Latency, output and cache models are fitted from --fit-cassette
+    recordings (see src/processors/simulator.py); try settings by overriding
+    them in the environment.
+    """
+    stages = ["pcap", "hmsts"] if args.stage == "all" else [args.stage]
+    simulator = CapacitySimulator(settings, fit_profiles([Path(p) for p in args.fit_cassette or []]))
+    limit = args.limit or (settings.test_hadith_limit if settings.test_mode else None)
+    reports = []
+    for name in stages:
+        processor = PROCESSORS[name](client=None, storage=storage, version=args.version, settings=settings)
+        items = load_items(processor, storage, args, limit)
+        workload = await Workload.build(processor, items)
+        reports.append(simulator.run(workload, processor.priority_class if processor.book_priorities else None))
+    report = {
+        "version": args.version,
+        "model": settings.llm_primary_model,
+        "settings": {
+            "pcap_batch_size": settings.pcap_batch_size,
+            "hmsts_batch_size": settings.hmsts_batch_size,
+            "parallel_workers": settings.parallel_workers,
+            "adaptive_concurrency": settings.llm_adaptive_concurrency,
+            "concurrency_max": settings.llm_concurrency_max,
+            "long_lane_workers": settings.long_lane_workers,
+            "rate_limit_rpm": settings.rate_limit_rpm,
+            "rate_limit_tpm": settings.rate_limit_tpm,
+        },
+        **summarize(reports),
+    }
+    for r in reports:
+        logger.info(
+            f"[simulate] {r['stage']}: {r['hadiths']} hadiths in {r['makespan_hours']}h, ${r['cost_usd']} "
+            f"({r['calls']} calls, {r['rejected_rpm'] + r['rejected_tpm']} rate-limited, {r['failed']} failed, "
+            f"mean {r['mean_in_flight']} in flight); limited by {r['bottleneck']}"
+        )
+    logger.info(
+        f"[simulate] total {report['makespan_hours']}h, ${report['cost_usd']}; "
+        f"bottleneck stage {report['bottleneck_stage']} ({report['bottleneck']})"
+    )
+    output = Path(args.output or settings.processed_dir / f"simulation_{args.stage}_{args.version}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    logger.info(f"Report written to {output}")
+
+
+async def run(args) -> None:
+    """Run one stage according to the parsed CLI arguments."""
+    settings = get_settings()
+    storage = PostgresStorage()
+    if args.simulate:
+        await simulate(args, settings, storage)
+        return
+    offline = args.batch_mode or args.resume_batch
+    if args.replay_cassette:
+        client = CassetteClient.replay(Path(args.replay_cassette), args.replay_latency, settings.llm_primary_model)
+    elif offline:
+        # Provider batch jobs go to the primary only
+        client = create_client(settings.llm_primary_model, settings)
+    else:
+        client = create_live_client(settings)
+    if args.record_cassette:
+        client = CassetteClient.record(client, Path(args.record_cassette))
+
+    cascade_client = None
+    if args.cascade:
+        # Shares the cassette with the main client (request keys include the model)
+        if args.replay_cassette:
+            cascade_client = CassetteClient(client.cassette, model=settings.llm_cascade_model)
+        else:
+            cascade_client = create_client(settings.llm_cascade_model, settings)
+            if args.record_cassette:
+                cascade_client = CassetteClient(client.cassette, inner=cascade_client)
+
+    # Queue consumers and handoff runs share the version's budget with other processes
+    ledger_name = args.stage
+    if args.from_queue or args.handoff:
+        ledger_name += f"_{socket.gethostname()}-{os.getpid()}"
+    cost_tracker = (
+        CostTracker.from_settings(settings, args.version, name=ledger_name) if settings.enable_cost_tracking else None
+    )
+    writer = WriteBehindWriter.from_settings(storage, settings) if settings.db_write_behind else None
+    if writer:
+        writer.start()
+    processor = PROCESSORS[args.stage](
+        client=client,
+        storage=storage,
+        version=args.version,
+        settings=settings,
+        cost_tracker=cost_tracker,
+        cascade_client=cascade_client,
+        processed=ProcessedSet.from_settings(settings, PROCESSORS[args.stage].stage, args.version),
+        writer=writer,
+    )
+
+    publisher, validation_client = None, None
+    handoff, heartbeat = None, None
+    if args.handoff:
+        handoff = RedisWorkQueue.from_settings(settings, ProcessingStage.HMSTS_PROCESSING, args.version)
+        if args.stage == "pcap":
+            handoff.register_producer(settings.queue_visibility_timeout_seconds)
+            heartbeat = asyncio.create_task(keep_registered(handoff, settings.queue_visibility_timeout_seconds))
+            processor.on_commit(lambda rows: handoff.enqueue(
+                [row.hadith_id for row in rows],
+                {row.hadith_id: EraContext.from_pcap(row).dumps() for row in rows},
+                quiet=True,
+            ))
+
+    if args.publish:
+        validator = None
+        if args.validate:
+            validation_client = create_client(settings.cross_validation_model or settings.llm_secondary_model, settings)
+            validator = CrossModelValidator(
+                PCAPProcessor(client=validation_client, storage=None, version=args.version, settings=settings),
+                storage,
+                version=args.version,
+                max_cost_usd=settings.cross_validation_max_cost_usd,
+            )
+        publisher = BookPublisher.from_settings(storage, settings, args.version, validator)
+        publisher.attach(processor)
+
+    if processor.prompt_builder.prefix_hash:
+        logger.info(f"System prompts from methodology bundle {processor.prompt_builder.prefix_hash}")
+
+    try:
+        limit = args.limit or (settings.test_hadith_limit if settings.test_mode else None)
+
+        if offline:
+            runner = BatchRunner.from_settings(AnthropicBatchEndpoint(client), settings)
+            if args.resume_batch:
+                # Re-attach to a job submitted by an earlier run
+                progress = await processor.resume_offline(Path(args.resume_batch), runner)
+                logger.info(
+                    f"Resumed batch: {progress.processed_items - progress.failed_items} stored, "
+                    f"{progress.failed_items} failed (dead-lettered; re-run with --retry-failed)"
+                )
+                return
+
+            items = load_items(processor, storage, args, limit)
+            if publisher:
+                publisher.track(processor.stage, items)
+            progress = await processor.process_offline(items, runner)
+            logger.info(f"Offline run complete: {progress.success_rate}% success")
+            return
+
+        batch_size = settings.pcap_batch_size if args.stage == "pcap" else settings.hmsts_batch_size
+        if args.enqueue or args.from_queue:
+            queue = RedisWorkQueue.from_settings(settings, processor.stage, args.version)
+            if args.enqueue:
+                items = processor.prioritize(storage.fetch_pending_hadiths(processor.stage, args.version, limit=limit))
+                queue.enqueue(hadith.id for hadith, _ in items)
+            else:
+                await consume_queue(processor, storage, queue, args, batch_size)
+            return
+
+        if args.retry_failed:
+            await retry_failed(processor, storage, args, batch_size, publisher)
+            return
+
+        if handoff and args.stage == "hmsts":
+            await follow_pcap(processor, storage, handoff, args, batch_size)
+            return
+
+        items = load_items(processor, storage, args, limit)
+        if publisher:
+            publisher.track(processor.stage, items)
+        for start in range(0, len(items), batch_size):
+            _, progress = await processor.process_batch(items[start:start + batch_size])
+            logger.info(
+                f"Batch {start // batch_size + 1}: {progress.processed_items - progress.failed_items}"
+                f"/{progress.processed_items} succeeded"
+            )
+            if progress.status == ProcessingStatus.PAUSED:
+                logger.warning("Stopping: cost budget reached (raise COST_BUDGET_USD to continue)")
+                break
+        if hasattr(client, "stats"):
+            logger.info(f"Client stats: {client.stats}")
+    finally:
+        if writer:
+            await writer.close()
+        if heartbeat:
+            # After the last commits were handed off
+            heartbeat.cancel()
+            handoff.unregister_producer()
+            logger.info(f"Handoff: {handoff.status()}")
+        if publisher:
+            await publisher.close()
+        if validation_client:
+            await validation_client.close()
+        if cost_tracker:
+            cost_tracker.flush_all()
+            logger.info(f"Cost: {cost_tracker.summary()}")
+        if cascade_client:
+            await cascade_client.close()
+        await client.close()
+
+
+def main():
+    """Main entry point for the processing script."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run PCAP/HMSTS LLM processing")
+    parser.add_argument(
+        "--stage",
+        choices=sorted(PROCESSORS) + ["all"],
+        required=True,
+        help="Stage to run (all: both, --simulate only)"
+    )
+    parser.add_argument("--version", default="v1.0", help="Processing version")
+    parser.add_argument("--limit", type=int, help="Process at most N hadiths")
+    parser.add_argument(
+        "--batch-mode",
+        action="store_true",
+        help="Submit offline provider batch jobs instead of live requests"
+    )
+    parser.add_argument(
+        "--collapse-duplicates",
+        action="store_true",
+        help="Send one representative per near-duplicate cluster and fan results out"
+    )
+    parser.add_argument(
+        "--group-by-chapter",
+        action="store_true",
+        help="Order work by chapter and share a cached chapter context segment per chapter"
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Queue pending hadiths on the Redis work queue and exit"
+    )
+    parser.add_argument(
+        "--from-queue",
+        action="store_true",
+        help="Process batches leased from the Redis work queue until it is drained"
+    )
+    parser.add_argument(
+        "--handoff",
+        action="store_true",
+        help="PCAP: queue each committed hadith for HMSTS; HMSTS: process them as they arrive"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Replay only dead-lettered hadiths, with per-error-class retry policies"
+    )
+    parser.add_argument(
+        "--error-class",
+        action="append",
+        metavar="NAME",
+        help="With --retry-failed: only this error class (repeatable, e.g. RateLimitError)"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --retry-failed: ignore prompt-change and failure-count checks"
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="Validate and export each book as soon as it has PCAP and HMSTS rows for every hadith"
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="With --publish: cross-check each book's risky PCAP assignments before exporting it"
+    )
+    parser.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Project makespan, cost and bottleneck of a live run (no LLM calls)"
+    )
+    parser.add_argument(
+        "--fit-cassette",
+        action="append",
+        metavar="PATH",
+        help="With --simulate: fit latency/output/cache models from a recorded cassette (repeatable)"
+    )
+    parser.add_argument("--output", help="With --simulate: report path (JSON)")
+    parser.add_argument(
+        "--resume-batch",
+        help="Resume polling/collection of a submitted batch job manifest (.job.json)"
+    )
+
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="First pass on LLM_CASCADE_MODEL; escalate low-confidence results to the primary"
+    )
+
+    parser.add_argument("--record-cassette", metavar="PATH", help="Record live LLM calls to a cassette file")
+    parser.add_argument("--replay-cassette", metavar="PATH", help="Replay live LLM calls from a cassette file")
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=0.0,
+        metavar="SCALE",
+        help="Sleep recorded latency x SCALE when replaying (default 0: as fast as possible)"
+    )
+
+    args = parser.parse_args()
+    if (args.record_cassette or args.replay_cassette) and (args.batch_mode or args.resume_batch):
+        parser.error("cassettes record/replay live requests only (not --batch-mode/--resume-batch)")
+    if args.record_cassette and args.replay_cassette:
+        parser.error("use either --record-cassette or --replay-cassette")
+    if args.enqueue and args.from_queue:
+        parser.error("use either --enqueue or --from-queue")
+    if (args.enqueue or args.from_queue) and (args.batch_mode or args.resume_batch):
+        parser.error("the work queue applies to live processing only")
+    if (args.enqueue or args.from_queue) and args.collapse_duplicates:
+        parser.error("--collapse-duplicates needs every cluster in one process (not the work queue)")
+    if (args.error_class or args.force) and not args.retry_failed:
+        parser.error("--error-class/--force apply to --retry-failed only")
+    if args.retry_failed and (args.batch_mode or args.resume_batch or args.enqueue or args.from_queue):
+        parser.error("--retry-failed runs live in this process (not batch mode or the work queue)")
+    if args.retry_failed and args.collapse_duplicates:
+        parser.error("--retry-failed replays failed hadiths individually (not --collapse-duplicates)")
+    if args.stage == "all" and not args.simulate:
+        parser.error("--stage all applies to --simulate only")
+    if (args.fit_cassette or args.output) and not args.simulate:
+        parser.error("--fit-cassette/--output apply to --simulate only")
+    if args.simulate and (
+        args.batch_mode or args.resume_batch or args.enqueue or args.from_queue or args.retry_failed
+        or args.publish or args.cascade or args.record_cassette or args.replay_cassette or args.handoff
+    ):
+        parser.error("--simulate models a plain live run (no other modes)")
+    if args.handoff and args.stage == "pcap" and args.enqueue:
+        parser.error("--handoff queues committed PCAP rows (not with --enqueue)")
+    if args.handoff and args.stage == "hmsts" and (
+        args.batch_mode or args.resume_batch or args.enqueue or args.from_queue or args.retry_failed
+        or args.collapse_duplicates or args.publish
+    ):
+        parser.error("HMSTS --handoff consumes the handoff queue live (no other modes; publish with scripts/export_data.py)")
+    if args.validate and not args.publish:
+        parser.error("--validate applies to --publish (see scripts/validate_outputs.py for full runs)")
+    if args.publish and (args.enqueue or args.from_queue):
+        parser.error("--publish tracks one process's work; publish queue runs with scripts/export_data.py")
+    if args.cascade and (args.batch_mode or args.resume_batch):
+        parser.error("--cascade applies to live processing only")
+    if args.cascade and not get_settings().llm_cascade_model:
+        parser.error("--cascade needs LLM_CASCADE_MODEL")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Streaming Pipeline Script
+=========================
+
+Run PCAP, HMSTS and (optionally) cross-model validation concurrently,
+joined by bounded queues (see src/processors/orchestrator.py).
+
+- Hadiths pending PCAP flow through PCAP and on to HMSTS (and validation)
+  as soon as their PCAP result lands
+- Hadiths whose PCAP row already exists but that are pending HMSTS are fed
+  straight into HMSTS, with their stored PCAP context
+- --validate cross-checks PCAP results at or above
+  PIPELINE_VALIDATION_MIN_RISK on CROSS_VALIDATION_MODEL within
+  CROSS_VALIDATION_MAX_COST_USD
+- --publish validates (with --validate) and exports each book as soon as
+  all its hadiths have PCAP and HMSTS rows (see
+  src/processors/publisher.py); with BOOK_PRIORITIES the prioritized
+  books are fed first
+- --shards N (PIPELINE_SHARDS) runs the pipeline in N processes partitioned
+  by book_id, each with its own DB connection pool, checkpoint files and
+  cost ledger, rebalanced by a coordinator when a shard runs out of work
+  and sharing COST_BUDGET_USD through it (see src/processors/shards.py).
+  --publish needs a single process (a book can span shards); publish a
+  sharded run afterwards with scripts/export_data.py [--validate]
+
+The stage report is written to processed/pipeline_{version}.json.
+
+Examples:
+    python scripts/run_pipeline.py --limit 500
+    python scripts/run_pipeline.py --validate --queue-size 50
+    BOOK_PRIORITIES='{"1": 0, "2": 0}' python scripts/run_pipeline.py --validate --publish
+    python scripts/run_pipeline.py --shards 8 --validate
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from config.settings import get_settings
+from src.llm.factory import create_client, create_live_client
+from src.llm.cost_tracker import CostTracker, ledger_path, read_ledger, version_ledgers
+from src.models.processing import ProcessingStage
+from src.processors import PCAPProcessor, HMSTSProcessor
+from src.processors.orchestrator import PipelineOrchestrator
+from src.processors.publisher import BookPublisher
+from src.processors.shards import ShardCoordinator, plan_units, shard_settings
+from src.storage.postgres import PostgresStorage
+from src.storage.writer import WriteBehindWriter
+from src.utils.progress_tracker import ProcessedSet
+from src.validation import CrossModelValidator
+
+
+async def run_pipeline(args, settings, storage: PostgresStorage, feed, shard=None) -> dict:
+    """
+    Build the processors and the orchestrator, feed it and run it.
+
+    Args:
+        feed: `feed(orchestrator, pcap, hmsts, validator, cost_tracker)`
+            queues the work and returns a BookPublisher (or None)
+        shard: Shard index (per-shard checkpoint files and cost ledger)
+    """
+    if args.queue_size:
+        settings.pipeline_queue_size = args.queue_size
+    client = create_live_client(settings)
+    cost_tracker = (
+        CostTracker.from_settings(settings, args.version, name=shard_ledger(shard) if shard is not None else None)
+        if settings.enable_cost_tracking else None
+    )
+    writer = WriteBehindWriter.from_settings(storage, settings) if settings.db_write_behind else None
+    if writer:
+        writer.start()
+    pcap, hmsts = [
+        cls(
+            client=client,
+            storage=storage,
+            version=args.version,
+            settings=settings,
+            cost_tracker=cost_tracker,
+            processed=ProcessedSet.from_settings(settings, cls.stage, args.version, shard),
+            writer=writer,
+        )
+        for cls in (PCAPProcessor, HMSTSProcessor)
+    ]
+
+    validator, validation_client = None, None
+    if args.validate:
+        model = settings.cross_validation_model or settings.llm_secondary_model
+        validation_client = create_client(model, settings)
+        validator = CrossModelValidator(
+            PCAPProcessor(client=validation_client, storage=None, version=args.version, settings=settings),
+            storage,
+            version=args.version,
+            max_cost_usd=settings.cross_validation_max_cost_usd,
+        )
+
+    orchestrator = PipelineOrchestrator.build(pcap, hmsts, settings, validator=validator)
+    publisher = None
+    try:
+        publisher = feed(orchestrator, pcap, hmsts, validator, cost_tracker)
+        return await orchestrator.run()
+    finally:
+        if writer:
+            await writer.close()
+        if publisher:
+            await publisher.close()
+        if cost_tracker:
+            cost_tracker.flush_all()
+            logger.info(f"Cost: {cost_tracker.summary()}")
+        if validation_client:
+            await validation_client.close()
+        await client.close()
+
+
+async def run(args) -> None:
+    settings = get_settings()
+    storage = PostgresStorage()
+    limit = args.limit or (settings.test_hadith_limit if settings.test_mode else None)
+
+    def feed(orchestrator, pcap, hmsts, validator, cost_tracker):
+        pcap_items = pcap.prioritize(
+            storage.fetch_pending_hadiths(ProcessingStage.PCAP_PROCESSING, args.version, limit=limit)
+        )
+        pending_pcap = {hadith.id for hadith, _ in pcap_items}
+        hmsts_items = hmsts.prioritize([
+            item for item in storage.fetch_pending_hadiths(ProcessingStage.HMSTS_PROCESSING, args.version, limit=limit)
+            if item[0].id not in pending_pcap
+        ])
+        logger.info(f"{len(pcap_items)} hadiths pending PCAP, {len(hmsts_items)} more pending HMSTS only")
+        if cost_tracker:
+            cost_tracker.total_hadiths = cost_tracker.totals.hadiths + 2 * len(pcap_items) + len(hmsts_items)
+
+        publisher = None
+        if args.publish:
+            publisher = BookPublisher.from_settings(storage, settings, args.version, validator)
+            for processor in (pcap, hmsts):
+                publisher.attach(processor)
+            publisher.track(ProcessingStage.PCAP_PROCESSING, pcap_items)
+            publisher.track(ProcessingStage.HMSTS_PROCESSING, pcap_items + hmsts_items)
+
+        orchestrator.feed(orchestrator.stages[ProcessingStage.PCAP_PROCESSING.value], pcap_items)
+        orchestrator.feed(orchestrator.stages[ProcessingStage.HMSTS_PROCESSING.value], hmsts_items)
+        return publisher
+
+    report = await run_pipeline(args, settings, storage, feed)
+    write_report(args, settings, report)
+
+
+async def run_shard(channel, args) -> dict:
+    """One shard: pull work units from the coordinator until none are left."""
+    settings = shard_settings(get_settings(), channel.shards)
+    # This process's own connection pool
+    storage = PostgresStorage()
+
+    def feed(orchestrator, pcap, hmsts, validator, cost_tracker):
+        if cost_tracker:
+            cost_tracker.total_hadiths = cost_tracker.totals.hadiths + channel.planned
+
+        async def source():
+            unit = await channel.next_unit(cost_tracker.drain().cost_usd if cost_tracker else 0.0)
+            if cost_tracker:
+                cost_tracker.set_peer_spend(channel.spent_elsewhere)
+            if unit is None:
+                return None
+            pcap_items = storage.fetch_pending_hadiths(
+                ProcessingStage.PCAP_PROCESSING, args.version, hadith_ids=list(unit.pcap_ids),
+            ) if unit.pcap_ids else []
+            hmsts_items = storage.fetch_pending_hadiths(
+                ProcessingStage.HMSTS_PROCESSING, args.version, hadith_ids=list(unit.hmsts_ids),
+            ) if unit.hmsts_ids else []
+            logger.info(
+                f"[shard {channel.index}] book {unit.book_id}: {len(pcap_items)} pending PCAP, "
+                f"{len(hmsts_items)} pending HMSTS only"
+            )
+            return pcap_items, hmsts_items
+
+        orchestrator.feed_from(source)
+        return None
+
+    return await run_pipeline(args, settings, storage, feed, shard=channel.index)
+
+
+def shard_main(channel, args) -> None:
+    """Shard process entry point (spawned by the coordinator)."""
+    channel.report(asyncio.run(run_shard(channel, args)))
+
+
+def coordinate(args) -> None:
+    """Partition the pending corpus by book and run it across shard processes."""
+    settings = get_settings()
+    storage = PostgresStorage()
+    limit = args.limit or (settings.test_hadith_limit if settings.test_mode else None)
+    pending_pcap = storage.fetch_pending_ids(ProcessingStage.PCAP_PROCESSING, args.version, limit=limit)
+    pending_hmsts = storage.fetch_pending_ids(ProcessingStage.HMSTS_PROCESSING, args.version, limit=limit)
+    units = plan_units(pending_pcap, pending_hmsts, settings.pipeline_shard_unit_hadiths, settings.book_priorities)
+
+    # The shards' own ledgers (from earlier sharded runs) and everything else of the version
+    spent, spent_before = {}, 0.0
+    shard_ledgers = {ledger_path(settings.checkpoint_dir, args.version, shard_ledger(i)): i for i in range(args.shards)}
+    for path in version_ledgers(settings.checkpoint_dir, args.version):
+        delta = read_ledger(path)
+        if delta is None:
+            continue
+        if path in shard_ledgers:
+            spent[shard_ledgers[path]] = delta.cost_usd
+        else:
+            spent_before += delta.cost_usd
+    coordinator = ShardCoordinator(
+        shard_main, (args,), units, args.shards, settings.book_priorities,
+        budget_usd=settings.cost_budget_usd if settings.enable_cost_tracking else None,
+        spent=spent,
+        spent_before=spent_before,
+    )
+    report = coordinator.run()
+    write_report(args, settings, report)
+
+
+def shard_ledger(shard: int) -> str:
+    """Cost ledger name of a shard (unsharded runs use the version's default ledger)."""
+    return f"shard{shard}" if shard is not None else None
+
+
+def write_report(args, settings, report: dict) -> None:
+    output = Path(args.output or settings.processed_dir / f"pipeline_{args.version}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    logger.info(f"Report written to {output}")
+
+
+def main():
+    """Main entry point for the pipeline script."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run PCAP -> HMSTS (-> validation) as a streaming pipeline")
+    parser.add_argument("--version", default="v1.0", help="Processing version")
+    parser.add_argument("--limit", type=int, help="Feed at most N hadiths per source")
+    parser.add_argument("--validate", action="store_true", help="Cross-check risky PCAP results on a second model")
+    parser.add_argument("--publish", action="store_true", help="Validate and export each book as soon as it completes")
+    parser.add_argument("--queue-size", type=int, help="Inter-stage queue bound (PIPELINE_QUEUE_SIZE)")
+    parser.add_argument("--shards", type=int, help="Processes partitioned by book_id (PIPELINE_SHARDS)")
+    parser.add_argument("--output", help="Report path (JSON)")
+    args = parser.parse_args()
+    if args.queue_size is not None and args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    if args.shards is not None and args.shards < 1:
+        parser.error("--shards must be at least 1")
+    args.shards = args.shards or get_settings().pipeline_shards
+    if args.shards > 1 and args.publish:
+        parser.error(
+            "--publish needs a single process (--shards 1 / PIPELINE_SHARDS=1); "
+            "publish a sharded run afterwards with scripts/export_data.py [--validate]"
+        )
+    if args.shards > 1:
+        coordinate(args)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Output Validation Script
+========================
+
+Cross-model validation of stored PCAP assignments.
+
+The riskiest assignments (low posterior_confidence, speculative or
+contextual evidence, earlier validation warnings) are re-run on a second
+model within a cost and time budget; agreement is written to
+validation_results (validation_type 'cross_model') and disagreements are
+listed riskiest-first for review (see src/validation/cross_model_validator.py).
+
+The report is written to processed/cross_validation_{version}.json.
+
+Examples:
+    python scripts/validate_outputs.py --top-k 200 --max-cost-usd 10
+    python scripts/validate_outputs.py --model claude-3-5-haiku-20241022 --max-minutes 15
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from config.settings import get_settings
+from src.llm.factory import create_client
+from src.processors import PCAPProcessor
+from src.storage.postgres import PostgresStorage
+from src.validation import CrossModelValidator
+
+
+async def run(args) -> None:
+    settings = get_settings()
+    storage = PostgresStorage()
+    model = args.model or settings.cross_validation_model or settings.llm_secondary_model
+    client = create_client(model, settings)
+    # storage=None: second opinions must never overwrite pcap_assignments
+    processor = PCAPProcessor(client=client, storage=None, version=args.version, settings=settings)
+    validator = CrossModelValidator(
+        processor,
+        storage,
+        version=args.version,
+        top_k=args.top_k or settings.cross_validation_top_k,
+        max_cost_usd=settings.cross_validation_max_cost_usd if args.max_cost_usd is None else args.max_cost_usd,
+        max_seconds=60 * (args.max_minutes or settings.cross_validation_max_minutes),
+        revalidate=args.revalidate,
+    )
+    logger.info(f"Cross-validating {args.version} PCAP assignments against {model}")
+    try:
+        report = await validator.run()
+    finally:
+        await client.close()
+
+    report["model"] = model
+    for entry in report["review_queue"][: args.show]:
+        logger.info(
+            f"review hadith {entry['hadith_id']} [{entry['status']}, priority {entry['review_priority']:.2f}]: "
+            + "; ".join(entry["issues"])
+        )
+    output = Path(args.output or settings.processed_dir / f"cross_validation_{args.version}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    logger.info(f"Report written to {output}")
+
+
+def main():
+    """Main entry point for the validation script."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cross-validate risky PCAP assignments on a second model")
+    parser.add_argument("--version", default="v1.0", help="Processing version to validate")
+    parser.add_argument("--model", help="Second-opinion model (CROSS_VALIDATION_MODEL / LLM_SECONDARY_MODEL)")
+    parser.add_argument("--top-k", type=int, help="Re-check at most the K riskiest assignments")
+    parser.add_argument("--max-cost-usd", type=float, help="Spend limit for second-opinion calls")
+    parser.add_argument("--max-minutes", type=float, help="Stop starting new calls after this long")
+    parser.add_argument("--revalidate", action="store_true", help="Include hadiths already cross-validated")
+    parser.add_argument("--show", type=int, default=20, help="Disagreements to log (all are in the report)")
+    parser.add_argument("--output", help="Report path (JSON)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
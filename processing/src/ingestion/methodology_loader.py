@@ -0,0 +1,296 @@
+"""
+Methodology Bundle
+==================
+
+Compile the methodology documents (IPKSA.md, PCAP.md, HMSTS.md), stage
+prompt text, few-shot examples and the temporal marker table into one
+versioned binary bundle.
+
+Without it every worker re-reads the sources and re-renders the system
+prompts (YAML examples, marker table, JSON schema). With it a worker maps
+a single file and slices the pre-rendered prefixes out of it, so starting
+many workers is cheap and all of them send byte-identical prefixes (which
+is what provider prompt caching keys on).
+
+File format (`processed/methodology_bundle.bin`):
+- Header `IKBMTH1\\n`, 4-byte big-endian index length, JSON index
+- Index: format version, content hash, build time, source file stats,
+  output schema hash and per-entry offset/length/token estimate/sha256
+- Entries (UTF-8, concatenated after the index):
+  - `system/<stage>`: complete rendered system prompt per LLM stage
+  - `methodology/<name>`: raw methodology documents (IPKSA, PCAP, HMSTS)
+  - `markers`: rendered temporal marker reference table
+
+The content hash covers every entry and the output schemas, and serves as
+the cache key for the prompt prefix. A bundle is stale when any source
+file's size or mtime has changed since the build, or when the JSON schema
+of a stage's output model (src/models, embedded in its system prompt) no
+longer matches; stale bundles are ignored (with a warning) and prompts are
+rendered from the sources as before.
+
+Usage:
+------
+    python -m src.ingestion.methodology_loader          # build / rebuild
+    bundle = MethodologyBundle.load(settings.prompt_bundle_file)
+    prompt = bundle.system_prompt(ProcessingStage.PCAP_PROCESSING)
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from loguru import logger
+
+from config.settings import get_settings
+from src.llm.compaction import estimate_tokens
+from src.llm.prompt_builder import PromptBuilder, STAGE_PROMPT_NAMES, STAGE_OUTPUT_MODELS
+from src.models.processing import ProcessingStage
+
+
+MAGIC = b"IKBMTH1\n"
+FORMAT_VERSION = 1
+_LENGTH = struct.Struct(">I")
+
+METHODOLOGY_DOCUMENTS = ["IPKSA.md", "PCAP.md", "HMSTS.md"]
+# Reported in place of a file name when the output models changed
+SCHEMA_SOURCE = "output schemas (src/models)"
+
+
+def source_files(builder: PromptBuilder) -> List[Path]:
+    """Every file the bundle is compiled from (missing ones included, as absent)."""
+    files = [builder.methodology_dir / name for name in METHODOLOGY_DOCUMENTS]
+    for name in STAGE_PROMPT_NAMES.values():
+        files.append(builder.prompts_dir / f"{name}_system.txt")
+        files.append(builder.prompts_dir / f"{name}_examples.yaml")
+    if builder.markers_file:
+        files.append(builder.markers_file)
+    return files
+
+
+def schema_hash() -> str:
+    """Hash of the JSON schema of every stage's output model, as rendered into the system prompts."""
+    schemas = {stage.value: model.model_json_schema() for stage, model in STAGE_OUTPUT_MODELS.items()}
+    return hashlib.sha256(json.dumps(schemas, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def _stat(path: Path) -> Optional[List[int]]:
+    """[size, mtime_ns] of a file, None if it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def build_bundle(builder: PromptBuilder, path: Path) -> "MethodologyBundle":
+    """
+    Render every prompt prefix and write the bundle atomically.
+
+    Args:
+        builder: Prompt builder pointing at the sources (rendering without a bundle)
+        path: Bundle file to write
+
+    Returns:
+        The freshly written bundle, loaded
+    """
+    entries: Dict[str, str] = {}
+    for stage in STAGE_PROMPT_NAMES:
+        entries[f"system/{stage.value}"] = builder.render_system_prompt(stage)
+    for name in METHODOLOGY_DOCUMENTS:
+        document = builder.methodology_dir / name
+        if document.exists():
+            entries[f"methodology/{Path(name).stem}"] = document.read_text(encoding="utf-8")
+    entries["markers"] = builder.render_marker_table()
+
+    blobs, index_entries, offset = [], {}, 0
+    schemas = schema_hash()
+    digest = hashlib.sha256(b"schemas\0" + schemas.encode("ascii"))
+    for name, content in entries.items():
+        blob = content.encode("utf-8")
+        blob_hash = hashlib.sha256(blob).hexdigest()
+        digest.update(name.encode("utf-8") + b"\0" + blob_hash.encode("ascii"))
+        index_entries[name] = {
+            "offset": offset,
+            "length": len(blob),
+            "tokens": estimate_tokens(content),
+            "sha256": blob_hash,
+        }
+        blobs.append(blob)
+        offset += len(blob)
+
+    index = {
+        "format_version": FORMAT_VERSION,
+        "content_hash": digest.hexdigest()[:32],
+        "built_at": time.time(),
+        "sources": {str(p.resolve()): _stat(p) for p in source_files(builder)},
+        "schema_hash": schemas,
+        "entries": index_entries,
+    }
+    header = json.dumps(index, ensure_ascii=False).encode("utf-8")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + _LENGTH.pack(len(header)) + header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+    logger.info(
+        f"Wrote methodology bundle {path} ({len(entries)} entries, "
+        f"{len(MAGIC) + _LENGTH.size + len(header) + offset} bytes, hash {index['content_hash']})"
+    )
+    return MethodologyBundle.load(path)
+
+
+class MethodologyBundle:
+    """
+    Read-only, memory-mapped view of a compiled methodology bundle.
+    """
+
+    def __init__(self, path: Path, buffer: mmap.mmap, index: Dict[str, Any], data_offset: int):
+        self.path = path
+        self.buffer = buffer
+        self.index = index
+        self.data_offset = data_offset
+        self._texts: Dict[str, str] = {}
+
+    @classmethod
+    def load(cls, path: Path) -> "MethodologyBundle":
+        """
+        Map a bundle file.
+
+        Raises:
+            FileNotFoundError: If the bundle does not exist
+            ValueError: If the file is not a bundle of a supported format version
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(MAGIC)] != MAGIC:
+            buffer.close()
+            raise ValueError(f"{path} is not a methodology bundle")
+        (length,) = _LENGTH.unpack_from(buffer, len(MAGIC))
+        start = len(MAGIC) + _LENGTH.size
+        index = json.loads(buffer[start:start + length].decode("utf-8"))
+        if index.get("format_version") != FORMAT_VERSION:
+            buffer.close()
+            raise ValueError(f"{path}: unsupported bundle format {index.get('format_version')}")
+        return cls(path, buffer, index, start + length)
+
+    # ------------------------------------------------------------------
+    # Access
+    # ------------------------------------------------------------------
+
+    @property
+    def content_hash(self) -> str:
+        """Hash of every entry; changes whenever any prompt prefix changes."""
+        return self.index["content_hash"]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index["entries"]
+
+    def text(self, name: str) -> str:
+        """Decoded entry (sliced from the map on first access, then memoized)."""
+        if name not in self._texts:
+            entry = self.index["entries"][name]
+            start = self.data_offset + entry["offset"]
+            self._texts[name] = self.buffer[start:start + entry["length"]].decode("utf-8")
+        return self._texts[name]
+
+    def system_prompt(self, stage: ProcessingStage) -> Optional[str]:
+        """Pre-rendered system prompt for a stage (None if not bundled)."""
+        name = f"system/{stage.value}"
+        return self.text(name) if name in self else None
+
+    def tokens(self, name: str) -> int:
+        """Estimated token count of an entry."""
+        return self.index["entries"][name]["tokens"]
+
+    def stale_sources(self) -> List[str]:
+        """Source files whose size or mtime changed since the build (and SCHEMA_SOURCE if the output models did)."""
+        stale = [
+            source for source, stat in self.index["sources"].items()
+            if _stat(Path(source)) != stat
+        ]
+        if self.index.get("schema_hash") != schema_hash():
+            stale.append(SCHEMA_SOURCE)
+        return stale
+
+    def close(self) -> None:
+        if not self.buffer.closed:
+            self.buffer.close()
+
+
+def load_bundle(path: Path, builder: Optional[PromptBuilder] = None) -> Optional[MethodologyBundle]:
+    """
+    Load a bundle if it exists and matches its sources.
+
+    Args:
+        path: Bundle file
+        builder: Builder whose sources must match the bundle's (not checked if None)
+
+    Returns:
+        The bundle, or None if it is missing, unreadable or stale
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        bundle = MethodologyBundle.load(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring methodology bundle {path}: {e}")
+        return None
+    stale = bundle.stale_sources()
+    if builder is not None:
+        expected = {str(p.resolve()) for p in source_files(builder)}
+        stale += sorted(expected.symmetric_difference(bundle.index["sources"]))
+    if stale:
+        logger.warning(
+            f"Methodology bundle {path.name} is stale ({', '.join(Path(s).name for s in stale[:3])}"
+            f"{', ...' if len(stale) > 3 else ''} changed); rendering prompts from sources. "
+            f"Rebuild with: python -m src.ingestion.methodology_loader"
+        )
+        bundle.close()
+        return None
+    return bundle
+
+
+def main():
+    """
+    Main entry point for building the methodology bundle.
+    """
+    import argparse
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Compile methodology, prompts and markers into a bundle")
+    parser.add_argument("--output", default=str(settings.prompt_bundle_file), help="Bundle path")
+    parser.add_argument("--check", action="store_true", help="Only report whether the bundle is up to date")
+    args = parser.parse_args()
+
+    builder = PromptBuilder(
+        prompts_dir=settings.prompts_dir,
+        methodology_dir=settings.methodology_dir,
+        markers_file=settings.markers_file,
+    )
+    if args.check:
+        bundle = load_bundle(Path(args.output), builder)
+        if bundle is None:
+            logger.error(f"{args.output} is missing or stale")
+            sys.exit(1)
+        logger.info(f"{args.output} is up to date (hash {bundle.content_hash})")
+        return
+
+    bundle = build_bundle(builder, Path(args.output))
+    for name in bundle.index["entries"]:
+        logger.info(f"  {name}: ~{bundle.tokens(name)} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+LLM Integration
+===============
+
+Provider clients, prompt construction and batch submission for the
+PCAP/HMSTS processing stages.
+
+Usage:
+------
+    from src.llm import ClaudeClient, LLMRequest
+    from src.llm import create_live_client  # hedged primary/secondary
+    from src.llm.batch import BatchRunner, AnthropicBatchEndpoint
+"""
+
+from .base import (
+    LLMError,
+    RateLimitError,
+    OverloadedError,
+    TransientError,
+    LLMResponseError,
+    LLMRequest,
+    LLMResponse,
+    BaseLLMClient,
+    extract_json,
+)
+from .claude import ClaudeClient
+from .openai import OpenAIClient, LocalClient
+from .hedging import LatencyWindow, HedgedLLMClient
+from .rate_limiter import AIMDLimiter
+from .factory import provider_for_model, create_client, create_live_client
+from .streaming import StreamAborted, IncrementalJSONParser, StreamGuard
+from .repair import (
+    remove_trailing_commas,
+    repair_json,
+    enum_key,
+    SchemaRepairer,
+    get_repairer,
+    parse_json_lenient,
+)
+from .cost_tracker import (
+    ModelPricing,
+    PRICING,
+    pricing_for,
+    response_cost,
+    CostDelta,
+    CostShard,
+    CostTracker,
+)
+from .cassette import CassetteMissError, Cassette, CassetteClient, request_key
+from .prompt_builder import PromptBuilder, get_prompt_builder
+from .compaction import Compaction, estimate_tokens
+from .token_budget import hadith_tokens, fit_text
+from .batch import (
+    BatchStatus,
+    BatchJob,
+    BatchResult,
+    BatchEndpoint,
+    AnthropicBatchEndpoint,
+    LocalBatchEndpoint,
+    BatchRunner,
+)
+
+__all__ = [
+    # Base
+    "LLMError",
+    "RateLimitError",
+    "OverloadedError",
+    "TransientError",
+    "LLMResponseError",
+    "LLMRequest",
+    "LLMResponse",
+    "BaseLLMClient",
+    "extract_json",
+    # Clients
+    "ClaudeClient",
+    "OpenAIClient",
+    "LocalClient",
+    "LatencyWindow",
+    "HedgedLLMClient",
+    "AIMDLimiter",
+    "provider_for_model",
+    "create_client",
+    "create_live_client",
+    # Streaming
+    "StreamAborted",
+    "IncrementalJSONParser",
+    "StreamGuard",
+    # Repair
+    "remove_trailing_commas",
+    "repair_json",
+    "enum_key",
+    "SchemaRepairer",
+    "get_repairer",
+    "parse_json_lenient",
+    # Cost tracking
+    "ModelPricing",
+    "PRICING",
+    "pricing_for",
+    "response_cost",
+    "CostDelta",
+    "CostShard",
+    "CostTracker",
+    # Record / replay
+    "CassetteMissError",
+    "Cassette",
+    "CassetteClient",
+    "request_key",
+    # Prompts
+    "PromptBuilder",
+    "get_prompt_builder",
+    "Compaction",
+    "estimate_tokens",
+    "hadith_tokens",
+    "fit_text",
+    # Batch jobs
+    "BatchStatus",
+    "BatchJob",
+    "BatchResult",
+    "BatchEndpoint",
+    "AnthropicBatchEndpoint",
+    "LocalBatchEndpoint",
+    "BatchRunner",
+]
@@ -0,0 +1,213 @@
+"""
+LLM Client Base Types
+=====================
+
+Provider-neutral request/response models and the client interface used by
+the PCAP and HMSTS processors.
+
+Classes:
+- LLMRequest: A single structured-output request for one hadith
+- LLMResponse: Provider response with token usage and latency
+- BaseLLMClient: Abstract async client implemented per provider
+- LLMError (and subclasses): Errors raised by clients
+"""
+
+import hashlib
+import json
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, List, Dict, Any, TYPE_CHECKING
+from pydantic import BaseModel, Field, ConfigDict
+
+from src.models.processing import ProcessingStage
+
+if TYPE_CHECKING:
+    from .streaming import StreamGuard
+
+
+# ============================================================================
+# Errors
+# ============================================================================
+
+class LLMError(Exception):
+    """Base error for LLM client failures."""
+
+
+class RateLimitError(LLMError):
+    """Provider rejected the request because of rate limits (HTTP 429)."""
+
+
+class OverloadedError(LLMError):
+    """Provider is temporarily overloaded (HTTP 529/503)."""
+
+
+class TransientError(LLMError):
+    """Request failed in transit (timeout, dropped connection); safe to retry."""
+
+
+# HTTP statuses reported as OverloadedError by every client
+OVERLOAD_STATUSES = {503, 529}
+
+
+class LLMResponseError(LLMError):
+    """Response was received but could not be used (bad JSON, schema mismatch)."""
+
+
+# ============================================================================
+# Request / Response
+# ============================================================================
+
+class LLMRequest(BaseModel):
+    """
+    Provider-neutral LLM request for a single hadith and stage.
+
+    `request_id` doubles as the `custom_id` for provider batch endpoints, so it
+    is restricted to the characters those endpoints accept.
+    """
+    model_config = ConfigDict(validate_assignment=True)
+
+    request_id: str = Field(..., pattern=r"^[A-Za-z0-9_-]{1,64}$", description="Unique request identifier")
+    hadith_id: int = Field(..., description="References raw_hadiths.id")
+    stage: ProcessingStage = Field(..., description="Pipeline stage issuing the request")
+    version: str = Field("v1.0", max_length=20, description="Processing version")
+
+    # Prompt
+    system: str = Field("", description="System prompt (methodology, schema, examples)")
+    user: str = Field(..., min_length=1, description="Per-hadith user prompt")
+    context: str = Field("", description="Context shared by a group of requests (e.g. a chapter), sent after the system prompt")
+    cache_system: bool = Field(True, description="Mark the system prompt (and context) as cacheable")
+
+    # Generation parameters
+    model: Optional[str] = Field(None, description="Model override; client default if None")
+    max_tokens: int = Field(4096, ge=1)
+    temperature: float = Field(0.1, ge=0, le=1)
+
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+    @property
+    def prompt_hash(self) -> str:
+        """Hash of the system and user prompt (not the shared context, which depends on grouping)."""
+        payload = f"{self.stage.value}\0{self.system}\0{self.user}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()[:16]
+
+    @staticmethod
+    def make_id(stage: ProcessingStage, hadith_id: int, attempt: int = 0) -> str:
+        """Build a deterministic request id for a hadith/stage pair."""
+        base = f"{stage.value}-{hadith_id}"
+        return f"{base}-{attempt}" if attempt else base
+
+
+class LLMResponse(BaseModel):
+    """
+    Provider response with usage accounting.
+    """
+    model_config = ConfigDict(validate_assignment=True)
+
+    request_id: str
+    model: str
+    content: str = Field(..., description="Raw text content returned by the model")
+    stop_reason: Optional[str] = None
+
+    # Token usage
+    input_tokens: int = Field(0, ge=0)
+    output_tokens: int = Field(0, ge=0)
+    cache_read_tokens: int = Field(0, ge=0)
+    cache_write_tokens: int = Field(0, ge=0)
+
+    # Timing
+    latency_ms: int = Field(0, ge=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    # Billed calls cancelled in favour of this one (hedge losers; usage may be estimated)
+    abandoned: List["LLMResponse"] = Field(default_factory=list)
+
+    @property
+    def total_tokens(self) -> int:
+        """All tokens billed for this response."""
+        return self.input_tokens + self.output_tokens + self.cache_read_tokens + self.cache_write_tokens
+
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+
+def extract_json(content: str) -> Dict[str, Any]:
+    """
+    Extract the JSON object from a model response.
+
+    Args:
+        content: Raw response text (may be wrapped in a markdown code fence)
+
+    Returns:
+        Parsed JSON object
+
+    Raises:
+        LLMResponseError: If no JSON object can be parsed
+    """
+    text = _CODE_FENCE.sub("", content.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise LLMResponseError("Response does not contain a JSON object")
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise LLMResponseError(f"Invalid JSON in response: {e}") from e
+    if not isinstance(data, dict):
+        raise LLMResponseError("Response JSON is not an object")
+    return data
+
+
+# ============================================================================
+# Client interface
+# ============================================================================
+
+class BaseLLMClient(ABC):
+    """
+    Abstract async LLM client.
+
+    Implementations translate `LLMRequest` into provider calls and map provider
+    errors onto the `LLMError` hierarchy.
+    """
+
+    provider: str = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @abstractmethod
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """
+        Execute a request and return the full response.
+
+        Args:
+            request: Provider-neutral request
+
+        Returns:
+            LLMResponse with content and usage
+        """
+
+    async def stream(self, request: LLMRequest, guard: Optional["StreamGuard"] = None) -> LLMResponse:
+        """
+        Execute a request, feeding output text to `guard` as it arrives.
+
+        Streaming clients abort the generation as soon as the guard raises.
+        This default implementation validates the complete response instead.
+
+        Raises:
+            StreamAborted: If the guard rejects the output
+        """
+        response = await self.complete(request)
+        if guard is not None:
+            guard.feed(response.content)
+            guard.finish()
+        return response
+
+    async def close(self) -> None:
+        """Release any network resources held by the client."""
+
+    def resolve_model(self, request: LLMRequest) -> str:
+        """Model to use for a request (request override or client default)."""
+        return request.model or self.model
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(model={self.model!r})"
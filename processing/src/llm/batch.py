@@ -0,0 +1,415 @@
+"""
+Offline Batch Jobs
+==================
+
+Asynchronous batch submission for bulk (re)processing runs.
+
+Instead of one live request per hadith, requests are serialized to a JSONL
+job file, submitted to a provider batch endpoint, polled until the provider
+finishes, and the results are streamed back to a callback (normally the
+processor's assignment writer). Batch requests do not consume the
+interactive rate-limit budget, so full-corpus runs can go overnight.
+
+Job files:
+- {batch_dir}/{job_id}.jsonl      one serialized LLMRequest per line
+- {batch_dir}/{job_id}.job.json   BatchJob manifest (provider id, status, counts,
+                                   near-duplicate members to fan results out to)
+
+Endpoints:
+- AnthropicBatchEndpoint: Message Batches API
+- LocalBatchEndpoint: in-process stand-in that runs requests through any
+  async handler (e.g. a client's `complete`), for tests and dry runs
+"""
+
+import asyncio
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from enum import Enum
+from pathlib import Path
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable
+
+from pydantic import BaseModel, Field, ConfigDict
+from loguru import logger
+
+from src.models.processing import ProcessingStage
+from .base import LLMRequest, LLMResponse, LLMError
+from .claude import ClaudeClient
+
+
+class BatchStatus(str, Enum):
+    """Lifecycle of a batch job."""
+    CREATED = "created"
+    IN_PROGRESS = "in_progress"
+    ENDED = "ended"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    EXPIRED = "expired"
+
+
+class BatchJob(BaseModel):
+    """
+    Manifest for one submitted batch job.
+    """
+    model_config = ConfigDict(validate_assignment=True)
+
+    job_id: str = Field(..., description="Local job identifier (job file stem)")
+    stage: ProcessingStage
+    version: str = Field("v1.0", max_length=20)
+    job_file: str = Field(..., description="Path to the JSONL request file")
+    provider: Optional[str] = None
+    provider_batch_id: Optional[str] = None
+    status: BatchStatus = BatchStatus.CREATED
+
+    request_count: int = Field(0, ge=0)
+    # Representative hadith_id -> cluster members receiving its result (--collapse-duplicates)
+    fan_out: Dict[int, List[int]] = Field(default_factory=dict)
+    succeeded: int = Field(0, ge=0)
+    errored: int = Field(0, ge=0)
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    submitted_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+
+    @property
+    def manifest_path(self) -> Path:
+        """Path of the job manifest next to the job file."""
+        return Path(self.job_file).with_suffix(".job.json")
+
+    def save(self) -> None:
+        """Persist the manifest so polling can resume after a restart."""
+        self.manifest_path.write_text(self.model_dump_json(indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, manifest_path: Path) -> "BatchJob":
+        """Load a manifest written by `save`."""
+        return cls.model_validate_json(Path(manifest_path).read_text(encoding="utf-8"))
+
+
+class BatchResult(BaseModel):
+    """
+    Result for one request in a batch.
+    """
+    request_id: str
+    hadith_id: Optional[int] = None
+    response: Optional[LLMResponse] = None
+    error: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.response is not None
+
+
+def read_job_file(path: Path) -> List[LLMRequest]:
+    """Load the serialized requests of a job file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [LLMRequest.model_validate_json(line) for line in f if line.strip()]
+
+
+# ============================================================================
+# Endpoints
+# ============================================================================
+
+class BatchEndpoint(ABC):
+    """
+    Provider batch endpoint interface.
+    """
+
+    provider: str = "base"
+
+    @abstractmethod
+    async def submit(self, job_file: Path) -> str:
+        """
+        Submit a JSONL job file.
+
+        Returns:
+            Provider batch identifier
+        """
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> BatchStatus:
+        """Current status of a submitted batch."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> AsyncIterator[BatchResult]:
+        """Stream results of an ended batch."""
+
+    async def cancel(self, batch_id: str) -> None:
+        """Cancel a submitted batch (best effort)."""
+
+
+class AnthropicBatchEndpoint(BatchEndpoint):
+    """
+    Anthropic Message Batches API endpoint.
+
+    Request parameters are built by `ClaudeClient.build_params`, so batch and
+    live requests are identical.
+    """
+
+    provider = "anthropic"
+
+    _STATUS_MAP = {
+        "in_progress": BatchStatus.IN_PROGRESS,
+        "canceling": BatchStatus.IN_PROGRESS,
+        "ended": BatchStatus.ENDED,
+    }
+
+    def __init__(self, client: ClaudeClient):
+        self.client = client
+
+    async def submit(self, job_file: Path) -> str:
+        requests = [
+            {"custom_id": r.request_id, "params": self.client.build_params(r)}
+            for r in read_job_file(job_file)
+        ]
+        batch = await self.client.client.messages.batches.create(requests=requests)
+        return batch.id
+
+    async def status(self, batch_id: str) -> BatchStatus:
+        batch = await self.client.client.messages.batches.retrieve(batch_id)
+        return self._STATUS_MAP.get(batch.processing_status, BatchStatus.FAILED)
+
+    async def results(self, batch_id: str) -> AsyncIterator[BatchResult]:
+        async for entry in await self.client.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                yield BatchResult(
+                    request_id=entry.custom_id,
+                    response=ClaudeClient.parse_message(entry.custom_id, entry.result.message),
+                )
+            else:
+                error = getattr(entry.result, "error", None)
+                yield BatchResult(request_id=entry.custom_id, error=f"{entry.result.type}: {error}")
+
+    async def cancel(self, batch_id: str) -> None:
+        await self.client.client.messages.batches.cancel(batch_id)
+
+
+class LocalBatchEndpoint(BatchEndpoint):
+    """
+    In-process stand-in for a provider batch endpoint.
+
+    Runs each request of a job file through `handler` in the background with
+    bounded concurrency and serves results like a provider would. Use with a
+    real client (`client.complete`) for small dry runs, or with a canned
+    handler in tests.
+    """
+
+    provider = "local"
+
+    def __init__(
+        self,
+        handler: Callable[[LLMRequest], Awaitable[LLMResponse]],
+        concurrency: int = 5,
+    ):
+        self.handler = handler
+        self.concurrency = concurrency
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def submit(self, job_file: Path) -> str:
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        state: Dict[str, Any] = {"status": BatchStatus.IN_PROGRESS, "results": []}
+        self._jobs[batch_id] = state
+        state["task"] = asyncio.create_task(self._run(batch_id, read_job_file(job_file)))
+        return batch_id
+
+    async def _run(self, batch_id: str, requests: List[LLMRequest]) -> None:
+        state = self._jobs[batch_id]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(request: LLMRequest) -> BatchResult:
+            async with semaphore:
+                try:
+                    return BatchResult(request_id=request.request_id, response=await self.handler(request))
+                except Exception as e:  # provider batches report per-request errors
+                    return BatchResult(request_id=request.request_id, error=f"{e.__class__.__name__}: {e}")
+
+        try:
+            state["results"] = await asyncio.gather(*(run_one(r) for r in requests))
+            state["status"] = BatchStatus.ENDED
+        except asyncio.CancelledError:
+            state["status"] = BatchStatus.CANCELLED
+
+    async def status(self, batch_id: str) -> BatchStatus:
+        if batch_id not in self._jobs:
+            raise LLMError(f"Unknown batch: {batch_id}")
+        return self._jobs[batch_id]["status"]
+
+    async def results(self, batch_id: str) -> AsyncIterator[BatchResult]:
+        for result in self._jobs[batch_id]["results"]:
+            yield result
+
+    async def cancel(self, batch_id: str) -> None:
+        self._jobs[batch_id]["task"].cancel()
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+ResultCallback = Callable[[BatchResult], Awaitable[None]]
+
+
+class BatchRunner:
+    """
+    Serializes requests into job files, submits them, polls and streams results.
+    """
+
+    def __init__(
+        self,
+        endpoint: BatchEndpoint,
+        batch_dir: Path,
+        max_requests_per_job: int = 5000,
+        max_bytes_per_job: int = 200_000_000,
+        poll_interval: float = 60.0,
+        timeout_hours: float = 24.0,
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            endpoint: Provider batch endpoint
+            batch_dir: Directory for job files and manifests
+            max_requests_per_job: Split larger runs into several jobs
+            max_bytes_per_job: Split jobs before the provider's payload size limit
+            poll_interval: Seconds between status polls
+            timeout_hours: Give up (and cancel) after this long
+        """
+        self.endpoint = endpoint
+        self.batch_dir = Path(batch_dir)
+        self.max_requests_per_job = max_requests_per_job
+        self.max_bytes_per_job = max_bytes_per_job
+        self.poll_interval = poll_interval
+        self.timeout_seconds = timeout_hours * 3600
+        self.batch_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, endpoint: BatchEndpoint, settings: Any) -> "BatchRunner":
+        """Build a runner from pipeline settings."""
+        return cls(
+            endpoint=endpoint,
+            batch_dir=settings.llm_batch_dir,
+            max_requests_per_job=settings.llm_batch_max_requests,
+            poll_interval=settings.llm_batch_poll_interval_seconds,
+            timeout_hours=settings.llm_batch_timeout_hours,
+        )
+
+    def write_jobs(self, requests: List[LLMRequest], fan_out: Optional[Dict[int, List[int]]] = None) -> List[BatchJob]:
+        """
+        Serialize requests into one or more JSONL job files.
+
+        Requests are grouped by (stage, version) and split by count and size.
+
+        Args:
+            requests: Requests to serialize
+            fan_out: Representative hadith_id -> cluster members, recorded in
+                the manifest of the job holding the representative
+        """
+        fan_out = fan_out or {}
+        jobs: List[BatchJob] = []
+        handle = None
+        job: Optional[BatchJob] = None
+        size = 0
+
+        def close() -> None:
+            if handle:
+                handle.close()
+                job.save()
+                jobs.append(job)
+
+        for request in requests:
+            line = request.model_dump_json() + "\n"
+            line_size = len(line.encode("utf-8"))
+            if (
+                job is None
+                or job.stage != request.stage
+                or job.version != request.version
+                or job.request_count >= self.max_requests_per_job
+                or size + line_size > self.max_bytes_per_job
+            ):
+                close()
+                job_id = f"{request.stage.value}_{datetime.utcnow():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:6]}"
+                job = BatchJob(
+                    job_id=job_id,
+                    stage=request.stage,
+                    version=request.version,
+                    job_file=str(self.batch_dir / f"{job_id}.jsonl"),
+                    provider=self.endpoint.provider,
+                )
+                handle = open(job.job_file, "w", encoding="utf-8")
+                size = 0
+            handle.write(line)
+            size += line_size
+            job.request_count += 1
+            if request.hadith_id in fan_out:
+                job.fan_out[request.hadith_id] = list(fan_out[request.hadith_id])
+        close()
+
+        logger.info(f"Wrote {len(requests)} requests into {len(jobs)} batch job file(s)")
+        return jobs
+
+    async def submit(self, job: BatchJob) -> BatchJob:
+        """Submit a written job to the endpoint."""
+        job.provider_batch_id = await self.endpoint.submit(Path(job.job_file))
+        job.status = BatchStatus.IN_PROGRESS
+        job.submitted_at = datetime.utcnow()
+        job.save()
+        logger.info(f"Submitted batch job {job.job_id} ({job.request_count} requests) as {job.provider_batch_id}")
+        return job
+
+    async def wait(self, job: BatchJob) -> BatchJob:
+        """Poll until the job leaves IN_PROGRESS or times out."""
+        started = asyncio.get_running_loop().time()
+        while True:
+            job.status = await self.endpoint.status(job.provider_batch_id)
+            if job.status != BatchStatus.IN_PROGRESS:
+                break
+            if asyncio.get_running_loop().time() - started > self.timeout_seconds:
+                await self.endpoint.cancel(job.provider_batch_id)
+                job.status = BatchStatus.EXPIRED
+                break
+            await asyncio.sleep(self.poll_interval)
+        job.ended_at = datetime.utcnow()
+        job.save()
+        logger.info(f"Batch job {job.job_id} finished with status {job.status.value}")
+        return job
+
+    async def collect(self, job: BatchJob, on_result: ResultCallback) -> BatchJob:
+        """Stream results of an ended job into `on_result`."""
+        hadith_ids = {r.request_id: r.hadith_id for r in read_job_file(Path(job.job_file))}
+        async for result in self.endpoint.results(job.provider_batch_id):
+            result.hadith_id = hadith_ids.get(result.request_id)
+            if result.succeeded:
+                job.succeeded += 1
+            else:
+                job.errored += 1
+            await on_result(result)
+        job.save()
+        logger.info(f"Batch job {job.job_id}: {job.succeeded} succeeded, {job.errored} errored")
+        return job
+
+    async def run(
+        self,
+        requests: List[LLMRequest],
+        on_result: ResultCallback,
+        fan_out: Optional[Dict[int, List[int]]] = None,
+    ) -> List[BatchJob]:
+        """
+        Write, submit, wait for and collect all jobs for `requests`.
+
+        All jobs are submitted up front so the provider processes them in parallel.
+        """
+        jobs = [await self.submit(job) for job in self.write_jobs(requests, fan_out)]
+        for job in jobs:
+            await self.wait(job)
+            if job.status == BatchStatus.ENDED:
+                await self.collect(job, on_result)
+        return jobs
+
+    async def resume(self, manifest_path: Path, on_result: ResultCallback) -> BatchJob:
+        """Resume polling and collection of a previously submitted job."""
+        job = BatchJob.load(manifest_path)
+        if job.status == BatchStatus.IN_PROGRESS:
+            await self.wait(job)
+        if job.status == BatchStatus.ENDED:
+            await self.collect(job, on_result)
+        return job
@@ -0,0 +1,258 @@
+"""
+LLM Cassettes (Record / Replay)
+===============================
+
+Record every LLM request/response pair to a compressed, indexed cassette
+file, and replay them later without network access or API keys.
+
+Replay runs the rest of the pipeline (processors, parsing, validation, DB
+writers) at full speed on a laptop, so throughput regressions outside the
+LLM become visible. Recorded latency can optionally be reproduced (scaled).
+
+File format:
+- Header `IKBCAS1\\n`, then records of `[4-byte big-endian length][zlib(JSON)]`
+- Records are keyed by a hash of the prompt and generation parameters
+  (not the request id), so retries and re-runs hit the same entries
+- Sidecar `<file>.idx` maps key -> [(offset, length), ...] for random
+  access; rebuilt by scanning if missing or stale
+
+Usage:
+------
+    client = CassetteClient.record(create_live_client(settings), path)
+    client = CassetteClient.replay(path, latency_scale=1.0)
+"""
+
+import asyncio
+import hashlib
+import json
+import struct
+import zlib
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Iterator, TYPE_CHECKING
+
+from loguru import logger
+
+from .base import BaseLLMClient, LLMRequest, LLMResponse, LLMError
+
+if TYPE_CHECKING:
+    from .streaming import StreamGuard
+
+
+MAGIC = b"IKBCAS1\n"
+_LENGTH = struct.Struct(">I")
+
+
+class CassetteMissError(LLMError):
+    """Replay mode found no recording for a request."""
+
+
+def request_key(request: LLMRequest, model: str) -> str:
+    """Stable key for a request: prompt and generation parameters, not the request id."""
+    fields = [request.stage.value, model, request.system, request.user, request.max_tokens, request.temperature]
+    if request.context:
+        # Appended only when set, so keys recorded before group context existed still match
+        fields.append(request.context)
+    payload = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """
+    Append-only compressed record file with a key index.
+    """
+
+    def __init__(self, path: Path, mode: str = "r"):
+        """
+        Open a cassette.
+
+        Args:
+            path: Cassette file
+            mode: "r" to replay, "a" to record (appends to an existing file)
+        """
+        if mode not in ("r", "a"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.index: Dict[str, List[Tuple[int, int]]] = {}
+        self.cursors: Dict[str, int] = {}
+
+        if mode == "a":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            new = not self.path.exists() or self.path.stat().st_size == 0
+            self.file = open(self.path, "ab+")
+            if new:
+                self.file.write(MAGIC)
+                self.file.flush()
+            else:
+                self._load_index()
+        else:
+            if not self.path.exists():
+                raise FileNotFoundError(f"Cassette not found: {self.path}")
+            self.file = open(self.path, "rb")
+            self._load_index()
+
+    @property
+    def index_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".idx")
+
+    def _load_index(self) -> None:
+        size = self.path.stat().st_size
+        if self.index_path.exists():
+            data = json.loads(self.index_path.read_text())
+            if data.get("size") == size:
+                self.index = {k: [tuple(e) for e in v] for k, v in data["entries"].items()}
+                return
+        self._scan()
+
+    def _scan(self) -> None:
+        """Rebuild the index from the record stream (stops at a torn final record)."""
+        self.index = {}
+        self.file.seek(0)
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{self.path} is not a cassette file")
+        offset = len(MAGIC)
+        while True:
+            header = self.file.read(_LENGTH.size)
+            if len(header) < _LENGTH.size:
+                break
+            (length,) = _LENGTH.unpack(header)
+            blob = self.file.read(length)
+            if len(blob) < length:
+                logger.warning(f"{self.path.name}: ignoring truncated record at offset {offset}")
+                break
+            key = json.loads(zlib.decompress(blob))["key"]
+            self.index.setdefault(key, []).append((offset, length))
+            offset += _LENGTH.size + length
+        logger.info(f"Indexed cassette {self.path.name}: {len(self)} records")
+
+    def append(self, key: str, record: Dict[str, Any]) -> None:
+        """Write one record."""
+        blob = zlib.compress(json.dumps({"key": key, **record}, ensure_ascii=False).encode("utf-8"), 6)
+        self.file.seek(0, 2)
+        offset = self.file.tell()
+        self.file.write(_LENGTH.pack(len(blob)) + blob)
+        self.index.setdefault(key, []).append((offset, len(blob)))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Next recorded entry for a key.
+
+        Repeated lookups walk the recordings in order and then keep returning
+        the last one, so replay is deterministic for retried prompts.
+        """
+        entries = self.index.get(key)
+        if not entries:
+            return None
+        position = self.cursors.get(key, 0)
+        self.cursors[key] = position + 1
+        offset, length = entries[min(position, len(entries) - 1)]
+        self.file.seek(offset + _LENGTH.size)
+        return json.loads(zlib.decompress(self.file.read(length)))
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Every record in file order (e.g. to fit latency and cache models)."""
+        entries = sorted(entry for entries in self.index.values() for entry in entries)
+        for offset, length in entries:
+            self.file.seek(offset + _LENGTH.size)
+            yield json.loads(zlib.decompress(self.file.read(length)))
+
+    def close(self) -> None:
+        """Flush records and write the index sidecar."""
+        if self.file.closed:
+            return
+        if self.mode == "a":
+            self.file.flush()
+            self.index_path.write_text(json.dumps({
+                "size": self.path.stat().st_size,
+                "entries": self.index,
+            }))
+        self.file.close()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.index.values())
+
+
+class CassetteClient(BaseLLMClient):
+    """
+    Client that records through an inner client, or replays from a cassette.
+    """
+
+    provider = "cassette"
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        inner: Optional[BaseLLMClient] = None,
+        latency_scale: float = 0.0,
+        model: Optional[str] = None,
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            cassette: Open cassette ("a" with `inner` to record, "r" to replay)
+            inner: Client whose calls are recorded (None = replay)
+            latency_scale: Replay sleeps recorded latency x this (0 = instant)
+            model: Default model name used in request keys when replaying
+        """
+        super().__init__(inner.model if inner else (model or "replay"))
+        self.cassette = cassette
+        self.inner = inner
+        self.latency_scale = latency_scale
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+
+    @classmethod
+    def record(cls, inner: BaseLLMClient, path: Path) -> "CassetteClient":
+        """Record all calls made through `inner` to `path`."""
+        return cls(Cassette(path, "a"), inner=inner)
+
+    @classmethod
+    def replay(cls, path: Path, latency_scale: float = 0.0, model: Optional[str] = None) -> "CassetteClient":
+        """Serve calls from the cassette at `path`."""
+        return cls(Cassette(path, "r"), latency_scale=latency_scale, model=model)
+
+    @property
+    def recording(self) -> bool:
+        return self.inner is not None
+
+    def _save(self, request: LLMRequest, response: LLMResponse) -> None:
+        self.cassette.append(request_key(request, self.resolve_model(request)), {
+            "hadith_id": request.hadith_id,
+            "stage": request.stage.value,
+            "response": response.model_dump(mode="json"),
+        })
+        self.stats["recorded"] += 1
+
+    async def _replay(self, request: LLMRequest) -> LLMResponse:
+        record = self.cassette.get(request_key(request, self.resolve_model(request)))
+        if record is None:
+            self.stats["misses"] += 1
+            raise CassetteMissError(f"No recording for {request.request_id} in {self.cassette.path.name}")
+        response = LLMResponse.model_validate(record["response"])
+        if self.latency_scale and response.latency_ms:
+            await asyncio.sleep(response.latency_ms / 1000 * self.latency_scale)
+        self.stats["replayed"] += 1
+        return response.model_copy(update={"request_id": request.request_id})
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """Record or replay one call."""
+        if not self.recording:
+            return await self._replay(request)
+        response = await self.inner.complete(request)
+        self._save(request, response)
+        return response
+
+    async def stream(self, request: LLMRequest, guard: Optional["StreamGuard"] = None) -> LLMResponse:
+        """Record a streamed call (aborted streams are not recorded) or replay one."""
+        if not self.recording:
+            return await super().stream(request, guard)
+        response = await self.inner.stream(request, guard)
+        self._save(request, response)
+        return response
+
+    async def close(self) -> None:
+        """Write the cassette index and close the inner client."""
+        self.cassette.close()
+        if self.inner:
+            await self.inner.close()
+        logger.info(f"Cassette {self.cassette.path.name}: {self.stats}")
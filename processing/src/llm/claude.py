@@ -0,0 +1,149 @@
+"""
+Claude Client
+=============
+
+Anthropic Messages API client implementing `BaseLLMClient`.
+
+Features:
+- System prompt sent as a cacheable block (prompt caching)
+- Token usage including cache reads/writes
+- Streaming with per-delta validation (early abort of off-schema output)
+- Provider errors mapped onto the LLMError hierarchy
+"""
+
+import time
+from typing import Optional, Dict, Any, TYPE_CHECKING
+
+import anthropic
+
+from .base import (
+    BaseLLMClient,
+    LLMRequest,
+    LLMResponse,
+    LLMError,
+    RateLimitError,
+    OverloadedError,
+    TransientError,
+    OVERLOAD_STATUSES,
+)
+
+if TYPE_CHECKING:
+    from .streaming import StreamGuard
+
+
+class ClaudeClient(BaseLLMClient):
+    """
+    Async client for Anthropic Claude models.
+    """
+
+    provider = "anthropic"
+
+    def __init__(
+        self,
+        model: str = "claude-3-5-sonnet-20241022",
+        api_key: Optional[str] = None,
+        timeout: float = 120.0,
+    ):
+        """
+        Initialize the Claude client.
+
+        Args:
+            model: Default model name
+            api_key: Anthropic API key (uses ANTHROPIC_API_KEY if not provided)
+            timeout: Per-request timeout in seconds
+        """
+        super().__init__(model)
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, timeout=timeout, max_retries=0)
+
+    def build_params(self, request: LLMRequest) -> Dict[str, Any]:
+        """
+        Translate an LLMRequest into Messages API parameters.
+
+        Shared with the batch endpoint so live and batch requests are identical.
+        """
+        params: Dict[str, Any] = {
+            "model": self.resolve_model(request),
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "messages": [{"role": "user", "content": request.user}],
+        }
+        system = []
+        for text in (request.system, request.context):
+            if text:
+                block: Dict[str, Any] = {"type": "text", "text": text}
+                if request.cache_system:
+                    # Separate breakpoints: the system prompt stays cached across groups
+                    block["cache_control"] = {"type": "ephemeral"}
+                system.append(block)
+        if system:
+            params["system"] = system
+        return params
+
+    @staticmethod
+    def parse_message(request_id: str, message: Any, latency_ms: int = 0) -> LLMResponse:
+        """Convert an Anthropic Message object into an LLMResponse."""
+        content = "".join(
+            block.text for block in message.content if getattr(block, "type", None) == "text"
+        )
+        usage = message.usage
+        return LLMResponse(
+            request_id=request_id,
+            model=message.model,
+            content=content,
+            stop_reason=message.stop_reason,
+            input_tokens=usage.input_tokens or 0,
+            output_tokens=usage.output_tokens or 0,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+            cache_write_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0,
+            latency_ms=latency_ms,
+        )
+
+    @staticmethod
+    def translate_error(error: "anthropic.APIError") -> LLMError:
+        """Map an Anthropic SDK error onto the LLMError hierarchy."""
+        # anthropic.OverloadedError (529) is not an InternalServerError in newer SDKs
+        status = getattr(error, "status_code", None)
+        if isinstance(error, anthropic.RateLimitError) or status == 429:
+            return RateLimitError(str(error))
+        if isinstance(error, anthropic.InternalServerError) or status in OVERLOAD_STATUSES:
+            return OverloadedError(str(error))
+        if isinstance(error, anthropic.APIConnectionError):  # includes timeouts
+            return TransientError(str(error))
+        return LLMError(str(error))
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """Send a request to the Messages API."""
+        started = time.perf_counter()
+        try:
+            message = await self.client.messages.create(**self.build_params(request))
+        except anthropic.APIError as e:
+            raise self.translate_error(e) from e
+
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        return self.parse_message(request.request_id, message, latency_ms)
+
+    async def stream(self, request: LLMRequest, guard: Optional["StreamGuard"] = None) -> LLMResponse:
+        """
+        Stream a request, feeding text deltas to `guard`.
+
+        If the guard raises, leaving the stream context closes the connection
+        and the provider stops generating.
+        """
+        started = time.perf_counter()
+        try:
+            async with self.client.messages.stream(**self.build_params(request)) as stream:
+                async for text in stream.text_stream:
+                    if guard is not None:
+                        guard.feed(text)
+                message = await stream.get_final_message()
+        except anthropic.APIError as e:
+            raise self.translate_error(e) from e
+
+        if guard is not None:
+            guard.finish()
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        return self.parse_message(request.request_id, message, latency_ms)
+
+    async def close(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
@@ -0,0 +1,135 @@
+"""
+Prompt Compaction
+=================
+
+Shrink per-hadith user prompts without removing content the stages use.
+
+Levels (PROMPT_COMPACTION):
+- none: prompt as built
+- light: Arabic tashkeel, tatweel and direction marks stripped; whitespace
+  collapsed
+- standard: + honorific formulas collapsed (ﷺ for "peace be upon him" /
+  صلى الله عليه وسلم, "(ra)" / رض for the companion formula); redundant
+  metadata dropped (numeric ids when names are present, a narrator line
+  repeated in the English text)
+- aggressive: + Arabic isnad replaced by the parsed chain when preprocessing
+  provides one (the matn is kept verbatim)
+
+`estimate_tokens` gives a quick offline estimate for comparing levels;
+scripts/measure_prompt_compaction.py can also count exactly via the API.
+"""
+
+import re
+from enum import IntEnum
+from typing import Optional, List, Tuple
+
+from src.preprocessing.arabic_normalizer import strip_diacritics
+
+
+class Compaction(IntEnum):
+    """Prompt compaction level."""
+    NONE = 0
+    LIGHT = 1
+    STANDARD = 2
+    AGGRESSIVE = 3
+
+    @classmethod
+    def parse(cls, value: "str | int | Compaction") -> "Compaction":
+        if isinstance(value, str):
+            return cls[value.strip().upper()]
+        return cls(value)
+
+
+# Right-to-left / left-to-right marks and other invisible formatting
+_INVISIBLE = re.compile(r"[\u200B-\u200F\u202A-\u202E\u2066-\u2069]")
+_SPACES = re.compile(r"[ \t]+")
+_BLANK_LINES = re.compile(r"\s*\n\s*")
+
+_ARABIC_HONORIFICS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"صل[ىي] الله عليه و ?سلم"), "ﷺ"),
+    (re.compile(r"رض[يى] الله عن(?:ه|ها|هما|هم)"), "رض"),
+]
+
+_ENGLISH_HONORIFICS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(
+        r"\(\s*(?:may )?(?:Allah(?:'s)? )?(?:peace and blessings|blessings and peace)"
+        r"(?: of Allah)? be upon him\s*\)"
+        r"|\(\s*may Allah bless him and grant him peace\s*\)"
+        r"|\(\s*peace (?:and blessings )?(?:of Allah )?be upon him\s*\)"
+        r"|\((?:saws|pbuh|s\.a\.w\.s?\.?)\)",
+        re.IGNORECASE,
+    ), "(ﷺ)"),
+    (re.compile(r"\(\s*may Allah be pleased with (?:him|her|them|both of them)\s*\)", re.IGNORECASE), "(ra)"),
+]
+
+# Where the matn starts after the chain of narrators (diacritics already stripped)
+_MATN_START = re.compile(
+    r"(?:قال|ان|أن|عن|سمعت|رايت|رأيت|كان) ?(?:رسول الله|النبي)"
+)
+_TRANSMISSION = re.compile(r"حدثن[اي]|أخبرن[اي]|اخبرن[اي]|عن ")
+
+
+def compact_whitespace(text: str) -> str:
+    """Drop invisible marks, collapse spaces and blank lines."""
+    text = _INVISIBLE.sub("", text)
+    return _BLANK_LINES.sub("\n", _SPACES.sub(" ", text)).strip()
+
+
+def collapse_honorifics(text: str, arabic: bool = False) -> str:
+    """Replace honorific formulas with their short forms."""
+    for pattern, replacement in _ARABIC_HONORIFICS if arabic else _ENGLISH_HONORIFICS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def split_isnad(arabic: str) -> Tuple[str, str]:
+    """
+    Split diacritic-free Arabic into (isnad, matn).
+
+    The isnad is everything before the first reference to the Prophet that
+    opens the report; ("", text) if no transmission chain precedes it.
+    """
+    match = _MATN_START.search(arabic)
+    if not match or not _TRANSMISSION.search(arabic[:match.start()]):
+        return "", arabic
+    return arabic[:match.start()].strip(), arabic[match.start():]
+
+
+def compact_arabic(text: str, level: Compaction, isnad_chain: Optional[List[str]] = None) -> str:
+    """Compact Arabic hadith text to the given level."""
+    if level < Compaction.LIGHT or not text:
+        return text
+    text = compact_whitespace(strip_diacritics(text))
+    if level >= Compaction.STANDARD:
+        text = collapse_honorifics(text, arabic=True)
+    if level >= Compaction.AGGRESSIVE and isnad_chain:
+        _, matn = split_isnad(text)
+        text = matn
+    return text
+
+
+def compact_english(text: str, level: Compaction) -> str:
+    """Compact English text to the given level."""
+    if level < Compaction.LIGHT or not text:
+        return text
+    text = compact_whitespace(text)
+    if level >= Compaction.STANDARD:
+        text = collapse_honorifics(text)
+    return text
+
+
+_ARABIC_CHARS = re.compile(r"[\u0600-\u06FF\u0750-\u077F\uFB50-\uFDFF\uFE70-\uFEFF]")
+_ARABIC_MARKS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate for mixed Arabic/English prompts.
+
+    Latin text averages ~4 characters per token; Arabic letters ~2 and
+    diacritics roughly one token each with current Claude/GPT tokenizers.
+    """
+    marks = len(_ARABIC_MARKS.findall(text))
+    arabic = len(_ARABIC_CHARS.findall(text)) - marks
+    other = len(text) - arabic - marks
+    return int(marks + arabic / 2 + other / 4) + 1
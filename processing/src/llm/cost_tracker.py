@@ -0,0 +1,459 @@
+"""
+LLM Cost Tracker
+================
+
+Token and cost accounting with projected-budget enforcement.
+
+Design:
+- Each worker owns a `CostShard` and records every LLM call into plain
+  local counters (no lock, no DB write, no shared state touched per call)
+- Every `flush_every` calls or `flush_interval_seconds` a shard pushes its
+  accumulated delta onto the tracker's inbox, a `collections.deque` whose
+  append/popleft are atomic, so producers never block each other
+- `CostTracker` drains the inbox lazily when totals are read, keeps a
+  sliding window of recent cost-per-hadith, projects spend to completion
+  and refuses to admit more work once the projection (including work
+  already in flight) would cross COST_BUDGET_USD
+- The aggregate ledger is persisted to a small JSON file at most every
+  `persist_interval_seconds`, so a resumed run keeps counting against the
+  same budget
+- Ledgers are per process (`cost_ledger_{version}__{name}.json`, e.g. the
+  PCAP producer and each HMSTS consumer of a handoff run), so concurrent
+  processes never overwrite each other. Every ledger of the version counts
+  against the budget: the other processes' ledgers are summed on load and
+  re-read whenever this one is persisted
+
+Pricing is per 1M tokens; provider batch jobs are billed at 50%.
+"""
+
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional, Dict, Deque, List, NamedTuple, Tuple
+
+from loguru import logger
+
+from .base import LLMResponse
+
+
+# ============================================================================
+# Pricing
+# ============================================================================
+
+class ModelPricing(NamedTuple):
+    """USD per 1M tokens."""
+    input: float
+    output: float
+    cache_read: float
+    cache_write: float
+
+
+# Longest matching prefix wins
+PRICING: Dict[str, ModelPricing] = {
+    "claude-3-5-sonnet": ModelPricing(3.00, 15.00, 0.30, 3.75),
+    "claude-3-7-sonnet": ModelPricing(3.00, 15.00, 0.30, 3.75),
+    "claude-sonnet-4": ModelPricing(3.00, 15.00, 0.30, 3.75),
+    "claude-3-5-haiku": ModelPricing(0.80, 4.00, 0.08, 1.00),
+    "claude-3-haiku": ModelPricing(0.25, 1.25, 0.03, 0.30),
+    "claude-3-opus": ModelPricing(15.00, 75.00, 1.50, 18.75),
+    "claude-opus-4": ModelPricing(15.00, 75.00, 1.50, 18.75),
+    "gpt-4o-mini": ModelPricing(0.15, 0.60, 0.075, 0.0),
+    "gpt-4o": ModelPricing(2.50, 10.00, 1.25, 0.0),
+    "local/": ModelPricing(0.0, 0.0, 0.0, 0.0),
+}
+
+DEFAULT_PRICING = PRICING["claude-3-5-sonnet"]
+BATCH_DISCOUNT = 0.5
+
+_unknown_models = set()
+
+
+def pricing_for(model: str) -> ModelPricing:
+    """Pricing for a model name (Sonnet pricing if unknown)."""
+    matches = [prefix for prefix in PRICING if model.startswith(prefix)]
+    if matches:
+        return PRICING[max(matches, key=len)]
+    if model not in _unknown_models:
+        _unknown_models.add(model)
+        logger.warning(f"No pricing for model {model!r}; using {DEFAULT_PRICING}")
+    return DEFAULT_PRICING
+
+
+def response_cost(response: LLMResponse, batch: bool = False) -> float:
+    """
+    USD cost of one response, including the calls abandoned for it.
+
+    Args:
+        response: Response with token usage
+        batch: Billed through a provider batch job (discounted)
+    """
+    return sum(_call_cost(call, batch) for call in (response, *response.abandoned))
+
+
+def _call_cost(response: LLMResponse, batch: bool = False) -> float:
+    price = pricing_for(response.model)
+    cost = (
+        response.input_tokens * price.input
+        + response.output_tokens * price.output
+        + response.cache_read_tokens * price.cache_read
+        + response.cache_write_tokens * price.cache_write
+    ) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+# ============================================================================
+# Counters
+# ============================================================================
+
+@dataclass
+class CostDelta:
+    """Accumulated usage since a shard's last flush."""
+    calls: int = 0
+    hadiths: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost_usd: float = 0.0
+    by_model: Dict[str, float] = field(default_factory=dict)
+
+    def merge(self, other: "CostDelta") -> None:
+        self.calls += other.calls
+        self.hadiths += other.hadiths
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.cache_write_tokens += other.cache_write_tokens
+        self.cost_usd += other.cost_usd
+        for model, cost in other.by_model.items():
+            self.by_model[model] = self.by_model.get(model, 0.0) + cost
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens + self.cache_read_tokens + self.cache_write_tokens
+
+
+class CostShard:
+    """
+    Worker-local cost counters.
+
+    Not shared between workers: `record` touches only this object and
+    flushes to the tracker in bulk.
+    """
+
+    def __init__(self, tracker: "CostTracker"):
+        self.tracker = tracker
+        self.delta = CostDelta()
+        self.last_flush = time.monotonic()
+
+    def record(self, response: LLMResponse, batch: bool = False) -> float:
+        """
+        Account one LLM call (successful or not, it was billed), plus any
+        hedged calls abandoned for it.
+
+        Returns:
+            Cost of the call(s) in USD
+        """
+        delta = self.delta
+        total = 0.0
+        for call in (response, *response.abandoned):
+            cost = _call_cost(call, batch)
+            delta.calls += 1
+            delta.input_tokens += call.input_tokens
+            delta.output_tokens += call.output_tokens
+            delta.cache_read_tokens += call.cache_read_tokens
+            delta.cache_write_tokens += call.cache_write_tokens
+            delta.cost_usd += cost
+            delta.by_model[call.model] = delta.by_model.get(call.model, 0.0) + cost
+            total += cost
+        self._maybe_flush()
+        return total
+
+    def record_hadith(self, count: int = 1) -> None:
+        """Count hadiths finished (the denominator of cost-per-hadith)."""
+        self.delta.hadiths += count
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if (
+            self.delta.calls >= self.tracker.flush_every
+            or time.monotonic() - self.last_flush >= self.tracker.flush_interval_seconds
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Hand accumulated counters to the tracker."""
+        if self.delta.calls or self.delta.hadiths:
+            self.tracker.inbox.append(self.delta)
+            self.delta = CostDelta()
+        self.last_flush = time.monotonic()
+
+
+# ============================================================================
+# Ledger files
+# ============================================================================
+
+def ledger_path(directory: Path, version: str, name: Optional[str] = None) -> Path:
+    """A process's ledger file (`name` distinguishes concurrent processes of one version)."""
+    suffix = f"__{name}" if name else ""
+    return Path(directory) / f"cost_ledger_{version}{suffix}.json"
+
+
+def version_ledgers(directory: Path, version: str) -> List[Path]:
+    """Every ledger file of a version, whichever process wrote it."""
+    directory = Path(directory)
+    paths = sorted(directory.glob(f"cost_ledger_{version}__*.json"))
+    default = ledger_path(directory, version)
+    return ([default] if default.exists() else []) + paths
+
+
+def read_ledger(path: Path) -> Optional[CostDelta]:
+    """A persisted ledger (None if it vanished or is unreadable)."""
+    try:
+        return CostDelta(**json.loads(path.read_text()))
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Skipping cost ledger {path.name}: {e}")
+        return None
+
+
+# ============================================================================
+# Tracker
+# ============================================================================
+
+class CostTracker:
+    """
+    Aggregates shard deltas, projects spend to completion and gates dispatch.
+    """
+
+    def __init__(
+        self,
+        budget_usd: float,
+        alert_threshold: float = 0.8,
+        total_hadiths: int = 50884,
+        ledger_path: Optional[Path] = None,
+        flush_every: int = 20,
+        flush_interval_seconds: float = 5.0,
+        persist_interval_seconds: float = 30.0,
+        window_hadiths: int = 500,
+        version: Optional[str] = None,
+    ):
+        """
+        Initialize the tracker.
+
+        Args:
+            budget_usd: Hard spend limit
+            alert_threshold: Fraction of the budget at which to warn
+            total_hadiths: Hadiths the run is expected to process (for projection)
+            ledger_path: JSON file the running totals are persisted to
+            flush_every: Calls a shard accumulates before flushing
+            flush_interval_seconds: Maximum age of unflushed shard counters
+            persist_interval_seconds: Minimum time between ledger writes
+            window_hadiths: Recent hadiths used for the cost-per-hadith estimate
+            version: Count the version's other ledgers (next to `ledger_path`)
+                against the budget
+        """
+        self.budget_usd = budget_usd
+        self.alert_threshold = alert_threshold
+        self.total_hadiths = total_hadiths
+        self.ledger_path = ledger_path
+        self.flush_every = flush_every
+        self.flush_interval_seconds = flush_interval_seconds
+        self.persist_interval_seconds = persist_interval_seconds
+        self.window_hadiths = window_hadiths
+        self.version = version
+
+        self.inbox: Deque[CostDelta] = deque()
+        self.totals = CostDelta()
+        self.recent: Deque[Tuple[int, float]] = deque()  # (hadiths, cost) per drained delta
+        self.recent_hadiths = 0
+        self.recent_cost = 0.0
+        self.alerted = False
+        self.last_persist = time.monotonic()
+        self.shards = []
+        # Spend recorded in the version's other ledgers (other processes)
+        self.peers = CostDelta()
+
+        if ledger_path and ledger_path.exists():
+            self.load(ledger_path)
+        self.refresh_peers()
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings,
+        version: str = "v1.0",
+        total_hadiths: int = 50884,
+        name: Optional[str] = None,
+    ) -> "CostTracker":
+        """
+        Build a tracker with the configured budget and this process's ledger file.
+
+        Args:
+            name: Process key for the ledger file (e.g. stage and queue
+                consumer, or pipeline shard); None for the version's default ledger
+        """
+        return cls(
+            budget_usd=settings.cost_budget_usd,
+            alert_threshold=settings.cost_alert_threshold,
+            total_hadiths=total_hadiths,
+            ledger_path=ledger_path(settings.checkpoint_dir, version, name),
+            version=version,
+        )
+
+    def shard(self) -> CostShard:
+        """Create a worker-local shard."""
+        shard = CostShard(self)
+        self.shards.append(shard)
+        return shard
+
+    def release(self, shard: CostShard) -> None:
+        """Flush and forget a shard whose worker has finished."""
+        shard.flush()
+        if shard in self.shards:
+            self.shards.remove(shard)
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    def drain(self) -> CostDelta:
+        """Fold flushed shard deltas into the totals and return them."""
+        while self.inbox:
+            delta = self.inbox.popleft()
+            self.totals.merge(delta)
+            self.recent.append((delta.hadiths, delta.cost_usd))
+            self.recent_hadiths += delta.hadiths
+            self.recent_cost += delta.cost_usd
+            while len(self.recent) > 1 and self.recent_hadiths - self.recent[0][0] >= self.window_hadiths:
+                hadiths, cost = self.recent.popleft()
+                self.recent_hadiths -= hadiths
+                self.recent_cost -= cost
+        self._check_alert()
+        if self.ledger_path and time.monotonic() - self.last_persist >= self.persist_interval_seconds:
+            self.save(self.ledger_path)
+            self.refresh_peers()
+        return self.totals
+
+    def set_peer_spend(self, cost_usd: float) -> None:
+        """Spend of the other processes as reported by a coordinator (fresher than their ledgers)."""
+        self.peers = CostDelta(cost_usd=cost_usd)
+
+    def refresh_peers(self) -> CostDelta:
+        """Re-read the spend of the version's other ledgers."""
+        if not (self.ledger_path and self.version):
+            return self.peers
+        peers = CostDelta()
+        for path in version_ledgers(self.ledger_path.parent, self.version):
+            if path != self.ledger_path:
+                delta = read_ledger(path)
+                if delta:
+                    peers.merge(delta)
+        self.peers = peers
+        return peers
+
+    def flush_all(self) -> CostDelta:
+        """Flush every shard and drain (end of a batch/run)."""
+        for shard in self.shards:
+            shard.flush()
+        totals = self.drain()
+        if self.ledger_path:
+            self.save(self.ledger_path)
+        return totals
+
+    @property
+    def spent_usd(self) -> float:
+        """Spend of this process and of the version's other ledgers."""
+        return self.drain().cost_usd + self.peers.cost_usd
+
+    def cost_per_hadith(self) -> Optional[float]:
+        """Recent cost per finished hadith (None until hadiths have been counted)."""
+        self.drain()
+        if self.recent_hadiths:
+            return self.recent_cost / self.recent_hadiths
+        if self.totals.hadiths:
+            return self.totals.cost_usd / self.totals.hadiths
+        return None
+
+    def projected_total_usd(self, remaining_hadiths: Optional[int] = None) -> float:
+        """Spend so far plus the recent cost-per-hadith times the remaining hadiths."""
+        spent = self.spent_usd
+        rate = self.cost_per_hadith()
+        if rate is None:
+            return spent
+        if remaining_hadiths is None:
+            remaining_hadiths = max(0, self.total_hadiths - self.totals.hadiths)
+        return spent + rate * remaining_hadiths
+
+    # ------------------------------------------------------------------
+    # Enforcement
+    # ------------------------------------------------------------------
+
+    def admit(self, count: int = 1, in_flight: int = 0) -> bool:
+        """
+        Whether `count` more hadiths can be dispatched without crossing the budget.
+
+        Unflushed shard spend and hadiths already in flight are covered by
+        charging them at the recent cost-per-hadith.
+        """
+        rate = self.cost_per_hadith()
+        if rate is None:
+            return self.spent_usd < self.budget_usd
+        unflushed = sum(shard.delta.cost_usd for shard in self.shards)
+        return self.spent_usd + unflushed + rate * (count + in_flight) <= self.budget_usd
+
+    def affordable_hadiths(self, in_flight: int = 0) -> Optional[int]:
+        """How many more hadiths fit in the budget (None if no estimate yet)."""
+        rate = self.cost_per_hadith()
+        if not rate:
+            return None
+        return max(0, int((self.budget_usd - self.spent_usd) / rate) - in_flight)
+
+    def _check_alert(self) -> None:
+        if self.alerted or not self.budget_usd:
+            return
+        spent = self.totals.cost_usd + self.peers.cost_usd
+        rate = (self.recent_cost / self.recent_hadiths) if self.recent_hadiths else None
+        projected = spent + rate * max(0, self.total_hadiths - self.totals.hadiths) if rate else spent
+        if max(spent, projected) >= self.alert_threshold * self.budget_usd:
+            self.alerted = True
+            logger.warning(
+                f"Cost alert: ${spent:,.2f} spent, ${projected:,.2f} projected "
+                f"against a ${self.budget_usd:,.2f} budget"
+            )
+
+    # ------------------------------------------------------------------
+    # Reporting / persistence
+    # ------------------------------------------------------------------
+
+    def apply_to(self, state) -> None:
+        """Copy totals onto a ProcessingState (feeds estimated_total_cost)."""
+        totals = self.drain()
+        state.total_llm_cost_usd = round(Decimal(str(totals.cost_usd)), 2)
+        state.total_llm_calls = totals.calls
+
+    def summary(self) -> str:
+        """One-line spend summary for logs."""
+        totals = self.drain()
+        rate = self.cost_per_hadith()
+        return (
+            f"${totals.cost_usd:,.2f} spent over {totals.calls} calls / {totals.hadiths} hadiths"
+            + (f" (+${self.peers.cost_usd:,.2f} by other processes)" if self.peers.cost_usd else "")
+            + (f" (${rate:.4f}/hadith, projected ${self.projected_total_usd():,.2f}"
+               f" of ${self.budget_usd:,.2f})" if rate else "")
+        )
+
+    def save(self, path: Path) -> None:
+        """Persist the aggregate ledger."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(asdict(self.totals), indent=2))
+        tmp.replace(path)
+        self.last_persist = time.monotonic()
+
+    def load(self, path: Path) -> None:
+        """Resume totals from this process's persisted ledger."""
+        self.totals = CostDelta(**json.loads(path.read_text()))
+        logger.info(f"Loaded cost ledger {path.name}: ${self.totals.cost_usd:,.2f} spent so far")
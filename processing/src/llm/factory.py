@@ -0,0 +1,97 @@
+"""
+LLM Client Factory
+==================
+
+Builds provider clients from model names and pipeline settings.
+
+Usage:
+------
+    from src.llm.factory import create_client, create_live_client
+
+    client = create_live_client(settings)  # hedged primary/secondary if enabled
+"""
+
+from typing import Optional
+
+from loguru import logger
+
+from config.settings import Settings, get_settings
+from .base import BaseLLMClient
+from .claude import ClaudeClient
+from .openai import OpenAIClient, LocalClient
+from .hedging import HedgedLLMClient
+
+
+OPENAI_MODEL_PREFIXES = ("gpt-", "o1", "o3", "o4")
+
+
+LOCAL_MODEL_PREFIX = "local/"
+
+
+def provider_for_model(model: str) -> str:
+    """Provider name for a model ("anthropic", "openai" or "local")."""
+    if model.startswith(LOCAL_MODEL_PREFIX):
+        return "local"
+    if model.startswith("claude"):
+        return "anthropic"
+    if model.startswith(OPENAI_MODEL_PREFIXES):
+        return "openai"
+    raise ValueError(f"Unknown provider for model {model!r}")
+
+
+def create_client(model: str, settings: Optional[Settings] = None) -> BaseLLMClient:
+    """
+    Create a client for a model name.
+
+    Args:
+        model: Provider model name
+        settings: Pipeline settings (global settings if None)
+
+    Returns:
+        ClaudeClient, OpenAIClient or LocalClient (`local/<model>` names,
+        served from LLM_LOCAL_BASE_URL)
+    """
+    settings = settings or get_settings()
+    provider = provider_for_model(model)
+    if provider == "local":
+        if not settings.llm_local_base_url:
+            raise ValueError(f"{model!r} needs LLM_LOCAL_BASE_URL (an OpenAI-compatible server)")
+        return LocalClient(
+            model=model[len(LOCAL_MODEL_PREFIX):],
+            base_url=settings.llm_local_base_url,
+            timeout=settings.llm_request_timeout_seconds,
+        )
+    if provider == "anthropic":
+        return ClaudeClient(
+            model=model,
+            api_key=settings.anthropic_api_key,
+            timeout=settings.llm_request_timeout_seconds,
+        )
+    return OpenAIClient(
+        model=model,
+        api_key=settings.openai_api_key,
+        timeout=settings.llm_request_timeout_seconds,
+    )
+
+
+def create_live_client(settings: Optional[Settings] = None) -> BaseLLMClient:
+    """
+    Create the client used for live requests.
+
+    Returns a HedgedLLMClient over the primary and secondary models when
+    hedging is enabled and the secondary provider has an API key, otherwise
+    the plain primary client.
+    """
+    settings = settings or get_settings()
+    primary = create_client(settings.llm_primary_model, settings)
+    if not settings.llm_hedging_enabled or not settings.llm_secondary_model:
+        return primary
+
+    provider = provider_for_model(settings.llm_secondary_model)
+    api_key = settings.anthropic_api_key if provider == "anthropic" else settings.openai_api_key
+    if provider != "local" and not api_key:
+        logger.warning(f"No {provider} API key; running without hedging/failover")
+        return primary
+
+    secondary = create_client(settings.llm_secondary_model, settings)
+    return HedgedLLMClient.from_settings(primary, secondary, settings)
@@ -0,0 +1,321 @@
+"""
+Hedged Requests and Provider Failover
+=====================================
+
+`HedgedLLMClient` wraps a primary and a secondary client (LLM_PRIMARY_MODEL /
+LLM_SECONDARY_MODEL) to cut tail latency without doubling spend.
+
+Behaviour per request:
+1. Send to the primary
+2. If it has not answered within the primary's observed p95 latency, fire a
+   backup to the secondary and take whichever succeeds first (the loser is
+   cancelled; its billed usage, estimated from the prompt if it never
+   answered, rides on the winner as `LLMResponse.abandoned` so cost
+   tracking sees both calls)
+3. If the primary fails outright, retry once on the secondary (off-schema
+   output is left to the caller's retry loop; it says nothing about
+   provider health). This applies whether or not a hedge was fired
+
+A primary 429/529 (RateLimitError / OverloadedError) that the secondary
+absorbs never reaches the caller, so it is reported to the
+`overload_listeners` (e.g. the processor's AIMD limiter) instead, which
+can still cut concurrency.
+
+Hedging only starts after `min_samples` primary latencies have been observed,
+and at most `max_hedge_ratio` of requests may be hedged, so the extra spend
+is bounded (~5% at p95).
+
+When the primary's error rate over the last `failover_window` requests
+crosses `failover_error_rate`, all traffic goes to the secondary for
+`failover_cooldown_seconds`, after which the primary is tried again.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Dict, Deque, List, Callable, TYPE_CHECKING
+
+from loguru import logger
+
+from .base import BaseLLMClient, LLMRequest, LLMResponse, LLMError, LLMResponseError, RateLimitError, OverloadedError
+from .compaction import estimate_tokens
+
+if TYPE_CHECKING:
+    from .streaming import StreamGuard
+
+
+class LatencyWindow:
+    """Sliding window of recent latencies with percentile lookup."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile (0 < q < 1), or None if empty."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+class HedgedLLMClient(BaseLLMClient):
+    """
+    Primary/secondary client with latency hedging and error-rate failover.
+    """
+
+    provider = "hedged"
+
+    def __init__(
+        self,
+        primary: BaseLLMClient,
+        secondary: BaseLLMClient,
+        hedge_percentile: float = 0.95,
+        min_samples: int = 20,
+        max_hedge_ratio: float = 0.1,
+        latency_window: int = 200,
+        failover_error_rate: float = 0.5,
+        failover_window: int = 50,
+        failover_cooldown_seconds: float = 300.0,
+    ):
+        """
+        Initialize the hedged client.
+
+        Args:
+            primary: Client used for normal traffic
+            secondary: Client used for hedges and failover
+            hedge_percentile: Primary latency percentile after which a hedge fires
+            min_samples: Primary latencies required before hedging starts
+            max_hedge_ratio: Maximum fraction of requests that may be hedged
+            latency_window: Number of recent primary latencies kept
+            failover_error_rate: Primary error rate that triggers failover
+            failover_window: Number of recent primary outcomes used for the error rate
+            failover_cooldown_seconds: How long to stay on the secondary after failover
+        """
+        super().__init__(primary.model)
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.failover_error_rate = failover_error_rate
+        self.failover_cooldown_seconds = failover_cooldown_seconds
+
+        self.latencies = LatencyWindow(latency_window)
+        self.outcomes: Deque[bool] = deque(maxlen=failover_window)  # True = error
+        self.failover_until = 0.0
+        # Called with the call's elapsed seconds on every primary 429/529
+        self.overload_listeners: List[Callable[[float], None]] = []
+
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "primary_wins": 0,
+            "secondary_wins": 0,
+            "hedges_fired": 0,
+            "hedges_skipped_budget": 0,
+            "primary_errors": 0,
+            "primary_overloads": 0,
+            "fallbacks": 0,
+            "failovers": 0,
+        }
+
+    @classmethod
+    def from_settings(cls, primary: BaseLLMClient, secondary: BaseLLMClient, settings) -> "HedgedLLMClient":
+        """Build a hedged client configured from pipeline settings."""
+        return cls(
+            primary,
+            secondary,
+            hedge_percentile=settings.llm_hedge_percentile,
+            min_samples=settings.llm_hedge_min_samples,
+            max_hedge_ratio=settings.llm_hedge_max_ratio,
+            failover_error_rate=settings.llm_failover_error_rate,
+            failover_window=settings.llm_failover_window,
+            failover_cooldown_seconds=settings.llm_failover_cooldown_seconds,
+        )
+
+    # ------------------------------------------------------------------
+    # Policy
+    # ------------------------------------------------------------------
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait for the primary before hedging (None = don't hedge yet)."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    def failed_over(self) -> bool:
+        """Whether traffic is currently routed to the secondary."""
+        return time.monotonic() < self.failover_until
+
+    def _hedge_allowed(self) -> bool:
+        return self.stats["hedges_fired"] < self.max_hedge_ratio * self.stats["requests"]
+
+    def _record_primary(self, error: bool, seconds: Optional[float] = None) -> None:
+        if seconds is not None:
+            self.latencies.add(seconds)
+        self.outcomes.append(error)
+        if not error:
+            return
+        self.stats["primary_errors"] += 1
+        if len(self.outcomes) == self.outcomes.maxlen and not self.failed_over():
+            error_rate = sum(self.outcomes) / len(self.outcomes)
+            if error_rate >= self.failover_error_rate:
+                self.failover_until = time.monotonic() + self.failover_cooldown_seconds
+                self.outcomes.clear()
+                self.stats["failovers"] += 1
+                logger.warning(
+                    f"Primary {self.primary.model} error rate {error_rate:.0%}; routing to "
+                    f"{self.secondary.model} for {self.failover_cooldown_seconds:.0f}s"
+                )
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def _send(client: BaseLLMClient, request: LLMRequest, guard: Optional["StreamGuard"]) -> LLMResponse:
+        if guard is None:
+            return await client.complete(request)
+        return await client.stream(request, guard)
+
+    async def _call_primary(self, request: LLMRequest, guard: Optional["StreamGuard"]) -> LLMResponse:
+        started = time.perf_counter()
+        try:
+            response = await self._send(self.primary, request, guard)
+        except asyncio.CancelledError:
+            # Lost the race: the primary took at least this long
+            self._record_primary(False, time.perf_counter() - started)
+            raise
+        except LLMResponseError:
+            # Early aborts say nothing about latency or provider health
+            self._record_primary(False)
+            raise
+        except (RateLimitError, OverloadedError):
+            self.stats["primary_overloads"] += 1
+            for listener in self.overload_listeners:
+                listener(time.perf_counter() - started)
+            self._record_primary(True)
+            raise
+        except LLMError:
+            self._record_primary(True)
+            raise
+        self._record_primary(False, time.perf_counter() - started)
+        return response
+
+    async def _call_secondary(self, request: LLMRequest, guard: Optional["StreamGuard"]) -> LLMResponse:
+        # Model overrides name primary-provider models; concurrent streams need their own guard
+        return await self._send(
+            self.secondary,
+            request.model_copy(update={"model": None}),
+            guard.fresh() if guard is not None else None,
+        )
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """Execute a request with hedging and failover."""
+        return await self._dispatch(request, None)
+
+    async def stream(self, request: LLMRequest, guard: Optional["StreamGuard"] = None) -> LLMResponse:
+        """Stream a request with hedging and failover (each stream gets its own guard)."""
+        return await self._dispatch(request, guard)
+
+    async def _dispatch(self, request: LLMRequest, guard: Optional["StreamGuard"]) -> LLMResponse:
+        self.stats["requests"] += 1
+        if self.failed_over():
+            response = await self._call_secondary(request, guard)
+            self.stats["secondary_wins"] += 1
+            return response
+
+        primary = asyncio.create_task(self._call_primary(request, guard))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+
+        if not done and not self._hedge_allowed():
+            self.stats["hedges_skipped_budget"] += 1
+        elif not done:
+            self.stats["hedges_fired"] += 1
+            secondary = asyncio.create_task(self._call_secondary(request, guard))
+            return await self._race(primary, secondary, request)
+        return await self._primary_or_fallback(primary, request, guard)
+
+    async def _primary_or_fallback(
+        self, primary: asyncio.Task, request: LLMRequest, guard: Optional["StreamGuard"],
+    ) -> LLMResponse:
+        """Wait for an unhedged primary call; retry once on the secondary if it fails outright."""
+        try:
+            response = await primary
+        except LLMResponseError:
+            raise
+        except LLMError as e:
+            logger.debug(f"{request.request_id}: primary failed ({e}); falling back to secondary")
+            self.stats["fallbacks"] += 1
+            response = await self._call_secondary(request, guard)
+            self.stats["secondary_wins"] += 1
+            return response
+        self.stats["primary_wins"] += 1
+        return response
+
+    async def _race(self, primary: asyncio.Task, secondary: asyncio.Task, request: LLMRequest) -> LLMResponse:
+        """
+        Return the first successful response and cancel the other task.
+
+        The loser was billed too: a response it already returned, or an
+        estimate of its prompt if it is cancelled, is attached to the
+        winner's `abandoned` list.
+        """
+        pending = {primary, secondary}
+        errors = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                results = {}
+                for task in done:
+                    try:
+                        results[task] = task.result()
+                    except LLMError as e:
+                        errors[task] = e
+                if not results:
+                    continue
+                winner = primary if primary in results else secondary
+                loser = secondary if winner is primary else primary
+                response = results[winner]
+                if loser in results:
+                    response.abandoned.append(results[loser])
+                elif loser in pending:
+                    model = (request.model or self.primary.model) if loser is primary else self.secondary.model
+                    response.abandoned.append(self.estimate_abandoned(request, model))
+                self.stats["primary_wins" if winner is primary else "secondary_wins"] += 1
+                return response
+        finally:
+            for task in pending:
+                task.cancel()
+        raise errors.get(primary) or errors[secondary]
+
+    @staticmethod
+    def estimate_abandoned(request: LLMRequest, model: str) -> LLMResponse:
+        """
+        Usage of a call cancelled before it answered, estimated from its prompt.
+
+        The prompt was billed (the cacheable prefix as a cache read when
+        caching is on); output generated before the cancellation is unknown
+        and not counted.
+        """
+        prefix = estimate_tokens(request.system + request.context) if request.system or request.context else 0
+        return LLMResponse(
+            request_id=request.request_id,
+            model=model,
+            content="",
+            stop_reason="cancelled",
+            input_tokens=estimate_tokens(request.user) + (0 if request.cache_system else prefix),
+            cache_read_tokens=prefix if request.cache_system else 0,
+        )
+
+    async def close(self) -> None:
+        """Close both underlying clients."""
+        await asyncio.gather(self.primary.close(), self.secondary.close())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(primary={self.primary!r}, secondary={self.secondary!r})"
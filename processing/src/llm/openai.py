@@ -0,0 +1,196 @@
+"""
+OpenAI Client
+=============
+
+OpenAI Chat Completions client implementing `BaseLLMClient`.
+
+Used as the secondary provider (LLM_SECONDARY_MODEL) for hedged requests
+and failover. `LocalClient` points the same client at an OpenAI-compatible
+local server (vLLM, Ollama, llama.cpp) for `local/<model>` names.
+
+Features:
+- JSON-object response format (matches the PCAP/HMSTS output contract)
+- Token usage with cached prompt tokens reported as cache reads
+- Streaming with per-delta validation (early abort of off-schema output)
+- Provider errors mapped onto the LLMError hierarchy
+"""
+
+import time
+from typing import Optional, Dict, Any, List, TYPE_CHECKING
+
+import openai
+
+from .base import (
+    BaseLLMClient,
+    LLMRequest,
+    LLMResponse,
+    LLMError,
+    RateLimitError,
+    OverloadedError,
+    TransientError,
+    OVERLOAD_STATUSES,
+)
+
+if TYPE_CHECKING:
+    from .streaming import StreamGuard
+
+
+class OpenAIClient(BaseLLMClient):
+    """
+    Async client for OpenAI chat models.
+    """
+
+    provider = "openai"
+
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        api_key: Optional[str] = None,
+        timeout: float = 120.0,
+        base_url: Optional[str] = None,
+    ):
+        """
+        Initialize the OpenAI client.
+
+        Args:
+            model: Default model name
+            api_key: OpenAI API key (uses OPENAI_API_KEY if not provided)
+            timeout: Per-request timeout in seconds
+            base_url: Alternative API endpoint (OpenAI-compatible servers)
+        """
+        super().__init__(model)
+        self.client = openai.AsyncOpenAI(api_key=api_key, timeout=timeout, max_retries=0, base_url=base_url)
+
+    def build_params(self, request: LLMRequest) -> Dict[str, Any]:
+        """Translate an LLMRequest into Chat Completions parameters."""
+        messages = []
+        system = "\n\n".join(text for text in (request.system, request.context) if text)
+        if system:
+            # OpenAI caches long prompt prefixes automatically
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": request.user})
+        return {
+            "model": self.resolve_model(request),
+            "max_tokens": request.max_tokens,
+            "temperature": request.temperature,
+            "messages": messages,
+            "response_format": {"type": "json_object"},
+        }
+
+    @staticmethod
+    def _usage_fields(usage: Any) -> Dict[str, int]:
+        """Token counts from a CompletionUsage (uncached prompt tokens reported as input)."""
+        if usage is None:
+            return {}
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        return {
+            "input_tokens": max(0, (usage.prompt_tokens or 0) - cached),
+            "output_tokens": usage.completion_tokens or 0,
+            "cache_read_tokens": cached,
+        }
+
+    @classmethod
+    def parse_completion(cls, request_id: str, completion: Any, latency_ms: int = 0) -> LLMResponse:
+        """Convert a ChatCompletion object into an LLMResponse."""
+        choice = completion.choices[0]
+        return LLMResponse(
+            request_id=request_id,
+            model=completion.model,
+            content=choice.message.content or "",
+            stop_reason=choice.finish_reason,
+            latency_ms=latency_ms,
+            **cls._usage_fields(completion.usage),
+        )
+
+    @staticmethod
+    def translate_error(error: "openai.APIError") -> LLMError:
+        """Map an OpenAI SDK error onto the LLMError hierarchy."""
+        status = getattr(error, "status_code", None)
+        if isinstance(error, openai.RateLimitError) or status == 429:
+            return RateLimitError(str(error))
+        if isinstance(error, openai.InternalServerError) or status in OVERLOAD_STATUSES:
+            return OverloadedError(str(error))
+        if isinstance(error, openai.APIConnectionError):  # includes timeouts
+            return TransientError(str(error))
+        return LLMError(str(error))
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        """Send a request to the Chat Completions API."""
+        started = time.perf_counter()
+        try:
+            completion = await self.client.chat.completions.create(**self.build_params(request))
+        except openai.APIError as e:
+            raise self.translate_error(e) from e
+
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        return self.parse_completion(request.request_id, completion, latency_ms)
+
+    async def stream(self, request: LLMRequest, guard: Optional["StreamGuard"] = None) -> LLMResponse:
+        """
+        Stream a request, feeding text deltas to `guard`.
+
+        If the guard raises, the response stream is closed and the provider
+        stops generating.
+        """
+        started = time.perf_counter()
+        parts: List[str] = []
+        model, finish_reason, usage = self.resolve_model(request), None, None
+        try:
+            stream = await self.client.chat.completions.create(
+                **self.build_params(request), stream=True, stream_options={"include_usage": True}
+            )
+            try:
+                async for chunk in stream:
+                    model = chunk.model or model
+                    usage = chunk.usage or usage
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    finish_reason = choice.finish_reason or finish_reason
+                    text = choice.delta.content if choice.delta else None
+                    if text:
+                        parts.append(text)
+                        if guard is not None:
+                            guard.feed(text)
+            finally:
+                await stream.close()
+        except openai.APIError as e:
+            raise self.translate_error(e) from e
+
+        if guard is not None:
+            guard.finish()
+        return LLMResponse(
+            request_id=request.request_id,
+            model=model,
+            content="".join(parts),
+            stop_reason=finish_reason,
+            latency_ms=int((time.perf_counter() - started) * 1000),
+            **self._usage_fields(usage),
+        )
+
+    async def close(self) -> None:
+        """Close the underlying HTTP client."""
+        await self.client.close()
+
+
+class LocalClient(OpenAIClient):
+    """
+    OpenAI-compatible local model server.
+
+    Response model names are reported as `local/<model>` so they are priced
+    at zero and distinguishable in llm_model columns.
+    """
+
+    provider = "local"
+
+    def __init__(self, model: str, base_url: str, api_key: Optional[str] = None, timeout: float = 120.0):
+        super().__init__(model=model, api_key=api_key or "local", timeout=timeout, base_url=base_url)
+
+    async def complete(self, request: LLMRequest) -> LLMResponse:
+        response = await super().complete(request)
+        return response.model_copy(update={"model": f"local/{response.model}"})
+
+    async def stream(self, request: LLMRequest, guard: Optional["StreamGuard"] = None) -> LLMResponse:
+        response = await super().stream(request, guard)
+        return response.model_copy(update={"model": f"local/{response.model}"})
@@ -0,0 +1,359 @@
+"""
+Prompt Builder
+==============
+
+Builds system and per-hadith user prompts for PCAP and HMSTS processing.
+
+System prompt (cached, shared by every request of a stage):
+- Stage instructions from config/prompts/{stage}_system.txt
+- Methodology document (PCAP.md / HMSTS.md)
+- Temporal marker reference table (PCAP only)
+- Few-shot examples from config/prompts/{stage}_examples.yaml
+- JSON output schema generated from the Pydantic output model
+Served pre-rendered from the methodology bundle when one is built and up
+to date (src/ingestion/methodology_loader.py).
+
+Chapter context (optional, `--group-by-chapter`; cached, shared by every
+hadith of a (book_id, chapter_id) group):
+- Book and chapter names
+- One-line summaries of the chapter's hadiths
+
+User prompt (per hadith):
+- Book/chapter reference, isnad, Arabic and English text
+- Preprocessing hints (explicit temporal references, isnad chain)
+- Temporal context from PCAP (HMSTS only)
+- Optionally compacted (PROMPT_COMPACTION, see compaction.py)
+- Kept within PROMPT_USER_TOKEN_BUDGET; oversized matn is shortened to its
+  opening, closing and temporally relevant sentences (see token_budget.py)
+"""
+
+import csv
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, TYPE_CHECKING
+
+import yaml
+
+from config.settings import get_settings
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.temporal import PCAPOutput
+from src.models.semantic import HMSTSOutput
+from src.models.processing import ProcessingStage
+from .compaction import Compaction, compact_arabic, compact_english, compact_whitespace, estimate_tokens
+from .token_budget import hadith_tokens, fit_text
+
+if TYPE_CHECKING:
+    from src.ingestion.methodology_loader import MethodologyBundle
+
+
+STAGE_PROMPT_NAMES = {
+    ProcessingStage.PCAP_PROCESSING: "pcap",
+    ProcessingStage.HMSTS_PROCESSING: "hmsts",
+}
+
+STAGE_METHODOLOGY_FILES = {
+    ProcessingStage.PCAP_PROCESSING: "PCAP.md",
+    ProcessingStage.HMSTS_PROCESSING: "HMSTS.md",
+}
+
+STAGE_OUTPUT_MODELS = {
+    ProcessingStage.PCAP_PROCESSING: PCAPOutput,
+    ProcessingStage.HMSTS_PROCESSING: HMSTSOutput,
+}
+
+# Words per hadith in the chapter context summaries
+CHAPTER_SUMMARY_WORDS = 20
+
+
+def _read_text(path: Path) -> str:
+    """Read a UTF-8 text file, returning an empty string if it is missing."""
+    if not path.exists():
+        return ""
+    return path.read_text(encoding="utf-8").strip()
+
+
+class PromptBuilder:
+    """
+    Builds prompts for the LLM processing stages.
+    """
+
+    def __init__(
+        self,
+        prompts_dir: Path,
+        methodology_dir: Path,
+        markers_file: Optional[Path] = None,
+        compaction: Compaction = Compaction.NONE,
+        user_token_budget: Optional[int] = None,
+        bundle: Optional["MethodologyBundle"] = None,
+    ):
+        """
+        Initialize the prompt builder.
+
+        Args:
+            prompts_dir: Directory containing {stage}_system.txt and {stage}_examples.yaml
+            methodology_dir: Directory containing PCAP.md / HMSTS.md
+            markers_file: Prophetic era markers CSV (included in the PCAP system prompt)
+            compaction: User prompt compaction level
+            user_token_budget: Maximum user prompt tokens (no limit if None)
+            bundle: Pre-rendered system prompts (rendered from sources if None)
+        """
+        self.prompts_dir = Path(prompts_dir)
+        self.methodology_dir = Path(methodology_dir)
+        self.markers_file = Path(markers_file) if markers_file else None
+        self.compaction = Compaction.parse(compaction)
+        self.user_token_budget = user_token_budget
+        # Prompts shortened to fit the budget / estimated tokens dropped
+        self.budget_stats = {"fitted": 0, "tokens_omitted": 0}
+        self.bundle = bundle
+        self._system_prompts: Dict[ProcessingStage, str] = {}
+
+    # ------------------------------------------------------------------
+    # System prompt
+    # ------------------------------------------------------------------
+
+    def load_examples(self, stage: ProcessingStage) -> List[Dict[str, Any]]:
+        """Load few-shot examples for a stage (empty list if none are defined)."""
+        path = self.prompts_dir / f"{STAGE_PROMPT_NAMES[stage]}_examples.yaml"
+        if not path.exists():
+            return []
+        data = yaml.safe_load(path.read_text(encoding="utf-8")) or []
+        if isinstance(data, dict):
+            data = data.get("examples", [])
+        return list(data)
+
+    def render_marker_table(self) -> str:
+        """Render the temporal marker CSV as a compact reference table."""
+        if not self.markers_file or not self.markers_file.exists():
+            return ""
+        lines = ["event_id | parent | AH | marker | place"]
+        with open(self.markers_file, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                lines.append(
+                    f"{row['id']} | {row.get('parent') or '-'} | {row.get('ah') or '-'} | "
+                    f"{row['marker']} | {row.get('place') or '-'}"
+                )
+        return "\n".join(lines)
+
+    def build_system_prompt(self, stage: ProcessingStage) -> str:
+        """
+        System prompt for a stage (from the bundle if loaded; memoized).
+
+        Args:
+            stage: PCAP_PROCESSING or HMSTS_PROCESSING
+
+        Returns:
+            Complete system prompt text
+        """
+        if stage not in self._system_prompts:
+            prompt = self.bundle.system_prompt(stage) if self.bundle else None
+            self._system_prompts[stage] = prompt if prompt is not None else self.render_system_prompt(stage)
+        return self._system_prompts[stage]
+
+    @property
+    def prefix_hash(self) -> Optional[str]:
+        """Content hash of the bundled prompt prefixes (None without a bundle)."""
+        return self.bundle.content_hash if self.bundle else None
+
+    def render_system_prompt(self, stage: ProcessingStage) -> str:
+        """Render a stage's system prompt from the source files."""
+        name = STAGE_PROMPT_NAMES[stage]
+        sections = [_read_text(self.prompts_dir / f"{name}_system.txt")]
+
+        methodology = _read_text(self.methodology_dir / STAGE_METHODOLOGY_FILES[stage])
+        if methodology:
+            sections.append(f"# Methodology\n\n{methodology}")
+
+        if stage == ProcessingStage.PCAP_PROCESSING:
+            markers = self.render_marker_table()
+            if markers:
+                sections.append(f"# Temporal Marker Reference\n\n{markers}")
+
+        examples = self.load_examples(stage)
+        if examples:
+            rendered = "\n\n".join(
+                yaml.safe_dump(example, allow_unicode=True, sort_keys=False) for example in examples
+            )
+            sections.append(f"# Examples\n\n{rendered}")
+
+        schema = STAGE_OUTPUT_MODELS[stage].model_json_schema()
+        sections.append(
+            "# Output Format\n\nRespond with a single JSON object matching this schema "
+            f"and nothing else:\n\n{json.dumps(schema, ensure_ascii=False)}"
+        )
+
+        return "\n\n".join(section for section in sections if section)
+
+    # ------------------------------------------------------------------
+    # User prompt
+    # ------------------------------------------------------------------
+
+    def build_chapter_context(self, items: List[Tuple[RawHadith, Optional[PreprocessedHadith]]], max_tokens: int) -> str:
+        """
+        Build the shared context segment for the hadiths of one chapter.
+
+        The text depends only on the group, so every request of the chapter
+        sends an identical (cacheable) segment.
+
+        Args:
+            items: The chapter's (hadith, preprocessing) pairs, in processing order
+            max_tokens: Cap on the segment; summaries beyond it are dropped
+
+        Returns:
+            Chapter context text
+        """
+        first = items[0][0]
+        lines = [
+            "# Chapter Context",
+            f"Book: {first.book_name_english or first.book_id}"
+            + (f" ({first.book_name_arabic})" if first.book_name_arabic else ""),
+            f"Chapter: {first.chapter_name_english or first.chapter_id}"
+            + (f" / {first.chapter_name_arabic}" if first.chapter_name_arabic else ""),
+            f"\nHadiths in this chapter ({len(items)}), for context only:",
+        ]
+        used = estimate_tokens("\n".join(lines))
+        for shown, (hadith, preprocessed) in enumerate(items):
+            text = hadith.english_text or (preprocessed.arabic_normalized if preprocessed else None) or hadith.arabic
+            words = compact_whitespace(text).split()
+            line = f"- #{hadith.id_in_book}: {' '.join(words[:CHAPTER_SUMMARY_WORDS])}"
+            if len(words) > CHAPTER_SUMMARY_WORDS:
+                line += " ..."
+            used += estimate_tokens(line)
+            if used > max_tokens:
+                lines.append(f"- ... {len(items) - shown} more")
+                break
+            lines.append(line)
+        return "\n".join(lines)
+
+    def build_user_prompt(
+        self,
+        hadith: RawHadith,
+        preprocessed: Optional[PreprocessedHadith] = None,
+        temporal_context: Optional[PCAPOutput] = None,
+        chapter_in_context: bool = False,
+    ) -> str:
+        """
+        Build the per-hadith user prompt.
+
+        Args:
+            hadith: Source hadith
+            preprocessed: Preprocessing output (optional)
+            temporal_context: PCAP assignment (or its era context) to include as context (HMSTS only)
+            chapter_in_context: Book/chapter names are in the shared chapter
+                context, so the source line only locates the hadith
+
+        Returns:
+            User prompt text
+        """
+        level = self.compaction
+        isnad_chain = preprocessed.isnad_chain if preprocessed else None
+        english = compact_english(hadith.english_text or "", level)
+        narrator = compact_english(hadith.english_narrator or "", level)
+        arabic = compact_arabic(hadith.arabic, level, isnad_chain)
+
+        if chapter_in_context:
+            header = [f"Hadith ID: {hadith.id}"] if level < Compaction.STANDARD else []
+            header.append(f"Source: #{hadith.id_in_book} in the chapter above")
+            if narrator and (level < Compaction.STANDARD or narrator not in english):
+                header.append(f"Narrator: {narrator}")
+        elif level >= Compaction.STANDARD:
+            # Names only; ids mean nothing to the model
+            header = [
+                f"Source: {hadith.book_name_english or hadith.book_id}, "
+                f"{hadith.chapter_name_english or f'chapter {hadith.chapter_id}'}"
+            ]
+            if narrator and narrator not in english:
+                header.append(f"Narrator: {narrator}")
+        else:
+            header = [
+                f"Hadith ID: {hadith.id}",
+                f"Source: {hadith.book_name_english or hadith.book_id}, "
+                f"chapter {hadith.chapter_name_english or hadith.chapter_id}, #{hadith.id_in_book}",
+            ]
+            if narrator:
+                header.append(f"Narrator: {narrator}")
+
+        footer = []
+        if preprocessed:
+            if isnad_chain:
+                footer.append(f"\nParsed isnad: {' <- '.join(isnad_chain)}")
+            if preprocessed.explicit_temporal_references:
+                footer.append(
+                    "Detected temporal references: "
+                    + ", ".join(preprocessed.explicit_temporal_references)
+                )
+
+        if temporal_context:
+            footer.append(
+                f"\nTemporal context: era {temporal_context.era_id}"
+                f"{' / ' + temporal_context.sub_era_id if temporal_context.sub_era_id else ''}, "
+                f"{temporal_context.earliest_ah}–{temporal_context.latest_ah} AH "
+                f"({temporal_context.evidence_type.value})"
+            )
+
+        if self.user_token_budget:
+            arabic, english = self.fit_to_budget(hadith, preprocessed, arabic, english, header + footer)
+
+        lines = header + [f"\nArabic:\n{arabic}"]
+        if english:
+            lines.append(f"\nEnglish:\n{english}")
+        lines.extend(footer)
+        return "\n".join(lines)
+
+    # ------------------------------------------------------------------
+    # Token budget
+    # ------------------------------------------------------------------
+
+    def is_oversized(self, hadith: RawHadith, preprocessed: Optional[PreprocessedHadith] = None) -> bool:
+        """Whether a hadith's uncompacted prompt exceeds the user token budget."""
+        return bool(self.user_token_budget) and hadith_tokens(hadith, preprocessed) > self.user_token_budget
+
+    def fit_to_budget(
+        self,
+        hadith: RawHadith,
+        preprocessed: Optional[PreprocessedHadith],
+        arabic: str,
+        english: str,
+        other_lines: List[str],
+    ) -> Tuple[str, str]:
+        """
+        Shorten the Arabic and English texts so the prompt fits the budget.
+
+        Returns:
+            Tuple of (arabic, english), unchanged if already within budget
+        """
+        overhead = estimate_tokens("\n".join(other_lines)) + 10
+        if overhead + estimate_tokens(arabic) + estimate_tokens(english) <= self.user_token_budget:
+            return arabic, english
+
+        isnad_chain = preprocessed.isnad_chain if preprocessed else None
+        arabic = compact_arabic(hadith.arabic, Compaction.AGGRESSIVE, isnad_chain)
+        english = compact_english(hadith.english_text or "", Compaction.AGGRESSIVE)
+        sizes = estimate_tokens(arabic), estimate_tokens(english)
+        available = max(0, self.user_token_budget - overhead)
+        if sum(sizes) <= available:
+            return arabic, english
+
+        keep = (preprocessed.explicit_temporal_references if preprocessed else None) or []
+        arabic, arabic_omitted = fit_text(arabic, int(available * sizes[0] / sum(sizes)), keep)
+        english, english_omitted = fit_text(english, int(available * sizes[1] / sum(sizes)), keep)
+        self.budget_stats["fitted"] += 1
+        self.budget_stats["tokens_omitted"] += arabic_omitted + english_omitted
+        return arabic, english
+
+
+@lru_cache
+def get_prompt_builder() -> PromptBuilder:
+    """Return a PromptBuilder configured from settings."""
+    from src.ingestion.methodology_loader import load_bundle
+
+    settings = get_settings()
+    builder = PromptBuilder(
+        prompts_dir=settings.prompts_dir,
+        methodology_dir=settings.methodology_dir,
+        markers_file=settings.markers_file,
+        compaction=Compaction.parse(settings.prompt_compaction),
+        user_token_budget=settings.prompt_user_token_budget,
+    )
+    builder.bundle = load_bundle(settings.prompt_bundle_file, builder)
+    return builder
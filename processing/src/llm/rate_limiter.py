@@ -0,0 +1,258 @@
+"""
+Adaptive Concurrency (AIMD)
+===========================
+
+Finds and holds the provider's real capacity instead of a hand-tuned
+PARALLEL_WORKERS.
+
+`AIMDLimiter` caps the number of LLM calls in flight with a window that is:
+- raised additively (about +1 per window of successful calls) while calls
+  succeed at normal latency and the window is actually in use
+- cut multiplicatively on 429 / 529 (RateLimitError / OverloadedError) and
+  on latency spikes (a call slower than `spike_ratio` x the recent median)
+
+Only one cut is applied per congestion event: calls that started before the
+last cut cannot trigger another one, so a burst of 429s from the same wave
+halves the window once, not N times.
+
+The current window and counters are exposed through `metrics()`;
+`window_seconds()` integrates the window over time (slot capacity, the
+denominator of worker utilization).
+
+Usage:
+------
+    limiter = AIMDLimiter.from_settings(settings)
+    async with limiter.slot():
+        response = await client.complete(request)
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, AsyncIterator, Callable
+
+from loguru import logger
+
+from .base import RateLimitError, OverloadedError
+from .hedging import LatencyWindow
+
+
+class AIMDLimiter:
+    """
+    Additive-increase / multiplicative-decrease limit on concurrent LLM calls.
+    """
+
+    def __init__(
+        self,
+        initial: int = 5,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        increase: float = 1.0,
+        backoff: float = 0.5,
+        spike_ratio: float = 2.0,
+        min_samples: int = 20,
+        latency_window: int = 200,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            initial: Starting window (PARALLEL_WORKERS)
+            min_limit: Window floor
+            max_limit: Window ceiling
+            increase: Window growth per full window of successful calls
+            backoff: Factor applied to the window on overload or latency spikes
+            spike_ratio: Latency / recent median above which a call counts as a spike
+            min_samples: Successful calls observed before spike detection starts
+            latency_window: Number of recent latencies kept for the median
+            clock: Time source in seconds (simulated time in the capacity simulator)
+        """
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.increase = increase
+        self.backoff = backoff
+        self.spike_ratio = spike_ratio
+        self.min_samples = min_samples
+        self.latencies = LatencyWindow(latency_window)
+        self.clock = clock
+
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._window_seconds = 0.0
+        self._window_since = clock()
+        self._waiters: List[asyncio.Future] = []
+        self._room_waiters: List[asyncio.Future] = []
+        self.stats: Dict[str, int] = {
+            "calls": 0,
+            "increases": 0,
+            "decreases": 0,
+            "overloads": 0,
+            "latency_spikes": 0,
+            "peak_window": self.window,
+        }
+
+    @classmethod
+    def from_settings(cls, settings, clock: Callable[[], float] = time.monotonic) -> "AIMDLimiter":
+        """Build a limiter configured from pipeline settings."""
+        return cls(
+            initial=settings.parallel_workers,
+            min_limit=settings.llm_concurrency_min,
+            max_limit=settings.llm_concurrency_max,
+            spike_ratio=settings.llm_latency_spike_ratio,
+            clock=clock,
+        )
+
+    @property
+    def window(self) -> int:
+        """Current number of calls allowed in flight."""
+        return max(self.min_limit, int(self.limit))
+
+    def window_seconds(self) -> float:
+        """Window integrated over time since the limiter was created (slot-seconds)."""
+        return self._window_seconds + self.window * (self.clock() - self._window_since)
+
+    def _set_limit(self, limit: float) -> None:
+        now = self.clock()
+        self._window_seconds += self.window * (now - self._window_since)
+        self._window_since = now
+        self.limit = limit
+
+    # ------------------------------------------------------------------
+    # Slots
+    # ------------------------------------------------------------------
+
+    def try_acquire(self) -> Optional[float]:
+        """Take a free slot without waiting; returns the call's start time, or None if the window is full."""
+        if self.in_flight >= self.window:
+            return None
+        self.in_flight += 1
+        return self.clock()
+
+    async def acquire(self) -> float:
+        """Wait for a free slot; returns the call's start time."""
+        while (started := self.try_acquire()) is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        return started
+
+    async def wait_for_room(self) -> None:
+        """
+        Wait until the window has a free slot, without taking it.
+
+        Lets a worker hold off dequeuing work while the window is full, so
+        waiting items stay in the queues (and can be stolen). Every release
+        wakes all such workers: they re-check, and one whose queue has run
+        dry must get to exit.
+        """
+        while self.in_flight >= self.window:
+            waiter = asyncio.get_running_loop().create_future()
+            self._room_waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._room_waiters:
+                    self._room_waiters.remove(waiter)
+
+    def release(self, started: float, outcome: str) -> None:
+        """
+        Free a slot and adapt the window.
+
+        Args:
+            started: Value returned by `acquire`
+            outcome: "ok", "overload" (429/529) or "neutral" (other errors, cancellation)
+        """
+        saturated = self.in_flight >= self.window
+        self.in_flight -= 1
+        self.stats["calls"] += 1
+        latency = self.clock() - started
+
+        if outcome == "overload":
+            self.stats["overloads"] += 1
+            self._decrease(started, "overload")
+        elif outcome == "ok":
+            median = self.latencies.percentile(0.5) if len(self.latencies) >= self.min_samples else None
+            self.latencies.add(latency)
+            if median and latency > self.spike_ratio * median:
+                self.stats["latency_spikes"] += 1
+                self._decrease(started, f"latency {latency:.1f}s > {self.spike_ratio:g}x median {median:.1f}s")
+            elif saturated and self.limit < self.max_limit:
+                before = self.window
+                self._set_limit(min(self.max_limit, self.limit + self.increase / self.limit))
+                if self.window > before:
+                    self.stats["increases"] += 1
+                    self.stats["peak_window"] = max(self.stats["peak_window"], self.window)
+        self._wake()
+
+    def report_overload(self, elapsed: float = 0.0) -> None:
+        """
+        Account a 429/529 that did not surface through `slot()`.
+
+        E.g. a hedged client that served the call from its secondary
+        (HedgedLLMClient.overload_listeners).
+
+        Args:
+            elapsed: Seconds since the overloaded call started
+        """
+        self.stats["overloads"] += 1
+        self._decrease(self.clock() - elapsed, "overload")
+
+    def _decrease(self, started: float, reason: str) -> None:
+        if started < self.last_decrease:
+            return  # same congestion event as the last cut
+        before = self.window
+        self._set_limit(max(float(self.min_limit), self.limit * self.backoff))
+        self.last_decrease = self.clock()
+        self.stats["decreases"] += 1
+        logger.info(f"Concurrency window {before} -> {self.window} ({reason})")
+
+    def _wake(self) -> None:
+        for waiter in self._waiters[: max(0, self.window - self.in_flight)]:
+            if not waiter.done():
+                waiter.set_result(None)
+        for waiter in self._room_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of one LLM call."""
+        started = await self.acquire()
+        outcome = "neutral"
+        try:
+            yield
+            outcome = "ok"
+        except (RateLimitError, OverloadedError):
+            outcome = "overload"
+            raise
+        finally:
+            self.release(started, outcome)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current window, in-flight calls and adaptation counters."""
+        median = self.latencies.percentile(0.5)
+        return {
+            "window": self.window,
+            "in_flight": self.in_flight,
+            "median_latency_s": round(median, 3) if median is not None else None,
+            **self.stats,
+        }
+
+    def summary(self) -> str:
+        """One-line summary for logs."""
+        m = self.metrics()
+        return (
+            f"window {m['window']} (peak {m['peak_window']}, range {self.min_limit}-{self.max_limit}), "
+            f"{m['increases']} increases, {m['decreases']} decreases "
+            f"({m['overloads']} overloads, {m['latency_spikes']} latency spikes)"
+        )
@@ -0,0 +1,298 @@
+"""
+Local Output Repair
+===================
+
+Fix small formatting slips in LLM output locally instead of paying for a
+full retry (14-22k prompt tokens per PCAP/HMSTS call).
+
+Two layers:
+1. Syntax (`repair_json`): code fences and prose around the object,
+   trailing commas, unterminated strings and missing closing brackets in
+   truncated output
+2. Schema (`SchemaRepairer`): near-miss enum spellings mapped onto the
+   canonical values (`qati` -> `qatʿī`, `normative` -> `Normative`,
+   `prophetic_state` -> `Prophetic State`) and decimals rounded to the
+   field's `decimal_places`
+
+Repairers are built once per output model (`get_repairer`) with the enum
+lookup tables and field validators precompiled.
+"""
+
+import json
+import re
+import unicodedata
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter
+from pydantic.fields import FieldInfo
+
+from .base import LLMResponseError, extract_json
+
+
+# ============================================================================
+# Syntax repair
+# ============================================================================
+
+_CODE_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",(\s*)$")
+_LAST_STRING = re.compile(r'"(?:[^"\\]|\\.)*"\s*(?::\s*)?$')
+
+
+def remove_trailing_commas(text: str) -> str:
+    """Drop commas directly before a closing bracket (outside strings)."""
+    out: List[str] = []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+        out.append(char)
+    return "".join(out)
+
+
+def repair_json(content: str, changes: Optional[List[str]] = None) -> str:
+    """
+    Best-effort syntactic repair of a JSON object in model output.
+
+    Args:
+        content: Raw response text
+        changes: If given, a description of each repair is appended to it
+
+    Returns:
+        Repaired JSON text (may still be invalid if the damage is not local)
+    """
+    changes = changes if changes is not None else []
+    text = _CODE_FENCE.sub("", content).strip()
+    start = text.find("{")
+    if start == -1:
+        return text
+    if start or _CODE_FENCE.search(content):
+        changes.append("stripped text around the object")
+    text, raw = remove_trailing_commas(text[start:]), text[start:]
+    if text != raw:
+        changes.append("removed trailing commas")
+
+    # Track open brackets to find where the object ends or how to close it
+    stack: List[str] = []
+    in_string = escape = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return text[:index + 1]
+
+    # Truncated: close the open string, drop a dangling key or comma, close brackets
+    changes.append("output truncated")
+    if in_string:
+        text += '"'
+        changes.append("closed an unterminated string")
+    text = text.rstrip()
+    if stack and stack[-1] == "}":
+        # An object can't end on a bare key (with or without its colon)
+        last = _LAST_STRING.search(text)
+        if last:
+            before = text[:last.start()].rstrip()
+            if before.endswith(("{", ",")):
+                text = before
+                changes.append("dropped a dangling key")
+    text = _TRAILING_COMMA.sub(r"\1", text.rstrip()).rstrip()
+    if text.endswith(":"):
+        text += " null"
+        changes.append("filled a missing value with null")
+    changes.append(f"closed {len(stack)} bracket{'s' if len(stack) != 1 else ''}")
+    return text + "".join(reversed(stack))
+
+
+# ============================================================================
+# Schema repair
+# ============================================================================
+
+_APOSTROPHES = "ʿʾ'`’‘ʼ"
+
+
+def enum_key(value: str) -> str:
+    """Comparison key for enum spellings: no diacritics, case, spaces or punctuation."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(
+        c for c in decomposed if not unicodedata.combining(c) and c not in _APOSTROPHES
+    )
+    return re.sub(r"[^0-9a-z]", "", stripped.lower())
+
+
+def _decimal_places(field: FieldInfo) -> Optional[int]:
+    for item in field.metadata:
+        places = getattr(item, "decimal_places", None)
+        if places is not None:
+            return places
+    return None
+
+
+class _Node:
+    """Precompiled repair instructions for one value position in a model."""
+
+    __slots__ = ("kind", "enum_map", "children", "item", "places")
+
+    def __init__(self, kind: str, enum_map=None, children=None, item=None, places=None):
+        self.kind = kind            # enum | model | list | decimal
+        self.enum_map: Dict[str, str] = enum_map or {}
+        self.children: Dict[str, "_Node"] = children or {}
+        self.item: Optional["_Node"] = item
+        self.places: Optional[int] = places
+
+
+def _compile(annotation: Any, field: Optional[FieldInfo] = None) -> Optional[_Node]:
+    """Build the repair node for a type annotation (None if nothing to repair)."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        nodes = [_compile(arg, field) for arg in get_args(annotation) if arg is not type(None)]
+        return next((n for n in nodes if n is not None), None)
+    if origin in (list, List):
+        item = _compile(get_args(annotation)[0]) if get_args(annotation) else None
+        return _Node("list", item=item) if item else None
+    if isinstance(annotation, type) and issubclass(annotation, Enum):
+        enum_map = {}
+        for member in annotation:
+            enum_map[enum_key(member.name)] = member.value
+            enum_map[enum_key(str(member.value))] = member.value
+        return _Node("enum", enum_map=enum_map)
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        children = {
+            name: node for name, sub in annotation.model_fields.items()
+            if (node := _compile(sub.annotation, sub)) is not None
+        }
+        return _Node("model", children=children) if children else None
+    if annotation is Decimal and field is not None:
+        places = _decimal_places(field)
+        return _Node("decimal", places=places) if places is not None else None
+    return None
+
+
+class SchemaRepairer:
+    """
+    Coerce parsed output towards an output model before validation.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        """
+        Precompile enum tables and validators for a model.
+
+        Args:
+            model: Output model (e.g. PCAPOutput, HMSTSOutput)
+        """
+        self.model = model
+        self.adapter = TypeAdapter(model)
+        self.fields: Dict[str, _Node] = {
+            name: node for name, field in model.model_fields.items()
+            if (node := _compile(field.annotation, field)) is not None
+        }
+
+    def coerce_field(self, name: str, value: Any, changes: Optional[List[str]] = None) -> Any:
+        """Repair one top-level field value."""
+        node = self.fields.get(name)
+        return self._coerce(node, value, name, changes if changes is not None else []) if node else value
+
+    def coerce(self, data: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Repair all fields of a parsed object.
+
+        Returns:
+            Tuple of (repaired data, human-readable list of changes)
+        """
+        changes: List[str] = []
+        repaired = {
+            key: self.coerce_field(key, value, changes) for key, value in data.items()
+        }
+        return repaired, changes
+
+    def _coerce(self, node: _Node, value: Any, path: str, changes: List[str]) -> Any:
+        if value is None:
+            return value
+        if node.kind == "enum" and isinstance(value, str):
+            canonical = node.enum_map.get(enum_key(value))
+            if canonical is not None and canonical != value:
+                changes.append(f"{path}: {value!r} -> {canonical!r}")
+                return canonical
+            return value
+        if node.kind == "model" and isinstance(value, dict):
+            return {
+                key: self._coerce(node.children[key], sub, f"{path}.{key}", changes)
+                if key in node.children else sub
+                for key, sub in value.items()
+            }
+        if node.kind == "list" and isinstance(value, list):
+            return [self._coerce(node.item, sub, f"{path}[{i}]", changes) for i, sub in enumerate(value)]
+        if node.kind == "decimal" and isinstance(value, (int, float, str)):
+            try:
+                number = Decimal(str(value))
+            except ArithmeticError:
+                return value
+            rounded = round(number, node.places)
+            if rounded != number:
+                changes.append(f"{path}: {value} -> {rounded}")
+                return float(rounded)
+        return value
+
+    def validate(self, data: Dict[str, Any]) -> BaseModel:
+        """Validate with the precompiled model validator (raises ValidationError)."""
+        return self.adapter.validate_python(data)
+
+
+@lru_cache(maxsize=None)
+def get_repairer(model: Type[BaseModel]) -> SchemaRepairer:
+    """Return the cached repairer for an output model."""
+    return SchemaRepairer(model)
+
+
+def parse_json_lenient(content: str, changes: Optional[List[str]] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse the JSON object in a response, repairing syntax if needed.
+
+    Args:
+        content: Raw response text
+        changes: If given, receives a description of each syntax repair
+
+    Returns:
+        Tuple of (parsed object, whether syntax repair was needed)
+
+    Raises:
+        ValueError: If the object cannot be recovered
+    """
+    try:
+        return extract_json(content), False
+    except LLMResponseError:
+        pass
+    repairs: List[str] = []
+    try:
+        data = json.loads(repair_json(content, repairs))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"unrepairable JSON ({'; '.join(repairs) or 'no repair applied'}): {e}") from e
+    if changes is not None:
+        changes.extend(repairs)
+    if not isinstance(data, dict):
+        raise ValueError("repaired JSON is not an object")
+    return data, True
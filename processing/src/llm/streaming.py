@@ -0,0 +1,227 @@
+"""
+Streamed Output Validation
+==========================
+
+Incremental JSON parsing of streamed LLM output with early abort.
+
+Structured outputs such as HMSTSOutput run to ~2k tokens. Instead of
+discovering a malformed response after it has fully arrived, clients feed
+text deltas into a `StreamGuard` as they stream in. The guard tracks the
+top-level JSON object and validates each top-level field against the output
+model as soon as that field's value is complete (enums, nested models,
+constraints), after the same local repairs applied to complete responses
+(near-miss enum spellings, trailing commas). The first off-schema field
+raises `StreamAborted`, the client closes the stream, and the processor
+retries.
+
+Classes:
+- IncrementalJSONParser: character-level scanner yielding completed
+  top-level (key, value) pairs of a JSON object
+- StreamGuard: validates those pairs against a Pydantic model
+- StreamAborted: LLMResponseError raised on early abort
+"""
+
+import json
+from typing import Optional, List, Dict, Any, Tuple, Type, Annotated
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from .base import LLMResponseError
+from .repair import get_repairer, remove_trailing_commas
+
+
+class StreamAborted(LLMResponseError):
+    """Streamed output went off-schema and the generation was abandoned."""
+
+    def __init__(self, message: str, chars_received: int = 0):
+        super().__init__(message)
+        self.chars_received = chars_received
+
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Scan a streamed JSON object and emit its top-level members as they complete.
+
+    Text before the opening brace (prose, a ```json fence) and after the
+    closing brace is ignored. Nested values are not parsed until their
+    top-level member is complete, at which point the raw slice is handed to
+    `json.loads`.
+    """
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.depth = 0
+        self.started = False
+        self.finished = False
+        self.in_string = False
+        self.escape = False
+
+        # Top-level member state
+        self.expect = "key"          # key | colon | value | comma
+        self.key_start: Optional[int] = None
+        self.current_key: Optional[str] = None
+        self.value_start: Optional[int] = None
+        self.keys: List[str] = []
+
+    @property
+    def position(self) -> int:
+        """Characters consumed since the opening brace."""
+        return len(self.buffer)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume a text delta.
+
+        Returns:
+            Top-level (key, value) pairs completed by this chunk
+
+        Raises:
+            StreamAborted: On malformed JSON structure
+        """
+        completed = []
+        for char in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                    self.buffer.append(char)
+                continue
+
+            index = len(self.buffer)
+            self.buffer.append(char)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.expect == "key":
+                        self.current_key = json.loads("".join(self.buffer[self.key_start:index + 1]))
+                        self.expect = "colon"
+                continue
+
+            if self.depth == 1 and self.expect != "value":
+                if char in _WHITESPACE:
+                    continue
+                if self.expect == "key" and char == '"':
+                    self.key_start = index
+                    self.in_string = True
+                elif self.expect == "key" and char == "}":
+                    # Empty object, or a trailing comma (left for JSON repair)
+                    self.finished = True
+                elif self.expect == "colon" and char == ":":
+                    self.expect = "value"
+                    self.value_start = index + 1
+                else:
+                    raise self._error(f"unexpected {char!r} at top level")
+                continue
+
+            if char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    completed.append(self._complete_member(index))
+                    self.finished = True
+            elif char == "," and self.depth == 1:
+                completed.append(self._complete_member(index))
+                self.expect = "key"
+        return completed
+
+    def _complete_member(self, end: int) -> Tuple[str, Any]:
+        raw = "".join(self.buffer[self.value_start:end]).strip()
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            # Trailing commas are repaired locally after the stream ends
+            try:
+                value = json.loads(remove_trailing_commas(raw))
+            except json.JSONDecodeError as e:
+                raise self._error(f"invalid value for {self.current_key!r}: {e}") from e
+        self.keys.append(self.current_key)
+        return self.current_key, value
+
+    def _error(self, message: str) -> StreamAborted:
+        return StreamAborted(f"Malformed JSON stream: {message}", self.position)
+
+
+class StreamGuard:
+    """
+    Validate a streamed response against a Pydantic output model, field by field.
+    """
+
+    # Per-model field adapters, built once per output model
+    _adapters: Dict[Type[BaseModel], Dict[str, TypeAdapter]] = {}
+
+    def __init__(self, model: Type[BaseModel]):
+        """
+        Initialize the guard.
+
+        Args:
+            model: Output model the response must satisfy (e.g. HMSTSOutput)
+        """
+        self.model = model
+        self.parser = IncrementalJSONParser()
+        self.fields = self.adapters_for(model)
+        self.repairer = get_repairer(model)
+        self.required = [name for name, field in model.model_fields.items() if field.is_required()]
+
+    @classmethod
+    def adapters_for(cls, model: Type[BaseModel]) -> Dict[str, TypeAdapter]:
+        """Field validators (annotation plus constraints) for a model."""
+        if model not in cls._adapters:
+            cls._adapters[model] = {
+                name: TypeAdapter(Annotated[field.annotation, field])
+                for name, field in model.model_fields.items()
+            }
+        return cls._adapters[model]
+
+    def fresh(self) -> "StreamGuard":
+        """New guard for the same model (for a concurrent stream of the same request)."""
+        return StreamGuard(self.model)
+
+    def feed(self, chunk: str) -> None:
+        """
+        Consume a text delta.
+
+        Raises:
+            StreamAborted: If a completed field fails validation or the JSON is malformed
+        """
+        for key, value in self.parser.feed(chunk):
+            adapter = self.fields.get(key)
+            if adapter is None:
+                if self.model.model_config.get("extra") == "forbid":
+                    raise StreamAborted(f"Unexpected field {key!r}", self.parser.position)
+                continue
+            try:
+                adapter.validate_python(self.repairer.coerce_field(key, value))
+            except ValidationError as e:
+                raise StreamAborted(
+                    f"{self.model.__name__}.{key} off-schema: {e.errors()[0]['msg']}",
+                    self.parser.position,
+                ) from e
+
+    def finish(self) -> None:
+        """
+        Check the completed response.
+
+        An object that never closed (truncated output) is left to local JSON
+        repair; the generation is over either way.
+
+        Raises:
+            StreamAborted: If a closed object is missing required fields
+        """
+        if not self.parser.finished:
+            return
+        missing = [name for name in self.required if name not in self.parser.keys]
+        if missing:
+            raise StreamAborted(f"Missing required fields: {', '.join(missing)}", self.parser.position)
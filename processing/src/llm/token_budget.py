@@ -0,0 +1,141 @@
+"""
+User Prompt Token Budget
+========================
+
+Keeps oversized hadiths (long Musnad Ahmad and Mishkat narrations with
+commentary) within PROMPT_USER_TOKEN_BUDGET.
+
+Sizing uses the preprocessing text lengths (`text_length_arabic`,
+`text_length_english`) when available, so routing a batch does not rescan
+the texts; otherwise the texts are estimated with `estimate_tokens`.
+
+Strategy for a hadith over budget (matn only; the source line, parsed isnad
+and detected temporal references are always kept):
+1. Compact the texts at the aggressive level (diacritics, honorifics, isnad
+   replaced by the parsed chain), whatever PROMPT_COMPACTION is
+2. Give the Arabic and English texts shares of the remaining budget in
+   proportion to their size
+3. Split each text into sentence chunks (fixed-size word windows for
+   unpunctuated runs)
+4. Keep chunks that mention a detected temporal reference (up to 25% of
+   the share), then the opening chunks (setting, first statement) up to 60%
+   of what is left and the closing chunks (ruling, narrator's conclusion)
+   up to the rest; kept chunks stay in their original order
+5. Replace every omitted span with "[... ~N tokens omitted ...]" so the
+   model knows the text is incomplete
+
+Oversized hadiths also run on a separate low-concurrency lane (see
+base_processor.py) so they never hold up the main workers.
+"""
+
+import re
+from typing import Optional, List, Tuple
+
+from src.models.hadith import RawHadith, PreprocessedHadith
+from .compaction import estimate_tokens
+
+
+# Characters per token for the preprocessing text lengths (see estimate_tokens)
+ARABIC_CHARS_PER_TOKEN = 2.0
+ENGLISH_CHARS_PER_TOKEN = 4.0
+
+# Source line, narrator, section labels
+PROMPT_OVERHEAD_TOKENS = 60
+
+HEAD_SHARE = 0.6
+CUE_SHARE = 0.25
+MAX_CHUNK_TOKENS = 120
+
+_SENTENCE_END = re.compile(r"(?<=[.!?؟۔;:؛])\s+")
+
+
+def hadith_tokens(hadith: RawHadith, preprocessed: Optional[PreprocessedHadith] = None) -> int:
+    """Approximate uncompacted user prompt size of a hadith."""
+    if preprocessed and preprocessed.text_length_arabic is not None:
+        text_tokens = (
+            preprocessed.text_length_arabic / ARABIC_CHARS_PER_TOKEN
+            + (preprocessed.text_length_english or 0) / ENGLISH_CHARS_PER_TOKEN
+        )
+    else:
+        text_tokens = estimate_tokens(hadith.arabic or "") + estimate_tokens(hadith.english_text or "")
+    return int(text_tokens) + PROMPT_OVERHEAD_TOKENS
+
+
+def split_chunks(text: str, max_tokens: int = MAX_CHUNK_TOKENS) -> List[str]:
+    """Sentence chunks, with sentences over `max_tokens` cut into word windows."""
+    chunks = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if estimate_tokens(sentence) <= max_tokens:
+            chunks.append(sentence)
+            continue
+        words = sentence.split()
+        window: List[str] = []
+        for word in words:
+            window.append(word)
+            if estimate_tokens(" ".join(window)) >= max_tokens:
+                chunks.append(" ".join(window))
+                window = []
+        if window:
+            chunks.append(" ".join(window))
+    return [chunk for chunk in chunks if chunk]
+
+
+def _omitted(tokens: int) -> str:
+    return f"[... ~{tokens} tokens omitted ...]"
+
+
+def fit_text(text: str, budget: int, keep: Optional[List[str]] = None) -> Tuple[str, int]:
+    """
+    Shorten text to about `budget` tokens (head, cue-bearing middle, tail).
+
+    Args:
+        text: Arabic or English text
+        budget: Token budget for this text
+        keep: Phrases whose chunks should survive when they fit (temporal references)
+
+    Returns:
+        Tuple of (text, estimated tokens omitted)
+    """
+    if estimate_tokens(text) <= budget:
+        return text, 0
+    chunks = split_chunks(text)
+    sizes = [estimate_tokens(chunk) for chunk in chunks]
+    marker = estimate_tokens(_omitted(1000))
+
+    kept = [False] * len(chunks)
+    used = 0
+
+    def take(i: int, limit: float) -> bool:
+        nonlocal used
+        if kept[i]:
+            return True
+        if used + sizes[i] + marker > limit:
+            return False
+        kept[i] = True
+        used += sizes[i]
+        return True
+
+    cues = [phrase.lower() for phrase in keep or [] if phrase]
+    for i, chunk in enumerate(chunks):
+        if cues and any(cue in chunk.lower() for cue in cues):
+            take(i, budget * CUE_SHARE)
+    head_limit = used + (budget - used) * HEAD_SHARE
+    for i in range(len(chunks)):
+        if not take(i, head_limit):
+            break
+    for i in reversed(range(len(chunks))):
+        if not take(i, budget - marker):
+            break
+
+    parts, omitted = [], 0
+    for chunk, size, keep_chunk in zip(chunks, sizes, kept, strict=True):
+        if keep_chunk:
+            if omitted:
+                parts.append(_omitted(omitted))
+                omitted = 0
+            parts.append(chunk)
+        else:
+            omitted += size
+    if omitted:
+        parts.append(_omitted(omitted))
+    return " ".join(parts), sum(size for size, keep_chunk in zip(sizes, kept, strict=True) if not keep_chunk)
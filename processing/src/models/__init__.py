@@ -21,7 +21,7 @@ Model Categories:
    - ValidationStatus, ValidationResult, QualityMetrics
 
 5. Processing Models (processing.py):
-   - ProcessingStage, ProcessingState, Checkpoint, BatchProgress
+   - ProcessingStage, ProcessingState, Checkpoint, DeadLetter, BatchProgress
 
 Usage:
 ------
@@ -81,6 +81,7 @@ from .processing import (
     ProcessingStage,
     ProcessingStatus,
     Checkpoint,
+    DeadLetter,
     BatchProgress,
     ProcessingState,
     ProcessingStatistics,
@@ -125,6 +126,7 @@ __all__ = [
     "ProcessingStage",
     "ProcessingStatus",
     "Checkpoint",
+    "DeadLetter",
     "BatchProgress",
     "ProcessingState",
     "ProcessingStatistics",
@@ -8,6 +8,7 @@ Models:
 - ProcessingStage: Enum for pipeline stages
 - ProcessingStatus: Enum for status tracking
 - Checkpoint: Resume point for processing
+- DeadLetter: A hadith whose stage processing failed, kept for targeted retries
 - BatchProgress: Progress tracking for current batch
 - ProcessingState: Complete processing state
 - ProcessingStatistics: Summary statistics
@@ -55,7 +56,7 @@ class Checkpoint(BaseModel):
     version: str = Field("v1.0", max_length=20)
 
     # Progress tracking
-    last_processed_hadith_id: int = Field(..., description="Last successfully processed hadith")
+    processed_ids_path: str = Field(..., description="Processed-ID bitmap (see src/utils/progress_tracker.py)")
     total_processed: int = Field(..., ge=0, description="Total hadiths processed so far")
     total_remaining: int = Field(..., ge=0, description="Hadiths remaining")
 
@@ -70,6 +71,27 @@ class Checkpoint(BaseModel):
 
 
 
+class DeadLetter(BaseModel):
+    """
+    Failed hadith for a stage/version, kept for `process_hadiths.py --retry-failed`.
+    """
+    model_config = ConfigDict(validate_assignment=True)
+
+    hadith_id: int = Field(..., description="References raw_hadiths.id")
+    stage: ProcessingStage = Field(..., description="Stage that failed")
+    version: str = Field("v1.0", max_length=20)
+
+    error_class: str = Field(..., max_length=100, description="Exception class of the last failure cause")
+    error_message: str = Field("", description="Last error message")
+    prompt_hash: Optional[str] = Field(None, max_length=32, description="LLMRequest.prompt_hash of the failing prompt")
+    failures: int = Field(1, ge=1, description="Failed runs recorded for this hadith")
+
+    first_failed_at: datetime = Field(default_factory=datetime.utcnow)
+    last_failed_at: datetime = Field(default_factory=datetime.utcnow)
+    resolved_at: Optional[datetime] = Field(None, description="Set once a later run stored the hadith")
+
+
+
 class BatchProgress(BaseModel):
     """
     Real-time progress tracking for current batch.
@@ -96,6 +118,8 @@ class BatchProgress(BaseModel):
     total_cost_usd: Decimal = Field(Decimal(0), ge=0, decimal_places=6)
     total_tokens_used: int = Field(0, ge=0)
     avg_processing_time_ms: Optional[int] = Field(None, ge=0)
+    makespan_ms: Optional[int] = Field(None, ge=0, description="First dispatch to last worker finished")
+    worker_utilization: Optional[float] = Field(None, ge=0, le=1, description="LLM call time / (open slots x makespan)")
 
     # Error tracking
     errors: List[str] = Field(default_factory=list)
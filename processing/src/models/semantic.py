@@ -262,6 +262,12 @@ class HMSTSAssignment(BaseModel):
     processing_duration_ms: Optional[int] = Field(None, ge=0)
     semantic_completeness_score: Optional[Decimal] = Field(None, ge=0, le=1, decimal_places=3)
 
+    # Provenance
+    derived_from_hadith_id: Optional[int] = Field(
+        None,
+        description="Near-duplicate cluster representative this result was copied from"
+    )
+
     # Timestamps
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
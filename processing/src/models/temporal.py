@@ -149,6 +149,12 @@ class PCAPAssignment(PCAPOutput):
     llm_cost_usd: Optional[Decimal] = Field(None, ge=0, decimal_places=6, description="API cost in USD")
     processing_duration_ms: Optional[int] = Field(None, ge=0, description="Processing time in milliseconds")
 
+    # Provenance
+    derived_from_hadith_id: Optional[int] = Field(
+        None,
+        description="Near-duplicate cluster representative this result was copied from"
+    )
+
     # Timestamps
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
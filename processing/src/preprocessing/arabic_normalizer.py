@@ -0,0 +1,68 @@
+"""
+Arabic Text Normalizer
+======================
+
+Orthographic normalization of Arabic hadith text.
+
+Steps (each available separately):
+- strip_diacritics: remove tashkeel (harakat, tanwin, shadda, sukun),
+  Quranic annotation marks and tatweel
+- normalize_letters: unify alef variants, alef maqsura, ta marbuta and
+  hamza carriers
+- collapse_whitespace: strip punctuation noise and collapse runs of spaces
+
+`normalize_arabic` applies all of them and produces the form stored in
+preprocessed_hadiths.arabic_normalized.
+"""
+
+import re
+
+
+# Harakat, tanwin, shadda, sukun, superscript alef and Quranic annotation marks
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+_TATWEEL = "\u0640"
+
+_LETTER_MAP = str.maketrans({
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ؤ": "و",
+    "ئ": "ي",
+})
+
+# Punctuation (Arabic and Latin) replaced by spaces before collapsing
+_PUNCTUATION = re.compile(r"[،؛؟۔«»\"'“”‘’()\[\]{}<>:;,.!?\-–—_/\\|*]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def strip_diacritics(text: str) -> str:
+    """Remove tashkeel and tatweel, keeping the consonantal skeleton."""
+    return _DIACRITICS.sub("", text).replace(_TATWEEL, "")
+
+
+def normalize_letters(text: str) -> str:
+    """Unify orthographic letter variants."""
+    return text.translate(_LETTER_MAP)
+
+
+def collapse_whitespace(text: str) -> str:
+    """Replace punctuation with spaces and collapse whitespace runs."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    Full normalization used for arabic_normalized.
+
+    Args:
+        text: Raw Arabic text
+
+    Returns:
+        Normalized text (no diacritics, unified letters, single spaces)
+    """
+    if not text:
+        return ""
+    return collapse_whitespace(normalize_letters(strip_diacritics(text)))
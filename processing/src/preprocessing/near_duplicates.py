@@ -0,0 +1,251 @@
+"""
+Near-Duplicate Matn Detection
+=============================
+
+MinHash + LSH clustering of near-identical hadith texts so that only one
+representative per cluster is sent to PCAP/HMSTS; its results are fanned out
+to the other members with a provenance link (derived_from_hadith_id).
+
+The same matn recurs across Bukhari, Muslim, Riyad as-Salihin, Mishkat and
+Bulugh al-Maram with small orthographic or isnad-prefix differences, so
+similarity is computed over word shingles of `arabic_normalized`.
+
+Algorithm:
+1. Shingle each text into word n-grams, hash with CRC32
+2. MinHash signature: min over shingles of (a*h + b) mod (2^61 - 1) for
+   `num_perm` random (a, b) pairs (vectorized with numpy)
+3. LSH banding: texts sharing any identical band become candidate pairs
+4. Candidates are kept if their estimated Jaccard similarity >= threshold,
+   merged with union-find, and every member is re-checked against the
+   cluster representative to stop similarity chains drifting apart
+
+Runs in O(n) signature time plus near-linear bucket work; the full corpus
+clusters in a few minutes on one CPU core.
+"""
+
+import sys
+import zlib
+from collections import defaultdict
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional, Iterable
+
+import numpy as np
+from loguru import logger
+
+sys.path.insert(0, str(Path(__file__).parents[2]))
+
+from src.preprocessing.arabic_normalizer import normalize_arabic
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """
+    Hash the word n-grams of a normalized text.
+
+    Args:
+        text: Normalized Arabic text
+        size: Words per shingle
+
+    Returns:
+        Array of unique 32-bit shingle hashes (uint64)
+    """
+    words = text.split()
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)
+    ))
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Choose (bands, rows) whose LSH S-curve midpoint is closest to `threshold`.
+
+    The curve midpoint is approximately (1 / bands) ** (1 / rows).
+    """
+    best = (1, num_perm)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class UnionFind:
+    """Disjoint-set forest over hadith IDs."""
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        parent = self.parent.setdefault(x, x)
+        if parent != x:
+            parent = self.parent[x] = self.find(parent)
+        return parent
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Lower ID becomes the root so representatives are deterministic
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+class NearDuplicateDetector:
+    """
+    MinHash/LSH near-duplicate clustering over normalized hadith texts.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        num_perm: int = 128,
+        shingle_size: int = 3,
+        min_words: int = 8,
+        seed: int = 1,
+    ):
+        """
+        Initialize the detector.
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity to treat texts as duplicates
+            num_perm: MinHash permutations (signature length)
+            shingle_size: Words per shingle
+            min_words: Texts shorter than this are never clustered (too little signal)
+            seed: RNG seed for the permutation parameters
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        rng = np.random.default_rng(seed)
+        # a, b < 2^32 keep a*h + b below 2^64, so uint64 arithmetic is exact
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        MinHash signature of a normalized text.
+
+        Returns:
+            uint32 array of length num_perm, or None if the text is too short
+        """
+        if len(text.split()) < self.min_words:
+            return None
+        hashes = shingles(text, self.shingle_size)
+        values = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return (values.min(axis=1) & _MAX_HASH).astype(np.uint32)
+
+    def similarity(self, sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.count_nonzero(sig_a == sig_b)) / self.num_perm
+
+    def cluster(
+        self,
+        texts: Iterable[Tuple[int, str]],
+        normalized: bool = True,
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Group near-identical texts.
+
+        Args:
+            texts: (hadith_id, text) pairs
+            normalized: False to apply normalize_arabic before shingling
+
+        Returns:
+            Mapping of representative hadith_id -> [(member hadith_id, similarity), ...]
+            for clusters with at least two hadiths. Representatives are the
+            lowest hadith_id in each cluster and are not listed as members.
+        """
+        signatures: Dict[int, np.ndarray] = {}
+        for hadith_id, text in texts:
+            sig = self.signature(text if normalized else normalize_arabic(text))
+            if sig is not None:
+                signatures[hadith_id] = sig
+        logger.info(
+            f"Computed {len(signatures)} MinHash signatures "
+            f"({self.bands} bands x {self.rows} rows, threshold {self.threshold})"
+        )
+
+        # LSH: bucket every signature band, compare only within buckets
+        union_find = UnionFind()
+        compared = set()
+        for band in range(self.bands):
+            start = band * self.rows
+            buckets: Dict[bytes, List[int]] = defaultdict(list)
+            for hadith_id, sig in signatures.items():
+                buckets[sig[start:start + self.rows].tobytes()].append(hadith_id)
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                first = bucket[0]
+                for other in bucket[1:]:
+                    pair = (first, other)
+                    if pair in compared:
+                        continue
+                    compared.add(pair)
+                    if self.similarity(signatures[first], signatures[other]) >= self.threshold:
+                        union_find.union(first, other)
+
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for hadith_id in union_find.parent:
+            groups[union_find.find(hadith_id)].append(hadith_id)
+
+        clusters: Dict[int, List[Tuple[int, float]]] = {}
+        for representative, members in groups.items():
+            rep_sig = signatures[representative]
+            kept = []
+            for member in sorted(members):
+                if member == representative:
+                    continue
+                score = self.similarity(rep_sig, signatures[member])
+                if score >= self.threshold:
+                    kept.append((member, round(score, 3)))
+            if kept:
+                clusters[representative] = kept
+
+        collapsed = sum(len(m) for m in clusters.values())
+        logger.info(
+            f"Found {len(clusters)} near-duplicate clusters; "
+            f"{collapsed} of {len(signatures)} hadiths can reuse a representative's results"
+        )
+        return clusters
+
+
+def main():
+    """Build near-duplicate clusters from preprocessed_hadiths and store them."""
+    import argparse
+    import time
+    from src.storage.postgres import PostgresStorage
+
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate hadith texts (MinHash/LSH)")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Jaccard similarity threshold")
+    parser.add_argument("--num-perm", type=int, default=128, help="MinHash permutations")
+    parser.add_argument("--version", default="v1.0", help="Cluster set version")
+    parser.add_argument("--dry-run", action="store_true", help="Compute clusters but don't store them")
+    args = parser.parse_args()
+
+    storage = PostgresStorage()
+    texts = storage.fetch_normalized_texts()
+    started = time.perf_counter()
+    detector = NearDuplicateDetector(threshold=args.threshold, num_perm=args.num_perm)
+    clusters = detector.cluster(texts)
+    logger.info(f"Clustered {len(texts)} texts in {time.perf_counter() - started:.1f}s")
+
+    if not args.dry_run:
+        written = storage.save_duplicate_clusters(clusters, args.version)
+        logger.info(f"Stored {written} cluster memberships (version {args.version})")
+
+
+if __name__ == "__main__":
+    main()
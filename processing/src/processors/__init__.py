@@ -0,0 +1,23 @@
+"""
+LLM Stage Processors
+====================
+
+Usage:
+------
+    from src.processors import PCAPProcessor, HMSTSProcessor
+"""
+
+from .base_processor import BaseProcessor, WorkItem
+from .pcap_processor import PCAPProcessor
+from .hmsts_processor import HMSTSProcessor
+from .cascade import CascadeStats
+from .pcap_rules import PCAPRuleEngine
+
+__all__ = [
+    "BaseProcessor",
+    "WorkItem",
+    "PCAPProcessor",
+    "HMSTSProcessor",
+    "CascadeStats",
+    "PCAPRuleEngine",
+]
@@ -0,0 +1,1004 @@
+"""
+Base Processor
+==============
+
+Shared request/parse/store loop for the LLM processing stages (PCAP, HMSTS):
+build the request, call the client, validate (and locally repair) the JSON
+output against the stage's Pydantic model, and store the assignment.
+
+`BaseProcessor.process_batch` runs a batch live on worker coroutines dealt
+work by `WorkScheduler`; `process_offline` / `resume_offline` run it as
+provider batch jobs. Optional behaviour (cascade, near-duplicate fan-out,
+chapter grouping, priority classes, dead letters) is described on the
+methods that implement it.
+"""
+
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from contextlib import nullcontext
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Type, Set, Callable, Hashable, Awaitable
+
+from pydantic import BaseModel, ValidationError
+from loguru import logger
+
+from config.settings import Settings, get_settings
+from src.llm.base import (
+    BaseLLMClient,
+    LLMRequest,
+    LLMResponse,
+    LLMError,
+    LLMResponseError,
+    RateLimitError,
+    OverloadedError,
+    TransientError,
+)
+from src.llm.batch import BatchRunner, BatchResult, BatchJob, read_job_file
+from src.llm.cost_tracker import CostTracker, CostShard, response_cost
+from src.llm.hedging import HedgedLLMClient
+from src.llm.rate_limiter import AIMDLimiter
+from src.llm.streaming import StreamGuard, StreamAborted
+from src.llm.repair import get_repairer, parse_json_lenient
+from src.llm.prompt_builder import PromptBuilder, get_prompt_builder
+from src.llm.token_budget import hadith_tokens
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.processing import ProcessingStage, ProcessingStatus, BatchProgress, DeadLetter
+from src.storage.postgres import PostgresStorage
+from src.storage.writer import WriteBehindWriter
+from src.utils.progress_tracker import ProcessedSet
+from .cascade import CascadeStats
+
+
+# (hadith, preprocessing) pair as returned by PostgresStorage.fetch_pending_hadiths
+WorkItem = Tuple[RawHadith, Optional[PreprocessedHadith]]
+
+
+class WorkScheduler:
+    """
+    Longest-first distribution of work items over worker deques, with stealing.
+
+    Items are dealt by estimated prompt tokens to per-worker deques (always
+    to the least loaded); a worker whose deque runs dry steals from the back
+    of the most loaded one, so no worker sits idle while another still has a
+    queue. Grouped chapters are dealt as one unit to keep their cached
+    context warm. `metrics()` reports makespan, utilization and tail idle time.
+    """
+
+    def __init__(
+        self,
+        items: List[WorkItem],
+        workers: int,
+        unit_key: Optional[Callable[[RawHadith], Hashable]] = None,
+        priority: Optional[Callable[[RawHadith], int]] = None,
+    ):
+        """
+        Deal items to workers, heaviest unit first, each to the least loaded worker.
+
+        Args:
+            items: (hadith, preprocessing) pairs
+            workers: Number of worker deques
+            unit_key: Items sharing a key are dealt together, in their given
+                order (chapters); every item is its own unit if None
+            priority: Priority class of a unit's first hadith (lower first);
+                classes are dealt in order, heaviest first within each
+        """
+        units: Dict[Any, List[Tuple[WorkItem, int]]] = {}
+        for index, item in enumerate(items):
+            key = unit_key(item[0]) if unit_key else index
+            units.setdefault(key, []).append((item, hadith_tokens(*item)))
+        self.queues: List[deque] = [deque() for _ in range(max(1, workers))]
+        self.loads = [0] * len(self.queues)
+        def deal_order(unit: List[Tuple[WorkItem, int]]) -> Tuple[int, int]:
+            return priority(unit[0][0][0]) if priority else 0, -sum(tokens for _, tokens in unit)
+
+        for unit in sorted(units.values(), key=deal_order):
+            target = min(range(len(self.queues)), key=self.loads.__getitem__)
+            self.queues[target].extend(unit)
+            self.loads[target] += sum(tokens for _, tokens in unit)
+        self.busy = [0.0] * len(self.queues)
+        self.finished: List[Optional[float]] = [None] * len(self.queues)
+        self.steals = 0
+        self.started = time.perf_counter()
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues)
+
+    def next(self, worker: int) -> Optional[WorkItem]:
+        """Next item for a worker: its own front, else the back of the most loaded deque."""
+        queue = self.queues[worker]
+        if not queue:
+            victim = max(range(len(self.queues)), key=self.loads.__getitem__)
+            queue = self.queues[victim]
+            if not queue:
+                return None
+            item, tokens = queue.pop()
+            self.loads[victim] -= tokens
+            self.steals += 1
+            return item
+        item, tokens = queue.popleft()
+        self.loads[worker] -= tokens
+        return item
+
+    def record(self, worker: int, seconds: float) -> None:
+        self.busy[worker] += seconds
+
+    def done(self, worker: int) -> None:
+        self.finished[worker] = time.perf_counter()
+
+    def remaining(self) -> List[WorkItem]:
+        """Items never handed out (budget stop)."""
+        return [item for queue in self.queues for item, _ in queue]
+
+    def metrics(self, capacity_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Makespan, utilization and idle time at the tail.
+
+        Args:
+            capacity_seconds: Slot-seconds available over the run (the
+                adaptive window integrated over time); workers x makespan if None
+        """
+        end = max((t for t in self.finished if t is not None), default=time.perf_counter())
+        makespan = max(end - self.started, 1e-9)
+        capacity = capacity_seconds if capacity_seconds else len(self.queues) * makespan
+        return {
+            "workers": len(self.queues),
+            "makespan_ms": int(makespan * 1000),
+            "utilization": round(min(1.0, sum(self.busy) / capacity), 4),
+            "tail_idle_ms": int(sum(end - t for t in self.finished if t is not None) * 1000),
+            "steals": self.steals,
+        }
+
+    def summary(self, capacity_seconds: Optional[float] = None) -> str:
+        m = self.metrics(capacity_seconds)
+        return (
+            f"makespan {m['makespan_ms']} ms on {m['workers']} workers, "
+            f"utilization {m['utilization']:.0%}, tail idle {m['tail_idle_ms']} ms, {m['steals']} steals"
+        )
+
+
+class BaseProcessor(ABC):
+    """
+    Abstract LLM stage processor.
+    """
+
+    stage: ProcessingStage
+    output_model: Type[BaseModel]
+
+    def __init__(
+        self,
+        client: Optional[BaseLLMClient] = None,
+        storage: Optional[PostgresStorage] = None,
+        prompt_builder: Optional[PromptBuilder] = None,
+        version: str = "v1.0",
+        settings: Optional[Settings] = None,
+        max_attempts: int = 3,
+        cost_tracker: Optional[CostTracker] = None,
+        cascade_client: Optional[BaseLLMClient] = None,
+        processed: Optional[ProcessedSet] = None,
+        writer: Optional[WriteBehindWriter] = None,
+    ):
+        """
+        Initialize the processor.
+
+        Args:
+            client: LLM client used for live requests
+            storage: Storage for reading context and writing assignments
+            prompt_builder: Prompt builder (settings-configured default if None)
+            version: Processing version written to output rows
+            settings: Pipeline settings (global settings if None)
+            max_attempts: Attempts per hadith before giving up
+            cost_tracker: Spend accounting and budget gate (no limit if None)
+            cascade_client: Cheaper first-pass client (no cascade if None)
+            processed: Checkpointed set of stored hadith IDs, updated after every write
+            writer: Write-behind writer; rows are handed to it as they are produced
+                instead of being upserted by the batch (synchronous writes if None)
+        """
+        self.client = client
+        self.storage = storage
+        self.settings = settings or get_settings()
+        self.prompt_builder = prompt_builder or get_prompt_builder()
+        self.version = version
+        self.max_attempts = max_attempts
+        self.cost_tracker = cost_tracker
+        self.cascade_client = cascade_client
+        self.processed = processed
+        self.writer = writer
+        # Called with each committed list of rows (synchronous writes)
+        self.commit_callbacks: List[Callable[[List[BaseModel]], Any]] = []
+        if processed is not None:
+            self.on_commit(self.mark_processed)
+        # book_id -> priority class (0 first; unlisted books last)
+        self.book_priorities = self.settings.book_priorities
+        self.limiter = AIMDLimiter.from_settings(self.settings) if self.settings.llm_adaptive_concurrency else None
+        if self.limiter:
+            # Primary 429/529s a hedged client absorbs must still cut the window
+            for hedged in (client, cascade_client):
+                if isinstance(hedged, HedgedLLMClient) and self.limiter.report_overload not in hedged.overload_listeners:
+                    hedged.overload_listeners.append(self.limiter.report_overload)
+        self.cascade_stats = (
+            CascadeStats.from_settings(self.stage.value, self.settings, version) if cascade_client else None
+        )
+
+        # representative hadith_id -> pending member ids receiving its result
+        self.fan_out_map: Dict[int, List[int]] = {}
+        # (book_id, chapter_id) -> shared chapter context segment
+        self.chapter_contexts: Dict[Tuple[int, int], str] = {}
+        # Hadiths of the current batch routed to the long lane
+        self.long_lane_ids: Set[int] = set()
+        # WorkScheduler metrics of the last batch
+        self.schedule_metrics: Dict[str, Any] = {}
+        self.call_seconds: Dict[int, float] = {}  # hadith_id -> time spent in LLM calls (current batch)
+        # Hadiths of the last batch never dispatched (budget stop)
+        self.undispatched_ids: Set[int] = set()
+        # Failures not yet written to the dead-letter store
+        self.dead_letters: List[DeadLetter] = []
+
+        self.repairer = get_repairer(self.output_model)
+        # Responses valid as returned / fixed locally / sent back for a retry
+        self.parse_stats = {"clean": 0, "repaired": 0, "retried": 0}
+
+    # ------------------------------------------------------------------
+    # Request building / parsing
+    # ------------------------------------------------------------------
+
+    def build_user_prompt(self, hadith: RawHadith, preprocessed: Optional[PreprocessedHadith]) -> str:
+        """Per-hadith user prompt (overridden to add stage context)."""
+        return self.prompt_builder.build_user_prompt(
+            hadith, preprocessed, chapter_in_context=self.chapter_key(hadith) in self.chapter_contexts
+        )
+
+    def build_request(
+        self,
+        hadith: RawHadith,
+        preprocessed: Optional[PreprocessedHadith] = None,
+        attempt: int = 0,
+    ) -> LLMRequest:
+        """
+        Build the LLM request for a hadith.
+
+        Args:
+            hadith: Source hadith
+            preprocessed: Preprocessing output (optional)
+            attempt: Retry attempt number (part of the request id)
+
+        Returns:
+            LLMRequest ready for a client or batch endpoint
+        """
+        return LLMRequest(
+            request_id=LLMRequest.make_id(self.stage, hadith.id, attempt),
+            hadith_id=hadith.id,
+            stage=self.stage,
+            version=self.version,
+            system=self.prompt_builder.build_system_prompt(self.stage),
+            user=self.build_user_prompt(hadith, preprocessed),
+            context=self.chapter_contexts.get(self.chapter_key(hadith), ""),
+            cache_system=self.settings.enable_prompt_caching,
+            max_tokens=self.settings.llm_max_tokens,
+            temperature=self.settings.llm_temperature,
+        )
+
+    def fix_output(self, data: Dict[str, Any]) -> List[str]:
+        """
+        Stage-specific repairs applied in place after enum coercion.
+
+        Returns:
+            Descriptions of the changes made (empty by default)
+        """
+        return []
+
+    def parse_response(self, response: LLMResponse) -> BaseModel:
+        """
+        Parse and validate a response against the stage output model.
+
+        Syntax and schema slips are repaired locally first; only output that
+        is still invalid after repair costs a model call. The error then
+        names the syntax repairs applied (e.g. a truncated string closed as
+        "") next to the fields that failed.
+
+        Raises:
+            LLMResponseError: If the content cannot be repaired into a valid output
+        """
+        syntax_changes: List[str] = []
+        try:
+            data, syntax_repaired = parse_json_lenient(response.content, syntax_changes)
+        except ValueError as e:
+            self.parse_stats["retried"] += 1
+            raise LLMResponseError(f"{self.output_model.__name__}: {e}") from e
+
+        if not syntax_repaired:
+            try:
+                output = self.repairer.validate(data)
+                self.parse_stats["clean"] += 1
+                return output
+            except ValidationError:
+                pass
+
+        data, changes = self.repairer.coerce(data)
+        changes += self.fix_output(data)
+        try:
+            output = self.repairer.validate(data)
+        except ValidationError as e:
+            self.parse_stats["retried"] += 1
+            fields = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            if syntax_repaired:
+                raise LLMResponseError(
+                    f"{self.output_model.__name__} invalid after JSON repair "
+                    f"({'; '.join(syntax_changes)}): {fields}"
+                ) from e
+            raise LLMResponseError(f"{self.output_model.__name__} validation failed: {fields}") from e
+
+        self.parse_stats["repaired"] += 1
+        logger.debug(
+            f"[{self.stage.value}] {response.request_id} repaired locally"
+            f": {'; '.join(syntax_changes + changes) or 'no field changes'}"
+        )
+        return output
+
+    def confidence(self, assignment: BaseModel) -> Optional[float]:
+        """Stage confidence score of an assignment, used by the cascade (None = unknown)."""
+        return None
+
+    def escalation_threshold(self) -> float:
+        """Cascade results with a confidence below this are escalated."""
+        return 1.0
+
+    def agrees(self, first: BaseModel, final: BaseModel) -> bool:
+        """Whether a first-pass and an escalated assignment share the stage's key label."""
+        return False
+
+    def repair_summary(self) -> str:
+        """Repair-vs-retry rate for log lines."""
+        stats = self.parse_stats
+        needed = stats["repaired"] + stats["retried"]
+        rate = f"{stats['repaired'] / needed:.0%}" if needed else "n/a"
+        return (
+            f"{stats['clean']} clean, {stats['repaired']} repaired, "
+            f"{stats['retried']} retried (repair rate {rate})"
+        )
+
+    @abstractmethod
+    def to_assignment(self, hadith_id: int, output: BaseModel, response: LLMResponse) -> BaseModel:
+        """Convert a validated output into the stage's database assignment model."""
+
+    def assignment_from_response(
+        self,
+        hadith_id: int,
+        response: LLMResponse,
+        cost_usd: Optional[float] = None,
+    ) -> BaseModel:
+        """
+        Parse a response and convert it into an assignment.
+
+        Args:
+            hadith_id: Hadith the response belongs to
+            response: LLM response
+            cost_usd: Spend to record on the row (this response's cost if None)
+        """
+        assignment = self.to_assignment(hadith_id, self.parse_response(response), response)
+        cost = response_cost(response) if cost_usd is None else cost_usd
+        assignment.llm_cost_usd = round(Decimal(str(cost)), 6)
+        return assignment
+
+    # ------------------------------------------------------------------
+    # Chapter grouping
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def chapter_key(hadith: RawHadith) -> Tuple[int, int]:
+        return hadith.book_id, hadith.chapter_id
+
+    def group_by_chapter(self, items: List[WorkItem]) -> List[WorkItem]:
+        """
+        Order work by (book_id, chapter_id, id) and build shared chapter contexts.
+
+        A chapter's context (chapter names, neighbouring hadith summaries) is
+        sent as a cacheable segment after the system prompt, so the provider
+        cache serves it for the rest of the group.
+
+        Contexts are built from every pending hadith of a chapter up front,
+        so a chapter split across batches still sends one identical segment.
+        Chapters with a single pending hadith get no context (nothing to share).
+
+        Returns:
+            Items in chapter order
+        """
+        ordered = sorted(items, key=lambda item: (*self.chapter_key(item[0]), item[0].id))
+        groups: Dict[Tuple[int, int], List[WorkItem]] = {}
+        for item in ordered:
+            groups.setdefault(self.chapter_key(item[0]), []).append(item)
+        self.chapter_contexts = {
+            key: self.prompt_builder.build_chapter_context(group, self.settings.chapter_context_max_tokens)
+            for key, group in groups.items()
+            if len(group) > 1
+        }
+        grouped = sum(len(groups[key]) for key in self.chapter_contexts)
+        logger.info(
+            f"[{self.stage.value}] chapter grouping: {len(items)} hadiths in {len(groups)} chapters, "
+            f"{grouped} sharing context across {len(self.chapter_contexts)} chapters"
+        )
+        return ordered
+
+    # ------------------------------------------------------------------
+    # Priority classes
+    # ------------------------------------------------------------------
+
+    def priority_class(self, hadith: RawHadith) -> int:
+        """Priority class of a hadith's book (lower runs first)."""
+        return self.book_priorities.get(hadith.book_id, max(self.book_priorities.values(), default=-1) + 1)
+
+    def prioritize(self, items: List[WorkItem]) -> List[WorkItem]:
+        """
+        Stable-sort work by priority class (chapter order is kept within a class).
+
+        Classes come from `book_priorities` (book_id -> class, 0 first;
+        unlisted books after every listed class), so e.g. Bukhari and Muslim
+        finish, and can be published (see publisher.py), long before the rest
+        of the corpus.
+        """
+        if not self.book_priorities:
+            return items
+        ordered = sorted(items, key=lambda item: self.priority_class(item[0]))
+        classes = Counter(self.priority_class(hadith) for hadith, _ in ordered)
+        logger.info(
+            f"[{self.stage.value}] priority classes: "
+            + ", ".join(f"class {c}: {n} hadiths" for c, n in sorted(classes.items()))
+        )
+        return ordered
+
+    # ------------------------------------------------------------------
+    # Near-duplicate collapsing
+    # ------------------------------------------------------------------
+
+    def collapse_duplicates(self, items: List[WorkItem], clusters: Dict[int, List[int]]) -> List[WorkItem]:
+        """
+        Drop cluster members whose representative is also pending.
+
+        Members are only dropped when their representative will be processed
+        in this run; otherwise they are kept and processed normally.
+
+        Args:
+            items: All pending (hadith, preprocessing) pairs for the run
+            clusters: representative hadith_id -> member hadith_ids
+
+        Returns:
+            Items to send to the LLM
+        """
+        pending = {hadith.id for hadith, _ in items}
+        self.fan_out_map = {
+            representative: [m for m in members if m in pending]
+            for representative, members in clusters.items()
+            if representative in pending
+        }
+        skipped = {m for members in self.fan_out_map.values() for m in members}
+        kept = [item for item in items if item[0].id not in skipped]
+        logger.info(
+            f"[{self.stage.value}] near-duplicate collapsing: {len(items)} pending -> "
+            f"{len(kept)} LLM requests ({len(skipped)} results fanned out)"
+        )
+        return kept
+
+    def fan_out(self, assignments: List[BaseModel]) -> List[BaseModel]:
+        """Copy representatives' assignments to their cluster members (with provenance)."""
+        fanned = list(assignments)
+        for assignment in assignments:
+            for member in self.fan_out_map.get(assignment.hadith_id, []):
+                fanned.append(assignment.model_copy(update={
+                    "id": None,
+                    "hadith_id": member,
+                    "derived_from_hadith_id": assignment.hadith_id,
+                }))
+        return fanned
+
+    # ------------------------------------------------------------------
+    # Live processing
+    # ------------------------------------------------------------------
+
+    async def prepare(self, items: List[WorkItem]) -> None:
+        """Load any context needed before processing a batch (no-op by default)."""
+
+    def resolve_without_llm(self, items: List[WorkItem]) -> Tuple[List[BaseModel], List[WorkItem]]:
+        """
+        Resolve what the stage can decide deterministically (nothing by default).
+
+        Returns:
+            Tuple of (assignments, items still needing the LLM)
+        """
+        return [], items
+
+    def _resolve_locally(self, items: List[WorkItem]) -> Tuple[List[BaseModel], List[WorkItem]]:
+        """`resolve_without_llm`, with resolved hadiths counted by the cost tracker at zero cost."""
+        resolved, remaining = self.resolve_without_llm(items)
+        if resolved and self.cost_tracker:
+            shard = self.cost_tracker.shard()
+            shard.record_hadith(len(resolved))
+            self.cost_tracker.release(shard)
+        return resolved, remaining
+
+    async def process_hadith(
+        self,
+        hadith: RawHadith,
+        preprocessed: Optional[PreprocessedHadith] = None,
+        shard: Optional[CostShard] = None,
+    ) -> BaseModel:
+        """
+        Process a single hadith through the LLM (through the cascade if configured).
+
+        Raises:
+            LLMError: If all attempts fail
+        """
+        if self.client is None:
+            raise LLMError(f"{self.__class__.__name__} has no LLM client configured")
+        if self.cascade_client is None:
+            return await self.run_attempts(self.client, hadith, preprocessed, shard)
+        return await self.run_cascade(hadith, preprocessed, shard)
+
+    async def run_attempts(
+        self,
+        client: BaseLLMClient,
+        hadith: RawHadith,
+        preprocessed: Optional[PreprocessedHadith] = None,
+        shard: Optional[CostShard] = None,
+        attempts: Optional[int] = None,
+    ) -> BaseModel:
+        """
+        Request, parse and retry one hadith on one client.
+
+        With `llm_stream_validation` the response is streamed and validated
+        field by field, so off-schema output is abandoned mid-generation.
+        Calls outside the long lane hold an AIMD limiter slot.
+
+        Retries unusable responses with a fresh request and backs off
+        exponentially on rate limits, overload and transient errors
+        (timeouts, dropped connections); other LLMErrors (e.g. a rejected
+        request) fail at once. Every billed response is recorded in `shard`;
+        the row's llm_cost_usd covers all attempts.
+
+        Args:
+            client: Client to send requests to
+            attempts: Attempt limit (max_attempts if None)
+
+        Raises:
+            LLMError: If all attempts fail
+        """
+        attempts = attempts or self.max_attempts
+        last_error: Optional[Exception] = None
+        spent = 0.0
+        for attempt in range(attempts):
+            request = self.build_request(hadith, preprocessed, attempt)
+            # The long lane is capped by its own worker count
+            use_limiter = self.limiter and hadith.id not in self.long_lane_ids
+            try:
+                async with self.limiter.slot() if use_limiter else nullcontext():
+                    # Busy time for the schedule metrics: the call itself, not the wait for a slot
+                    call_started = time.perf_counter()
+                    try:
+                        if self.settings.llm_stream_validation:
+                            response = await client.stream(request, StreamGuard(self.output_model))
+                        else:
+                            response = await client.complete(request)
+                    finally:
+                        self.call_seconds[hadith.id] = (
+                            self.call_seconds.get(hadith.id, 0.0) + time.perf_counter() - call_started
+                        )
+                spent += shard.record(response) if shard else response_cost(response)
+                return self.assignment_from_response(hadith.id, response, spent)
+            except StreamAborted as e:
+                last_error = e
+                logger.warning(
+                    f"[{self.stage.value}] hadith {hadith.id} attempt {attempt + 1}: "
+                    f"aborted after {e.chars_received} chars: {e}"
+                )
+            except LLMResponseError as e:
+                last_error = e
+                logger.warning(f"[{self.stage.value}] hadith {hadith.id} attempt {attempt + 1}: {e}")
+            except (RateLimitError, OverloadedError, TransientError) as e:
+                last_error = e
+                delay = min(60, 4 * 2 ** attempt)
+                logger.warning(f"[{self.stage.value}] {e.__class__.__name__}; retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+        raise LLMError(f"hadith {hadith.id} failed after {attempts} attempts: {last_error}") from last_error
+
+    async def run_cascade(
+        self,
+        hadith: RawHadith,
+        preprocessed: Optional[PreprocessedHadith] = None,
+        shard: Optional[CostShard] = None,
+    ) -> BaseModel:
+        """
+        Cheap first pass, escalated to the main client on low confidence or failure.
+
+        The first pass gets a single attempt: a retry on the cheap model costs
+        about as much latency as escalating. Escalated rows carry the
+        combined cost and latency of both passes.
+        """
+        started = time.perf_counter()
+        first: Optional[BaseModel] = None
+        try:
+            first = await self.run_attempts(self.cascade_client, hadith, preprocessed, shard, attempts=1)
+        except LLMError as e:
+            logger.debug(f"[{self.stage.value}] hadith {hadith.id}: first pass failed ({e}); escalating")
+        first_ms = int((time.perf_counter() - started) * 1000)
+
+        if first is not None:
+            score = self.confidence(first)
+            if score is not None and score >= self.escalation_threshold():
+                self.cascade_stats.record_accepted(first_ms)
+                return first
+            logger.debug(
+                f"[{self.stage.value}] hadith {hadith.id}: first-pass confidence {score} "
+                f"< {self.escalation_threshold()}; escalating"
+            )
+
+        final = await self.run_attempts(self.client, hadith, preprocessed, shard)
+        self.cascade_stats.record_escalated(
+            first_ms,
+            final.processing_duration_ms or 0,
+            self.agrees(first, final) if first is not None else None,
+        )
+        if first is not None:
+            final.llm_cost_usd = (final.llm_cost_usd or Decimal(0)) + (first.llm_cost_usd or Decimal(0))
+        final.processing_duration_ms = (final.processing_duration_ms or 0) + first_ms
+        return final
+
+    # ------------------------------------------------------------------
+    # Dead letters
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def error_class(error: Exception) -> str:
+        """Class of the underlying failure (the last attempt's error when retries ran out)."""
+        cause = error.__cause__
+        return type(cause if isinstance(cause, LLMError) else error).__name__
+
+    def dead_letter(self, hadith: RawHadith, preprocessed: Optional[PreprocessedHadith], error: Exception) -> None:
+        """
+        Queue a failed hadith for the dead-letter store.
+
+        The error class and prompt hash are saved at the end of the batch, so
+        the hadith can be replayed on its own (see dead_letters.py).
+        """
+        self.dead_letter_request(self.build_request(hadith, preprocessed), error)
+
+    def dead_letter_request(self, request: LLMRequest, error: Exception) -> None:
+        """Queue the hadith of a failed request (e.g. from a batch job file) for the dead-letter store."""
+        self.dead_letters.append(DeadLetter(
+            hadith_id=request.hadith_id,
+            stage=self.stage,
+            version=self.version,
+            error_class=self.error_class(error),
+            error_message=str(error)[:2000],
+            prompt_hash=request.prompt_hash,
+        ))
+
+    def flush_dead_letters(self) -> None:
+        if self.storage and self.dead_letters:
+            self.storage.save_dead_letters(self.dead_letters)
+        self.dead_letters = []
+
+    def store(self, assignments: List[BaseModel]) -> None:
+        """Upsert assignments (or hand them to the writer); commit callbacks run after the commit."""
+        if not self.storage or not assignments:
+            return
+        if self.writer:
+            self.writer.submit(self.stage, assignments)
+            return
+        self.storage.save_assignments(self.stage, assignments)
+        for callback in self.commit_callbacks:
+            callback(assignments)
+
+    async def wait_for_writer(self) -> None:
+        """Backpressure: wait while the write-behind buffer is full."""
+        if self.writer:
+            await self.writer.wait_for_room()
+
+    def on_commit(self, callback: Callable[[List[BaseModel]], Any]) -> None:
+        """Call `callback(rows)` after each commit of this stage's rows (by the writer or `store()`)."""
+        if self.writer:
+            self.writer.on_commit(self.stage, callback)
+        else:
+            self.commit_callbacks.append(callback)
+
+    def mark_processed(self, assignments: List[BaseModel]) -> None:
+        """Checkpoint committed assignments' hadith IDs."""
+        if self.processed is not None:
+            self.processed.record(a.hadith_id for a in assignments)
+
+    async def process_batch(self, items: List[WorkItem]) -> Tuple[List[BaseModel], BatchProgress]:
+        """
+        Process a batch on concurrent workers and store results.
+
+        LLM calls in flight are capped by the AIMD window
+        (`llm_adaptive_concurrency`, see src/llm/rate_limiter.py) or by a
+        fixed `parallel_workers`. Hadiths over the user token budget run on a
+        separate lane of `long_lane_workers` outside the window, so a few
+        huge narrations neither occupy the main workers nor register as
+        latency spikes. With a write-behind writer (src/storage/writer.py)
+        each result is handed over as it lands, otherwise the batch is stored
+        with one upsert. Before each hadith a worker asks the cost tracker
+        whether projected spend still fits the budget; if not, the batch
+        pauses with the rest undispatched.
+
+        Args:
+            items: (hadith, preprocessing) pairs
+
+        Returns:
+            Tuple of (assignments, BatchProgress)
+        """
+        progress = BatchProgress(
+            batch_id=f"{self.stage.value}-{uuid.uuid4().hex[:8]}",
+            stage=self.stage,
+            status=ProcessingStatus.IN_PROGRESS,
+            total_items=max(1, len(items)),
+        )
+        await self.prepare(items)
+        results, llm_items = self._resolve_locally(items)
+        progress.processed_items = len(results)
+        if self.writer:
+            self.store(self.fan_out(results))
+
+        long_items = [item for item in llm_items if self.prompt_builder.is_oversized(*item)]
+        self.long_lane_ids = {hadith.id for hadith, _ in long_items}
+        main_items = [item for item in llm_items if item[0].id not in self.long_lane_ids]
+        # With an adaptive window there are enough workers for its ceiling;
+        # those beyond the current window wait for room before taking work
+        workers = min(self.limiter.max_limit if self.limiter else self.settings.parallel_workers, len(main_items))
+        long_workers = min(self.settings.long_lane_workers, len(long_items))
+        unit_key = self.chapter_key if self.chapter_contexts else None
+        priority = self.priority_class if self.book_priorities else None
+        scheduler = WorkScheduler(main_items, workers, unit_key, priority)
+        long_scheduler = WorkScheduler(long_items, long_workers, unit_key, priority)
+        in_flight = 0
+        self.call_seconds = {}
+        window_started = self.limiter.window_seconds() if self.limiter else 0.0
+        started = time.perf_counter()
+
+        async def worker(scheduler: WorkScheduler, index: int, use_window: bool) -> None:
+            nonlocal in_flight
+            shard = self.cost_tracker.shard() if self.cost_tracker else None
+            try:
+                while len(scheduler):
+                    if self.cost_tracker and not self.cost_tracker.admit(1, in_flight):
+                        return
+                    if use_window and self.limiter:
+                        await self.limiter.wait_for_room()
+                    item = scheduler.next(index)
+                    if item is None:
+                        return
+                    hadith, preprocessed = item
+                    in_flight += 1
+                    try:
+                        assignment = await self.process_hadith(hadith, preprocessed, shard)
+                        results.append(assignment)
+                        if self.writer:
+                            await self.wait_for_writer()
+                            self.store(self.fan_out([assignment]))
+                    except Exception as e:
+                        # One hadith's failure, expected or not, never aborts the batch
+                        if not isinstance(e, LLMError):
+                            logger.exception(f"[{self.stage.value}] hadith {hadith.id}: unexpected error")
+                        progress.failed_items += 1
+                        progress.last_error = str(e)
+                        progress.errors.append(f"{hadith.id}: {e}")
+                        self.dead_letter(hadith, preprocessed, e)
+                    finally:
+                        in_flight -= 1
+                        scheduler.record(index, self.call_seconds.pop(hadith.id, 0.0))
+                        progress.processed_items += 1
+                        if shard:
+                            shard.record_hadith()
+            finally:
+                scheduler.done(index)
+                if shard:
+                    self.cost_tracker.release(shard)
+
+        await asyncio.gather(
+            *(worker(scheduler, i, True) for i in range(workers)),
+            *(worker(long_scheduler, i, False) for i in range(long_workers)),
+        )
+        queue = scheduler.remaining() + long_scheduler.remaining()
+        self.undispatched_ids = {hadith.id for hadith, _ in queue}
+        self.long_lane_ids = set()
+        # Utilization against the window actually open, not the idle workers above it
+        capacity = self.limiter.window_seconds() - window_started if self.limiter else None
+        self.schedule_metrics = scheduler.metrics(capacity)
+        assignments = self.fan_out(results)
+        if not self.writer:
+            self.store(assignments)
+        self.flush_dead_letters()
+
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        progress.llm_calls_made = len(llm_items) - len(queue)
+        progress.total_cost_usd = sum((a.llm_cost_usd or Decimal(0) for a in results), Decimal(0))
+        progress.avg_processing_time_ms = elapsed_ms // max(1, len(items))
+        progress.makespan_ms = self.schedule_metrics["makespan_ms"]
+        progress.worker_utilization = self.schedule_metrics["utilization"]
+        progress.actual_completion = datetime.utcnow()
+        progress.status = ProcessingStatus.FAILED if items and not assignments else ProcessingStatus.COMPLETED
+        if queue:
+            progress.skipped_items = len(queue)
+            progress.status = ProcessingStatus.PAUSED
+            logger.warning(
+                f"[{self.stage.value}] budget reached: paused with {len(queue)} hadiths undispatched "
+                f"({self.cost_tracker.summary()})"
+            )
+        logger.info(
+            f"[{self.stage.value}] batch {progress.batch_id}: "
+            f"{len(results)}/{progress.processed_items} succeeded in {elapsed_ms} ms"
+            + (f" (+{len(assignments) - len(results)} fanned out)" if self.fan_out_map else "")
+        )
+        logger.info(f"[{self.stage.value}] responses: {self.repair_summary()}")
+        if workers:
+            logger.info(f"[{self.stage.value}] schedule: {scheduler.summary(capacity)}")
+        if long_items:
+            logger.info(
+                f"[{self.stage.value}] long lane: {len(long_items)} hadiths over the "
+                f"{self.prompt_builder.user_token_budget}-token user budget "
+                f"({self.prompt_builder.budget_stats['fitted']} prompts shortened so far, "
+                f"~{self.prompt_builder.budget_stats['tokens_omitted']} tokens omitted)"
+            )
+        if self.limiter:
+            logger.info(f"[{self.stage.value}] concurrency: {self.limiter.summary()}")
+        if self.cascade_stats:
+            self.cascade_stats.save()
+            logger.info(f"[{self.stage.value}] cascade: {self.cascade_stats.summary()}")
+        return assignments, progress
+
+    # ------------------------------------------------------------------
+    # Offline batch processing
+    # ------------------------------------------------------------------
+
+    async def process_offline(self, items: List[WorkItem], runner: BatchRunner) -> BatchProgress:
+        """
+        Process hadiths through a provider batch endpoint instead of live calls.
+
+        Results are parsed as they stream back and written in chunks of
+        `checkpoint_interval` rows. Failed or unparseable results are counted
+        and can be re-run in live mode. With a cost tracker, only as many
+        hadiths as the remaining budget covers (at the recent cost per hadith,
+        batch-discounted) are submitted.
+
+        Args:
+            items: (hadith, preprocessing) pairs
+            runner: Batch runner bound to an endpoint
+
+        Returns:
+            BatchProgress for the whole offline run
+        """
+        progress = BatchProgress(
+            batch_id=f"{self.stage.value}-offline-{uuid.uuid4().hex[:8]}",
+            stage=self.stage,
+            status=ProcessingStatus.IN_PROGRESS,
+            total_items=max(1, len(items)),
+        )
+        await self.prepare(items)
+        resolved, items = self._resolve_locally(items)
+        if resolved:
+            progress.processed_items = len(resolved)
+            self.store(self.fan_out(resolved))
+
+        shard = self.cost_tracker.shard() if self.cost_tracker else None
+        if self.cost_tracker:
+            affordable = self.cost_tracker.affordable_hadiths()
+            if affordable is not None and affordable < len(items):
+                # Batch pricing is discounted, so the live-rate estimate is conservative
+                progress.skipped_items = len(items) - affordable
+                logger.warning(
+                    f"[{self.stage.value}] budget covers ~{affordable} of {len(items)} hadiths; "
+                    f"submitting those only ({self.cost_tracker.summary()})"
+                )
+                items = items[:affordable]
+
+        requests = [self.build_request(hadith, preprocessed) for hadith, preprocessed in items]
+        on_result, flush = self._offline_collector(progress, shard, requests)
+        try:
+            jobs = await runner.run(requests, on_result, self.fan_out_map)
+        finally:
+            flush()
+            self.flush_dead_letters()
+            if shard:
+                self.cost_tracker.release(shard)
+
+        progress.llm_calls_made = sum(job.request_count for job in jobs)
+        progress.actual_completion = datetime.utcnow()
+        progress.status = ProcessingStatus.COMPLETED if progress.processed_items else ProcessingStatus.FAILED
+        if progress.skipped_items:
+            progress.status = ProcessingStatus.PAUSED
+        logger.info(
+            f"[{self.stage.value}] offline run: {progress.processed_items - progress.failed_items}"
+            f"/{len(items) + len(resolved)} succeeded across {len(jobs)} batch job(s)"
+            + (f" ({len(resolved)} resolved without the LLM)" if resolved else "")
+        )
+        logger.info(f"[{self.stage.value}] responses: {self.repair_summary()}")
+        return progress
+
+    async def resume_offline(self, manifest_path: Path, runner: BatchRunner) -> BatchProgress:
+        """
+        Collect a batch job submitted by an earlier run (see `BatchRunner.resume`).
+
+        Results are written in `checkpoint_interval` chunks (fanned out to the
+        near-duplicate members recorded in the manifest), and failed or
+        unparseable ones are counted and dead-lettered, as in `process_offline`.
+
+        Args:
+            manifest_path: The job's `.job.json` manifest
+            runner: Batch runner bound to the job's endpoint
+
+        Returns:
+            BatchProgress for the job's results
+
+        Raises:
+            ValueError: If the job belongs to another stage
+        """
+        job = BatchJob.load(manifest_path)
+        if job.stage != self.stage:
+            raise ValueError(f"{manifest_path} is a {job.stage.value} job, not {self.stage.value}")
+        self.fan_out_map = dict(job.fan_out)
+        progress = BatchProgress(
+            batch_id=f"{self.stage.value}-offline-{uuid.uuid4().hex[:8]}",
+            stage=self.stage,
+            status=ProcessingStatus.IN_PROGRESS,
+            total_items=max(1, job.request_count),
+        )
+        shard = self.cost_tracker.shard() if self.cost_tracker else None
+        on_result, flush = self._offline_collector(progress, shard, read_job_file(Path(job.job_file)))
+        try:
+            job = await runner.resume(manifest_path, on_result)
+        finally:
+            flush()
+            self.flush_dead_letters()
+            if shard:
+                self.cost_tracker.release(shard)
+
+        progress.llm_calls_made = job.request_count
+        progress.actual_completion = datetime.utcnow()
+        progress.status = ProcessingStatus.COMPLETED if progress.processed_items else ProcessingStatus.FAILED
+        logger.info(
+            f"[{self.stage.value}] resumed job {job.job_id} ({job.status.value}): "
+            f"{progress.processed_items - progress.failed_items}/{progress.processed_items} succeeded"
+        )
+        return progress
+
+    def _offline_collector(
+        self, progress: BatchProgress, shard: Optional[CostShard], requests: List[LLMRequest],
+    ) -> Tuple[Callable[[BatchResult], Awaitable[None]], Callable[[], None]]:
+        """
+        Result callback for batch jobs, and the flush that writes its last chunk.
+
+        Successful results are buffered and stored every `checkpoint_interval`
+        rows; failed or unparseable ones are counted and dead-lettered.
+        """
+        by_id = {request.hadith_id: request for request in requests}
+        pending: List[BaseModel] = []
+
+        def flush() -> None:
+            self.store(self.fan_out(pending))
+            pending.clear()
+
+        async def on_result(result: BatchResult) -> None:
+            progress.processed_items += 1
+            try:
+                if not result.succeeded:
+                    raise LLMError(result.error or "batch request failed")
+                cost = shard.record(result.response, batch=True) if shard else response_cost(result.response, batch=True)
+                progress.total_tokens_used += result.response.total_tokens
+                progress.total_cost_usd += round(Decimal(str(cost)), 6)
+                pending.append(self.assignment_from_response(result.hadith_id, result.response, cost))
+            except LLMError as e:
+                progress.failed_items += 1
+                progress.last_error = str(e)
+                progress.errors.append(f"{result.hadith_id}: {e}")
+                if result.hadith_id in by_id:
+                    self.dead_letter_request(by_id[result.hadith_id], e)
+            if shard:
+                shard.record_hadith()
+            if len(pending) >= self.settings.checkpoint_interval:
+                await self.wait_for_writer()
+                flush()
+
+        return on_result, flush
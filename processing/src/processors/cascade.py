@@ -0,0 +1,155 @@
+"""
+Model Cascade Statistics
+========================
+
+Bookkeeping for the cheap-first model cascade (`--cascade`).
+
+Every hadith is first sent to LLM_CASCADE_MODEL (a cheaper hosted model or a
+`local/<model>` server). Results whose stage confidence is below the
+escalation threshold (PCAP `posterior_confidence`, HMSTS
+`semantic_completeness_score`), or that fail outright, are re-run on the
+primary model.
+
+Tracked per stage and version:
+- Escalation rate
+- Agreement between first-pass and escalated results (same era for PCAP,
+  same functional role for HMSTS)
+- Latency saved versus sending every hadith to the primary model
+
+Stats accumulate across runs in `checkpoint_dir/cascade_{version}.json`.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from loguru import logger
+
+
+class CascadeStats:
+    """
+    Counters for one stage's cascade in one processing version.
+    """
+
+    COUNTERS = (
+        "first_pass",          # hadiths sent to the cascade model
+        "accepted",            # first-pass results kept
+        "escalated",           # hadiths re-run on the primary model
+        "first_pass_failed",   # escalations caused by errors rather than low confidence
+        "compared",            # escalations with a usable first-pass result
+        "agreed",              # ... whose key label matched the primary's
+        "first_latency_ms",    # total first-pass latency
+        "primary_latency_ms",  # total latency of escalated calls
+    )
+
+    def __init__(self, stage: str, version: str, path: Optional[Path] = None):
+        """
+        Initialize (and load previous runs' counters from `path` if present).
+
+        Args:
+            stage: Stage name (e.g. "pcap_processing")
+            version: Processing version
+            path: Stats file shared by all stages of the version (not persisted if None)
+        """
+        self.stage = stage
+        self.version = version
+        self.path = Path(path) if path else None
+        self.stats: Dict[str, int] = {name: 0 for name in self.COUNTERS}
+        if self.path and self.path.exists():
+            saved = json.loads(self.path.read_text()).get(stage, {})
+            for name in self.COUNTERS:
+                self.stats[name] = int(saved.get(name, 0))
+
+    @classmethod
+    def from_settings(cls, stage: str, settings, version: str) -> "CascadeStats":
+        """Stats persisted in the checkpoint directory."""
+        return cls(stage, version, Path(settings.checkpoint_dir) / f"cascade_{version}.json")
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record_accepted(self, latency_ms: int) -> None:
+        """A first-pass result was confident enough to keep."""
+        self.stats["first_pass"] += 1
+        self.stats["accepted"] += 1
+        self.stats["first_latency_ms"] += latency_ms
+
+    def record_escalated(self, first_latency_ms: int, primary_latency_ms: int, agreed: Optional[bool]) -> None:
+        """
+        A hadith was re-run on the primary model.
+
+        Args:
+            first_latency_ms: Time spent on the first pass (including failures)
+            primary_latency_ms: Latency of the escalated call
+            agreed: Whether both results share the key label (None if the first pass failed)
+        """
+        self.stats["first_pass"] += 1
+        self.stats["escalated"] += 1
+        self.stats["first_latency_ms"] += first_latency_ms
+        self.stats["primary_latency_ms"] += primary_latency_ms
+        if agreed is None:
+            self.stats["first_pass_failed"] += 1
+        else:
+            self.stats["compared"] += 1
+            self.stats["agreed"] += int(agreed)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    @property
+    def escalation_rate(self) -> Optional[float]:
+        return self.stats["escalated"] / self.stats["first_pass"] if self.stats["first_pass"] else None
+
+    @property
+    def agreement_rate(self) -> Optional[float]:
+        return self.stats["agreed"] / self.stats["compared"] if self.stats["compared"] else None
+
+    def latency_saved_ms(self) -> Optional[int]:
+        """
+        Estimated LLM latency saved versus primary-only processing.
+
+        Baseline is every hadith at the mean primary latency observed on
+        escalations; None until something has been escalated.
+        """
+        if not self.stats["escalated"]:
+            return None
+        mean_primary = self.stats["primary_latency_ms"] / self.stats["escalated"]
+        baseline = mean_primary * self.stats["first_pass"]
+        actual = self.stats["first_latency_ms"] + self.stats["primary_latency_ms"]
+        return int(baseline - actual)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "escalation_rate": self.escalation_rate,
+            "agreement_rate": self.agreement_rate,
+            "latency_saved_ms": self.latency_saved_ms(),
+        }
+
+    def summary(self) -> str:
+        """One-line summary for logs."""
+        def pct(value: Optional[float]) -> str:
+            return f"{value:.0%}" if value is not None else "n/a"
+
+        saved = self.latency_saved_ms()
+        return (
+            f"{self.stats['first_pass']} first-pass, {self.stats['escalated']} escalated "
+            f"({pct(self.escalation_rate)}, {self.stats['first_pass_failed']} on errors), "
+            f"agreement {pct(self.agreement_rate)}, "
+            f"latency saved {f'{saved / 1000:.0f}s' if saved is not None else 'n/a'}"
+        )
+
+    def save(self) -> None:
+        """Write this stage's counters into the version's stats file (atomically)."""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.loads(self.path.read_text()) if self.path.exists() else {}
+        data[self.stage] = self.to_dict()
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, indent=2))
+        os.replace(tmp, self.path)
+        logger.debug(f"Saved cascade stats to {self.path}")
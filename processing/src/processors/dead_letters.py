@@ -0,0 +1,84 @@
+"""
+Dead-Letter Retries
+===================
+
+Targeted replay of failed hadiths (`process_hadiths.py --retry-failed`)
+instead of another pass over the corpus.
+
+Failures are recorded per (hadith, stage, version) in `dead_letters` with
+the class of the last error and the hash of the prompt that failed (see
+BaseProcessor.dead_letter). Each error class has a policy:
+- LLMResponseError / StreamAborted (unusable output: schema or prompt
+  problem): replayed only once the prompt has changed since the failure
+  (fixed prompt, examples or methodology), with 2 attempts
+- RateLimitError / OverloadedError / TransientError (provider pressure,
+  timeouts, dropped connections): always replayed, with 5 attempts
+- anything else (client/configuration errors): replayed with 3 attempts
+
+A hadith that has failed `max_failures` runs is left for manual review.
+`--force` ignores both checks.
+"""
+
+from typing import Optional, List, Dict, Tuple, NamedTuple
+
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.processing import DeadLetter
+from .base_processor import BaseProcessor, WorkItem
+
+
+class RetryPolicy(NamedTuple):
+    """How failed hadiths of one error class are replayed."""
+    attempts: int  # Attempts per hadith in the retry run
+    max_failures: int  # Recorded failures after which the hadith is left for review
+    needs_prompt_change: bool  # Replay only if the prompt hash differs from the failed one
+
+
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    "LLMResponseError": RetryPolicy(attempts=2, max_failures=3, needs_prompt_change=True),
+    "StreamAborted": RetryPolicy(attempts=2, max_failures=3, needs_prompt_change=True),
+    "RateLimitError": RetryPolicy(attempts=5, max_failures=10, needs_prompt_change=False),
+    "OverloadedError": RetryPolicy(attempts=5, max_failures=10, needs_prompt_change=False),
+    "TransientError": RetryPolicy(attempts=5, max_failures=10, needs_prompt_change=False),
+}
+DEFAULT_POLICY = RetryPolicy(attempts=3, max_failures=3, needs_prompt_change=False)
+
+
+def policy_for(error_class: str) -> RetryPolicy:
+    return RETRY_POLICIES.get(error_class, DEFAULT_POLICY)
+
+
+def plan_retries(
+    processor: BaseProcessor,
+    letters: List[DeadLetter],
+    items: Dict[int, Tuple[RawHadith, Optional[PreprocessedHadith]]],
+    force: bool = False,
+) -> Tuple[Dict[int, List[WorkItem]], Dict[str, int]]:
+    """
+    Select dead letters to replay and group them by attempts per hadith.
+
+    Args:
+        processor: Stage processor (builds the current prompt for the hash check)
+        letters: Unresolved dead letters of the processor's stage/version
+        items: hadith_id -> (hadith, preprocessing) for the letters
+        force: Replay everything, ignoring prompt-change and failure limits
+
+    Returns:
+        Tuple of (attempts -> work items, skip reason -> count)
+    """
+    groups: Dict[int, List[WorkItem]] = {}
+    skipped = {"prompt_unchanged": 0, "too_many_failures": 0, "missing": 0}
+    for letter in letters:
+        item = items.get(letter.hadith_id)
+        if item is None:
+            skipped["missing"] += 1
+            continue
+        policy = policy_for(letter.error_class)
+        if not force:
+            if letter.failures >= policy.max_failures:
+                skipped["too_many_failures"] += 1
+                continue
+            if policy.needs_prompt_change and processor.build_request(*item).prompt_hash == letter.prompt_hash:
+                skipped["prompt_unchanged"] += 1
+                continue
+        groups.setdefault(policy.attempts, []).append(item)
+    return groups, skipped
@@ -0,0 +1,144 @@
+"""
+HMSTS Processor
+===============
+
+5-layer semantic tagging (HMSTS) for hadiths.
+
+HMSTS prompts include the hadith's PCAP assignment as temporal context.
+Only the era context (era, sub-era, AH range, evidence type) is kept, in a
+small lookup that is filled from PCAP rows for the same version before each
+batch (or from handoff queue entries, see `remember`) and emptied as the
+hadiths' HMSTS rows are committed.
+
+Each row gets a `semantic_completeness_score`: the weighted share of
+optional HMSTS content the model filled in (layer 0 facts, the eight
+layer 3 interpretive levels, layer 4 vectors).
+"""
+
+import json
+from decimal import Decimal
+from typing import Optional, List, Dict, Set, Iterable, NamedTuple, Union
+
+from src.llm.base import LLMResponse
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.processing import ProcessingStage
+from src.models.temporal import PCAPOutput, EvidenceType
+from src.models.semantic import HMSTSOutput, HMSTSAssignment
+from .base_processor import BaseProcessor, WorkItem
+
+
+# Layer weights for semantic_completeness_score (layers 1-2 are required)
+COMPLETENESS_WEIGHTS = {"layer0": 0.2, "layer1": 0.15, "layer2": 0.15, "layer3": 0.3, "layer4": 0.2}
+
+
+def _filled(values: List) -> float:
+    return sum(1 for v in values if v not in (None, "", [])) / len(values)
+
+
+def semantic_completeness(output: HMSTSOutput) -> Decimal:
+    """Weighted share of HMSTS layers filled in (0-1, three decimals)."""
+    levels = [getattr(output.layer3_axis_a, name, None) for name in ("zahir", "ishara", "akhlaq", "haqiqa")]
+    levels += [getattr(output.layer3_axis_b, name, None) for name in ("amal", "niyya", "hadd", "marifa")]
+    scores = {
+        "layer0": _filled(list(output.layer0.model_dump().values())),
+        "layer1": 1.0,
+        "layer2": 1.0,
+        "layer3": _filled(levels),
+        "layer4": _filled(list(output.layer4.model_dump().values())),
+    }
+    score = sum(COMPLETENESS_WEIGHTS[layer] * value for layer, value in scores.items())
+    return round(Decimal(str(score)), 3)
+
+
+class EraContext(NamedTuple):
+    """The part of a PCAP assignment HMSTS prompts use as temporal context."""
+    era_id: str
+    sub_era_id: Optional[str]
+    earliest_ah: Decimal
+    latest_ah: Decimal
+    evidence_type: EvidenceType
+
+    @classmethod
+    def from_pcap(cls, output: PCAPOutput) -> "EraContext":
+        return cls(output.era_id, output.sub_era_id, output.earliest_ah, output.latest_ah, output.evidence_type)
+
+    def dumps(self) -> str:
+        """Compact JSON (carried in handoff queue entries)."""
+        return json.dumps(
+            [self.era_id, self.sub_era_id, str(self.earliest_ah), str(self.latest_ah), self.evidence_type.value]
+        )
+
+    @classmethod
+    def loads(cls, data: str) -> "EraContext":
+        era_id, sub_era_id, earliest_ah, latest_ah, evidence_type = json.loads(data)
+        return cls(era_id, sub_era_id, Decimal(earliest_ah), Decimal(latest_ah), EvidenceType(evidence_type))
+
+
+class HMSTSProcessor(BaseProcessor):
+    """
+    LLM processor for HMSTS semantic tagging.
+    """
+
+    stage = ProcessingStage.HMSTS_PROCESSING
+    output_model = HMSTSOutput
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.temporal_context: Dict[int, EraContext] = {}
+        self.on_commit(self.forget_context)
+
+    def remember(self, hadith_id: int, context: Union[PCAPOutput, EraContext]) -> None:
+        """Use a PCAP result (e.g. just produced upstream) as the hadith's temporal context."""
+        self.temporal_context[hadith_id] = context if isinstance(context, EraContext) else EraContext.from_pcap(context)
+
+    def forget_context(self, rows: List[HMSTSAssignment]) -> None:
+        """Commit callback: stored hadiths no longer need their context."""
+        for row in rows:
+            self.temporal_context.pop(row.hadith_id, None)
+
+    def load_context(self, hadith_ids: Iterable[int]) -> Set[int]:
+        """
+        Load PCAP rows as temporal context for hadiths not in the lookup yet.
+
+        Returns:
+            Hadiths that have no PCAP row (yet)
+        """
+        missing = [hadith_id for hadith_id in hadith_ids if hadith_id not in self.temporal_context]
+        if not self.storage or not missing:
+            return set(missing)
+        for hadith_id, assignment in self.storage.fetch_pcap_assignments(missing, self.version).items():
+            self.remember(hadith_id, assignment)
+        return {hadith_id for hadith_id in missing if hadith_id not in self.temporal_context}
+
+    async def prepare(self, items: List[WorkItem]) -> None:
+        """Load PCAP assignments for the batch as temporal context."""
+        self.load_context(h.id for h, _ in items)
+
+    def build_user_prompt(self, hadith: RawHadith, preprocessed: Optional[PreprocessedHadith]) -> str:
+        """User prompt with the hadith's PCAP assignment as temporal context."""
+        return self.prompt_builder.build_user_prompt(
+            hadith,
+            preprocessed,
+            temporal_context=self.temporal_context.get(hadith.id),
+            chapter_in_context=self.chapter_key(hadith) in self.chapter_contexts,
+        )
+
+    def to_assignment(self, hadith_id: int, output: HMSTSOutput, response: LLMResponse) -> HMSTSAssignment:
+        """Flatten a validated HMSTS output into an hmsts_tags record."""
+        assignment = HMSTSAssignment.from_hmsts_output(hadith_id, output, self.version)
+        assignment.llm_model = response.model
+        assignment.processing_duration_ms = response.latency_ms
+        assignment.semantic_completeness_score = semantic_completeness(output)
+        return assignment
+
+    def confidence(self, assignment: HMSTSAssignment) -> Optional[float]:
+        """Cascade confidence: semantic_completeness_score."""
+        score = assignment.semantic_completeness_score
+        return float(score) if score is not None else None
+
+    def escalation_threshold(self) -> float:
+        return self.settings.cascade_hmsts_min_completeness
+
+    def agrees(self, first: HMSTSAssignment, final: HMSTSAssignment) -> bool:
+        """Same layer 2 functional role."""
+        return first.layer2_role == final.layer2_role
@@ -0,0 +1,413 @@
+"""
+Pipeline Orchestrator
+=====================
+
+Runs the processing stages as concurrent consumers joined by bounded
+queues, instead of finishing each stage over the whole corpus before the
+next one starts.
+
+    pending PCAP  ──> [PCAP] ──┬──> [HMSTS]
+    pending HMSTS (PCAP done) ─┘
+                               └──> [VALIDATION] (optional)
+
+- Every stage has its own worker pool and an `asyncio.Queue` of
+  `pipeline_queue_size` items. A full queue blocks the upstream workers
+  (backpressure), so a slow stage throttles its producers instead of
+  buffering the corpus in memory.
+- A hadith moves on to HMSTS (with its PCAP result as temporal context,
+  no database round-trip) and to validation as soon as its PCAP result lands.
+- Each stage stores its rows in chunks of its batch size and on shutdown.
+- A stage shuts down once every producer feeding it has finished and its
+  queue is drained, and then closes its own downstream stages.
+
+Wall-clock time approaches that of the slowest stage rather than the sum
+of all stages; `run()` reports both, plus per-stage busy time, queue
+high-water marks and the time producers spent blocked on full queues.
+
+`feed_from()` pulls work on demand instead of from a fixed list; sharded
+runs use it to stream work units from a coordinator into one pipeline per
+process (see shards.py).
+
+Stages without an implementation in this tree (ingestion, preprocessing,
+cross-linking, graph construction, export) can be added as `Stage`
+subclasses and connected the same way.
+
+Usage:
+------
+    orchestrator = PipelineOrchestrator.build(pcap, hmsts, settings, validator=validator)
+    orchestrator.feed(orchestrator.stages["pcap_processing"], pcap_items)
+    report = await orchestrator.run()
+"""
+
+import asyncio
+import time
+from typing import Optional, List, Dict, Any, NamedTuple, Callable, Awaitable, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from config.settings import Settings
+from src.llm.base import LLMError
+from src.llm.cost_tracker import CostTracker, CostShard
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.processing import ProcessingStage
+from src.validation.cross_model_validator import CrossModelValidator, Candidate, risk_score
+from src.processors.pcap_rules import RULES_MODEL
+from .base_processor import BaseProcessor, WorkItem
+
+
+class StageItem(NamedTuple):
+    """A hadith travelling through the pipeline with the previous stage's result."""
+    hadith: RawHadith
+    preprocessed: Optional[PreprocessedHadith]
+    result: Optional[BaseModel] = None
+
+
+_DONE = object()
+
+
+class Stage:
+    """
+    A worker pool consuming one bounded queue and feeding downstream stages.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        queue_size: int,
+        cost_tracker: Optional[CostTracker] = None,
+    ):
+        """
+        Initialize the stage.
+
+        Args:
+            name: Stage name for logs and the report
+            workers: Concurrent workers
+            queue_size: Inbound queue bound (producers block when it is full)
+            cost_tracker: Budget gate and spend accounting (no limit if None)
+        """
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue: asyncio.Queue = asyncio.Queue(max(1, queue_size))
+        self.cost_tracker = cost_tracker
+        self.downstream: List["Stage"] = []
+        self.open_producers = 0
+        self.in_flight = 0
+        self.stats: Dict[str, Any] = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "skipped_budget": 0,
+            "screened_out": 0,
+            "emitted": 0,
+            "busy_ms": 0,
+            "blocked_ms": 0,
+            "max_queue": 0,
+        }
+
+    def connect(self, other: "Stage") -> "Stage":
+        """Send this stage's results to `other`."""
+        self.downstream.append(other)
+        other.open_producers += 1
+        return other
+
+    # ------------------------------------------------------------------
+    # Queue plumbing
+    # ------------------------------------------------------------------
+
+    async def put(self, item: StageItem) -> None:
+        await self.queue.put(item)
+        self.stats["received"] += 1
+        self.stats["max_queue"] = max(self.stats["max_queue"], self.queue.qsize())
+
+    async def emit(self, item: StageItem) -> None:
+        """Pass a result downstream, waiting while a downstream queue is full."""
+        for stage in self.downstream:
+            started = time.perf_counter()
+            await stage.put(item)
+            self.stats["blocked_ms"] += int((time.perf_counter() - started) * 1000)
+        self.stats["emitted"] += 1
+
+    async def producer_done(self) -> None:
+        """One producer finished; after the last, tell the workers to stop."""
+        self.open_producers -= 1
+        if self.open_producers <= 0:
+            for _ in range(self.workers):
+                await self.queue.put(_DONE)
+
+    # ------------------------------------------------------------------
+    # Work
+    # ------------------------------------------------------------------
+
+    def accepts(self, item: StageItem) -> bool:
+        """Whether an item needs this stage at all (screened-out items cost nothing)."""
+        return True
+
+    async def handle(self, item: StageItem, shard: Optional[CostShard]) -> Optional[StageItem]:
+        """Process one item; returns what to pass downstream (None = nothing)."""
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        """Hook run before the workers start."""
+
+    async def finish(self) -> None:
+        """Hook run after the last worker stopped (flush buffered rows)."""
+
+    async def worker(self) -> None:
+        shard = self.cost_tracker.shard() if self.cost_tracker else None
+        try:
+            while True:
+                item = await self.queue.get()
+                if item is _DONE:
+                    return
+                if not self.accepts(item):
+                    self.stats["screened_out"] += 1
+                    continue
+                if self.cost_tracker and not self.cost_tracker.admit(1, self.in_flight):
+                    # Keep draining so upstream stages are never blocked on us
+                    self.stats["skipped_budget"] += 1
+                    continue
+                self.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    result = await self.handle(item, shard)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    if isinstance(e, LLMError):
+                        logger.warning(f"[{self.name}] hadith {item.hadith.id}: {e}")
+                    else:
+                        logger.exception(f"[{self.name}] hadith {item.hadith.id}: unexpected error")
+                    result = None
+                finally:
+                    self.in_flight -= 1
+                    self.stats["processed"] += 1
+                    self.stats["busy_ms"] += int((time.perf_counter() - started) * 1000)
+                    if shard:
+                        shard.record_hadith()
+                if result is not None and self.downstream:
+                    await self.emit(result)
+        finally:
+            if shard:
+                self.cost_tracker.release(shard)
+
+    async def run(self) -> None:
+        """Run the workers until closed, then close the downstream stages."""
+        await self.start()
+        if self.open_producers <= 0:
+            await self.producer_done()  # nothing feeds this stage
+        try:
+            await asyncio.gather(*(self.worker() for _ in range(self.workers)))
+            await self.finish()
+        finally:
+            for stage in self.downstream:
+                await stage.producer_done()
+        logger.info(f"[{self.name}] done: {self.summary()}")
+
+    def summary(self) -> str:
+        s = self.stats
+        skipped = f", {s['skipped_budget']} skipped (budget)" if s["skipped_budget"] else ""
+        screened = f", {s['screened_out']} screened out" if s["screened_out"] else ""
+        return (
+            f"{s['processed'] - s['failed']}/{s['processed']} succeeded{skipped}{screened}, "
+            f"busy {s['busy_ms'] / 1000 / self.workers:.1f}s/worker, "
+            f"queue peak {s['max_queue']}, blocked {s['blocked_ms'] / 1000:.1f}s on downstream"
+        )
+
+
+class ProcessorStage(Stage):
+    """
+    Stage backed by a PCAP/HMSTS processor; stores rows in chunks.
+    """
+
+    def __init__(self, processor: BaseProcessor, workers: int, queue_size: int, flush_size: int):
+        """
+        Args:
+            processor: Stage processor (its storage receives the rows)
+            workers: Concurrent workers
+            queue_size: Inbound queue bound
+            flush_size: Rows buffered before an upsert
+        """
+        super().__init__(processor.stage.value, workers, queue_size, processor.cost_tracker)
+        self.processor = processor
+        self.flush_size = flush_size
+        self.pending: List[BaseModel] = []
+        self.initial: List[WorkItem] = []
+
+    async def start(self) -> None:
+        # Rule engine / stored PCAP context for items fed from the database
+        await self.processor.prepare(self.initial)
+
+    async def handle(self, item: StageItem, shard: Optional[CostShard]) -> Optional[StageItem]:
+        processor = self.processor
+        if item.result is not None and hasattr(processor, "remember"):
+            # HMSTS: the PCAP result just produced upstream, no database round-trip
+            processor.remember(item.hadith.id, item.result)
+        resolved, _ = processor.resolve_without_llm([(item.hadith, item.preprocessed)])
+        try:
+            assignment = resolved[0] if resolved else await processor.process_hadith(item.hadith, item.preprocessed, shard)
+        except Exception as e:
+            processor.dead_letter(item.hadith, item.preprocessed, e)
+            raise
+        self.pending.append(assignment)
+        if len(self.pending) >= self.flush_size:
+            await processor.wait_for_writer()
+            self.flush()
+        return StageItem(item.hadith, item.preprocessed, assignment)
+
+    def flush(self) -> None:
+        self.processor.store(self.pending)
+        self.pending = []
+
+    async def finish(self) -> None:
+        self.flush()
+        self.processor.flush_dead_letters()
+
+
+class ValidationStage(Stage):
+    """
+    Cross-model second opinion on PCAP results above a risk threshold.
+    """
+
+    def __init__(self, validator: CrossModelValidator, workers: int, queue_size: int, min_risk: float, flush_size: int):
+        """
+        Args:
+            validator: Cross-model validator (second-model processor, budget, storage)
+            workers: Concurrent workers
+            queue_size: Inbound queue bound
+            min_risk: PCAP results below this risk score are not cross-checked
+            flush_size: Validation rows buffered before a write
+        """
+        super().__init__(ProcessingStage.VALIDATION.value, workers, queue_size, validator.cost_tracker)
+        self.validator = validator
+        self.min_risk = min_risk
+        self.flush_size = flush_size
+        self.pending = []
+
+    def accepts(self, item: StageItem) -> bool:
+        assignment = item.result
+        return assignment.llm_model != RULES_MODEL and risk_score(assignment) >= self.min_risk
+
+    async def handle(self, item: StageItem, shard: Optional[CostShard]) -> Optional[StageItem]:
+        assignment = item.result
+        risk = risk_score(assignment)
+        second = await self.validator.processor.process_hadith(item.hadith, item.preprocessed, shard)
+        self.pending.append(self.validator.to_result(Candidate(risk, assignment, 0), second))
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+        return None
+
+    def flush(self) -> None:
+        if self.validator.storage and self.pending:
+            self.validator.storage.save_validation_results(self.pending)
+        self.pending = []
+
+    async def finish(self) -> None:
+        self.flush()
+
+
+class PipelineOrchestrator:
+    """
+    Wires stages together, feeds them and runs them concurrently.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {stage.name: stage for stage in stages}
+        self._feeds: List[Any] = []
+
+    @classmethod
+    def build(
+        cls,
+        pcap: BaseProcessor,
+        hmsts: BaseProcessor,
+        settings: Settings,
+        validator: Optional[CrossModelValidator] = None,
+    ) -> "PipelineOrchestrator":
+        """PCAP -> HMSTS (and -> validation when a validator is given)."""
+        def workers(processor: BaseProcessor) -> int:
+            return processor.limiter.max_limit if processor.limiter else settings.parallel_workers
+
+        size = settings.pipeline_queue_size
+        pcap_stage = ProcessorStage(pcap, workers(pcap), size, settings.pcap_batch_size)
+        hmsts_stage = ProcessorStage(hmsts, workers(hmsts), size, settings.hmsts_batch_size)
+        pcap_stage.connect(hmsts_stage)
+        stages: List[Stage] = [pcap_stage, hmsts_stage]
+        if validator:
+            validation = ValidationStage(
+                validator, workers(validator.processor), size,
+                settings.pipeline_validation_min_risk, settings.pcap_batch_size,
+            )
+            pcap_stage.connect(validation)
+            stages.append(validation)
+        return cls(stages)
+
+    def feed(self, stage: Stage, items: List[WorkItem]) -> None:
+        """Queue items from the database into a stage (fed while the pipeline runs)."""
+        stage.open_producers += 1
+        if isinstance(stage, ProcessorStage):
+            stage.initial.extend(items)
+
+        async def producer() -> None:
+            try:
+                for hadith, preprocessed in items:
+                    await stage.put(StageItem(hadith, preprocessed))
+            finally:
+                await stage.producer_done()
+
+        self._feeds.append(producer)
+
+    def feed_from(self, source: Callable[[], Awaitable[Optional[Tuple[List[WorkItem], List[WorkItem]]]]]) -> None:
+        """
+        Feed work fetched on demand (e.g. units from a shard coordinator).
+
+        `source()` returns (items pending PCAP, items pending HMSTS only) or
+        None when there is no more work. It is called again once the previous
+        items are queued, so a full pipeline pulls no further work.
+        """
+        pcap = self.stages[ProcessingStage.PCAP_PROCESSING.value]
+        hmsts = self.stages[ProcessingStage.HMSTS_PROCESSING.value]
+        pcap.open_producers += 1
+        hmsts.open_producers += 1
+
+        async def put_all(stage: ProcessorStage, items: List[WorkItem]) -> None:
+            await stage.processor.prepare(items)
+            for hadith, preprocessed in items:
+                await stage.put(StageItem(hadith, preprocessed))
+
+        async def producer() -> None:
+            try:
+                while (work := await source()) is not None:
+                    pcap_items, hmsts_items = work
+                    await asyncio.gather(put_all(pcap, pcap_items), put_all(hmsts, hmsts_items))
+            finally:
+                await pcap.producer_done()
+                await hmsts.producer_done()
+
+        self._feeds.append(producer)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage to completion.
+
+        Returns:
+            Report with wall-clock time, per-stage stats and the sum of
+            per-stage busy times (the sequential-run estimate)
+        """
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(stage.run() for stage in self.stages.values()),
+            *(feed() for feed in self._feeds),
+        )
+        wall_ms = int((time.perf_counter() - started) * 1000)
+        stage_ms = {name: stage.stats["busy_ms"] // stage.workers for name, stage in self.stages.items()}
+        report = {
+            "wall_ms": wall_ms,
+            "sum_of_stages_ms": sum(stage_ms.values()),
+            "slowest_stage_ms": max(stage_ms.values(), default=0),
+            "stages": {name: dict(stage.stats, workers=stage.workers) for name, stage in self.stages.items()},
+        }
+        logger.info(
+            f"Pipeline finished in {wall_ms / 1000:.1f}s (slowest stage {report['slowest_stage_ms'] / 1000:.1f}s, "
+            f"stages back to back {report['sum_of_stages_ms'] / 1000:.1f}s)"
+        )
+        return report
@@ -0,0 +1,125 @@
+"""
+PCAP Processor
+==============
+
+Temporal assignment (Prophetic Chronology Assignment Protocol) for hadiths.
+
+Produces one PCAPAssignment per hadith, written to pcap_assignments.
+
+Hadiths that name an anchor event outright are resolved by the rule engine
+(pcap_rules.py, llm_model 'rules') before any LLM call when
+`enable_pcap_rules` is set.
+"""
+
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Optional, List, Dict, Any, Tuple
+
+from loguru import logger
+
+from src.llm.base import LLMResponse
+from src.models.processing import ProcessingStage
+from src.models.temporal import PCAPOutput, PCAPAssignment
+from .base_processor import BaseProcessor, WorkItem
+from .pcap_rules import PCAPRuleEngine, RULES_MODEL
+
+
+_SUB_ERA = re.compile(r"^E[0-3]\.\d+$")
+
+
+def _decimal(value: Any):
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+class PCAPProcessor(BaseProcessor):
+    """
+    LLM processor for PCAP temporal assignment.
+    """
+
+    stage = ProcessingStage.PCAP_PROCESSING
+    output_model = PCAPOutput
+
+    def __init__(self, *args, rule_engine: Optional[PCAPRuleEngine] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rule_engine = rule_engine
+
+    async def prepare(self, items: List[WorkItem]) -> None:
+        """Build the rule engine from temporal_markers on first use."""
+        if self.rule_engine is None and self.settings.enable_pcap_rules and self.storage:
+            self.rule_engine = PCAPRuleEngine(self.storage.fetch_temporal_markers())
+
+    def resolve_without_llm(self, items: List[WorkItem]) -> Tuple[List[PCAPAssignment], List[WorkItem]]:
+        """Resolve explicit anchor-event hadiths with the rule engine."""
+        if self.rule_engine is None or not self.settings.enable_pcap_rules:
+            return [], items
+        resolved, remaining = [], []
+        for hadith, preprocessed in items:
+            output = self.rule_engine.resolve(hadith, preprocessed)
+            if output is None:
+                remaining.append((hadith, preprocessed))
+                continue
+            resolved.append(PCAPAssignment(
+                **output.model_dump(),
+                hadith_id=hadith.id,
+                version=self.version,
+                llm_model=RULES_MODEL,
+                llm_cost_usd=Decimal(0),
+                processing_duration_ms=0,
+            ))
+        if resolved:
+            logger.info(f"[{self.stage.value}] {self.rule_engine.summary()}")
+        return resolved, remaining
+
+    def fix_output(self, data: Dict[str, Any]) -> List[str]:
+        """
+        Repair PCAP-specific slips.
+
+        - era/sub-era IDs: whitespace and case ("e2.1 " -> "E2.1"); a
+          sub_era_id that is not a sub-era is dropped (it is optional)
+        - earliest_ah > latest_ah: swapped
+        - posterior_confidence given as a percentage: scaled to [0, 1]
+        """
+        changes = []
+        for key in ("era_id", "sub_era_id"):
+            value = data.get(key)
+            if isinstance(value, str) and value.strip().upper() != value:
+                data[key] = value.strip().upper()
+                changes.append(f"{key}: {value!r} -> {data[key]!r}")
+        if data.get("sub_era_id") and not _SUB_ERA.match(str(data["sub_era_id"])):
+            changes.append(f"sub_era_id: {data['sub_era_id']!r} -> None")
+            data["sub_era_id"] = None
+
+        earliest, latest = _decimal(data.get("earliest_ah")), _decimal(data.get("latest_ah"))
+        if earliest is not None and latest is not None and latest < earliest:
+            data["earliest_ah"], data["latest_ah"] = data["latest_ah"], data["earliest_ah"]
+            changes.append(f"earliest_ah/latest_ah swapped ({earliest} > {latest})")
+
+        confidence = _decimal(data.get("posterior_confidence"))
+        if confidence is not None and 1 < confidence <= 100:
+            data["posterior_confidence"] = float(round(confidence / 100, 3))
+            changes.append(f"posterior_confidence: {confidence} -> {data['posterior_confidence']}")
+        return changes
+
+    def to_assignment(self, hadith_id: int, output: PCAPOutput, response: LLMResponse) -> PCAPAssignment:
+        """Attach database metadata to a validated PCAP output."""
+        return PCAPAssignment(
+            **output.model_dump(),
+            hadith_id=hadith_id,
+            version=self.version,
+            llm_model=response.model,
+            processing_duration_ms=response.latency_ms,
+        )
+
+    def confidence(self, assignment: PCAPAssignment) -> Optional[float]:
+        """Cascade confidence: the model's posterior_confidence."""
+        return float(assignment.posterior_confidence)
+
+    def escalation_threshold(self) -> float:
+        return self.settings.cascade_pcap_min_confidence
+
+    def agrees(self, first: PCAPAssignment, final: PCAPAssignment) -> bool:
+        """Same top-level era (E0-E3)."""
+        return first.era_id.split(".")[0] == final.era_id.split(".")[0]
@@ -0,0 +1,219 @@
+"""
+PCAP Rule Engine
+================
+
+Deterministic PCAP resolution for hadiths that name an anchor event outright
+("on the day of Badr", "the treaty of Hudaybiyyah", "in the Farewell Pilgrimage").
+
+For such hadiths era, sub-era, event window, AH range and
+`evidence_type=explicit_event` follow directly from the temporal_markers
+row, so a complete PCAPOutput is produced without an LLM call (llm_model
+'rules', templated reasoning). Everything else is left to the LLM.
+
+Matching is deliberately conservative:
+- Event names only count with a temporal or event cue ("day of", "battle
+  of", "expedition of", "treaty of", "Tabuk expedition", "يوم", "غزوة",
+  "عام", ...); place names alone ("the Tabuk mosque", "a well at
+  Hudaybiyyah") say nothing about when the hadith was said. Only "the
+  Farewell Hajj" needs no cue
+- A hadith naming two different events is left to the LLM
+- Markers without a parseable AH value are never used
+
+Anchors follow the PCAP logical constraints (methodology/PCAP.md): the
+nearest constraint event before and after the matched event.
+"""
+
+import re
+from decimal import Decimal
+from typing import Optional, List, Dict, Tuple, NamedTuple
+
+from loguru import logger
+
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.temporal import TemporalMarker, PCAPOutput, EvidenceType
+from src.preprocessing.arabic_normalizer import normalize_arabic
+
+
+RULES_MODEL = "rules"
+
+# PCAP logical-constraint anchors in chronological order (event_id, AH)
+CONSTRAINT_ANCHORS: List[Tuple[str, int]] = [
+    ("E2.11", 1),     # Hijrah
+    ("E3.2.1", 2),    # Badr
+    ("E3.2.2", 3),    # Uhud
+    ("E3.2.4", 5),    # Khandaq
+    ("E3.3.1", 6),    # Hudaybiyyah
+    ("E3.3.6", 8),    # Fath Makkah
+    ("E3.4.1", 9),    # Tabuk
+    ("E3.4.4", 10),   # Farewell Hajj
+    ("E3.4.6", 11),   # Death
+]
+
+# Marker certainty grades (cert_date / cert_event) -> posterior confidence
+CERTAINTY_CONFIDENCE = {"A": Decimal("0.95"), "B": Decimal("0.9"), "C": Decimal("0.8")}
+
+_EN_CUE = (
+    r"(?:day|battle|ghazwa|ghazwah|ghazwat|expedition|campaign|year|siege|night|time|treaty|truce|umrah|umra)"
+    r"\s+of\s+(?:the\s+)?(?:(?:battle|ghazwa|ghazwah|expedition)\s+of\s+)?(?:al-?)?"
+)
+_AR_CUE = r"(?:يوم|غزوه|غزاه|عام|زمن|وقعه|ليله|صلح|عمره)\s+(?:ال)?"
+_EN_SUFFIX = r"(?:expedition|campaign|ghazwa|ghazwah|treaty|truce)"
+
+
+def _en(*names: str) -> str:
+    return rf"(?:{_EN_CUE})(?:{'|'.join(names)})\b"
+
+
+def _ar(*names: str) -> str:
+    return rf"(?:{_AR_CUE})(?:{'|'.join(names)})(?![ء-ي])"
+
+
+def _en_before(*names: str) -> str:
+    """Name used as a modifier of the event ("the Tabuk expedition")."""
+    return rf"\b(?:{'|'.join(names)})\s+{_EN_SUFFIX}\b"
+
+
+_HUDAYBIYYAH = ("hudaibiya", "hudaibiyya", "hudaybiyya", "hudaybiyyah", "hudaibiyah", "hudaybiya")
+
+# event_id -> patterns (English matched case-insensitively, Arabic against normalize_arabic output)
+EVENT_PATTERNS: Dict[str, List[str]] = {
+    "E3.2.1": [_en("badr"), _ar("بدر")],
+    "E3.2.2": [_en("uhud"), r"(?:يوم|غزوه|وقعه)\s+احد(?![ء-ي])"],
+    "E3.2.4": [
+        _en("khandaq", "trench", "ahzab", "confederates"),
+        r"(?:يوم|غزوه|وقعه|عام)\s+(?:الخندق|الاحزاب)",
+    ],
+    "E3.2.5": [_en(r"banu\s+quraiz?a", r"bani\s+quraiz?a", "quraiza", "qurayza"), r"يوم\s+قريظه|غزوه\s+بني\s+قريظه"],
+    "E3.3.1": [
+        _en(*_HUDAYBIYYAH),
+        _en_before(*_HUDAYBIYYAH),
+        r"(?:يوم|عام|زمن|صلح|عمره)\s+الحديبيه(?![ء-ي])",
+    ],
+    "E3.3.3": [_en("khaibar", "khaybar"), _ar("خيبر")],
+    "E3.3.5": [_en("mu'?tah", "mu'?ta"), _ar("موته")],
+    "E3.3.6": [
+        r"conquest\s+of\s+(?:mecca|makkah|makka)|(?:day|year)\s+of\s+(?:the\s+)?conquest",
+        r"(?:عام|يوم)\s+الفتح|فتح\s+مكه",
+    ],
+    "E3.3.7": [_en("hunain", "hunayn"), _ar("حنين")],
+    "E3.3.8": [r"siege\s+of\s+(?:al-?)?ta'?if", r"(?:حصار|غزوه)\s+الطايف"],
+    "E3.4.1": [_en("tabuk", "tabook"), _en_before("tabuk", "tabook"), _ar("تبوك")],
+    "E3.4.4": [r"farewell\s+(?:pilgrimage|hajj)|hajjat[\s-]+al-?wada", r"حجه\s+الوداع"],
+}
+
+_AH_RANGE = re.compile(r"(\d+)(?:\s*[–-]\s*(\d+))?\s*(AH|BH)")
+
+
+def parse_ah_range(ah_value: Optional[str]) -> Optional[Tuple[Decimal, Decimal]]:
+    """
+    AH interval of a marker's ah_value ("7 AH", "6–7 AH", "17 Ramadan 2 AH", "~3 BH").
+
+    Before-Hijrah years are negative. Returns None if no year is given.
+    """
+    match = _AH_RANGE.search(ah_value or "")
+    if not match:
+        return None
+    first, second, era = match.groups()
+    sign = -1 if era == "BH" else 1
+    years = sorted(sign * Decimal(value) for value in (first, second or first))
+    return years[0], years[1]
+
+
+class RuleMatch(NamedTuple):
+    """An anchor event found in a hadith."""
+    marker: TemporalMarker
+    phrase: str
+
+
+class PCAPRuleEngine:
+    """
+    Resolve PCAP for explicit anchor-event hadiths from temporal markers.
+    """
+
+    def __init__(self, markers: List[TemporalMarker]):
+        """
+        Compile event patterns for the markers that can be dated.
+
+        Args:
+            markers: temporal_markers rows
+        """
+        by_id = {marker.event_id: marker for marker in markers}
+        self.markers: Dict[str, TemporalMarker] = {}
+        self.ranges: Dict[str, Tuple[Decimal, Decimal]] = {}
+        self.patterns: List[Tuple[str, re.Pattern]] = []
+        for event_id, patterns in EVENT_PATTERNS.items():
+            marker = by_id.get(event_id)
+            ah_range = parse_ah_range(marker.ah_value) if marker else None
+            if ah_range is None:
+                continue
+            self.markers[event_id] = marker
+            self.ranges[event_id] = ah_range
+            for pattern in patterns:
+                self.patterns.append((event_id, re.compile(pattern, re.IGNORECASE)))
+        self.stats = {"checked": 0, "resolved": 0, "conflicts": 0}
+        logger.debug(f"PCAP rule engine: {len(self.markers)} anchor events, {len(self.patterns)} patterns")
+
+    def match(self, hadith: RawHadith, preprocessed: Optional[PreprocessedHadith] = None) -> List[RuleMatch]:
+        """Distinct anchor events named in a hadith (first phrase per event)."""
+        arabic = (preprocessed.arabic_normalized if preprocessed else None) or normalize_arabic(hadith.arabic)
+        texts = [hadith.english_text or "", arabic]
+        found: Dict[str, str] = {}
+        for event_id, pattern in self.patterns:
+            if event_id in found:
+                continue
+            for text in texts:
+                hit = pattern.search(text)
+                if hit:
+                    found[event_id] = hit.group(0).strip()
+                    break
+        return [RuleMatch(self.markers[event_id], phrase) for event_id, phrase in found.items()]
+
+    def resolve(self, hadith: RawHadith, preprocessed: Optional[PreprocessedHadith] = None) -> Optional[PCAPOutput]:
+        """
+        PCAP output for a hadith naming exactly one anchor event.
+
+        Returns:
+            Validated PCAPOutput, or None if the hadith needs the LLM
+        """
+        self.stats["checked"] += 1
+        matches = self.match(hadith, preprocessed)
+        if len(matches) != 1:
+            if len(matches) > 1:
+                self.stats["conflicts"] += 1
+            return None
+        output = self.build_output(matches[0])
+        self.stats["resolved"] += 1
+        return output
+
+    def build_output(self, match: RuleMatch) -> PCAPOutput:
+        """PCAPOutput for a matched event."""
+        marker = match.marker
+        earliest, latest = self.ranges[marker.event_id]
+        parts = marker.event_id.split(".")
+        grades = [g for g in (marker.certainty_date, marker.certainty_event) if g in CERTAINTY_CONFIDENCE]
+        confidence = min((CERTAINTY_CONFIDENCE[g] for g in grades), default=CERTAINTY_CONFIDENCE["C"])
+        before = [event_id for event_id, ah in CONSTRAINT_ANCHORS if ah < earliest][-1:]
+        after = [event_id for event_id, ah in CONSTRAINT_ANCHORS if ah > latest][:1]
+        return PCAPOutput(
+            era_id=parts[0],
+            sub_era_id=".".join(parts[:2]) if len(parts) > 1 else None,
+            event_window_id=marker.event_id if len(parts) > 2 else None,
+            earliest_ah=earliest,
+            latest_ah=latest,
+            earliest_ce=marker.ce_start,
+            latest_ce=marker.ce_end,
+            anchor_before=before,
+            anchor_after=after,
+            evidence_type=EvidenceType.EXPLICIT_EVENT,
+            posterior_confidence=confidence,
+            reasoning=(
+                f"Rule-based: the text names {marker.event_name_english} (\"{match.phrase}\"), "
+                f"temporal marker {marker.event_id} dated {marker.ah_value} "
+                f"(date certainty {marker.certainty_date or '?'}, event certainty {marker.certainty_event or '?'})."
+            ),
+        )
+
+    def summary(self) -> str:
+        stats = self.stats
+        rate = f"{stats['resolved'] / stats['checked']:.0%}" if stats["checked"] else "n/a"
+        return f"{stats['resolved']}/{stats['checked']} resolved by rules ({rate}), {stats['conflicts']} conflicting"
@@ -0,0 +1,246 @@
+"""
+Partial Publication
+===================
+
+Publish each book as soon as it is complete instead of at the end of the
+corpus run (priority collection mode: with `book_priorities` set, Bukhari
+and Muslim finish first and are published hours into a multi-day run).
+
+A book is complete when every one of its hadiths has both a PCAP and an
+HMSTS row for the version. The publisher tracks the hadiths a run feeds to
+each stage and listens for committed rows (writer or synchronous store);
+when a book's last tracked hadith is committed it checks completeness in
+PostgreSQL (hadiths that failed, or are left for another run, keep it
+open) and then, in the background:
+1. Validates the book: with a CrossModelValidator, its riskiest PCAP
+   assignments not yet cross-checked are re-run on the second model
+   (within the validator's budgets)
+2. Exports it to `{export_dir}/published/{version}/book_{book_id}.jsonl`:
+   one line per hadith with its PCAP and HMSTS rows and validation
+   statuses (written to a tmp file and renamed, so readers never see a
+   partial file)
+3. Records it in `manifest.json` next to it (hadith count, validation
+   counts, publication time); consumers poll the manifest
+
+`sweep()` publishes every complete book not yet in the manifest (used at
+the end of a run and by scripts/export_data.py).
+
+Usage:
+------
+    publisher = BookPublisher.from_settings(storage, settings, "v1.0", validator)
+    publisher.attach(processor)
+    publisher.track(processor.stage, items)
+    ...
+    await publisher.close()
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Set
+
+from loguru import logger
+from pydantic import BaseModel
+
+from config.settings import Settings
+from src.models.processing import ProcessingStage
+from src.storage.postgres import PostgresStorage
+from src.validation import CrossModelValidator
+from .base_processor import BaseProcessor, WorkItem
+
+
+# Stages whose rows a published book must have
+PUBLISHED_STAGES = (ProcessingStage.PCAP_PROCESSING, ProcessingStage.HMSTS_PROCESSING)
+
+
+class BookPublisher:
+    """
+    Validates and exports books as they complete.
+    """
+
+    def __init__(
+        self,
+        storage: PostgresStorage,
+        output_dir: Path,
+        version: str = "v1.0",
+        validator: Optional[CrossModelValidator] = None,
+    ):
+        """
+        Initialize the publisher (loads the manifest of books already published).
+
+        Args:
+            storage: Storage to check completeness and read export rows from
+            output_dir: Directory of the version's book files and manifest
+            version: Processing version to publish
+            validator: Cross-model validator run on each book before export (none if None)
+        """
+        self.storage = storage
+        self.output_dir = Path(output_dir)
+        self.version = version
+        self.validator = validator
+        self.manifest_path = self.output_dir / "manifest.json"
+        self.manifest: Dict[str, Any] = {"version": version, "books": {}}
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text())
+        # book_id -> stage -> tracked hadiths not yet committed
+        self.remaining: Dict[int, Dict[ProcessingStage, Set[int]]] = {}
+        self.book_of: Dict[int, int] = {}
+        self.scheduled: Set[int] = set()
+        self.tasks: Set[asyncio.Task] = set()
+        self.lock = asyncio.Lock()
+        self.stats = {"published": 0, "hadiths": 0, "incomplete": 0, "failed": 0}
+
+    @classmethod
+    def from_settings(
+        cls,
+        storage: PostgresStorage,
+        settings: Settings,
+        version: str = "v1.0",
+        validator: Optional[CrossModelValidator] = None,
+    ) -> "BookPublisher":
+        return cls(storage, Path(settings.export_dir) / "published" / version, version, validator)
+
+    def is_published(self, book_id: int) -> bool:
+        return str(book_id) in self.manifest["books"]
+
+    # ------------------------------------------------------------------
+    # Tracking
+    # ------------------------------------------------------------------
+
+    def attach(self, processor: BaseProcessor) -> None:
+        """Listen for the processor's committed rows."""
+        stage = processor.stage
+        processor.on_commit(lambda rows: self.committed(stage, rows))
+
+    def track(self, stage: ProcessingStage, items: List[WorkItem]) -> None:
+        """Register hadiths this run will process for a stage."""
+        for hadith, _ in items:
+            self.book_of[hadith.id] = hadith.book_id
+            self.remaining.setdefault(hadith.book_id, {}).setdefault(stage, set()).add(hadith.id)
+
+    def committed(self, stage: ProcessingStage, rows: List[BaseModel]) -> None:
+        """Commit callback: schedule books whose last tracked hadith was just stored."""
+        books = set()
+        for row in rows:
+            book_id = self.book_of.get(row.hadith_id)
+            if book_id is not None:
+                self.remaining[book_id].get(stage, set()).discard(row.hadith_id)
+                books.add(book_id)
+        for book_id in books:
+            if not any(self.remaining[book_id].values()) and book_id not in self.scheduled:
+                self.schedule(book_id)
+
+    def schedule(self, book_id: int) -> None:
+        self.scheduled.add(book_id)
+        task = asyncio.get_running_loop().create_task(self.publish(book_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # ------------------------------------------------------------------
+    # Publication
+    # ------------------------------------------------------------------
+
+    async def publish(self, book_id: int, force: bool = False) -> bool:
+        """
+        Validate and export a book if it is complete.
+
+        Args:
+            book_id: Book to publish
+            force: Republish a book already in the manifest
+
+        Returns:
+            True if the book was published
+        """
+        async with self.lock:
+            if self.is_published(book_id) and not force:
+                return False
+            try:
+                progress = (await asyncio.to_thread(self.storage.fetch_book_progress, self.version, [book_id]))[book_id]
+                missing = {
+                    stage.value: progress["total"] - progress[stage.value]
+                    for stage in PUBLISHED_STAGES
+                    if progress[stage.value] < progress["total"]
+                }
+                if missing:
+                    self.stats["incomplete"] += 1
+                    logger.info(f"[publish] book {book_id} not complete yet (missing rows: {missing})")
+                    return False
+                rows = await asyncio.to_thread(self.storage.fetch_book_export, book_id, self.version)
+                hadith_ids = [row["hadith_id"] for row in rows]
+                if self.validator:
+                    await self.validator.run(hadith_ids)
+                statuses = await asyncio.to_thread(self.storage.fetch_validation_statuses, hadith_ids, self.version)
+                await asyncio.to_thread(self.write_book, book_id, rows, statuses)
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"[publish] book {book_id} failed: {e}")
+                return False
+            self.stats["published"] += 1
+            self.stats["hadiths"] += len(rows)
+            return True
+
+    def write_book(self, book_id: int, rows: List[Dict[str, Any]], statuses: Dict[int, Dict[str, str]]) -> None:
+        """Write the book file and its manifest entry (each via tmp file + rename)."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"book_{book_id}.jsonl"
+        tmp = path.with_suffix(".tmp")
+        counts: Dict[str, int] = {"pass": 0, "warning": 0, "fail": 0, "unchecked": 0}
+        with open(tmp, "w", encoding="utf-8") as f:
+            for row in rows:
+                validation = statuses.get(row["hadith_id"], {})
+                worst = next((s for s in ("fail", "warning", "pass") if s in validation.values()), "unchecked")
+                counts[worst] += 1
+                f.write(json.dumps({**row, "validation": validation}, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp, path)
+
+        self.manifest["books"][str(book_id)] = {
+            "file": path.name,
+            "book_name": rows[0]["book_name_english"] if rows else None,
+            "hadiths": len(rows),
+            "validation": counts,
+            "published_at": datetime.utcnow().isoformat(),
+        }
+        self.manifest["updated_at"] = datetime.utcnow().isoformat()
+        tmp = self.manifest_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.manifest, indent=2, ensure_ascii=False))
+        os.replace(tmp, self.manifest_path)
+        logger.info(f"[publish] book {book_id}: {len(rows)} hadiths -> {path} (validation {counts})")
+
+    async def sweep(self, book_ids: Optional[List[int]] = None, force: bool = False) -> List[int]:
+        """
+        Publish every complete book not yet published.
+
+        Args:
+            book_ids: Books to consider (all if None)
+            force: Republish books already in the manifest
+
+        Returns:
+            Books published
+        """
+        progress = await asyncio.to_thread(self.storage.fetch_book_progress, self.version, book_ids)
+        published = []
+        for book_id, counts in progress.items():
+            if self.is_published(book_id) and not force:
+                continue
+            if all(counts[stage.value] >= counts["total"] for stage in PUBLISHED_STAGES):
+                if await self.publish(book_id, force=force):
+                    published.append(book_id)
+        return published
+
+    async def close(self) -> None:
+        """Wait for scheduled publications, then publish books completed by other runs."""
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+        await self.sweep()
+        logger.info(f"[publish] {self.summary()}")
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"{s['published']} books published ({s['hadiths']} hadiths), "
+            f"{len(self.manifest['books'])} in the manifest"
+            + (f", {s['incomplete']} completion checks found missing rows" if s["incomplete"] else "")
+            + (f", {s['failed']} failed" if s["failed"] else "")
+        )
@@ -0,0 +1,378 @@
+"""
+Sharded Pipeline
+================
+
+Run the streaming pipeline (see orchestrator.py) in several OS processes,
+partitioned by book, so one monolithic worker pool no longer mixes
+42-hadith forties with Ahmad and Mishkat.
+
+- Work units: the pending corpus (PCAP, and HMSTS-only) grouped by book;
+  books with more than `pipeline_shard_unit_hadiths` pending hadiths are
+  split into ID-ordered chunks so several shards can share them
+- Units are dealt to the shards as contiguous book_id ranges of roughly
+  equal weight (pending LLM calls); with `book_priorities`, each priority
+  class is dealt separately and first, so every shard starts on the
+  prioritized books
+- Each shard is a spawned process with its own PostgreSQL connection pool,
+  LLM client and caches, checkpoint files and cost ledger
+  (`cost_ledger_{version}__shard{n}`), and a 1/N share of the concurrency
+  settings. It pulls its next unit from the coordinator whenever its
+  pipeline has room, so parsing, the rule engine and validation use one
+  core per shard
+- Budget: the coordinator hands it out with the units. Each request for a
+  unit reports the shard's spend; the reply carries what every other shard
+  and earlier run of the version has spent, so each shard checks the whole
+  COST_BUDGET_USD against the whole spend (between units, the shards also
+  re-read each other's ledgers). Once the budget is spent, no more units
+  are handed out
+- Rebalancing: a shard whose own range is exhausted is handed the last
+  unstarted unit of the shard with the most unstarted work. A shard that
+  stalls holds only the units it has started; one that dies has its units
+  re-queued (their stored rows are skipped) and is restarted
+
+Usage:
+------
+    units = plan_units(pending_pcap, pending_hmsts, settings.pipeline_shard_unit_hadiths, settings.book_priorities)
+    coordinator = ShardCoordinator(shard_main, (args,), units, shards=4, budget_usd=settings.cost_budget_usd)
+    report = coordinator.run()
+
+    # in shard_main(channel, args), inside the shard process:
+    orchestrator.feed_from(source)   # source() awaits channel.next_unit(spent)
+"""
+
+import asyncio
+import math
+import multiprocessing
+import queue
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, Deque, Callable, NamedTuple
+
+from loguru import logger
+
+from config.settings import Settings
+
+
+class WorkUnit(NamedTuple):
+    """A book, or an ID-ordered chunk of one, handed to a shard."""
+    book_id: int
+    pcap_ids: Tuple[int, ...]
+    # Pending HMSTS only (their PCAP row exists)
+    hmsts_ids: Tuple[int, ...]
+
+    @property
+    def weight(self) -> int:
+        """LLM calls the unit needs (hadiths pending PCAP also need HMSTS)."""
+        return 2 * len(self.pcap_ids) + len(self.hmsts_ids)
+
+
+def plan_units(
+    pending_pcap: Dict[int, List[int]],
+    pending_hmsts: Dict[int, List[int]],
+    unit_hadiths: int,
+    priorities: Optional[Dict[int, int]] = None,
+) -> List[WorkUnit]:
+    """
+    Split pending hadiths into per-book work units.
+
+    Args:
+        pending_pcap: book_id -> hadith IDs pending PCAP
+        pending_hmsts: book_id -> hadith IDs pending HMSTS
+        unit_hadiths: Largest unit (bigger books are chunked in ID order)
+        priorities: book_id -> priority class (0 first; unlisted books last)
+
+    Returns:
+        Units in (priority class, book_id, hadith ID) order
+    """
+    priorities = priorities or {}
+    unlisted = max(priorities.values(), default=-1) + 1
+    units = []
+    for book_id in sorted(set(pending_pcap) | set(pending_hmsts), key=lambda b: (priorities.get(b, unlisted), b)):
+        pcap = set(pending_pcap.get(book_id, ()))
+        ids = sorted(pcap | set(pending_hmsts.get(book_id, ())))
+        for start in range(0, len(ids), unit_hadiths):
+            chunk = ids[start:start + unit_hadiths]
+            units.append(WorkUnit(
+                book_id,
+                tuple(i for i in chunk if i in pcap),
+                tuple(i for i in chunk if i not in pcap),
+            ))
+    return units
+
+
+def partition(units: List[WorkUnit], shards: int, priorities: Optional[Dict[int, int]] = None) -> List[Deque[WorkUnit]]:
+    """
+    Deal units to shards as contiguous ranges of roughly equal weight, per priority class.
+
+    Returns:
+        One deque of units per shard, in processing order
+    """
+    priorities = priorities or {}
+    unlisted = max(priorities.values(), default=-1) + 1
+    classes: Dict[int, List[WorkUnit]] = {}
+    for unit in units:
+        classes.setdefault(priorities.get(unit.book_id, unlisted), []).append(unit)
+    dealt: List[Deque[WorkUnit]] = [deque() for _ in range(shards)]
+    for _, members in sorted(classes.items()):
+        total = sum(unit.weight for unit in members) or 1
+        cumulative = 0
+        for unit in members:
+            # The shard whose share of the range contains the unit's midpoint
+            dealt[min(shards - 1, int((cumulative + unit.weight / 2) / total * shards))].append(unit)
+            cumulative += unit.weight
+    return dealt
+
+
+def shard_settings(settings: Settings, shards: int) -> Settings:
+    """
+    A shard's settings: its share of the concurrency limits.
+
+    COST_BUDGET_USD is not split (the coordinator hands it out, see
+    ShardChannel.next_unit); the in-memory cross-validation cap is.
+    """
+    return settings.model_copy(update={
+        "parallel_workers": math.ceil(settings.parallel_workers / shards),
+        "llm_concurrency_max": math.ceil(settings.llm_concurrency_max / shards),
+        "long_lane_workers": math.ceil(settings.long_lane_workers / shards),
+        "cross_validation_max_cost_usd": settings.cross_validation_max_cost_usd / shards,
+    })
+
+
+class ShardChannel:
+    """
+    A shard's connection to the coordinator (passed to the shard process).
+    """
+
+    def __init__(self, index: int, shards: int, requests, responses, planned: int):
+        self.index = index
+        self.shards = shards
+        self.requests = requests
+        self.responses = responses
+        # Weight initially dealt to this shard (for cost projection)
+        self.planned = planned
+        # Spend of the other shards and earlier runs, as of the last unit
+        self.spent_elsewhere = 0.0
+
+    async def next_unit(self, spent_usd: float = 0.0) -> Optional[WorkUnit]:
+        """
+        Ask for the next unit.
+
+        Args:
+            spent_usd: This shard's spend so far (its ledger total)
+
+        Returns:
+            The unit (None: no work left anywhere, or the budget is spent)
+        """
+        self.requests.put((self.index, "next", spent_usd))
+        unit, self.spent_elsewhere = await asyncio.to_thread(self.responses.get)
+        return unit
+
+    def report(self, report: Dict[str, Any]) -> None:
+        """Send the shard's final report (the shard then exits)."""
+        self.requests.put((self.index, "report", report))
+
+
+class ShardCoordinator:
+    """
+    Spawns shard processes and hands out units, rebalancing idle shards.
+    """
+
+    def __init__(
+        self,
+        worker: Callable[..., None],
+        worker_args: Tuple[Any, ...],
+        units: List[WorkUnit],
+        shards: int,
+        priorities: Optional[Dict[int, int]] = None,
+        max_restarts: Optional[int] = None,
+        poll_seconds: float = 1.0,
+        budget_usd: Optional[float] = None,
+        spent: Optional[Dict[int, float]] = None,
+        spent_before: float = 0.0,
+    ):
+        """
+        Initialize the coordinator.
+
+        Args:
+            worker: Module-level function run in each shard process as
+                `worker(channel, *worker_args)`
+            worker_args: Picklable arguments for the worker
+            units: Work units (see plan_units)
+            shards: Number of shard processes
+            priorities: book_id -> priority class, for the initial deal
+            max_restarts: Restarts of crashed shards allowed in total (default: shards)
+            poll_seconds: How often shard processes are checked for crashes
+            budget_usd: Spend limit across all shards (None: no limit)
+            spent: Spend already in each shard's ledger (earlier runs)
+            spent_before: Spend in the version's other ledgers
+        """
+        self.worker = worker
+        self.worker_args = worker_args
+        self.shards = shards
+        self.max_restarts = shards if max_restarts is None else max_restarts
+        self.poll_seconds = poll_seconds
+        self.context = multiprocessing.get_context("spawn")
+        self.requests = self.context.Queue()
+        self.queues = partition(units, shards, priorities)
+        self.orphans: Deque[WorkUnit] = deque()
+        self.processes: Dict[int, Any] = {}
+        self.responses: Dict[int, Any] = {}
+        # Units handed to a shard and not yet confirmed by its final report
+        self.handed: Dict[int, List[WorkUnit]] = {index: [] for index in range(shards)}
+        self.finished: set = set()
+        self.reports: Dict[int, Dict[str, Any]] = {}
+        self.budget_usd = budget_usd
+        self.spent = {index: (spent or {}).get(index, 0.0) for index in range(shards)}
+        self.spent_before = spent_before
+        self.stats = {"units": len(units), "stolen": 0, "requeued": 0, "restarts": 0, "budget_stopped": False}
+        self.shard_stats = {
+            index: {"units": 0, "weight": 0, "stolen": 0, "planned": sum(u.weight for u in self.queues[index])}
+            for index in range(shards)
+        }
+
+    # ------------------------------------------------------------------
+    # Units
+    # ------------------------------------------------------------------
+
+    def remaining(self, index: int) -> int:
+        return sum(unit.weight for unit in self.queues[index])
+
+    def next_unit(self, index: int) -> Optional[WorkUnit]:
+        """The shard's next unit: its own range, then re-queued units, then stolen work."""
+        if self.queues[index]:
+            return self.queues[index].popleft()
+        if self.orphans:
+            return self.orphans.popleft()
+        victim = max(range(self.shards), key=self.remaining)
+        if not self.queues[victim]:
+            return None
+        # From the far end of the victim's range, which it would reach last
+        unit = self.queues[victim].pop()
+        self.stats["stolen"] += 1
+        self.shard_stats[index]["stolen"] += 1
+        logger.info(
+            f"[shards] shard {index} idle: took book {unit.book_id} ({unit.weight} calls) from shard {victim}"
+        )
+        return unit
+
+    def has_work(self) -> bool:
+        return bool(self.orphans) or any(self.queues)
+
+    def spent_usd(self) -> float:
+        """Spend of the whole version, as last reported by the shards."""
+        return self.spent_before + sum(self.spent.values())
+
+    def budget_left(self) -> bool:
+        if self.budget_usd is None or self.spent_usd() < self.budget_usd:
+            return True
+        if not self.stats["budget_stopped"]:
+            self.stats["budget_stopped"] = True
+            logger.warning(
+                f"[shards] ${self.spent_usd():,.2f} spent of the ${self.budget_usd:,.2f} budget: "
+                f"no more units are handed out (raise COST_BUDGET_USD to continue)"
+            )
+        return False
+
+    # ------------------------------------------------------------------
+    # Processes
+    # ------------------------------------------------------------------
+
+    def spawn(self, index: int) -> None:
+        # A fresh reply queue, so a restarted shard never reads its predecessor's reply
+        self.responses[index] = self.context.Queue()
+        channel = ShardChannel(index, self.shards, self.requests, self.responses[index], self.shard_stats[index]["planned"])
+        process = self.context.Process(
+            target=self.worker, args=(channel, *self.worker_args), name=f"shard-{index}", daemon=False,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def reap(self) -> None:
+        """Handle exited shard processes: re-queue a crashed shard's units and restart it."""
+        exited = [
+            index for index, process in self.processes.items()
+            if index not in self.finished and not process.is_alive()
+        ]
+        if exited:
+            # A clean exit's final report may still be queued
+            self.drain()
+        for index in exited:
+            process = self.processes[index]
+            process.join()
+            if process.exitcode == 0 and index in self.reports:
+                self.finished.add(index)
+                continue
+            units = self.handed[index]
+            self.handed[index] = []
+            self.orphans.extend(units)
+            self.stats["requeued"] += len(units)
+            logger.error(f"[shards] shard {index} exited with code {process.exitcode}; re-queued {len(units)} units")
+            if self.has_work() and self.stats["restarts"] < self.max_restarts:
+                self.stats["restarts"] += 1
+                self.spawn(index)
+            else:
+                self.finished.add(index)
+
+    def handle(self, index: int, kind: str, payload: Any) -> None:
+        if kind == "next":
+            self.spent[index] = max(self.spent[index], payload)
+            unit = self.next_unit(index) if self.budget_left() else None
+            if unit is not None:
+                self.handed[index].append(unit)
+                self.shard_stats[index]["units"] += 1
+                self.shard_stats[index]["weight"] += unit.weight
+            self.responses[index].put((unit, self.spent_usd() - self.spent[index]))
+        elif kind == "report":
+            self.reports[index] = payload
+            self.handed[index] = []
+
+    def drain(self) -> None:
+        while True:
+            try:
+                self.handle(*self.requests.get_nowait())
+            except queue.Empty:
+                return
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run every shard to completion.
+
+        Returns:
+            Report with wall-clock time, rebalancing stats and each shard's
+            pipeline report
+        """
+        started = time.perf_counter()
+        logger.info(
+            f"[shards] {self.stats['units']} units across {self.shards} shards "
+            f"(planned calls per shard: {[s['planned'] for s in self.shard_stats.values()]})"
+        )
+        for index in range(self.shards):
+            self.spawn(index)
+        while len(self.finished) < self.shards:
+            try:
+                self.handle(*self.requests.get(timeout=self.poll_seconds))
+            except queue.Empty:
+                pass
+            self.reap()
+
+        wall_ms = int((time.perf_counter() - started) * 1000)
+        left = sum(unit.weight for unit in self.orphans) + sum(self.remaining(i) for i in range(self.shards))
+        if left:
+            logger.error(f"[shards] {left} calls left undone (shards crashed too often); they stay pending")
+        report = {
+            "wall_ms": wall_ms,
+            "shards": self.shards,
+            **self.stats,
+            "spent_usd": round(self.spent_usd(), 2),
+            "calls_left": left,
+            "per_shard": {
+                index: dict(self.shard_stats[index], report=self.reports.get(index))
+                for index in range(self.shards)
+            },
+        }
+        logger.info(
+            f"[shards] finished in {wall_ms / 1000:.1f}s: {self.stats['stolen']} units rebalanced, "
+            f"{self.stats['restarts']} restarts; calls per shard "
+            f"{[s['weight'] for s in self.shard_stats.values()]}"
+        )
+        return report
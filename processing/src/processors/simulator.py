@@ -0,0 +1,439 @@
+"""
+Capacity Simulator
+==================
+
+Discrete-event simulation of a live processing run
+(`process_hadiths.py --simulate`), for choosing batch sizes, worker counts
+and provider tiers before spending money. A full-corpus run simulates in
+seconds.
+
+What is replayed:
+- Workload: the real pending hadiths of the stage, each with its estimated
+  prompt size (`hadith_tokens` plus the stage's measured prompt overhead and
+  system prompt), its lane (long lane above PROMPT_USER_TOKEN_BUDGET) and,
+  for PCAP, whether the rule engine resolves it without the LLM
+- Batching and scheduling: batches of the stage's batch size run to
+  completion one after another, dealt by the real `WorkScheduler`
+  (longest first, work stealing, book priority classes)
+- Concurrency: the real `AIMDLimiter` on a simulated clock (or a fixed
+  PARALLEL_WORKERS window), plus the long lane's own workers
+- Retries: rate-limited calls back off `min(60, 4 x 2^attempt)` seconds and
+  fail after `max_attempts`, as in `run_attempts`
+
+Models (`StageProfile`, fitted from recorded cassettes with `--fit-cassette`,
+defaults from COST_ANALYSIS.md otherwise):
+- Latency: `base + per_output_token x output tokens`, times log-normal noise
+  fitted on the residuals
+- Output tokens: drawn from the recorded distribution
+- Prompt cache: share of the cacheable prefix (system prompt) read from the
+  cache rather than written
+- Provider tier: token buckets of RATE_LIMIT_RPM requests and
+  RATE_LIMIT_TPM uncached input + output tokens per minute; a call that
+  finds a bucket empty is rejected (429)
+
+Not modelled: hedging/failover to the secondary model, response caching,
+cascades and database write time.
+
+Output per stage: makespan, cost (pricing of LLM_PRIMARY_MODEL), calls,
+429s, mean concurrency and the limiting resource; for several stages, the
+bottleneck stage (longest makespan).
+
+Usage:
+------
+    simulator = CapacitySimulator(settings, fit_profiles(cassette_paths))
+    report = simulator.run(await Workload.build(processor, items), processor.priority_class)
+"""
+
+import heapq
+import math
+import random
+from collections import deque
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Callable, Deque
+
+from loguru import logger
+
+from config.settings import Settings
+from src.llm.cassette import Cassette
+from src.llm.compaction import estimate_tokens
+from src.llm.cost_tracker import pricing_for
+from src.llm.rate_limiter import AIMDLimiter
+from src.llm.token_budget import hadith_tokens
+from src.models.processing import ProcessingStage
+from .base_processor import BaseProcessor, WorkScheduler, WorkItem
+
+
+MIN_FIT_SAMPLES = 20
+
+# Hadiths sampled to measure a stage's prompt overhead over `hadith_tokens`
+OVERHEAD_SAMPLE = 50
+
+# A call rejected with 429 still takes a round trip
+REJECT_LATENCY_S = 0.3
+
+
+@dataclass
+class StageProfile:
+    """Latency, output size and cache behaviour of one stage's LLM calls."""
+    output_tokens: List[int]
+    latency_base_s: float
+    latency_per_output_token_s: float
+    latency_sigma: float
+    cache_hit_rate: float
+    samples: int = 0
+
+    def latency(self, output_tokens: int, rng: random.Random) -> float:
+        mean = self.latency_base_s + self.latency_per_output_token_s * output_tokens
+        return mean * math.exp(rng.gauss(-self.latency_sigma ** 2 / 2, self.latency_sigma))
+
+
+# COST_ANALYSIS.md estimates; ~50 output tokens/s
+DEFAULT_PROFILES: Dict[ProcessingStage, StageProfile] = {
+    ProcessingStage.PCAP_PROCESSING: StageProfile([1000], 1.5, 0.02, 0.35, 0.9),
+    ProcessingStage.HMSTS_PROCESSING: StageProfile([2000], 1.5, 0.02, 0.35, 0.9),
+}
+
+
+def fit_profiles(paths: List[Path]) -> Dict[ProcessingStage, StageProfile]:
+    """
+    Fit stage profiles from recorded cassettes (defaults for stages with too few records).
+
+    Latency is fitted by least squares on output tokens; the noise is the
+    spread of log(recorded / fitted). The cache hit rate is cache reads over
+    cache reads and writes.
+    """
+    calls: Dict[str, List[Dict[str, Any]]] = {}
+    for path in paths:
+        cassette = Cassette(path, "r")
+        try:
+            for record in cassette.records():
+                calls.setdefault(record["stage"], []).append(record["response"])
+        finally:
+            cassette.close()
+
+    profiles = dict(DEFAULT_PROFILES)
+    for stage in DEFAULT_PROFILES:
+        responses = [r for r in calls.get(stage.value, []) if r["latency_ms"] and r["output_tokens"]]
+        if len(responses) < MIN_FIT_SAMPLES:
+            logger.warning(
+                f"[simulate] {stage.value}: {len(responses)} recorded calls (< {MIN_FIT_SAMPLES}); "
+                f"using default latency/output assumptions"
+            )
+            continue
+        xs = [r["output_tokens"] for r in responses]
+        ys = [r["latency_ms"] / 1000 for r in responses]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        slope = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys, strict=True)) / var_x) if var_x else 0.0
+        base = max(0.05, mean_y - slope * mean_x)
+        residuals = [math.log(y / (base + slope * x)) for x, y in zip(xs, ys, strict=True)]
+        mean_r = sum(residuals) / len(residuals)
+        sigma = math.sqrt(sum((r - mean_r) ** 2 for r in residuals) / len(residuals))
+        reads = sum(r["cache_read_tokens"] for r in responses)
+        writes = sum(r["cache_write_tokens"] for r in responses)
+        profiles[stage] = StageProfile(
+            output_tokens=xs,
+            latency_base_s=base,
+            latency_per_output_token_s=slope,
+            latency_sigma=sigma,
+            cache_hit_rate=reads / (reads + writes) if reads + writes else 0.0,
+            samples=len(responses),
+        )
+        logger.info(
+            f"[simulate] {stage.value}: fitted on {len(responses)} calls: latency {base:.2f}s + "
+            f"{slope * 1000:.1f}ms/output token (sigma {sigma:.2f}), "
+            f"median output {sorted(xs)[len(xs) // 2]} tokens, cache hit rate {profiles[stage].cache_hit_rate:.0%}"
+        )
+    return profiles
+
+
+# ============================================================================
+# Workload
+# ============================================================================
+
+@dataclass
+class SimJob:
+    """One hadith's LLM work."""
+    prompt_tokens: int  # Uncacheable part of the prompt (user prompt)
+    long_lane: bool
+
+
+@dataclass
+class Workload:
+    """A stage's pending hadiths as seen by the scheduler and the provider."""
+    stage: ProcessingStage
+    items: List[WorkItem]
+    jobs: Dict[int, SimJob]
+    system_tokens: int
+    resolved_locally: int
+
+    @classmethod
+    async def build(cls, processor: BaseProcessor, items: List[WorkItem]) -> "Workload":
+        """Size every pending hadith (prompt overhead measured on a sample of real prompts)."""
+        sample = items[:: max(1, len(items) // OVERHEAD_SAMPLE)][:OVERHEAD_SAMPLE]
+        await processor.prepare(sample)
+        requests = [processor.build_request(hadith, pre) for hadith, pre in sample]
+        overhead = (
+            sum(estimate_tokens(r.user) - hadith_tokens(h, p) for r, (h, p) in zip(requests, sample, strict=True)) // len(sample)
+            if sample else 0
+        )
+        system_tokens = estimate_tokens(requests[0].system) if requests else 0
+        resolved, llm_items = processor.resolve_without_llm(items)
+        budget = processor.prompt_builder.user_token_budget
+        jobs = {}
+        for hadith, pre in llm_items:
+            tokens = hadith_tokens(hadith, pre)
+            long_lane = processor.prompt_builder.is_oversized(hadith, pre)
+            jobs[hadith.id] = SimJob(max(1, min(tokens, budget or tokens) + overhead), long_lane)
+        return cls(processor.stage, llm_items, jobs, system_tokens, len(resolved))
+
+
+# ============================================================================
+# Provider
+# ============================================================================
+
+class ProviderModel:
+    """Per-minute request and token buckets (continuous refill)."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm, self.tpm = rpm, tpm
+        self.requests, self.tokens = float(rpm), float(tpm)
+        self.updated = 0.0
+
+    def admit(self, now: float, tokens: int) -> Optional[str]:
+        """Take capacity for a call; returns the exhausted limit ("rpm"/"tpm") if rejected."""
+        elapsed, self.updated = now - self.updated, now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+        if self.requests < 1:
+            return "rpm"
+        if self.tokens < min(tokens, self.tpm):
+            return "tpm"
+        self.requests -= 1
+        self.tokens -= tokens
+        return None
+
+
+# ============================================================================
+# Simulation
+# ============================================================================
+
+class CapacitySimulator:
+    """
+    Event-driven replay of one live run per stage on a simulated clock.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        profiles: Optional[Dict[ProcessingStage, StageProfile]] = None,
+        max_attempts: int = 3,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            settings: Pipeline settings to simulate (batch sizes, concurrency, tier, model)
+            profiles: Stage profiles (defaults if None)
+            max_attempts: Attempts per hadith before it counts as failed
+            seed: Random seed (runs are reproducible)
+        """
+        self.settings = settings
+        self.profiles = profiles or DEFAULT_PROFILES
+        self.max_attempts = max_attempts
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.events: List[Tuple[float, int, Callable[[], None]]] = []
+        self.sequence = 0
+
+    def at(self, delay: float, action: Callable[[], None]) -> None:
+        self.sequence += 1
+        heapq.heappush(self.events, (self.now + delay, self.sequence, action))
+
+    def batch_size(self, stage: ProcessingStage) -> int:
+        if stage == ProcessingStage.PCAP_PROCESSING:
+            return self.settings.pcap_batch_size
+        return self.settings.hmsts_batch_size
+
+    def run(self, workload: Workload, priority: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Simulate a live run of the workload's stage.
+
+        Args:
+            workload: Sized pending hadiths
+            priority: Book priority class function (BaseProcessor.priority_class), if any
+
+        Returns:
+            Stage report (makespan, cost, limits hit, bottleneck)
+        """
+        settings = self.settings
+        stage = workload.stage
+        profile = self.profiles[stage]
+        price = pricing_for(settings.llm_primary_model)
+        provider = ProviderModel(settings.rate_limit_rpm, settings.rate_limit_tpm)
+        limiter = AIMDLimiter.from_settings(settings, clock=lambda: self.now) if settings.llm_adaptive_concurrency else None
+        cached = workload.system_tokens if settings.enable_prompt_caching else 0
+        stats = {
+            "calls": 0, "rejected_rpm": 0, "rejected_tpm": 0, "failed": 0, "succeeded": 0,
+            "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0,
+            "cost_usd": 0.0, "in_flight_seconds": 0.0, "window_seconds": 0.0, "batch_tail_seconds": 0.0, "batches": 0,
+        }
+        in_flight = 0
+        fixed_in_flight = 0  # Main-lane calls when the window is fixed (no limiter)
+        last_change = 0.0
+        waiting: Deque[Callable[[], None]] = deque()
+
+        def free_slots() -> int:
+            if limiter:
+                return limiter.window - limiter.in_flight
+            return settings.parallel_workers - fixed_in_flight
+
+        def track(delta: int) -> None:
+            nonlocal in_flight, last_change
+            stats["in_flight_seconds"] += in_flight * (self.now - last_change)
+            stats["window_seconds"] += (limiter.window if limiter else settings.parallel_workers) * (self.now - last_change)
+            in_flight += delta
+            last_change = self.now
+
+        def call(job: SimJob, attempt: int, done: Callable[[bool], None], use_window: bool) -> None:
+            nonlocal fixed_in_flight
+            started = self.now
+            if use_window:
+                if limiter:
+                    started = limiter.try_acquire()
+                elif free_slots() > 0:
+                    fixed_in_flight += 1
+                else:
+                    started = None
+                if started is None:
+                    waiting.append(lambda: call(job, attempt, done, use_window))
+                    return
+            track(1)
+            stats["calls"] += 1
+            output = self.rng.choice(profile.output_tokens)
+            reads = int(cached * profile.cache_hit_rate)
+            rejected = provider.admit(self.now, job.prompt_tokens + cached - reads + output)
+
+            def finish() -> None:
+                nonlocal fixed_in_flight
+                track(-1)
+                if use_window and limiter:
+                    limiter.release(started, "overload" if rejected else "ok")
+                elif use_window:
+                    fixed_in_flight -= 1
+                if rejected:
+                    stats[f"rejected_{rejected}"] += 1
+                    if attempt + 1 >= self.max_attempts:
+                        stats["failed"] += 1
+                        done(False)
+                    else:
+                        self.at(min(60, 4 * 2 ** attempt), lambda: call(job, attempt + 1, done, use_window))
+                else:
+                    stats["succeeded"] += 1
+                    stats["input_tokens"] += job.prompt_tokens
+                    stats["output_tokens"] += output
+                    stats["cache_read_tokens"] += reads
+                    stats["cache_write_tokens"] += cached - reads
+                    stats["cost_usd"] += (
+                        job.prompt_tokens * price.input + output * price.output
+                        + reads * price.cache_read + (cached - reads) * price.cache_write
+                    ) / 1_000_000
+                    done(True)
+                for _ in range(min(len(waiting), max(0, free_slots()))):
+                    waiting.popleft()()
+
+            self.at(REJECT_LATENCY_S if rejected else profile.latency(output, self.rng), finish)
+
+        items = workload.items
+        size = self.batch_size(stage)
+        # One log line per window cut would flood the output
+        logger.disable("src.llm.rate_limiter")
+        try:
+            for start in range(0, len(items), size):
+                batch = items[start:start + size]
+                main = [item for item in batch if not workload.jobs[item[0].id].long_lane]
+                long = [item for item in batch if workload.jobs[item[0].id].long_lane]
+                lanes = [
+                    (WorkScheduler(main, min(limiter.max_limit if limiter else settings.parallel_workers, len(main)),
+                                   None, priority), True),
+                    (WorkScheduler(long, min(settings.long_lane_workers, len(long)), None, priority), False),
+                ]
+                # When the last item was handed out (the batch's tail starts)
+                drained: List[float] = []
+                batch_started = self.now
+
+                def worker(scheduler: WorkScheduler, index: int, use_window: bool) -> None:
+                    # Workers above the current window wait for room before taking an item,
+                    # so queued work stays stealable (as in process_batch)
+                    if use_window and free_slots() <= 0 and len(scheduler):
+                        waiting.append(lambda: worker(scheduler, index, use_window))
+                        return
+                    item = scheduler.next(index)
+                    if item is None:
+                        drained.append(self.now)
+                        return
+                    call(workload.jobs[item[0].id], 0, lambda ok: worker(scheduler, index, use_window), use_window)
+
+                for scheduler, use_window in lanes:
+                    for index in range(len(scheduler.queues) if len(scheduler) else 0):
+                        worker(scheduler, index, use_window)
+                while self.events:
+                    self.now, _, action = heapq.heappop(self.events)
+                    action()
+                stats["batches"] += 1
+                if drained:
+                    stats["batch_tail_seconds"] += self.now - min(drained)
+                logger.debug(f"[simulate] {stage.value} batch {stats['batches']}: {self.now - batch_started:.1f}s")
+        finally:
+            logger.enable("src.llm.rate_limiter")
+
+        makespan = self.now
+        ceiling = limiter.max_limit if limiter else settings.parallel_workers
+        mean_in_flight = stats["in_flight_seconds"] / makespan if makespan else 0.0
+        mean_window = stats["window_seconds"] / makespan if makespan else 0.0
+        report = {
+            "stage": stage.value,
+            "hadiths": len(items) + workload.resolved_locally,
+            "resolved_without_llm": workload.resolved_locally,
+            "makespan_hours": round(makespan / 3600, 2),
+            "cost_usd": round(stats["cost_usd"], 2),
+            "cost_per_hadith_usd": round(stats["cost_usd"] / max(1, stats["succeeded"]), 5),
+            "mean_in_flight": round(mean_in_flight, 1),
+            "mean_window": round(mean_window, 1),
+            "peak_window": limiter.stats["peak_window"] if limiter else settings.parallel_workers,
+            "concurrency_decreases": limiter.stats["decreases"] if limiter else 0,
+            "latency_spikes": limiter.stats["latency_spikes"] if limiter else 0,
+            **{k: v for k, v in stats.items() if k not in ("cost_usd", "in_flight_seconds", "window_seconds")},
+            "batch_tail_seconds": round(stats["batch_tail_seconds"], 1),
+            "bottleneck": self.bottleneck(stats, mean_window, ceiling, makespan),
+            "profile": {k: v for k, v in asdict(profile).items() if k != "output_tokens"},
+        }
+        self.now = 0.0
+        return report
+
+    def bottleneck(self, stats: Dict[str, Any], mean_window: float, ceiling: int, makespan: float) -> str:
+        """The resource that limited throughput."""
+        rejected = stats["rejected_rpm"] + stats["rejected_tpm"]
+        if stats["calls"] and rejected / stats["calls"] > 0.02:
+            limit = "RATE_LIMIT_TPM" if stats["rejected_tpm"] >= stats["rejected_rpm"] else "RATE_LIMIT_RPM"
+            return f"provider rate limit ({limit})"
+        if mean_window >= 0.9 * ceiling:
+            return "concurrency ceiling (LLM_CONCURRENCY_MAX)" if self.settings.llm_adaptive_concurrency \
+                else "fixed concurrency (PARALLEL_WORKERS)"
+        if makespan and stats["batch_tail_seconds"] / makespan > 0.2:
+            return "batch barriers (batches waiting on their slowest calls; raise the batch size)"
+        if self.settings.llm_adaptive_concurrency and mean_window < 0.5 * ceiling:
+            return "adaptive window held down by latency spikes (LLM_LATENCY_SPIKE_RATIO)"
+        return "LLM latency"
+
+
+def summarize(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals over the simulated stages (run one after another) and the bottleneck stage."""
+    slowest = max(reports, key=lambda r: r["makespan_hours"])
+    return {
+        "makespan_hours": round(sum(r["makespan_hours"] for r in reports), 2),
+        "cost_usd": round(sum(r["cost_usd"] for r in reports), 2),
+        "bottleneck_stage": slowest["stage"],
+        "bottleneck": slowest["bottleneck"],
+        "stages": reports,
+    }
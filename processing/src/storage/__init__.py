@@ -0,0 +1,20 @@
+"""
+Storage Layer
+=============
+
+Usage:
+------
+    from src.storage import PostgresStorage, RedisWorkQueue
+"""
+
+from .postgres import PostgresStorage, STAGE_TABLES
+from .redis_cache import RedisWorkQueue, Lease
+from .writer import WriteBehindWriter
+
+__all__ = [
+    "PostgresStorage",
+    "STAGE_TABLES",
+    "RedisWorkQueue",
+    "Lease",
+    "WriteBehindWriter",
+]
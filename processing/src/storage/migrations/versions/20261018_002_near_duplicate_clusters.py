@@ -0,0 +1,66 @@
+"""Near-duplicate clusters and fan-out provenance
+
+Revision ID: 002_near_duplicate_clusters
+Revises: 001_initial
+Create Date: 2026-10-18
+
+Changes:
+1. hadith_clusters - MinHash/LSH near-duplicate cluster memberships
+2. pcap_assignments.derived_from_hadith_id - set when a row was fanned out
+   from its cluster representative instead of processed by the LLM
+3. hmsts_tags.derived_from_hadith_id - same for HMSTS
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_near_duplicate_clusters'
+down_revision = '001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create hadith_clusters and add provenance columns."""
+
+    # ========================================================================
+    # TABLE: hadith_clusters - near-duplicate cluster memberships
+    # ========================================================================
+    op.create_table(
+        'hadith_clusters',
+        sa.Column('hadith_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.String(20), server_default=sa.text("'v1.0'"), nullable=False),
+        sa.Column('representative_hadith_id', sa.Integer(), nullable=False),
+        sa.Column('similarity', sa.Numeric(4, 3), nullable=False),
+        sa.Column('method', sa.String(50), server_default=sa.text("'minhash_lsh'"), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.PrimaryKeyConstraint('hadith_id', 'version'),
+        sa.ForeignKeyConstraint(['hadith_id'], ['raw_hadiths.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['representative_hadith_id'], ['raw_hadiths.id'], ondelete='CASCADE'),
+        sa.CheckConstraint('hadith_id != representative_hadith_id', name='check_cluster_member_not_representative'),
+        sa.CheckConstraint('similarity >= 0 AND similarity <= 1', name='check_cluster_similarity_range')
+    )
+    op.create_index('idx_clusters_representative', 'hadith_clusters', ['representative_hadith_id', 'version'])
+
+    # ========================================================================
+    # Provenance of fanned-out results
+    # ========================================================================
+    for table in ('pcap_assignments', 'hmsts_tags'):
+        op.add_column(table, sa.Column('derived_from_hadith_id', sa.Integer(), nullable=True))
+        op.create_foreign_key(
+            f'fk_{table}_derived_from', table, 'raw_hadiths',
+            ['derived_from_hadith_id'], ['id'], ondelete='SET NULL'
+        )
+        op.create_index(
+            f'idx_{table}_derived_from', table, ['derived_from_hadith_id'],
+            postgresql_where=sa.text('derived_from_hadith_id IS NOT NULL')
+        )
+
+
+def downgrade() -> None:
+    """Drop provenance columns and hadith_clusters."""
+    for table in ('pcap_assignments', 'hmsts_tags'):
+        op.drop_index(f'idx_{table}_derived_from', table_name=table)
+        op.drop_constraint(f'fk_{table}_derived_from', table, type_='foreignkey')
+        op.drop_column(table, 'derived_from_hadith_id')
+    op.drop_table('hadith_clusters')
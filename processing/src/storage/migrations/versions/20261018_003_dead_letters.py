@@ -0,0 +1,53 @@
+"""Dead-letter store for failed hadiths
+
+Revision ID: 003_dead_letters
+Revises: 002_near_duplicate_clusters
+Create Date: 2026-10-18
+
+Changes:
+1. dead_letters - hadiths whose PCAP/HMSTS processing failed, with the
+   error class and prompt hash of the last failure, for targeted retries
+   (process_hadiths.py --retry-failed)
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_dead_letters'
+down_revision = '002_near_duplicate_clusters'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Create dead_letters."""
+
+    # ========================================================================
+    # TABLE: dead_letters - failed hadiths per stage/version
+    # ========================================================================
+    op.create_table(
+        'dead_letters',
+        sa.Column('hadith_id', sa.Integer(), nullable=False),
+        sa.Column('stage', sa.String(50), nullable=False),
+        sa.Column('version', sa.String(20), server_default=sa.text("'v1.0'"), nullable=False),
+        sa.Column('error_class', sa.String(100), nullable=False),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('prompt_hash', sa.String(32), nullable=True),
+        sa.Column('failures', sa.Integer(), server_default=sa.text('1'), nullable=False),
+        sa.Column('first_failed_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('last_failed_at', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+        sa.Column('resolved_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('hadith_id', 'stage', 'version'),
+        sa.ForeignKeyConstraint(['hadith_id'], ['raw_hadiths.id'], ondelete='CASCADE'),
+        sa.CheckConstraint('failures >= 1', name='check_dead_letter_failures_positive')
+    )
+    op.create_index(
+        'idx_dead_letters_open', 'dead_letters', ['stage', 'version', 'error_class'],
+        postgresql_where=sa.text('resolved_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Drop dead_letters."""
+    op.drop_index('idx_dead_letters_open', table_name='dead_letters')
+    op.drop_table('dead_letters')
@@ -0,0 +1,738 @@
+"""
+PostgreSQL Storage
+==================
+
+Read/write access to the processing tables.
+
+Features:
+- Fetch hadiths still pending for a stage/version (with preprocessing joined)
+- Upsert PCAP assignments into pcap_assignments
+- Upsert HMSTS assignments into hmsts_tags
+- Read/write near-duplicate clusters (hadith_clusters)
+- Read temporal markers (PCAP rule engine)
+- Read validation flags / write validation_results (cross-model validation)
+- Record, list and resolve failed hadiths (dead_letters)
+- Per-book completion counts and joined per-book export rows (publication)
+- PCAP/HMSTS upserts are multi-row INSERT ... VALUES (...), (...) statements
+  (psycopg2 `execute_values`, up to `UPSERT_PAGE_SIZE` rows per statement),
+  so a batch costs one round-trip per page rather than one per row
+"""
+
+import json
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set
+
+from psycopg2.extras import execute_values
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from loguru import logger
+
+from config.settings import get_settings
+from src.models.hadith import RawHadith, PreprocessedHadith
+from src.models.temporal import PCAPAssignment, TemporalMarker
+from src.models.semantic import HMSTSAssignment
+from src.models.validation import ValidationResult
+from src.models.processing import ProcessingStage, DeadLetter
+
+
+# Output table per LLM stage
+STAGE_TABLES = {
+    ProcessingStage.PCAP_PROCESSING: "pcap_assignments",
+    ProcessingStage.HMSTS_PROCESSING: "hmsts_tags",
+}
+
+RAW_COLUMNS = [
+    "id", "id_in_book", "book_id", "chapter_id", "arabic", "english_narrator",
+    "english_text", "book_name_arabic", "book_name_english", "chapter_name_arabic",
+    "chapter_name_english", "source_file", "loaded_at",
+]
+
+PREPROCESSED_COLUMNS = [
+    "hadith_id", "arabic_normalized", "english_normalized", "isnad_chain",
+    "isnad_generation", "explicit_temporal_references", "explicit_person_references",
+    "text_length_arabic", "text_length_english", "has_explicit_date",
+    "processed_at", "preprocessing_version",
+]
+
+PCAP_COLUMNS = [
+    "hadith_id", "version", "era_id", "sub_era_id", "event_window_id",
+    "earliest_ah", "latest_ah", "earliest_ce", "latest_ce",
+    "anchor_before", "anchor_after", "evidence_type", "posterior_confidence",
+    "reasoning", "llm_model", "llm_cost_usd", "processing_duration_ms",
+    "derived_from_hadith_id",
+]
+
+HMSTS_COLUMNS = [
+    "hadith_id", "version", "layer0_speaker", "layer0_addressee", "layer0_verb_type",
+    "layer0_modality", "layer1_categories", "layer2_role", "layer3_axis_a",
+    "layer3_axis_b", "layer4_vectors", "llm_model", "llm_cost_usd",
+    "processing_duration_ms", "semantic_completeness_score", "derived_from_hadith_id",
+]
+
+HMSTS_JSONB_COLUMNS = {"layer3_axis_a", "layer3_axis_b", "layer4_vectors"}
+
+VALIDATION_COLUMNS = [
+    "hadith_id", "version", "validation_type", "validation_category", "status",
+    "issues", "quality_score", "temporal_confidence", "semantic_completeness",
+    "validation_pass_rate", "validator_version",
+]
+
+# Rows per multi-row upsert statement
+UPSERT_PAGE_SIZE = 1000
+
+DEAD_LETTER_COLUMNS = [
+    "hadith_id", "stage", "version", "error_class", "error_message", "prompt_hash",
+    "failures", "first_failed_at", "last_failed_at", "resolved_at",
+]
+
+
+def _upsert_sql(table: str, columns: List[str], jsonb_columns: Iterable[str] = ()) -> Tuple[str, str]:
+    """
+    Build a multi-row INSERT ... ON CONFLICT (hadith_id, version) DO UPDATE statement.
+
+    Returns:
+        Tuple of (statement with a single `VALUES %s`, per-row template) for `execute_values`
+    """
+    jsonb = set(jsonb_columns)
+    template = "(" + ", ".join(
+        f"CAST(%({c})s AS JSONB)" if c in jsonb else f"%({c})s" for c in columns
+    ) + ")"
+    updates = ", ".join(
+        f"{c} = EXCLUDED.{c}" for c in columns if c not in ("hadith_id", "version")
+    )
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+        f"ON CONFLICT (hadith_id, version) DO UPDATE SET {updates}, "
+        f"updated_at = CURRENT_TIMESTAMP"
+    )
+    return sql, template
+
+
+class PostgresStorage:
+    """
+    Storage layer for pipeline inputs and LLM outputs.
+    """
+
+    def __init__(self, database_url: Optional[str] = None):
+        """
+        Initialize storage.
+
+        Args:
+            database_url: PostgreSQL connection string (uses settings if not provided)
+        """
+        self.database_url = database_url or get_settings().database_url
+        if self.database_url.startswith("postgresql://"):
+            # Upserts use psycopg2's execute_values (SQLAlchemy 2.1 defaults to psycopg 3)
+            self.database_url = "postgresql+psycopg2://" + self.database_url[len("postgresql://"):]
+        self.engine = create_engine(self.database_url, echo=False, pool_pre_ping=True)
+        self.SessionLocal = sessionmaker(bind=self.engine)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def fetch_pending_hadiths(
+        self,
+        stage: ProcessingStage,
+        version: str = "v1.0",
+        limit: Optional[int] = None,
+        hadith_ids: Optional[List[int]] = None,
+    ) -> List[Tuple[RawHadith, Optional[PreprocessedHadith]]]:
+        """
+        Fetch hadiths that have no output row for a stage/version yet.
+
+        Args:
+            stage: PCAP_PROCESSING or HMSTS_PROCESSING
+            version: Processing version
+            limit: Maximum number of hadiths to return
+            hadith_ids: Restrict to these hadith IDs
+
+        Returns:
+            List of (RawHadith, PreprocessedHadith or None) ordered by ID
+        """
+        table = STAGE_TABLES[stage]
+        raw_cols = ", ".join(f"r.{c}" for c in RAW_COLUMNS)
+        pre_cols = ", ".join(f"p.{c}" for c in PREPROCESSED_COLUMNS)
+        sql = f"""
+            SELECT {raw_cols}, {pre_cols}
+            FROM raw_hadiths r
+            LEFT JOIN preprocessed_hadiths p ON p.hadith_id = r.id
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {table} o WHERE o.hadith_id = r.id AND o.version = :version
+            )
+        """
+        params: Dict[str, Any] = {"version": version}
+        if hadith_ids is not None:
+            sql += " AND r.id = ANY(:hadith_ids)"
+            params["hadith_ids"] = list(hadith_ids)
+        sql += " ORDER BY r.id"
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text(sql), params).fetchall()
+        finally:
+            session.close()
+        return self._work_items(rows)
+
+    def fetch_pending_ids(
+        self,
+        stage: ProcessingStage,
+        version: str = "v1.0",
+        limit: Optional[int] = None,
+    ) -> Dict[int, List[int]]:
+        """
+        IDs of hadiths that have no output row for a stage/version yet, by book.
+
+        Returns:
+            Mapping of book_id -> hadith IDs in ID order
+        """
+        sql = f"""
+            SELECT r.book_id, r.id
+            FROM raw_hadiths r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {STAGE_TABLES[stage]} o WHERE o.hadith_id = r.id AND o.version = :version
+            )
+            ORDER BY r.id
+        """
+        params: Dict[str, Any] = {"version": version}
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = limit
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text(sql), params).fetchall()
+        finally:
+            session.close()
+        pending: Dict[int, List[int]] = {}
+        for book_id, hadith_id in rows:
+            pending.setdefault(book_id, []).append(hadith_id)
+        return pending
+
+    def fetch_hadiths(self, hadith_ids: List[int]) -> List[Tuple[RawHadith, Optional[PreprocessedHadith]]]:
+        """
+        Fetch hadiths (with preprocessing) by ID, whether processed or not.
+
+        Returns:
+            List of (RawHadith, PreprocessedHadith or None) ordered by ID
+        """
+        if not hadith_ids:
+            return []
+        raw_cols = ", ".join(f"r.{c}" for c in RAW_COLUMNS)
+        pre_cols = ", ".join(f"p.{c}" for c in PREPROCESSED_COLUMNS)
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(
+                text(f"""
+                    SELECT {raw_cols}, {pre_cols}
+                    FROM raw_hadiths r
+                    LEFT JOIN preprocessed_hadiths p ON p.hadith_id = r.id
+                    WHERE r.id = ANY(:hadith_ids)
+                    ORDER BY r.id
+                """),
+                {"hadith_ids": list(hadith_ids)},
+            ).fetchall()
+        finally:
+            session.close()
+        return self._work_items(rows)
+
+    @staticmethod
+    def _work_items(rows) -> List[Tuple[RawHadith, Optional[PreprocessedHadith]]]:
+        """Split joined raw/preprocessed rows into model pairs."""
+        results = []
+        n_raw = len(RAW_COLUMNS)
+        for row in rows:
+            raw = RawHadith(**dict(zip(RAW_COLUMNS, row[:n_raw], strict=True)))
+            pre_values = dict(zip(PREPROCESSED_COLUMNS, row[n_raw:], strict=True))
+            preprocessed = None
+            if pre_values["hadith_id"] is not None:
+                pre_values["has_explicit_date"] = bool(pre_values["has_explicit_date"])
+                if pre_values["preprocessing_version"] is None:
+                    pre_values.pop("preprocessing_version")
+                preprocessed = PreprocessedHadith(**pre_values)
+            results.append((raw, preprocessed))
+        return results
+
+    def fetch_pcap_assignments(
+        self,
+        hadith_ids: Optional[List[int]],
+        version: str = "v1.0",
+    ) -> Dict[int, PCAPAssignment]:
+        """
+        Fetch PCAP assignments for the given hadiths (used as HMSTS context).
+
+        Args:
+            hadith_ids: Hadiths to fetch (all of the version's rows if None)
+            version: Processing version
+
+        Returns:
+            Mapping of hadith_id -> PCAPAssignment
+        """
+        if hadith_ids is not None and not hadith_ids:
+            return {}
+        sql = f"""
+            SELECT id, {', '.join(PCAP_COLUMNS)}, created_at, updated_at
+            FROM pcap_assignments
+            WHERE version = :version
+        """
+        params: Dict[str, Any] = {"version": version}
+        if hadith_ids is not None:
+            sql += " AND hadith_id = ANY(:hadith_ids)"
+            params["hadith_ids"] = list(hadith_ids)
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text(sql), params).mappings().fetchall()
+        finally:
+            session.close()
+
+        assignments = {}
+        for row in rows:
+            data = dict(row)
+            data["anchor_before"] = data["anchor_before"] or []
+            data["anchor_after"] = data["anchor_after"] or []
+            assignments[data["hadith_id"]] = PCAPAssignment(**data)
+        return assignments
+
+    def fetch_temporal_markers(self) -> List[TemporalMarker]:
+        """Fetch all temporal_markers rows."""
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text("SELECT * FROM temporal_markers ORDER BY event_id")).mappings().fetchall()
+        finally:
+            session.close()
+        return [TemporalMarker(**dict(row)) for row in rows]
+
+    def count_validation_flags(self, version: str = "v1.0", exclude_type: Optional[str] = None) -> Dict[int, int]:
+        """
+        Count warning/fail validation_results rows per hadith.
+
+        Args:
+            version: Processing version
+            exclude_type: validation_type whose rows are not counted
+
+        Returns:
+            Mapping of hadith_id -> number of flagged validations
+        """
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(
+                text("""
+                    SELECT hadith_id, COUNT(*)
+                    FROM validation_results
+                    WHERE version = :version AND status IN ('warning', 'fail')
+                      AND validation_type IS DISTINCT FROM :exclude_type
+                    GROUP BY hadith_id
+                """),
+                {"version": version, "exclude_type": exclude_type},
+            ).fetchall()
+        finally:
+            session.close()
+        return {row[0]: row[1] for row in rows}
+
+    def fetch_validated_ids(self, validation_type: str, version: str = "v1.0") -> Set[int]:
+        """IDs of hadiths that already have a validation_results row of this type."""
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(
+                text("""
+                    SELECT DISTINCT hadith_id FROM validation_results
+                    WHERE version = :version AND validation_type = :validation_type
+                """),
+                {"version": version, "validation_type": validation_type},
+            ).fetchall()
+        finally:
+            session.close()
+        return {row[0] for row in rows}
+
+    def fetch_validation_statuses(self, hadith_ids: List[int], version: str = "v1.0") -> Dict[int, Dict[str, str]]:
+        """Mapping of hadith_id -> {validation_type: status} for the given hadiths."""
+        if not hadith_ids:
+            return {}
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(
+                text("""
+                    SELECT hadith_id, validation_type, status FROM validation_results
+                    WHERE version = :version AND hadith_id = ANY(:hadith_ids)
+                """),
+                {"version": version, "hadith_ids": list(hadith_ids)},
+            ).fetchall()
+        finally:
+            session.close()
+        statuses: Dict[int, Dict[str, str]] = {}
+        for hadith_id, validation_type, status in rows:
+            statuses.setdefault(hadith_id, {})[validation_type] = status
+        return statuses
+
+    def fetch_book_progress(
+        self,
+        version: str = "v1.0",
+        book_ids: Optional[List[int]] = None,
+    ) -> Dict[int, Dict[str, int]]:
+        """
+        Count each book's hadiths and its stored rows per LLM stage.
+
+        Args:
+            version: Processing version
+            book_ids: Books to count (all if None)
+
+        Returns:
+            Mapping of book_id -> {"total": n, stage value: rows stored}
+        """
+        tables = list(STAGE_TABLES.items())
+        counts = ", ".join(f"COUNT(t{i}.hadith_id) AS {stage.value}" for i, (stage, _) in enumerate(tables))
+        joins = " ".join(
+            f"LEFT JOIN {table} t{i} ON t{i}.hadith_id = r.id AND t{i}.version = :version"
+            for i, (_, table) in enumerate(tables)
+        )
+        sql = f"SELECT r.book_id, COUNT(*) AS total, {counts} FROM raw_hadiths r {joins}"
+        params: Dict[str, Any] = {"version": version}
+        if book_ids is not None:
+            sql += " WHERE r.book_id = ANY(:book_ids)"
+            params["book_ids"] = list(book_ids)
+        sql += " GROUP BY r.book_id ORDER BY r.book_id"
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text(sql), params).mappings().fetchall()
+        finally:
+            session.close()
+        return {row["book_id"]: {k: v for k, v in row.items() if k != "book_id"} for row in rows}
+
+    def fetch_book_export(self, book_id: int, version: str = "v1.0") -> List[Dict[str, Any]]:
+        """
+        Hadiths of a book with both stored assignments (PCAP and HMSTS), in book order.
+
+        Returns:
+            One dict per hadith with identifying fields plus `pcap` and `hmsts` row objects
+        """
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(
+                text("""
+                    SELECT r.id AS hadith_id, r.book_id, r.id_in_book, r.chapter_id,
+                           r.book_name_english, r.chapter_name_english,
+                           to_jsonb(p) - 'id' - 'hadith_id' - 'version' AS pcap,
+                           to_jsonb(h) - 'id' - 'hadith_id' - 'version' AS hmsts
+                    FROM raw_hadiths r
+                    JOIN pcap_assignments p ON p.hadith_id = r.id AND p.version = :version
+                    JOIN hmsts_tags h ON h.hadith_id = r.id AND h.version = :version
+                    WHERE r.book_id = :book_id
+                    ORDER BY r.id_in_book
+                """),
+                {"book_id": book_id, "version": version},
+            ).mappings().fetchall()
+        finally:
+            session.close()
+        return [dict(row) for row in rows]
+
+    def fetch_dead_letters(
+        self,
+        stage: ProcessingStage,
+        version: str = "v1.0",
+        error_classes: Optional[List[str]] = None,
+    ) -> List[DeadLetter]:
+        """
+        Fetch unresolved dead letters whose hadith still has no output row.
+
+        Args:
+            stage: PCAP_PROCESSING or HMSTS_PROCESSING
+            version: Processing version
+            error_classes: Restrict to these error classes (all if None)
+
+        Returns:
+            Dead letters ordered by hadith ID
+        """
+        table = STAGE_TABLES[stage]
+        sql = f"""
+            SELECT {', '.join(f'd.{c}' for c in DEAD_LETTER_COLUMNS)}
+            FROM dead_letters d
+            WHERE d.stage = :stage AND d.version = :version AND d.resolved_at IS NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM {table} t WHERE t.hadith_id = d.hadith_id AND t.version = d.version
+              )
+        """
+        params: Dict[str, Any] = {"stage": stage.value, "version": version}
+        if error_classes:
+            sql += " AND d.error_class = ANY(:error_classes)"
+            params["error_classes"] = list(error_classes)
+        sql += " ORDER BY d.hadith_id"
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text(sql), params).fetchall()
+        finally:
+            session.close()
+        return [DeadLetter(**dict(zip(DEAD_LETTER_COLUMNS, row, strict=True))) for row in rows]
+
+    def fetch_normalized_texts(self) -> List[Tuple[int, str]]:
+        """
+        Fetch normalized Arabic text for near-duplicate clustering.
+
+        Returns:
+            List of (hadith_id, arabic_normalized) ordered by ID
+        """
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(text("""
+                SELECT hadith_id, arabic_normalized
+                FROM preprocessed_hadiths
+                WHERE arabic_normalized IS NOT NULL AND arabic_normalized != ''
+                ORDER BY hadith_id
+            """)).fetchall()
+        finally:
+            session.close()
+        return [(row[0], row[1]) for row in rows]
+
+    def fetch_duplicate_clusters(self, version: str = "v1.0") -> Dict[int, List[int]]:
+        """
+        Fetch near-duplicate clusters.
+
+        Returns:
+            Mapping of representative hadith_id -> member hadith_ids
+        """
+        session = self.SessionLocal()
+        try:
+            rows = session.execute(
+                text("""
+                    SELECT representative_hadith_id, hadith_id
+                    FROM hadith_clusters
+                    WHERE version = :version
+                    ORDER BY representative_hadith_id, hadith_id
+                """),
+                {"version": version},
+            ).fetchall()
+        finally:
+            session.close()
+
+        clusters: Dict[int, List[int]] = {}
+        for representative, member in rows:
+            clusters.setdefault(representative, []).append(member)
+        return clusters
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def save_duplicate_clusters(
+        self,
+        clusters: Dict[int, List[Tuple[int, float]]],
+        version: str = "v1.0",
+    ) -> int:
+        """
+        Replace the stored near-duplicate clusters for a version.
+
+        Args:
+            clusters: representative -> [(member, similarity), ...]
+            version: Cluster set version
+
+        Returns:
+            Number of memberships written
+        """
+        rows = [
+            {"hadith_id": member, "version": version,
+             "representative_hadith_id": representative, "similarity": similarity}
+            for representative, members in clusters.items()
+            for member, similarity in members
+        ]
+        session = self.SessionLocal()
+        try:
+            session.execute(text("DELETE FROM hadith_clusters WHERE version = :version"), {"version": version})
+            if rows:
+                session.execute(
+                    text("""
+                        INSERT INTO hadith_clusters (hadith_id, version, representative_hadith_id, similarity)
+                        VALUES (:hadith_id, :version, :representative_hadith_id, :similarity)
+                    """),
+                    rows,
+                )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return len(rows)
+
+    @staticmethod
+    def pcap_row(assignment: PCAPAssignment) -> Dict[str, Any]:
+        """Convert a PCAPAssignment into upsert parameters."""
+        row = {c: getattr(assignment, c) for c in PCAP_COLUMNS}
+        row["evidence_type"] = assignment.evidence_type.value
+        return row
+
+    @staticmethod
+    def hmsts_row(assignment: HMSTSAssignment) -> Dict[str, Any]:
+        """Convert an HMSTSAssignment into upsert parameters."""
+        row = {c: getattr(assignment, c) for c in HMSTS_COLUMNS}
+        row["layer0_modality"] = assignment.layer0_modality.value if assignment.layer0_modality else None
+        row["layer2_role"] = assignment.layer2_role.value
+        for column in HMSTS_JSONB_COLUMNS:
+            if row[column] is not None:
+                row[column] = json.dumps(row[column], ensure_ascii=False, default=str)
+        return row
+
+    def _upsert_many(self, statement: Tuple[str, str], rows: List[Dict[str, Any]]) -> int:
+        """
+        Upsert rows with multi-row statements in a single transaction.
+
+        Rows for the same (hadith_id, version) are coalesced (last one wins):
+        one statement may not update a row twice.
+        """
+        rows = list({(row["hadith_id"], row["version"]): row for row in rows}.values())
+        if not rows:
+            return 0
+        sql, template = statement
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                execute_values(cursor, sql, rows, template=template, page_size=UPSERT_PAGE_SIZE)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        return len(rows)
+
+    def save_validation_results(self, results: List[ValidationResult]) -> int:
+        """
+        Write validation results, replacing earlier rows of the same
+        hadith/version/validation_type.
+
+        Returns:
+            Number of rows written
+        """
+        if not results:
+            return 0
+        keys = [
+            {"hadith_id": r.hadith_id, "version": r.version, "validation_type": r.validation_type}
+            for r in results
+        ]
+        rows = [
+            {
+                **{c: getattr(r, c) for c in VALIDATION_COLUMNS},
+                "validation_category": r.validation_category.value,
+                "status": r.status.value,
+                "issues": json.dumps(r.issues, ensure_ascii=False, default=str) if r.issues is not None else None,
+            }
+            for r in results
+        ]
+        session = self.SessionLocal()
+        try:
+            session.execute(
+                text("""
+                    DELETE FROM validation_results
+                    WHERE hadith_id = :hadith_id AND version = :version AND validation_type = :validation_type
+                """),
+                keys,
+            )
+            session.execute(
+                text(
+                    f"INSERT INTO validation_results ({', '.join(VALIDATION_COLUMNS)}) VALUES ("
+                    + ", ".join("CAST(:issues AS JSONB)" if c == "issues" else f":{c}" for c in VALIDATION_COLUMNS)
+                    + ")"
+                ),
+                rows,
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        logger.debug(f"Saved {len(rows)} validation results")
+        return len(rows)
+
+    def save_pcap_assignments(self, assignments: List[PCAPAssignment]) -> int:
+        """
+        Upsert PCAP assignments.
+
+        Returns:
+            Number of rows written
+        """
+        written = self._upsert_many(
+            _upsert_sql("pcap_assignments", PCAP_COLUMNS),
+            [self.pcap_row(a) for a in assignments],
+        )
+        logger.debug(f"Saved {written} PCAP assignments")
+        return written
+
+    def save_hmsts_assignments(self, assignments: List[HMSTSAssignment]) -> int:
+        """
+        Upsert HMSTS assignments.
+
+        Returns:
+            Number of rows written
+        """
+        written = self._upsert_many(
+            _upsert_sql("hmsts_tags", HMSTS_COLUMNS, HMSTS_JSONB_COLUMNS),
+            [self.hmsts_row(a) for a in assignments],
+        )
+        logger.debug(f"Saved {written} HMSTS assignments")
+        return written
+
+    def save_dead_letters(self, letters: List[DeadLetter]) -> int:
+        """
+        Record failures; a hadith failing again has its count incremented and is reopened.
+
+        Returns:
+            Number of rows written
+        """
+        if not letters:
+            return 0
+        columns = DEAD_LETTER_COLUMNS[:-1]  # resolved_at stays NULL
+        rows = [{**{c: getattr(d, c) for c in columns}, "stage": d.stage.value} for d in letters]
+        session = self.SessionLocal()
+        try:
+            session.execute(
+                text(f"""
+                    INSERT INTO dead_letters ({', '.join(columns)})
+                    VALUES ({', '.join(f':{c}' for c in columns)})
+                    ON CONFLICT (hadith_id, stage, version) DO UPDATE SET
+                        error_class = EXCLUDED.error_class,
+                        error_message = EXCLUDED.error_message,
+                        prompt_hash = EXCLUDED.prompt_hash,
+                        failures = dead_letters.failures + 1,
+                        last_failed_at = EXCLUDED.last_failed_at,
+                        resolved_at = NULL
+                """),
+                rows,
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        logger.debug(f"Recorded {len(rows)} dead letters")
+        return len(rows)
+
+    def resolve_dead_letters(self, stage: ProcessingStage, hadith_ids: List[int], version: str = "v1.0") -> int:
+        """Mark dead letters of hadiths that have since been stored as resolved."""
+        if not hadith_ids:
+            return 0
+        session = self.SessionLocal()
+        try:
+            result = session.execute(
+                text("""
+                    UPDATE dead_letters SET resolved_at = CURRENT_TIMESTAMP
+                    WHERE stage = :stage AND version = :version
+                      AND hadith_id = ANY(:hadith_ids) AND resolved_at IS NULL
+                """),
+                {"stage": stage.value, "version": version, "hadith_ids": list(hadith_ids)},
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        return result.rowcount
+
+    def save_assignments(self, stage: ProcessingStage, assignments: List[Any]) -> int:
+        """Upsert assignments for the given stage."""
+        if stage == ProcessingStage.PCAP_PROCESSING:
+            return self.save_pcap_assignments(assignments)
+        if stage == ProcessingStage.HMSTS_PROCESSING:
+            return self.save_hmsts_assignments(assignments)
+        raise ValueError(f"No output table for stage {stage.value}")
@@ -0,0 +1,301 @@
+"""
+Redis Work Queue
+================
+
+Distributed queue of hadith work items on Redis Streams, so PCAP/HMSTS
+can run on several machines at once (add nodes to shorten the run).
+
+Features:
+- One stream and consumer group per (stage, version); entries carry only
+  the hadith ID (workers read the hadith itself from PostgreSQL)
+- Deduplication on (hadith_id, version, stage): enqueueing is a Lua script
+  that adds an entry only if the ID is not already in the queue's `seen` set,
+  so re-running the producer or several producers never duplicate work
+- Leases: a delivered entry stays in the group's pending list, owned by its
+  consumer, until acknowledged. An entry idle longer than the visibility
+  timeout (the consumer crashed or hung) is reclaimed by the next consumer
+  that asks for work (XAUTOCLAIM). Long-running consumers renew their
+  leases (XCLAIM ... JUSTID resets the idle time)
+- Entries are acknowledged only after their rows are committed
+- Failed hadiths are dropped from the queue and from `seen` (still pending
+  in PostgreSQL, so the next producer run re-queues them); undispatched
+  hadiths (budget stop) are put back for other consumers
+- Handoff: PCAP runs can queue each hadith on the HMSTS queue as soon as its
+  PCAP row is committed, with its era context in the entry. They register as
+  producers (with an expiry they keep renewing), and HMSTS consumers keep
+  waiting for entries while any producer is alive
+
+Keys (prefix `ikb:queue:{stage}:{version}`):
+- `:stream` entries `{hadith_id}`, consumer group `workers`
+- `:seen` hadith IDs queued or in progress
+- `:done` hadith IDs acknowledged as stored
+- `:producers` sorted set of live upstream producers (score = expiry time)
+
+Usage:
+------
+    queue = RedisWorkQueue.from_settings(settings, ProcessingStage.PCAP_PROCESSING, "v1.0")
+    queue.enqueue(hadith_ids)
+    leases = queue.claim(count=100)
+    ...
+    queue.ack(leases)
+"""
+
+import os
+import socket
+import time
+from typing import List, Dict, Any, Optional, Iterable, NamedTuple
+
+import redis
+from loguru import logger
+
+from config.settings import Settings
+from src.models.processing import ProcessingStage
+
+
+GROUP = "workers"
+
+# KEYS: stream, seen; ARGV: (hadith ID, context or '') pairs. Returns the number of entries added.
+_ENQUEUE_SCRIPT = """
+local added = 0
+for i = 1, #ARGV, 2 do
+    local hadith_id = ARGV[i]
+    if redis.call('SADD', KEYS[2], hadith_id) == 1 then
+        if ARGV[i + 1] == '' then
+            redis.call('XADD', KEYS[1], '*', 'hadith_id', hadith_id)
+        else
+            redis.call('XADD', KEYS[1], '*', 'hadith_id', hadith_id, 'context', ARGV[i + 1])
+        end
+        added = added + 1
+    end
+end
+return added
+"""
+
+
+class Lease(NamedTuple):
+    """A delivered stream entry owned by this consumer until acknowledged."""
+    entry_id: str
+    hadith_id: int
+    # Upstream result carried with the entry (e.g. era context for HMSTS)
+    context: Optional[str] = None
+
+
+class RedisWorkQueue:
+    """
+    Redis Streams work queue for one processing stage and version.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        stage: ProcessingStage,
+        version: str = "v1.0",
+        consumer: Optional[str] = None,
+        visibility_timeout_seconds: float = 600.0,
+    ):
+        """
+        Initialize the queue (creates the stream and consumer group if needed).
+
+        Args:
+            client: Redis client (decode_responses=True)
+            stage: PCAP_PROCESSING or HMSTS_PROCESSING
+            version: Processing version
+            consumer: Consumer name (hostname-pid if None)
+            visibility_timeout_seconds: Idle time after which a lease is reclaimable
+        """
+        self.client = client
+        self.stage = stage
+        self.version = version
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.visibility_timeout_ms = int(visibility_timeout_seconds * 1000)
+        prefix = f"ikb:queue:{stage.value}:{version}"
+        self.stream_key = f"{prefix}:stream"
+        self.seen_key = f"{prefix}:seen"
+        self.done_key = f"{prefix}:done"
+        self.producers_key = f"{prefix}:producers"
+        self._enqueue = client.register_script(_ENQUEUE_SCRIPT)
+        self.stats = {"claimed": 0, "reclaimed": 0, "acked": 0, "dropped": 0, "released": 0}
+        try:
+            client.xgroup_create(self.stream_key, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings: Settings,
+        stage: ProcessingStage,
+        version: str = "v1.0",
+        consumer: Optional[str] = None,
+    ) -> "RedisWorkQueue":
+        client = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            password=settings.redis_password or None,
+            decode_responses=True,
+        )
+        return cls(client, stage, version, consumer, settings.queue_visibility_timeout_seconds)
+
+    # ------------------------------------------------------------------
+    # Producer
+    # ------------------------------------------------------------------
+
+    def enqueue(
+        self,
+        hadith_ids: Iterable[int],
+        contexts: Optional[Dict[int, str]] = None,
+        chunk_size: int = 1000,
+        quiet: bool = False,
+    ) -> int:
+        """
+        Queue hadiths not already queued, in progress or done.
+
+        Args:
+            hadith_ids: Hadiths to queue
+            contexts: Context stored with each hadith's entry (Lease.context)
+            chunk_size: Hadiths per script call
+            quiet: Log at debug level (handoff enqueues every commit)
+
+        Returns:
+            Number of entries added
+        """
+        contexts = contexts or {}
+        args = []
+        for hadith_id in hadith_ids:
+            args += [str(hadith_id), contexts.get(hadith_id, "")]
+        added = 0
+        for start in range(0, len(args), 2 * chunk_size):
+            added += self._enqueue(keys=[self.stream_key, self.seen_key], args=args[start:start + 2 * chunk_size])
+        total = len(args) // 2
+        (logger.debug if quiet else logger.info)(
+            f"[{self.stage.value}] queued {added} of {total} hadiths ({total - added} already queued)"
+        )
+        return added
+
+    def register_producer(self, ttl_seconds: float) -> None:
+        """Announce (or renew) this process as a live upstream producer for `ttl_seconds`."""
+        self.client.zadd(self.producers_key, {self.consumer: time.time() + ttl_seconds})
+
+    def unregister_producer(self) -> None:
+        self.client.zrem(self.producers_key, self.consumer)
+
+    def producers_alive(self) -> int:
+        """Upstream producers registered and not expired (crashed producers expire)."""
+        self.client.zremrangebyscore(self.producers_key, "-inf", time.time())
+        return self.client.zcard(self.producers_key)
+
+    # ------------------------------------------------------------------
+    # Consumer
+    # ------------------------------------------------------------------
+
+    def claim(self, count: int, block_ms: Optional[int] = None) -> List[Lease]:
+        """
+        Lease up to `count` entries: expired leases of other consumers first, then new entries.
+
+        Args:
+            count: Maximum entries to lease
+            block_ms: Wait this long for new entries when none are available
+
+        Returns:
+            Leased entries (empty when there is nothing to do right now)
+        """
+        leases: List[Lease] = []
+        _, reclaimed, _ = self.client.xautoclaim(
+            self.stream_key, GROUP, self.consumer, self.visibility_timeout_ms, start_id="0-0", count=count,
+        )
+        leases.extend(self._leases(reclaimed))
+        self.stats["reclaimed"] += len(leases)
+        if len(leases) < count:
+            response = self.client.xreadgroup(
+                GROUP, self.consumer, {self.stream_key: ">"}, count=count - len(leases), block=block_ms,
+            )
+            for _, entries in response or []:
+                leases.extend(self._leases(entries))
+        self.stats["claimed"] += len(leases)
+        return leases
+
+    @staticmethod
+    def _leases(entries) -> List[Lease]:
+        # Entries deleted while pending come back with no fields
+        return [
+            Lease(entry_id, int(fields["hadith_id"]), fields.get("context"))
+            for entry_id, fields in entries if fields
+        ]
+
+    def renew(self, leases: List[Lease]) -> None:
+        """Reset the idle time of leases still being worked on."""
+        if leases:
+            self.client.xclaim(
+                self.stream_key, GROUP, self.consumer, 0, [lease.entry_id for lease in leases], justid=True,
+            )
+
+    def ack(self, leases: List[Lease]) -> None:
+        """Mark leased hadiths as stored (call after the rows are committed)."""
+        if not leases:
+            return
+        entry_ids = [lease.entry_id for lease in leases]
+        pipe = self.client.pipeline()
+        pipe.xack(self.stream_key, GROUP, *entry_ids)
+        pipe.xdel(self.stream_key, *entry_ids)
+        pipe.sadd(self.done_key, *(lease.hadith_id for lease in leases))
+        pipe.execute()
+        self.stats["acked"] += len(leases)
+
+    def drop(self, leases: List[Lease]) -> None:
+        """Remove failed hadiths from the queue; the next enqueue can add them again."""
+        if not leases:
+            return
+        entry_ids = [lease.entry_id for lease in leases]
+        pipe = self.client.pipeline()
+        pipe.xack(self.stream_key, GROUP, *entry_ids)
+        pipe.xdel(self.stream_key, *entry_ids)
+        pipe.srem(self.seen_key, *(lease.hadith_id for lease in leases))
+        pipe.execute()
+        self.stats["dropped"] += len(leases)
+
+    def release(self, leases: List[Lease]) -> None:
+        """Give leased hadiths back unprocessed (re-queued at the tail for any consumer)."""
+        if not leases:
+            return
+        entry_ids = [lease.entry_id for lease in leases]
+        pipe = self.client.pipeline()
+        pipe.xack(self.stream_key, GROUP, *entry_ids)
+        pipe.xdel(self.stream_key, *entry_ids)
+        for lease in leases:
+            fields = {"hadith_id": lease.hadith_id}
+            if lease.context:
+                fields["context"] = lease.context
+            pipe.xadd(self.stream_key, fields)
+        pipe.execute()
+        self.stats["released"] += len(leases)
+
+    # ------------------------------------------------------------------
+    # Status
+    # ------------------------------------------------------------------
+
+    def pending(self) -> int:
+        """Entries leased to any consumer and not yet acknowledged."""
+        return self.client.xpending(self.stream_key, GROUP)["pending"]
+
+    def is_drained(self) -> bool:
+        """No entries waiting and none leased."""
+        return self.client.xlen(self.stream_key) == 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage.value,
+            "version": self.version,
+            "entries": self.client.xlen(self.stream_key),
+            "leased": self.pending(),
+            "done": self.client.scard(self.done_key),
+            "producers": self.producers_alive(),
+            "consumers": [c["name"] for c in self.client.xinfo_consumers(self.stream_key, GROUP)],
+        }
+
+    def summary(self) -> str:
+        s = self.stats
+        return (
+            f"{s['claimed']} leased ({s['reclaimed']} reclaimed from expired leases), "
+            f"{s['acked']} stored, {s['dropped']} failed, {s['released']} released"
+        )
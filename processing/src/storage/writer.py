@@ -0,0 +1,231 @@
+"""
+Write-Behind Writer
+===================
+
+Takes PostgreSQL writes off the LLM workers' critical path.
+
+Workers hand validated PCAPAssignment / HMSTSAssignment objects to
+`submit()`, which only buffers them (it never waits on the database).
+Async producers call `wait_for_room()` first: once `max_buffered` rows are
+waiting (database down or slow), it blocks them until a flush frees room,
+so memory stays bounded. A background task coalesces the buffer into one multi-row upsert per stage
+when either trigger fires:
+- size: `db_write_batch_size` rows buffered
+- time: `db_flush_interval_seconds` since the last flush
+
+Rows for the same hadith submitted before a flush are coalesced (last one
+wins), so one upsert never touches a row twice. The upsert runs in a
+worker thread so the event loop keeps serving LLM calls meanwhile.
+
+Commit callbacks (checkpointing processed IDs, see
+src/utils/progress_tracker.py; handoff; publication) run only after the
+rows are committed. A raising callback is logged and counted; it never
+stops the background task or the other callbacks. A failed flush keeps its
+rows and is retried with backoff; rows still unwritten at `close()` are
+reported and raise.
+
+Usage:
+------
+    writer = WriteBehindWriter.from_settings(storage, settings)
+    writer.start()
+    await writer.wait_for_room()
+    writer.submit(ProcessingStage.PCAP_PROCESSING, [assignment])
+    await writer.flush()      # before acknowledging work elsewhere
+    await writer.close()
+"""
+
+import asyncio
+import time
+from typing import Optional, List, Dict, Any, Callable
+
+from loguru import logger
+from pydantic import BaseModel
+
+from config.settings import Settings
+from src.models.processing import ProcessingStage
+from .postgres import PostgresStorage
+
+
+CommitCallback = Callable[[List[BaseModel]], Any]
+
+
+class WriteBehindWriter:
+    """
+    Buffers assignments and upserts them in coalesced batches in the background.
+    """
+
+    def __init__(
+        self,
+        storage: PostgresStorage,
+        batch_size: int = 1000,
+        flush_interval_seconds: float = 2.0,
+        max_retries: int = 5,
+        max_buffered: int = 20000,
+    ):
+        """
+        Initialize the writer.
+
+        Args:
+            storage: Storage performing the upserts
+            batch_size: Buffered rows that trigger a flush
+            flush_interval_seconds: Longest time rows wait in the buffer
+            max_retries: Attempts per flush before the rows are left for the next one
+            max_buffered: Buffered rows at which `wait_for_room()` blocks producers
+        """
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.max_buffered = max_buffered
+        self.buffers: Dict[ProcessingStage, Dict[int, BaseModel]] = {}
+        self.callbacks: Dict[ProcessingStage, List[CommitCallback]] = {}
+        self.stats = {
+            "submitted": 0, "written": 0, "flushes": 0, "failed_flushes": 0, "write_ms": 0, "max_buffered": 0,
+            "callback_errors": 0, "backpressure_waits": 0,
+        }
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @classmethod
+    def from_settings(cls, storage: PostgresStorage, settings: Settings) -> "WriteBehindWriter":
+        return cls(
+            storage,
+            settings.db_write_batch_size,
+            settings.db_flush_interval_seconds,
+            max_buffered=settings.db_write_max_buffered,
+        )
+
+    def on_commit(self, stage: ProcessingStage, callback: CommitCallback) -> None:
+        """Call `callback(rows)` after each commit of a stage's rows."""
+        self.callbacks.setdefault(stage, []).append(callback)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def submit(self, stage: ProcessingStage, assignments: List[BaseModel]) -> None:
+        """Buffer rows for the next flush (never blocks)."""
+        buffer = self.buffers.setdefault(stage, {})
+        for assignment in assignments:
+            buffer[assignment.hadith_id] = assignment
+        self.stats["submitted"] += len(assignments)
+        buffered = self.buffered
+        self.stats["max_buffered"] = max(self.stats["max_buffered"], buffered)
+        if buffered >= self.batch_size:
+            self._wakeup.set()
+
+    async def wait_for_room(self) -> None:
+        """Wait while `max_buffered` rows are waiting for the database (backpressure)."""
+        if self.buffered < self.max_buffered or self._closed:
+            return
+        self.stats["backpressure_waits"] += 1
+        while self.buffered >= self.max_buffered and not self._closed:
+            self._room.clear()
+            self._wakeup.set()
+            await self._room.wait()
+
+    @property
+    def buffered(self) -> int:
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    # ------------------------------------------------------------------
+    # Background flushing
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start the background flush task (inside a running event loop)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Rows stay buffered for the next flush; the task must keep running
+                logger.error(f"[writer] flush failed: {e}")
+
+    async def flush(self) -> int:
+        """
+        Write everything buffered so far and run the commit callbacks.
+
+        Returns:
+            Rows written (rows of a stage whose write failed stay buffered)
+        """
+        async with self._lock:
+            written = 0
+            for stage in list(self.buffers):
+                rows = list(self.buffers.pop(stage).values())
+                if not rows:
+                    continue
+                if not await self._write(stage, rows):
+                    # Keep rows submitted meanwhile (they are newer)
+                    buffer = self.buffers.setdefault(stage, {})
+                    for row in rows:
+                        buffer.setdefault(row.hadith_id, row)
+                    continue
+                written += len(rows)
+                for callback in self.callbacks.get(stage, []):
+                    try:
+                        callback(rows)
+                    except Exception as e:
+                        self.stats["callback_errors"] += 1
+                        logger.exception(f"[writer] {stage.value}: commit callback {callback!r} failed: {e}")
+            self._room.set()
+            return written
+
+    async def _write(self, stage: ProcessingStage, rows: List[BaseModel]) -> bool:
+        for attempt in range(self.max_retries):
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.storage.save_assignments, stage, rows)
+            except Exception as e:
+                delay = min(30, 2 ** attempt)
+                logger.warning(
+                    f"[writer] {stage.value}: writing {len(rows)} rows failed "
+                    f"(attempt {attempt + 1}/{self.max_retries}): {e}; retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(rows)
+            self.stats["write_ms"] += int((time.perf_counter() - started) * 1000)
+            return True
+        self.stats["failed_flushes"] += 1
+        return False
+
+    async def close(self) -> None:
+        """
+        Stop the background task and write what is left.
+
+        Raises:
+            RuntimeError: If rows could not be written
+        """
+        self._closed = True
+        self._wakeup.set()
+        self._room.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info(f"[writer] {self.summary()}")
+        if self.buffered:
+            raise RuntimeError(f"write-behind writer closed with {self.buffered} unwritten rows")
+
+    def summary(self) -> str:
+        s = self.stats
+        failed = f", {s['failed_flushes']} failed flushes" if s["failed_flushes"] else ""
+        failed += f", {s['callback_errors']} failed commit callbacks" if s["callback_errors"] else ""
+        failed += f", producers waited {s['backpressure_waits']} times on a full buffer" if s["backpressure_waits"] else ""
+        return (
+            f"{s['written']}/{s['submitted']} rows in {s['flushes']} upserts "
+            f"({s['write_ms'] / 1000:.1f}s writing, peak buffer {s['max_buffered']}{failed})"
+        )
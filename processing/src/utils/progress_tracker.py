@@ -0,0 +1,358 @@
+"""
+Processed-ID Checkpoints
+========================
+
+Exact resume for parallel processing: the set of hadith IDs stored for a
+(stage, version), kept as a compressed bitmap instead of a "last processed
+ID" (work finishes out of order, is stolen between workers and retried, so
+the processed set has holes).
+
+`IdBitmap` is a roaring-style bitmap:
+- IDs are split into 16-bit chunks by their high bits; each chunk is a
+  sorted uint16 array while it holds at most 4096 IDs and an 8 KiB bitset
+  above that
+- Serialized chunks use whichever of array, bitset or run-length encoding
+  is smallest, so the full corpus (~50k mostly contiguous IDs) takes a few
+  bytes and a sparse set two bytes per ID
+
+`ProcessedSet` persists one bitmap per (stage, version) in
+`checkpoint_dir`:
+- `processed_{stage}_{version}.bm`: compacted base snapshot
+- `processed_{stage}_{version}.delta`: append-only log of the IDs stored
+  since, one CRC-checked bitmap record per commit (a torn last record from
+  a crash is cut off on load, so later records append to intact data)
+- After `checkpoint_compaction_deltas` records the base is rewritten
+  (tmp file + os.replace) and the log truncated; re-applying a log after a
+  crash between the two steps is harmless (union)
+
+Usage:
+------
+    processed = ProcessedSet.from_settings(settings, ProcessingStage.PCAP_PROCESSING, "v1.0")
+    if hadith_id not in processed: ...
+    processed.record(stored_ids)   # after the rows are committed
+"""
+
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from loguru import logger
+
+from config.settings import Settings
+from src.models.processing import ProcessingStage
+
+
+MAGIC = b"IKBBM1\n"
+ARRAY_MAX = 4096
+BITSET_BYTES = 8192
+
+KIND_ARRAY, KIND_BITSET, KIND_RUNS = 0, 1, 2
+
+_CHUNK = struct.Struct("<HBI")  # high bits, kind, payload length
+_COUNT = struct.Struct("<I")
+_RECORD = struct.Struct("<II")  # payload length, crc32
+
+Container = Union[array, bytearray]
+
+
+def _to_le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array("H", values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(data: bytes) -> array:
+    values = array("H")
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+# Set bit positions of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def _bitset_values(bits: bytearray) -> Iterator[int]:
+    for byte_index, byte in enumerate(bits):
+        if byte:
+            base = byte_index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base | bit
+
+
+def _runs(values: Iterable[int]) -> array:
+    """(start, length - 1) pairs of consecutive values."""
+    runs = array("H")
+    start = previous = None
+    for value in values:
+        if previous is not None and value == previous + 1:
+            previous = value
+            continue
+        if start is not None:
+            runs.extend((start, previous - start))
+        start = previous = value
+    if start is not None:
+        runs.extend((start, previous - start))
+    return runs
+
+
+class IdBitmap:
+    """
+    Compressed set of non-negative 32-bit integer IDs (roaring-style).
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self.chunks: Dict[int, Container] = {}
+        self.sizes: Dict[int, int] = {}
+        self.update(ids)
+
+    # ------------------------------------------------------------------
+    # Set operations
+    # ------------------------------------------------------------------
+
+    def add(self, value: int) -> bool:
+        """Add an ID; returns False if it was already present."""
+        high, low = value >> 16, value & 0xFFFF
+        chunk = self.chunks.get(high)
+        if chunk is None:
+            self.chunks[high] = array("H", [low])
+            self.sizes[high] = 1
+            return True
+        if isinstance(chunk, bytearray):
+            mask = 1 << (low & 7)
+            if chunk[low >> 3] & mask:
+                return False
+            chunk[low >> 3] |= mask
+        else:
+            i = bisect_left(chunk, low)
+            if i < len(chunk) and chunk[i] == low:
+                return False
+            chunk.insert(i, low)
+            if len(chunk) > ARRAY_MAX:
+                self.chunks[high] = self._bitset(chunk)
+        self.sizes[high] += 1
+        return True
+
+    def update(self, ids: Iterable[int]) -> int:
+        """Add IDs; returns how many were new."""
+        return sum(self.add(value) for value in ids)
+
+    def discard(self, value: int) -> bool:
+        """Remove an ID; returns False if it was absent."""
+        high, low = value >> 16, value & 0xFFFF
+        if value not in self:
+            return False
+        chunk = self.chunks[high]
+        if isinstance(chunk, bytearray):
+            chunk[low >> 3] &= ~(1 << (low & 7)) & 0xFF
+        else:
+            chunk.pop(bisect_left(chunk, low))
+        self.sizes[high] -= 1
+        if not self.sizes[high]:
+            del self.chunks[high], self.sizes[high]
+        return True
+
+    def __contains__(self, value: int) -> bool:
+        chunk = self.chunks.get(value >> 16)
+        if chunk is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(chunk, bytearray):
+            return bool(chunk[low >> 3] & (1 << (low & 7)))
+        i = bisect_left(chunk, low)
+        return i < len(chunk) and chunk[i] == low
+
+    def __len__(self) -> int:
+        return sum(self.sizes.values())
+
+    def __iter__(self) -> Iterator[int]:
+        for high in sorted(self.chunks):
+            base = high << 16
+            for low in self._values(self.chunks[high]):
+                yield base | low
+
+    def __ior__(self, other: "IdBitmap") -> "IdBitmap":
+        self.update(other)
+        return self
+
+    @staticmethod
+    def _bitset(values: Iterable[int]) -> bytearray:
+        bits = bytearray(BITSET_BYTES)
+        for low in values:
+            bits[low >> 3] |= 1 << (low & 7)
+        return bits
+
+    @staticmethod
+    def _values(chunk: Container) -> Iterable[int]:
+        return _bitset_values(chunk) if isinstance(chunk, bytearray) else chunk
+
+    # ------------------------------------------------------------------
+    # Serialization
+    # ------------------------------------------------------------------
+
+    def to_bytes(self) -> bytes:
+        """Serialize, each chunk as the smallest of array, bitset or runs."""
+        parts = [MAGIC, _COUNT.pack(len(self.chunks))]
+        for high in sorted(self.chunks):
+            chunk = self.chunks[high]
+            runs = _runs(self._values(chunk))
+            candidates = [(KIND_RUNS, len(runs) * 2)]
+            if isinstance(chunk, bytearray):
+                candidates.append((KIND_BITSET, BITSET_BYTES))
+            else:
+                candidates.append((KIND_ARRAY, len(chunk) * 2))
+            kind = min(candidates, key=lambda c: c[1])[0]
+            if kind == KIND_RUNS:
+                payload = _to_le(runs)
+            elif kind == KIND_BITSET:
+                payload = bytes(chunk)
+            else:
+                payload = _to_le(chunk)
+            parts.append(_CHUNK.pack(high, kind, len(payload)))
+            parts.append(payload)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IdBitmap":
+        """
+        Raises:
+            ValueError: If the data is not a serialized bitmap
+        """
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not an ID bitmap")
+        bitmap = cls()
+        offset = len(MAGIC)
+        (count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        for _ in range(count):
+            high, kind, length = _CHUNK.unpack_from(data, offset)
+            offset += _CHUNK.size
+            payload = data[offset:offset + length]
+            offset += length
+            if kind == KIND_BITSET:
+                chunk: Container = bytearray(payload)
+                size = sum(bin(byte).count("1") for byte in chunk)
+            elif kind == KIND_ARRAY:
+                chunk = _from_le(payload)
+                size = len(chunk)
+            else:
+                runs = _from_le(payload)
+                values = array("H")
+                for start, extra in zip(runs[::2], runs[1::2], strict=True):
+                    values.extend(range(start, start + extra + 1))
+                chunk = values if len(values) <= ARRAY_MAX else cls._bitset(values)
+                size = len(values)
+            if size:
+                bitmap.chunks[high] = chunk
+                bitmap.sizes[high] = size
+        return bitmap
+
+
+class ProcessedSet:
+    """
+    Persistent processed-ID set for one (stage, version): base snapshot plus delta log.
+    """
+
+    def __init__(self, path: Path, compact_after: int = 50):
+        """
+        Load the set (base snapshot and every intact delta record).
+
+        Args:
+            path: Base snapshot path (the delta log sits next to it, `.delta`)
+            compact_after: Delta records written before the base is rewritten
+        """
+        self.path = Path(path)
+        self.delta_path = self.path.with_suffix(".delta")
+        self.compact_after = compact_after
+        self.ids = IdBitmap()
+        self.deltas = 0
+        if self.path.exists():
+            try:
+                self.ids = IdBitmap.from_bytes(self.path.read_bytes())
+            except ValueError as e:
+                logger.warning(f"Ignoring processed-ID snapshot {self.path}: {e}")
+        for delta in self._read_deltas():
+            self.ids |= delta
+            self.deltas += 1
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings: Settings,
+        stage: ProcessingStage,
+        version: str = "v1.0",
+        shard: Optional[int] = None,
+    ) -> "ProcessedSet":
+        suffix = f"_shard{shard}" if shard is not None else ""
+        return cls(
+            Path(settings.checkpoint_dir) / f"processed_{stage.value}_{version}{suffix}.bm",
+            settings.checkpoint_compaction_deltas,
+        )
+
+    def _read_deltas(self) -> List[IdBitmap]:
+        if not self.delta_path.exists():
+            return []
+        data = self.delta_path.read_bytes()
+        deltas, offset = [], 0
+        while offset + _RECORD.size <= len(data):
+            length, crc = _RECORD.unpack_from(data, offset)
+            payload = data[offset + _RECORD.size:offset + _RECORD.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            deltas.append(IdBitmap.from_bytes(payload))
+            offset += _RECORD.size + length
+        if offset < len(data):
+            # Cut the torn tail, or every record appended after it would be unreadable
+            logger.warning(f"{self.delta_path.name}: dropping torn record at byte {offset}")
+            os.truncate(self.delta_path, offset)
+        return deltas
+
+    def __contains__(self, hadith_id: int) -> bool:
+        return hadith_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def record(self, hadith_ids: Iterable[int]) -> int:
+        """
+        Append newly stored IDs to the delta log (compacting when due).
+
+        Returns:
+            Number of IDs not already in the set
+        """
+        delta = IdBitmap(hadith_id for hadith_id in hadith_ids if hadith_id not in self.ids)
+        if not len(delta):
+            return 0
+        self.ids |= delta
+        payload = delta.to_bytes()
+        self.delta_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.delta_path, "ab") as f:
+            f.write(_RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+        self.deltas += 1
+        if self.deltas >= self.compact_after:
+            self.compact()
+        return len(delta)
+
+    def discard(self, hadith_ids: Iterable[int]) -> int:
+        """Forget IDs (their rows are gone); rewrites the base. Returns how many were present."""
+        removed = sum(self.ids.discard(hadith_id) for hadith_id in hadith_ids)
+        if removed:
+            self.compact()
+        return removed
+
+    def compact(self) -> None:
+        """Rewrite the base snapshot with every delta folded in, then truncate the log."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(self.ids.to_bytes())
+        os.replace(tmp, self.path)
+        if self.delta_path.exists():
+            self.delta_path.unlink()
+        self.deltas = 0
@@ -0,0 +1,16 @@
+"""
+Output Validation
+=================
+
+Usage:
+------
+    from src.validation import CrossModelValidator
+"""
+
+from .cross_model_validator import CrossModelValidator, risk_score, compare_assignments
+
+__all__ = [
+    "CrossModelValidator",
+    "risk_score",
+    "compare_assignments",
+]
@@ -0,0 +1,350 @@
+"""
+Cross-Model Validation
+======================
+
+Second opinion on the PCAP assignments most likely to be wrong.
+
+Re-running every hadith on a second model doubles the bill; most
+assignments are explicit, high-confidence and not worth checking. Instead:
+
+1. Rank assignments by risk:
+   - low `posterior_confidence`
+   - weak evidence (speculative > contextual_order > isnad_generation >
+     sirah_alignment; explicit evidence adds nothing)
+   - earlier validator warnings/failures in validation_results
+   Rule-engine rows and fanned-out duplicates are skipped (the former are
+   deterministic, the latter share their representative's answer).
+2. Re-run the top K on the second model (LLM_SECONDARY_MODEL by default),
+   highest risk first, until K, the cost budget or the time budget runs out.
+3. Compare the two answers and write a `cross_model` row per hadith into
+   validation_results:
+   - pass: same era, compatible sub-era, overlapping AH ranges
+   - warning: same era but a different sub-era or disjoint AH ranges
+   - fail: different era
+4. Order disagreements by review priority (risk x severity) so reviewers
+   see the most consequential ones first. The priority is also stored in
+   `issues->>'review_priority'`.
+
+Usage:
+------
+    validator = CrossModelValidator(processor, storage, top_k=500, max_cost_usd=50)
+    report = await validator.run()
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, NamedTuple
+
+from loguru import logger
+
+from src.llm.base import LLMError
+from src.llm.cost_tracker import CostTracker
+from src.models.temporal import PCAPAssignment, EvidenceType
+from src.models.validation import ValidationResult, ValidationCategory, ValidationStatus
+from src.processors.pcap_processor import PCAPProcessor
+from src.processors.pcap_rules import RULES_MODEL
+from src.storage.postgres import PostgresStorage
+
+
+VALIDATION_TYPE = "cross_model"
+VALIDATOR_VERSION = "1.0"
+
+# How much each evidence type adds to an assignment's risk
+EVIDENCE_RISK: Dict[EvidenceType, float] = {
+    EvidenceType.SPECULATIVE: 1.0,
+    EvidenceType.CONTEXTUAL_ORDER: 0.7,
+    EvidenceType.ISNAD_GENERATION: 0.4,
+    EvidenceType.SIRAH_ALIGNMENT: 0.3,
+    EvidenceType.EXPLICIT_EVENT: 0.0,
+    EvidenceType.EXPLICIT_TEXT: 0.0,
+}
+
+# Risk = weighted sum of (1 - confidence), evidence risk and prior flags
+RISK_WEIGHTS = {"confidence": 0.5, "evidence": 0.35, "flags": 0.15}
+
+# Disagreement severity -> weight in the review priority
+SEVERITY_WEIGHT = {"high": 1.0, "medium": 0.6, "low": 0.3}
+
+
+def risk_score(assignment: PCAPAssignment, flags: int = 0) -> float:
+    """
+    Risk that an assignment is wrong, in [0, 1].
+
+    Args:
+        assignment: Stored PCAP assignment
+        flags: Earlier warning/fail validation rows for the hadith
+    """
+    confidence = float(assignment.posterior_confidence)
+    return round(
+        RISK_WEIGHTS["confidence"] * (1 - confidence)
+        + RISK_WEIGHTS["evidence"] * EVIDENCE_RISK.get(assignment.evidence_type, 0.5)
+        + RISK_WEIGHTS["flags"] * min(flags, 2) / 2,
+        4,
+    )
+
+
+def compare_assignments(original: PCAPAssignment, second: PCAPAssignment) -> Tuple[ValidationStatus, List[Dict[str, Any]]]:
+    """
+    Compare a stored assignment with a second model's answer.
+
+    Returns:
+        Tuple of (status, issues as ValidationIssue-shaped dicts)
+    """
+    issues = []
+    original_era = original.era_id.split(".")[0]
+    second_era = second.era_id.split(".")[0]
+    if original_era != second_era:
+        issues.append({
+            "issue_type": "era_disagreement",
+            "severity": "high",
+            "description": f"Second model places the hadith in {second.era_id}, not {original.era_id}",
+            "field": "era_id",
+            "expected": second.era_id,
+            "actual": original.era_id,
+        })
+    elif original.sub_era_id and second.sub_era_id and original.sub_era_id != second.sub_era_id:
+        issues.append({
+            "issue_type": "sub_era_disagreement",
+            "severity": "medium",
+            "description": f"Second model chose sub-era {second.sub_era_id}, not {original.sub_era_id}",
+            "field": "sub_era_id",
+            "expected": second.sub_era_id,
+            "actual": original.sub_era_id,
+        })
+
+    ranges = (original.earliest_ah, original.latest_ah, second.earliest_ah, second.latest_ah)
+    if None not in ranges and (original.latest_ah < second.earliest_ah or second.latest_ah < original.earliest_ah):
+        issues.append({
+            "issue_type": "ah_range_disjoint",
+            "severity": "medium" if original_era == second_era else "high",
+            "description": (
+                f"AH ranges do not overlap: {original.earliest_ah}-{original.latest_ah} "
+                f"vs {second.earliest_ah}-{second.latest_ah}"
+            ),
+            "field": "earliest_ah/latest_ah",
+            "expected": f"{second.earliest_ah}-{second.latest_ah}",
+            "actual": f"{original.earliest_ah}-{original.latest_ah}",
+        })
+
+    if any(issue["severity"] == "high" for issue in issues):
+        return ValidationStatus.FAIL, issues
+    return (ValidationStatus.WARNING if issues else ValidationStatus.PASS), issues
+
+
+class Candidate(NamedTuple):
+    """A stored assignment selected for a second opinion."""
+    risk: float
+    assignment: PCAPAssignment
+    flags: int
+
+
+class CrossModelValidator:
+    """
+    Risk-ranked second-opinion validation of PCAP assignments.
+    """
+
+    def __init__(
+        self,
+        processor: PCAPProcessor,
+        storage: Optional[PostgresStorage],
+        version: str = "v1.0",
+        top_k: int = 500,
+        max_cost_usd: float = 50.0,
+        max_seconds: Optional[float] = None,
+        revalidate: bool = False,
+    ):
+        """
+        Initialize the validator.
+
+        Args:
+            processor: PCAP processor bound to the second model (with storage=None,
+                so second opinions are never written to pcap_assignments)
+            storage: Storage to read assignments from and write validation_results to
+            version: Processing version to validate
+            top_k: Maximum number of hadiths to cross-check
+            max_cost_usd: Spend limit for second-opinion calls
+            max_seconds: Wall-clock limit (no new calls are started after it)
+            revalidate: Also re-check hadiths that already have a cross_model row
+        """
+        self.processor = processor
+        self.storage = storage
+        self.version = version
+        self.top_k = top_k
+        self.max_seconds = max_seconds
+        self.revalidate = revalidate
+        self.cost_tracker = CostTracker(budget_usd=max_cost_usd, total_hadiths=top_k)
+        self.stats = {"ranked": 0, "selected": 0, "checked": 0, "failed_calls": 0, "skipped_budget": 0}
+
+    # ------------------------------------------------------------------
+    # Ranking
+    # ------------------------------------------------------------------
+
+    def rank(self, assignments: List[PCAPAssignment], flags: Dict[int, int]) -> List[Candidate]:
+        """Eligible assignments ordered by descending risk (ties by hadith_id)."""
+        candidates = [
+            Candidate(risk_score(a, flags.get(a.hadith_id, 0)), a, flags.get(a.hadith_id, 0))
+            for a in assignments
+            if a.llm_model != RULES_MODEL and a.derived_from_hadith_id is None
+        ]
+        candidates.sort(key=lambda c: (-c.risk, c.assignment.hadith_id))
+        self.stats["ranked"] = len(candidates)
+        return candidates
+
+    def select(self, hadith_ids: Optional[List[int]] = None) -> List[Candidate]:
+        """Top-K riskiest stored assignments not yet cross-checked (among `hadith_ids` if given)."""
+        assignments = self.storage.fetch_pcap_assignments(hadith_ids, self.version)
+        flags = self.storage.count_validation_flags(self.version, exclude_type=VALIDATION_TYPE)
+        if not self.revalidate:
+            done = self.storage.fetch_validated_ids(VALIDATION_TYPE, self.version)
+            assignments = {hid: a for hid, a in assignments.items() if hid not in done}
+        selected = self.rank(list(assignments.values()), flags)[: self.top_k]
+        self.stats["selected"] = len(selected)
+        return selected
+
+    # ------------------------------------------------------------------
+    # Second opinions
+    # ------------------------------------------------------------------
+
+    async def second_opinions(self, candidates: List[Candidate]) -> Dict[int, PCAPAssignment]:
+        """
+        Run candidates on the second model, riskiest first, within the budgets.
+
+        Returns:
+            Mapping of hadith_id -> second-opinion assignment
+        """
+        items = {hadith.id: (hadith, pre) for hadith, pre in
+                 self.storage.fetch_hadiths([c.assignment.hadith_id for c in candidates])}
+        queue = deque(c for c in candidates if c.assignment.hadith_id in items)
+        deadline = time.monotonic() + self.max_seconds if self.max_seconds else None
+        results: Dict[int, PCAPAssignment] = {}
+        in_flight = 0
+
+        async def worker() -> None:
+            nonlocal in_flight
+            shard = self.cost_tracker.shard()
+            try:
+                while queue:
+                    if deadline and time.monotonic() >= deadline:
+                        return
+                    if not self.cost_tracker.admit(1, in_flight):
+                        return
+                    hadith, preprocessed = items[queue.popleft().assignment.hadith_id]
+                    in_flight += 1
+                    try:
+                        results[hadith.id] = await self.processor.process_hadith(hadith, preprocessed, shard)
+                    except LLMError as e:
+                        self.stats["failed_calls"] += 1
+                        logger.warning(f"[cross-model] hadith {hadith.id}: {e}")
+                    finally:
+                        in_flight -= 1
+                        shard.record_hadith()
+            finally:
+                self.cost_tracker.release(shard)
+
+        limiter = self.processor.limiter
+        workers = min(limiter.max_limit if limiter else self.processor.settings.parallel_workers, len(queue))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        self.stats["skipped_budget"] = len(queue)
+        self.stats["checked"] = len(results)
+        return results
+
+    def to_result(self, candidate: Candidate, second: PCAPAssignment) -> ValidationResult:
+        """validation_results row recording agreement between the two models."""
+        original = candidate.assignment
+        status, issues = compare_assignments(original, second)
+        severity = max((SEVERITY_WEIGHT[i["severity"]] for i in issues), default=0.0)
+        return ValidationResult(
+            hadith_id=original.hadith_id,
+            version=self.version,
+            validation_type=VALIDATION_TYPE,
+            validation_category=ValidationCategory.TEMPORAL,
+            status=status,
+            issues={
+                "issues": issues,
+                "risk": candidate.risk,
+                "prior_flags": candidate.flags,
+                "review_priority": round(candidate.risk * severity, 4),
+                "original": {
+                    "model": original.llm_model,
+                    "era_id": original.era_id,
+                    "sub_era_id": original.sub_era_id,
+                    "ah_range": [original.earliest_ah, original.latest_ah],
+                    "evidence_type": original.evidence_type.value,
+                    "posterior_confidence": original.posterior_confidence,
+                },
+                "second": {
+                    "model": second.llm_model,
+                    "era_id": second.era_id,
+                    "sub_era_id": second.sub_era_id,
+                    "ah_range": [second.earliest_ah, second.latest_ah],
+                    "evidence_type": second.evidence_type.value,
+                    "posterior_confidence": second.posterior_confidence,
+                    "reasoning": second.reasoning,
+                },
+            },
+            temporal_confidence=min(original.posterior_confidence, second.posterior_confidence)
+            if status == ValidationStatus.PASS else None,
+            validator_version=VALIDATOR_VERSION,
+        )
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    async def run(self, hadith_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Select, cross-check and record; returns a report with the review queue.
+
+        Args:
+            hadith_ids: Restrict validation to these hadiths (e.g. one published book)
+        """
+        candidates = self.select(hadith_ids)
+        logger.info(
+            f"[cross-model] {self.stats['selected']} of {self.stats['ranked']} eligible assignments selected "
+            f"(risk {candidates[0].risk:.2f}-{candidates[-1].risk:.2f})" if candidates
+            else "[cross-model] nothing to validate"
+        )
+        if not candidates:
+            return self.report([])
+
+        seconds = await self.second_opinions(candidates)
+        results = [self.to_result(c, seconds[c.assignment.hadith_id])
+                   for c in candidates if c.assignment.hadith_id in seconds]
+        if self.storage and results:
+            self.storage.save_validation_results(results)
+        return self.report(results)
+
+    def report(self, results: List[ValidationResult]) -> Dict[str, Any]:
+        """Agreement summary plus disagreements ordered by review priority."""
+        disagreements = sorted(
+            (r for r in results if r.status != ValidationStatus.PASS),
+            key=lambda r: (-r.issues["review_priority"], r.hadith_id),
+        )
+        agreed = len(results) - len(disagreements)
+        spent = self.cost_tracker.flush_all().cost_usd
+        report = {
+            "version": self.version,
+            **self.stats,
+            "agreed": agreed,
+            "agreement_rate": round(agreed / len(results), 4) if results else None,
+            "failed": sum(r.status == ValidationStatus.FAIL for r in results),
+            "cost_usd": round(spent, 4),
+            "review_queue": [
+                {
+                    "hadith_id": r.hadith_id,
+                    "status": r.status.value,
+                    "review_priority": r.issues["review_priority"],
+                    "risk": r.issues["risk"],
+                    "issues": [i["description"] for i in r.issues["issues"]],
+                }
+                for r in disagreements
+            ],
+        }
+        logger.info(
+            f"[cross-model] {len(results)} checked, agreement "
+            f"{report['agreement_rate']:.0%}" if results else "[cross-model] no second opinions obtained"
+        )
+        if self.stats["skipped_budget"]:
+            logger.warning(f"[cross-model] {self.stats['skipped_budget']} selected hadiths not checked (cost/time budget)")
+        return report
@@ -0,0 +1,32 @@
+"""Methodology bundle staleness."""
+
+from config.settings import get_settings
+from src.ingestion import methodology_loader
+from src.ingestion.methodology_loader import SCHEMA_SOURCE, build_bundle, load_bundle
+from src.llm.prompt_builder import PromptBuilder
+
+
+def builder():
+    settings = get_settings()
+    return PromptBuilder(
+        prompts_dir=settings.prompts_dir,
+        methodology_dir=settings.methodology_dir,
+        markers_file=settings.markers_file,
+    )
+
+
+def test_fresh_bundle_loads(tmp_path):
+    build_bundle(builder(), tmp_path / "bundle.bin").close()
+    bundle = load_bundle(tmp_path / "bundle.bin", builder())
+    assert bundle is not None
+    bundle.close()
+
+
+def test_changed_output_schema_makes_the_bundle_stale(tmp_path, monkeypatch):
+    build_bundle(builder(), tmp_path / "bundle.bin").close()
+    monkeypatch.setattr(methodology_loader, "schema_hash", lambda: "0" * 32)
+
+    bundle = methodology_loader.MethodologyBundle.load(tmp_path / "bundle.bin")
+    assert bundle.stale_sources() == [SCHEMA_SOURCE]
+    bundle.close()
+    assert load_bundle(tmp_path / "bundle.bin", builder()) is None
@@ -0,0 +1,107 @@
+"""BatchRunner job files, submit / poll / collect and resume against LocalBatchEndpoint."""
+
+import asyncio
+import json
+
+from src.llm.base import LLMRequest, LLMResponse
+from src.llm.batch import BatchJob, BatchRunner, BatchStatus, LocalBatchEndpoint, read_job_file
+from src.models.processing import ProcessingStage
+
+
+def requests(n, stage=ProcessingStage.PCAP_PROCESSING):
+    return [
+        LLMRequest(request_id=f"{stage.value}_{i}", hadith_id=i, stage=stage, user=f"hadith {i}")
+        for i in range(1, n + 1)
+    ]
+
+
+async def handler(request):
+    if request.hadith_id % 5 == 0:
+        raise ValueError("overloaded")
+    return LLMResponse(request_id=request.request_id, model="local", content=json.dumps({"id": request.hadith_id}))
+
+
+def runner(tmp_path, endpoint, **kwargs):
+    return BatchRunner(endpoint, tmp_path, poll_interval=0.01, **kwargs)
+
+
+def test_write_jobs_splits_by_count_and_stage(tmp_path):
+    batch = runner(tmp_path, LocalBatchEndpoint(handler), max_requests_per_job=4)
+    jobs = batch.write_jobs(requests(6) + requests(2, ProcessingStage.HMSTS_PROCESSING))
+
+    assert [(job.stage, job.request_count) for job in jobs] == [
+        (ProcessingStage.PCAP_PROCESSING, 4),
+        (ProcessingStage.PCAP_PROCESSING, 2),
+        (ProcessingStage.HMSTS_PROCESSING, 2),
+    ]
+    assert [r.hadith_id for r in read_job_file(jobs[1].job_file)] == [5, 6]
+    assert BatchJob.load(jobs[0].manifest_path).status == BatchStatus.CREATED
+
+
+def test_submit_poll_collect_store(tmp_path):
+    stored = {}
+    failed = []
+
+    async def on_result(result):
+        if result.succeeded:
+            stored[result.hadith_id] = json.loads(result.response.content)
+        else:
+            failed.append(result.hadith_id)
+
+    batch = runner(tmp_path, LocalBatchEndpoint(handler), max_requests_per_job=4)
+    jobs = asyncio.run(batch.run(requests(10), on_result))
+
+    assert all(job.status == BatchStatus.ENDED for job in jobs)
+    assert sorted(stored) == [1, 2, 3, 4, 6, 7, 8, 9]
+    assert sorted(failed) == [5, 10]
+    assert sum(job.succeeded for job in jobs) == 8
+    assert sum(job.errored for job in jobs) == 2
+    # Counts are persisted in the manifests
+    assert BatchJob.load(jobs[0].manifest_path).succeeded == jobs[0].succeeded
+
+
+def test_resume_collects_a_submitted_job(tmp_path):
+    release = asyncio.Event()
+
+    async def slow_handler(request):
+        await release.wait()
+        return await handler(request)
+
+    async def run():
+        endpoint = LocalBatchEndpoint(slow_handler)
+        (job,) = runner(tmp_path, endpoint).write_jobs(requests(3))
+        await runner(tmp_path, endpoint).submit(job)
+        assert BatchJob.load(job.manifest_path).status == BatchStatus.IN_PROGRESS
+
+        # A new runner (e.g. after a restart) picks the job up from its manifest
+        collected = []
+
+        async def on_result(result):
+            collected.append(result.hadith_id)
+
+        resumed = asyncio.create_task(runner(tmp_path, endpoint).resume(job.manifest_path, on_result))
+        await asyncio.sleep(0.05)
+        assert not resumed.done()
+        release.set()
+        return await resumed, collected
+
+    job, collected = asyncio.run(run())
+    assert job.status == BatchStatus.ENDED
+    assert sorted(collected) == [1, 2, 3]
+    assert BatchJob.load(job.manifest_path).succeeded == 3
+
+
+def test_resume_skips_a_failed_job(tmp_path):
+    batch = runner(tmp_path, LocalBatchEndpoint(handler))
+    (job,) = batch.write_jobs(requests(2))
+    job.provider_batch_id = "local_gone"
+    job.status = BatchStatus.FAILED
+    job.save()
+    collected = []
+
+    async def on_result(result):
+        collected.append(result)
+
+    resumed = asyncio.run(batch.resume(job.manifest_path, on_result))
+    assert resumed.status == BatchStatus.FAILED
+    assert collected == []
@@ -0,0 +1,42 @@
+"""Anthropic SDK errors mapped onto the LLMError hierarchy."""
+
+import asyncio
+from types import SimpleNamespace
+
+import anthropic
+import pytest
+
+from src.llm.base import LLMError, OverloadedError, RateLimitError
+from src.llm.claude import ClaudeClient
+from src.llm.rate_limiter import AIMDLimiter
+
+
+def status_error(cls, status):
+    # Only the attributes the SDK reads from its HTTP response
+    response = SimpleNamespace(status_code=status, headers={}, request=None)
+    return cls("error", response=response, body=None)
+
+
+@pytest.mark.parametrize("cls, status, expected", [
+    (anthropic.RateLimitError, 429, RateLimitError),
+    (anthropic.InternalServerError, 500, OverloadedError),
+    (anthropic.APIStatusError, 503, OverloadedError),
+    (anthropic.APIStatusError, 529, OverloadedError),
+    (anthropic.BadRequestError, 400, LLMError),
+])
+def test_translate_error(cls, status, expected):
+    assert type(ClaudeClient.translate_error(status_error(cls, status))) is expected
+
+
+@pytest.mark.skipif(not hasattr(anthropic, "OverloadedError"), reason="SDK has no OverloadedError class")
+def test_overloaded_529_cuts_the_limiter_window():
+    limiter = AIMDLimiter(initial=8)
+
+    async def call():
+        async with limiter.slot():
+            raise ClaudeClient.translate_error(status_error(anthropic.OverloadedError, 529))
+
+    with pytest.raises(OverloadedError):
+        asyncio.run(call())
+    assert limiter.window == 4
+    assert limiter.stats["overloads"] == 1
@@ -0,0 +1,92 @@
+"""Tests for prompt compaction levels."""
+
+import pytest
+
+from src.llm.compaction import (
+    Compaction,
+    compact_arabic,
+    compact_english,
+    estimate_tokens,
+    split_isnad,
+)
+from src.llm.prompt_builder import PromptBuilder
+from src.models.hadith import RawHadith, PreprocessedHadith
+
+ARABIC = (
+    "حَدَّثَنَا الْحُمَيْدِيُّ قَالَ حَدَّثَنَا سُفْيَانُ عَنْ عُمَرَ "
+    "قَالَ رَسُولُ اللَّهِ صَلَّى اللَّهُ عَلَيْهِ وَسَلَّمَ إِنَّمَا الْأَعْمَالُ بِالنِّيَّاتِ"
+)
+ENGLISH = "I heard Allah's Messenger (ﷺ) saying,‏  \"The reward of deeds\n\n  depends upon the intentions\" (peace be upon him)"
+
+
+@pytest.mark.parametrize("value, level", [
+    ("none", Compaction.NONE), (" Standard ", Compaction.STANDARD), (3, Compaction.AGGRESSIVE),
+])
+def test_level_parse(value, level):
+    assert Compaction.parse(value) is level
+
+
+def test_none_keeps_text_verbatim():
+    assert compact_arabic(ARABIC, Compaction.NONE, ["Umar"]) == ARABIC
+    assert compact_english(ENGLISH, Compaction.NONE) == ENGLISH
+
+
+def test_light_strips_marks_and_whitespace_only():
+    arabic = compact_arabic(ARABIC, Compaction.LIGHT)
+    assert "َ" not in arabic  # fatha
+    assert "صلى الله عليه وسلم" in arabic
+    english = compact_english(ENGLISH, Compaction.LIGHT)
+    assert english == (
+        "I heard Allah's Messenger (ﷺ) saying, \"The reward of deeds\n"
+        "depends upon the intentions\" (peace be upon him)"
+    )
+
+
+def test_standard_collapses_honorifics():
+    assert compact_arabic(ARABIC, Compaction.STANDARD).count("ﷺ") == 1
+    assert compact_english(ENGLISH, Compaction.STANDARD).endswith("intentions\" (ﷺ)")
+    assert compact_english("Abu Huraira (may Allah be pleased with him) said", Compaction.STANDARD) == (
+        "Abu Huraira (ra) said"
+    )
+
+
+def test_aggressive_drops_isnad_only_with_parsed_chain():
+    matn = compact_arabic(ARABIC, Compaction.AGGRESSIVE, ["Umar", "Sufyan", "al-Humaydi"])
+    assert matn.startswith("قال رسول الله")
+    assert "حدثنا" not in matn
+    assert "حدثنا" in compact_arabic(ARABIC, Compaction.AGGRESSIVE)
+
+
+def test_split_isnad_without_chain_keeps_text():
+    assert split_isnad("قال رسول الله ﷺ الدين النصيحه") == ("", "قال رسول الله ﷺ الدين النصيحه")
+
+
+def test_estimate_counts_arabic_denser_than_latin():
+    assert estimate_tokens("abcd" * 100) == 101
+    assert estimate_tokens("بسم" * 100) == 151
+    assert estimate_tokens(ARABIC) > estimate_tokens(compact_arabic(ARABIC, Compaction.LIGHT))
+
+
+def prompt(level, tmp_path):
+    builder = PromptBuilder(prompts_dir=tmp_path, methodology_dir=tmp_path, compaction=level)
+    hadith = RawHadith(
+        id=42, id_in_book=1, book_id=1, chapter_id=1, arabic=ARABIC, english_narrator="Narrated 'Umar bin Al-Khattab:",
+        english_text="Narrated 'Umar bin Al-Khattab: " + ENGLISH, book_name_english="Sahih al-Bukhari",
+        chapter_name_english="Revelation",
+    )
+    preprocessed = PreprocessedHadith(hadith_id=42, isnad_chain=["Umar", "Sufyan", "al-Humaydi"])
+    return builder.build_user_prompt(hadith, preprocessed)
+
+
+def test_prompt_shrinks_with_each_level(tmp_path):
+    sizes = [estimate_tokens(prompt(level, tmp_path)) for level in Compaction]
+    assert sizes == sorted(sizes, reverse=True)
+    assert sizes[-1] < sizes[0]
+
+
+def test_standard_prompt_drops_ids_and_repeated_narrator(tmp_path):
+    full, standard = prompt(Compaction.NONE, tmp_path), prompt(Compaction.STANDARD, tmp_path)
+    assert "Hadith ID: 42" in full and "Narrator:" in full
+    assert "Hadith ID" not in standard and "Narrator:" not in standard
+    assert "Source: Sahih al-Bukhari, Revelation" in standard
+    assert "Parsed isnad: Umar <- Sufyan <- al-Humaydi" in standard
@@ -0,0 +1,62 @@
+"""Per-process cost ledgers counted together against the budget."""
+
+from src.llm.base import LLMResponse
+from src.llm.cost_tracker import CostTracker, ledger_path, read_ledger
+
+
+def tracker(tmp_path, name, budget=10.0):
+    return CostTracker(
+        budget_usd=budget,
+        ledger_path=ledger_path(tmp_path, "v1.0", name),
+        version="v1.0",
+        persist_interval_seconds=0,
+    )
+
+
+def spend(tracker, dollars):
+    # Sonnet input pricing: $3 per 1M tokens
+    shard = tracker.shard()
+    shard.record(LLMResponse(request_id="r", model="claude-3-5-sonnet", content="{}", input_tokens=int(dollars / 3 * 1_000_000)))
+    shard.record_hadith()
+    tracker.release(shard)
+    return tracker.flush_all()
+
+
+def test_processes_keep_their_own_ledgers(tmp_path):
+    pcap, hmsts = tracker(tmp_path, "pcap_a"), tracker(tmp_path, "hmsts_b")
+    spend(pcap, 3.0)
+    spend(hmsts, 1.5)
+    spend(pcap, 3.0)
+
+    assert read_ledger(ledger_path(tmp_path, "v1.0", "pcap_a")).cost_usd == 6.0
+    assert read_ledger(ledger_path(tmp_path, "v1.0", "hmsts_b")).cost_usd == 1.5
+
+
+def test_budget_counts_every_ledger_of_the_version(tmp_path):
+    spend(tracker(tmp_path, "pcap_a"), 6.0)
+    spend(CostTracker(budget_usd=10.0, ledger_path=ledger_path(tmp_path, "v1.0"), version="v1.0"), 1.5)
+    # Another version's spend does not count
+    spend(CostTracker(budget_usd=10.0, ledger_path=ledger_path(tmp_path, "v1.0.1", "pcap_a"), version="v1.0.1"), 9.0)
+
+    consumer = tracker(tmp_path, "hmsts_b")
+    assert consumer.spent_usd == 7.5
+    spend(consumer, 1.5)
+    # $9 spent and $1.50 per hadith: one more does not fit
+    assert not consumer.admit(1)
+
+
+def test_peers_are_reread_while_running(tmp_path):
+    consumer = tracker(tmp_path, "hmsts_b")
+    assert consumer.spent_usd == 0
+    spend(tracker(tmp_path, "pcap_a"), 3.0)
+    spend(consumer, 1.5)
+    assert consumer.spent_usd == 4.5
+
+
+def test_abandoned_hedge_calls_are_recorded(tmp_path):
+    shard = tracker(tmp_path, "pcap_a").shard()
+    loser = LLMResponse(request_id="r", model="claude-3-5-sonnet", content="", input_tokens=1_000_000)
+    winner = LLMResponse(request_id="r", model="claude-3-5-haiku", content="{}", input_tokens=1_000_000, abandoned=[loser])
+    assert shard.record(winner) == 3.0 + 0.8
+    assert shard.delta.calls == 2
+    assert shard.delta.by_model == {"claude-3-5-haiku": 0.8, "claude-3-5-sonnet": 3.0}
@@ -0,0 +1,99 @@
+"""HedgedLLMClient failover and overload reporting."""
+
+import asyncio
+
+import pytest
+
+from src.llm.base import BaseLLMClient, LLMRequest, LLMResponse, LLMError, OverloadedError, LLMResponseError
+from src.llm.cost_tracker import response_cost
+from src.llm.hedging import HedgedLLMClient
+from src.llm.rate_limiter import AIMDLimiter
+from src.models.processing import ProcessingStage
+
+
+class FakeClient(BaseLLMClient):
+    def __init__(self, model, error=None, delay=0.0):
+        super().__init__(model)
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, request):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return LLMResponse(request_id=request.request_id, model=self.model, content="{}", input_tokens=1000)
+
+
+REQUEST = LLMRequest(request_id="r1", hadith_id=1, stage=ProcessingStage.PCAP_PROCESSING, user="hadith")
+
+
+def hedged(primary, secondary, **kwargs):
+    return HedgedLLMClient(primary, secondary, min_samples=1, **kwargs)
+
+
+def test_absorbed_overload_cuts_the_limiter_window():
+    client = hedged(FakeClient("primary", OverloadedError("529")), FakeClient("secondary"))
+    limiter = AIMDLimiter(initial=8)
+    client.overload_listeners.append(limiter.report_overload)
+
+    async def run():
+        async with limiter.slot():
+            return await client.complete(REQUEST)
+
+    assert asyncio.run(run()).model == "secondary"
+    assert limiter.window == 4
+    assert limiter.stats["overloads"] == 1
+
+
+def test_failover_applies_when_the_hedge_budget_is_spent():
+    primary = FakeClient("primary", OverloadedError("529"), delay=0.05)
+    secondary = FakeClient("secondary")
+    client = hedged(primary, secondary, max_hedge_ratio=0.0)
+    client.latencies.add(0.01)  # the primary outlives the hedge delay
+
+    response = asyncio.run(client.complete(REQUEST))
+    assert response.model == "secondary"
+    assert client.stats["hedges_skipped_budget"] == 1
+    assert client.stats["fallbacks"] == 1
+
+
+def test_off_schema_output_is_not_failed_over():
+    secondary = FakeClient("secondary")
+    client = hedged(FakeClient("primary", LLMResponseError("not JSON")), secondary)
+    with pytest.raises(LLMResponseError):
+        asyncio.run(client.complete(REQUEST))
+    assert secondary.calls == 0
+
+
+def test_cancelled_loser_is_billed_on_the_winner():
+    primary = FakeClient("claude-3-5-sonnet", delay=0.2)
+    client = hedged(primary, FakeClient("claude-3-5-haiku"))
+    client.latencies.add(0.01)
+    request = REQUEST.model_copy(update={"system": "methodology " * 200})
+
+    response = asyncio.run(client.complete(request))
+    assert response.model == "claude-3-5-haiku"
+    assert client.stats["secondary_wins"] == 1
+    [loser] = response.abandoned
+    assert loser.model == "claude-3-5-sonnet" and loser.stop_reason == "cancelled"
+    assert loser.cache_read_tokens > 0 and loser.input_tokens > 0
+    # The row's cost covers both calls
+    assert response_cost(response) > response_cost(response.model_copy(update={"abandoned": []}))
+
+
+def test_failed_over_secondary_error_is_not_a_win():
+    client = hedged(FakeClient("primary"), FakeClient("secondary", LLMError("bad request")))
+    client.failover_until = float("inf")
+    with pytest.raises(LLMError):
+        asyncio.run(client.complete(REQUEST))
+    assert client.stats["secondary_wins"] == 0
+
+
+def test_failed_fallback_is_not_a_win():
+    client = hedged(FakeClient("primary", OverloadedError("529")), FakeClient("secondary", LLMError("down")))
+    with pytest.raises(LLMError, match="down"):
+        asyncio.run(client.complete(REQUEST))
+    assert client.stats["fallbacks"] == 1
+    assert client.stats["secondary_wins"] == 0
@@ -0,0 +1,95 @@
+"""Tests for local JSON and schema repair of model output."""
+
+import json
+
+import pytest
+
+from config.settings import Settings
+from src.llm.base import LLMResponse, LLMResponseError
+from src.llm.repair import repair_json, parse_json_lenient, get_repairer
+from src.models.temporal import PCAPOutput
+from src.processors import PCAPProcessor
+
+PCAP_OK = {
+    "era_id": "E3.2", "earliest_ah": 2, "latest_ah": 3, "evidence_type": "explicit_event",
+    "posterior_confidence": 0.8, "reasoning": "Narrated by a Companion about the migration to Madinah.",
+}
+
+
+def test_trailing_commas_removed():
+    changes = []
+    assert json.loads(repair_json('{"a": [1, 2,], "b": {"c": 1,},}', changes)) == {"a": [1, 2], "b": {"c": 1}}
+    assert changes == ["removed trailing commas"]
+
+
+def test_trailing_comma_inside_string_kept():
+    assert json.loads(repair_json('{"a": "x,]", "b": 1,}')) == {"a": "x,]", "b": 1}
+
+
+def test_code_fence_and_prose_stripped():
+    changes = []
+    content = 'Here is the result:\n```json\n{"a": 1,}\n```\nHope this helps.'
+    assert json.loads(repair_json(content, changes)) == {"a": 1}
+    assert "stripped text around the object" in changes
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1, "b": {"c": 2', {"a": 1, "b": {"c": 2}}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('{"a": 1, "b":', {"a": 1}),
+    ('{"a": 1,', {"a": 1}),
+])
+def test_truncated_object_closed(content, expected):
+    changes = []
+    assert json.loads(repair_json(content, changes)) == expected
+    assert changes[0] == "output truncated"
+
+
+def test_truncated_string_closed():
+    changes = []
+    assert json.loads(repair_json('{"a": 1, "b": "half a sent', changes)) == {"a": 1, "b": "half a sent"}
+    assert "closed an unterminated string" in changes
+
+
+def test_lenient_parse_reports_syntax_repair():
+    assert parse_json_lenient(json.dumps(PCAP_OK)) == (PCAP_OK, False)
+    data, repaired = parse_json_lenient(json.dumps(PCAP_OK)[:-1] + ",")
+    assert repaired and data == PCAP_OK
+
+
+def test_lenient_parse_rejects_unrepairable():
+    with pytest.raises(ValueError, match="unrepairable"):
+        parse_json_lenient('{"a": 1 "b": 2}')
+
+
+def test_schema_repairer_coerces_enum_and_decimals():
+    data, changes = get_repairer(PCAPOutput).coerce(
+        {**PCAP_OK, "evidence_type": "Explicit-Event", "posterior_confidence": 0.81234}
+    )
+    assert data["evidence_type"] == "explicit_event"
+    assert data["posterior_confidence"] == 0.812
+    assert len(changes) == 2
+    get_repairer(PCAPOutput).validate(data)
+
+
+def parse(content):
+    processor = PCAPProcessor(client=None, settings=Settings(llm_adaptive_concurrency=False))
+    return processor.parse_response(LLMResponse(request_id="r1", model="fake-model", content=content))
+
+
+def test_truncated_output_repaired_into_valid_assignment():
+    content = json.dumps(PCAP_OK)[:-1]
+    assert parse(content).era_id == "E3.2"
+
+
+def test_repair_that_fails_validation_is_reported():
+    text = json.dumps(PCAP_OK)
+    # Cut inside the reasoning string: it is closed short of its minimum length
+    content = text[:text.index('"reasoning"') + len('"reasoning": "Narr')]
+    with pytest.raises(LLMResponseError) as excinfo:
+        parse(content)
+    message = str(excinfo.value)
+    assert "invalid after JSON repair" in message
+    assert "closed an unterminated string" in message
+    assert "reasoning" in message
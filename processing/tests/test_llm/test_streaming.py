@@ -0,0 +1,84 @@
+"""Tests for incremental JSON parsing and streamed field validation."""
+
+import json
+
+import pytest
+
+from src.llm.streaming import IncrementalJSONParser, StreamGuard, StreamAborted
+from src.models.temporal import PCAPOutput
+
+PCAP_OK = {
+    "era_id": "E3.2", "earliest_ah": 2, "latest_ah": 3, "evidence_type": "explicit_event",
+    "posterior_confidence": 0.8, "anchor_before": ["E2.11"],
+    "reasoning": "Narrated by a Companion about the migration to Madinah.",
+}
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_members_identical_across_chunk_splits(size):
+    text = "Here you go:\n```json\n" + json.dumps({"a": "x, \"}\" y", "b": {"c": [1, {"d": 2}]}, "e": 3}) + "\n```"
+    parser = IncrementalJSONParser()
+    members = [member for chunk in chunks(text, size) for member in parser.feed(chunk)]
+    assert members == [("a", 'x, "}" y'), ("b", {"c": [1, {"d": 2}]}), ("e", 3)]
+    assert parser.finished
+
+
+def test_member_emitted_as_soon_as_complete():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"era_id": "E3') == []
+    assert parser.feed('.2", "earl') == [("era_id", "E3.2")]
+
+
+def test_trailing_comma_in_nested_value_is_repaired():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": [1, 2,], "b": 1}') == [("a", [1, 2]), ("b", 1)]
+
+
+def test_malformed_top_level_aborts():
+    parser = IncrementalJSONParser()
+    with pytest.raises(StreamAborted):
+        parser.feed('{"a" 1}')
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_guard_accepts_valid_stream(size):
+    guard = StreamGuard(PCAPOutput)
+    for chunk in chunks(json.dumps(PCAP_OK), size):
+        guard.feed(chunk)
+    guard.finish()
+
+
+def test_guard_aborts_on_invalid_field_before_the_rest_arrives():
+    text = json.dumps({**PCAP_OK, "evidence_type": "astrology"})
+    cut = text.index('"posterior_confidence"')
+    guard = StreamGuard(PCAPOutput)
+    fed = 0
+    with pytest.raises(StreamAborted, match="evidence_type"):
+        for chunk in chunks(text, 4):
+            fed += len(chunk)
+            guard.feed(chunk)
+    # Aborted on the chunk that closed the bad field, not at the end of the response
+    assert fed <= cut + 4
+
+
+def test_guard_coerces_near_miss_enum_spelling():
+    guard = StreamGuard(PCAPOutput)
+    guard.feed(json.dumps({**PCAP_OK, "evidence_type": "Explicit Event"}))
+    guard.finish()
+
+
+def test_finish_reports_missing_required_field():
+    guard = StreamGuard(PCAPOutput)
+    guard.feed(json.dumps({k: v for k, v in PCAP_OK.items() if k != "reasoning"}))
+    with pytest.raises(StreamAborted, match="reasoning"):
+        guard.finish()
+
+
+def test_finish_leaves_truncated_object_to_repair():
+    guard = StreamGuard(PCAPOutput)
+    guard.feed(json.dumps(PCAP_OK)[:40])
+    guard.finish()
@@ -0,0 +1,72 @@
+"""Tests for the user prompt token budget."""
+
+import re
+
+from src.llm.compaction import estimate_tokens
+from src.llm.prompt_builder import PromptBuilder
+from src.llm.token_budget import PROMPT_OVERHEAD_TOKENS, fit_text, hadith_tokens, split_chunks
+from src.models.hadith import RawHadith, PreprocessedHadith
+
+SENTENCES = [f"Sentence number {i} tells part of the long story." for i in range(40)]
+TEXT = " ".join(SENTENCES)
+
+
+def hadith(english=TEXT, arabic="حدثنا"):
+    return RawHadith(id=1, id_in_book=1, book_id=1, chapter_id=1, arabic=arabic,
+                     english_narrator="Narrated Anas", english_text=english, book_name_english="Musnad Ahmad")
+
+
+def omitted_tokens(text):
+    return sum(int(n) for n in re.findall(r"\[\.\.\. ~(\d+) tokens omitted \.\.\.\]", text))
+
+
+def test_hadith_tokens_from_preprocessing_lengths():
+    preprocessed = PreprocessedHadith(hadith_id=1, text_length_arabic=1000, text_length_english=400)
+    assert hadith_tokens(hadith(), preprocessed) == 1000 // 2 + 400 // 4 + PROMPT_OVERHEAD_TOKENS
+
+
+def test_hadith_tokens_estimated_without_preprocessing():
+    assert hadith_tokens(hadith()) == estimate_tokens("حدثنا") + estimate_tokens(TEXT) + PROMPT_OVERHEAD_TOKENS
+
+
+def test_split_chunks_by_sentence_and_word_window():
+    assert split_chunks("One. Two? Three!") == ["One.", "Two?", "Three!"]
+    windows = split_chunks("word " * 300, max_tokens=20)
+    assert len(windows) > 1
+    assert all(estimate_tokens(window) <= 21 for window in windows)
+    assert " ".join(windows).split() == ["word"] * 300
+
+
+def test_text_within_budget_unchanged():
+    assert fit_text(TEXT, estimate_tokens(TEXT)) == (TEXT, 0)
+
+
+def test_fit_keeps_head_and_tail_within_budget():
+    budget = estimate_tokens(TEXT) // 3
+    fitted, omitted = fit_text(TEXT, budget)
+    assert estimate_tokens(fitted) <= budget
+    assert fitted.startswith(SENTENCES[0])
+    assert fitted.endswith(SENTENCES[-1])
+    # The markers account for exactly the chunks dropped
+    assert omitted == omitted_tokens(fitted)
+    kept = [s for s in SENTENCES if s in fitted]
+    assert omitted == sum(estimate_tokens(s) for s in SENTENCES if s not in kept)
+
+
+def test_fit_keeps_temporal_reference_from_the_middle():
+    sentences = list(SENTENCES)
+    sentences[20] = "This was in the year of the Trench."
+    fitted, _ = fit_text(" ".join(sentences), estimate_tokens(TEXT) // 3, keep=["year of the Trench"])
+    assert "year of the Trench" in fitted
+    assert fitted.count("tokens omitted") == 2
+
+
+def test_prompt_builder_fits_oversized_hadith(tmp_path):
+    builder = PromptBuilder(prompts_dir=tmp_path, methodology_dir=tmp_path, user_token_budget=150)
+    assert builder.is_oversized(hadith())
+    assert not builder.is_oversized(hadith(english="Short."))
+    prompt = builder.build_user_prompt(hadith())
+    assert estimate_tokens(prompt) <= 150
+    assert "tokens omitted" in prompt
+    assert builder.budget_stats["fitted"] == 1
+    assert builder.budget_stats["tokens_omitted"] == omitted_tokens(prompt)
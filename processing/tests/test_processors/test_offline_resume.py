@@ -0,0 +1,84 @@
+"""Collecting a resumed batch job: chunked stores and dead letters."""
+
+import asyncio
+import json
+
+from config.settings import Settings
+from src.llm.base import LLMResponse
+from src.llm.batch import BatchRunner, LocalBatchEndpoint
+from src.models.hadith import RawHadith
+from src.processors import PCAPProcessor
+
+PCAP_OK = {
+    "era_id": "E3.2", "earliest_ah": 2, "latest_ah": 3, "evidence_type": "explicit_event",
+    "posterior_confidence": 0.8, "reasoning": "Narrated by a Companion about the migration to Madinah.",
+}
+
+
+class FakeStorage:
+    def __init__(self):
+        self.writes = []
+        self.dead_letters = []
+
+    def save_assignments(self, stage, assignments):
+        self.writes.append([a.hadith_id for a in assignments])
+
+    def save_dead_letters(self, dead_letters):
+        self.dead_letters.extend(dead_letters)
+
+
+def hadith(i):
+    return RawHadith(
+        id=i, id_in_book=i, book_id=1, chapter_id=1, arabic="إنما الأعمال بالنيات",
+        english_narrator="Narrated Umar", english_text="Deeds are by intentions", book_name_english="Bukhari",
+    )
+
+
+async def handler(request):
+    if request.hadith_id == 4:
+        raise ConnectionError("request expired")
+    content = "not JSON at all" if request.hadith_id == 3 else json.dumps(PCAP_OK)
+    return LLMResponse(request_id=request.request_id, model="local", content=content)
+
+
+def test_resumed_results_are_chunked_and_failures_dead_lettered(tmp_path):
+    storage = FakeStorage()
+    processor = PCAPProcessor(
+        client=None, storage=storage, settings=Settings(checkpoint_interval=2, llm_adaptive_concurrency=False),
+    )
+
+    async def run():
+        runner = BatchRunner(LocalBatchEndpoint(handler), tmp_path, poll_interval=0.01)
+        (job,) = runner.write_jobs([processor.build_request(hadith(i), None) for i in range(1, 7)])
+        await runner.submit(job)
+        return await processor.resume_offline(job.manifest_path, runner)
+
+    progress = asyncio.run(run())
+    assert (progress.processed_items, progress.failed_items) == (6, 2)
+    assert storage.writes == [[1, 2], [5, 6]]
+    assert sorted(d.hadith_id for d in storage.dead_letters) == [3, 4]
+
+
+def test_resumed_results_fan_out_to_cluster_members(tmp_path):
+    settings = Settings(llm_adaptive_concurrency=False)
+    submitting = PCAPProcessor(client=None, storage=None, settings=settings)
+    items = submitting.collapse_duplicates([(hadith(i), None) for i in (1, 2, 7, 8)], {1: [7, 8]})
+
+    async def submit(runner):
+        (job,) = runner.write_jobs(
+            [submitting.build_request(h, p) for h, p in items], submitting.fan_out_map,
+        )
+        await runner.submit(job)
+        return job
+
+    async def run():
+        runner = BatchRunner(LocalBatchEndpoint(handler), tmp_path, poll_interval=0.01)
+        job = await submit(runner)
+        # A later process knows nothing about the clusters but the manifest
+        storage = FakeStorage()
+        resuming = PCAPProcessor(client=None, storage=storage, settings=settings)
+        await resuming.resume_offline(job.manifest_path, runner)
+        return storage
+
+    storage = asyncio.run(run())
+    assert sorted(i for write in storage.writes for i in write) == [1, 2, 7, 8]
@@ -0,0 +1,76 @@
+"""Tests for the PCAP rule engine's event matching."""
+
+import pytest
+
+from src.models.hadith import RawHadith
+from src.models.temporal import TemporalMarker, EvidenceType
+from src.processors.pcap_rules import PCAPRuleEngine
+
+
+MARKERS = [
+    TemporalMarker(event_id="E3.2.1", depth=2, ah_value="17 Ramadan 2 AH", event_name_english="Battle of Badr",
+                   certainty_date="A", certainty_event="A"),
+    TemporalMarker(event_id="E3.3.1", depth=2, ah_value="6 AH", event_name_english="Treaty of Hudaybiyyah",
+                   certainty_date="A", certainty_event="A"),
+    TemporalMarker(event_id="E3.4.1", depth=2, ah_value="9 AH", event_name_english="Expedition of Tabuk",
+                   certainty_date="A", certainty_event="B"),
+    TemporalMarker(event_id="E3.4.4", depth=2, ah_value="10 AH", event_name_english="Farewell Pilgrimage",
+                   certainty_date="A", certainty_event="A"),
+]
+
+
+def hadith(english: str = "", arabic: str = "حدثنا") -> RawHadith:
+    return RawHadith(id=1, id_in_book=1, book_id=1, chapter_id=1, arabic=arabic,
+                     english_narrator="Narrated Ka'b", english_text=english, book_name_english="Bukhari")
+
+
+@pytest.mark.parametrize("english, arabic, event_id", [
+    ("On the day of Badr the Prophet said...", "حدثنا", "E3.2.1"),
+    ("I stayed behind from the expedition of Tabuk.", "حدثنا", "E3.4.1"),
+    ("When the Tabuk expedition drew near...", "حدثنا", "E3.4.1"),
+    ("At the time of Hudaybiyyah we were fourteen hundred.", "حدثنا", "E3.3.1"),
+    ("He wrote the treaty of al-Hudaibiya.", "حدثنا", "E3.3.1"),
+    ("", "كنا مع النبي يوم الحديبية", "E3.3.1"),
+    ("", "تخلفت في غزوة تبوك", "E3.4.1"),
+    ("He delivered a sermon in the Farewell Hajj.", "حدثنا", "E3.4.4"),
+])
+def test_event_with_cue_resolves(english, arabic, event_id):
+    engine = PCAPRuleEngine(MARKERS)
+    output = engine.resolve(hadith(english, arabic))
+    assert output is not None
+    assert output.event_window_id == event_id
+    assert output.evidence_type == EvidenceType.EXPLICIT_EVENT
+
+
+@pytest.mark.parametrize("english, arabic", [
+    ("He prayed in the Tabuk mosque later.", "حدثنا"),
+    ("There was a well at Hudaybiyyah with little water.", "حدثنا"),
+    ("", "نزلنا الحديبية"),
+    ("", "مسجد تبوك"),
+    ("The people of Badr are forgiven.", "حدثنا"),
+])
+def test_bare_place_name_left_to_llm(english, arabic):
+    engine = PCAPRuleEngine(MARKERS)
+    assert engine.match(hadith(english, arabic)) == []
+    assert engine.resolve(hadith(english, arabic)) is None
+
+
+def test_two_events_left_to_llm():
+    engine = PCAPRuleEngine(MARKERS)
+    text = "He fought on the day of Badr and joined the expedition of Tabuk."
+    assert engine.resolve(hadith(text)) is None
+    assert engine.stats["conflicts"] == 1
+
+
+def test_output_dates_from_marker():
+    engine = PCAPRuleEngine(MARKERS)
+    output = engine.resolve(hadith("During the expedition of Tabuk..."))
+    assert (output.earliest_ah, output.latest_ah) == (9, 9)
+    assert output.anchor_before == ["E3.3.6"]
+    assert output.anchor_after == ["E3.4.4"]
+
+
+def test_undated_marker_ignored():
+    undated = TemporalMarker(event_id="E3.4.1", depth=2, event_name_english="Expedition of Tabuk")
+    engine = PCAPRuleEngine([undated])
+    assert engine.resolve(hadith("the expedition of Tabuk")) is None
@@ -0,0 +1,119 @@
+"""Per-hadith retries and failure isolation in process_batch."""
+
+import asyncio
+import json
+
+from config.settings import Settings
+from src.llm.base import BaseLLMClient, LLMResponse, TransientError
+from src.models.hadith import RawHadith
+from src.processors import PCAPProcessor
+from src.processors import base_processor
+
+PCAP_OK = {
+    "era_id": "E3.2", "earliest_ah": 2, "latest_ah": 3, "evidence_type": "explicit_event",
+    "posterior_confidence": 0.8, "reasoning": "Narrated by a Companion about the migration to Madinah.",
+}
+
+
+class FlakyClient(BaseLLMClient):
+    """Fails each hadith's first calls with `errors[hadith_id]`."""
+
+    def __init__(self, errors):
+        super().__init__("fake-model")
+        self.errors = errors
+        self.calls = {}
+
+    async def complete(self, request):
+        self.calls[request.hadith_id] = self.calls.get(request.hadith_id, 0) + 1
+        failures = self.errors.get(request.hadith_id, [])
+        if self.calls[request.hadith_id] <= len(failures):
+            raise failures[self.calls[request.hadith_id] - 1]
+        return LLMResponse(request_id=request.request_id, model=self.model, content=json.dumps(PCAP_OK))
+
+
+class FakeStorage:
+    def __init__(self):
+        self.saved = []
+        self.dead_letters = []
+
+    def save_assignments(self, stage, assignments):
+        self.saved.extend(a.hadith_id for a in assignments)
+
+    def save_dead_letters(self, dead_letters):
+        self.dead_letters.extend(dead_letters)
+
+    def fetch_temporal_markers(self):
+        return []
+
+
+def items(n):
+    return [
+        (RawHadith(
+            id=i, id_in_book=i, book_id=1, chapter_id=1, arabic="إنما الأعمال بالنيات",
+            english_narrator="Narrated Umar", english_text="Deeds are by intentions", book_name_english="Bukhari",
+        ), None)
+        for i in range(1, n + 1)
+    ]
+
+
+def run(client, monkeypatch):
+    real_sleep = asyncio.sleep
+
+    async def no_backoff(seconds):
+        await real_sleep(0)
+
+    monkeypatch.setattr(base_processor.asyncio, "sleep", no_backoff)
+    storage = FakeStorage()
+    processor = PCAPProcessor(client=client, storage=storage, settings=Settings(llm_adaptive_concurrency=False))
+    _, progress = asyncio.run(processor.process_batch(items(4)))
+    return storage, progress
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    client = FlakyClient({2: [TransientError("read timeout"), TransientError("connection reset")]})
+    storage, progress = run(client, monkeypatch)
+    assert sorted(storage.saved) == [1, 2, 3, 4]
+    assert client.calls[2] == 3
+    assert progress.failed_items == 0
+
+
+def test_unexpected_error_fails_only_its_hadith(monkeypatch):
+    client = FlakyClient({3: [KeyError("usage")] * 5})
+    storage, progress = run(client, monkeypatch)
+    assert sorted(storage.saved) == [1, 2, 4]
+    assert progress.failed_items == 1
+    assert [(d.hadith_id, d.error_class) for d in storage.dead_letters] == [(3, "KeyError")]
+
+
+class SlowClient(BaseLLMClient):
+    """Answers after `delay` seconds, tracking the peak number of concurrent calls."""
+
+    def __init__(self, delay):
+        super().__init__("fake-model")
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+
+    async def complete(self, request):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return LLMResponse(request_id=request.request_id, model=self.model, content=json.dumps(PCAP_OK))
+
+
+def test_adaptive_window_busy_time_excludes_slot_wait():
+    client = SlowClient(0.02)
+    settings = Settings(parallel_workers=2, llm_concurrency_max=8, llm_adaptive_concurrency=True)
+    processor = PCAPProcessor(client=client, storage=FakeStorage(), settings=settings)
+    processor.limiter.increase = 0  # hold the window at 2
+    _, progress = asyncio.run(processor.process_batch(items(8)))
+    metrics = processor.schedule_metrics
+    assert client.peak == 2
+    assert metrics["workers"] == 8
+    # Two slots kept busy: near-full utilization, not 2 of 8 workers
+    assert progress.worker_utilization > 0.6
+    # Workers above the window never held an item, so no worker idles with work in hand
+    assert metrics["steals"] == 6
@@ -0,0 +1,44 @@
+"""ShardCoordinator hands out units and the shared cost budget."""
+
+import queue
+
+from src.processors.shards import ShardCoordinator, WorkUnit
+
+
+def coordinator(units, shards=2, **kwargs):
+    coordinator = ShardCoordinator(print, (), units, shards, **kwargs)
+    for index in range(shards):
+        coordinator.responses[index] = queue.Queue()
+    return coordinator
+
+
+def ask(coordinator, index, spent=0.0):
+    coordinator.handle(index, "next", spent)
+    return coordinator.responses[index].get_nowait()
+
+
+UNITS = [WorkUnit(book_id, (book_id,), ()) for book_id in range(1, 5)]
+
+
+def test_reply_carries_the_spend_of_everyone_else():
+    shards = coordinator(UNITS, budget_usd=100.0, spent={1: 5.0}, spent_before=20.0)
+    unit, elsewhere = ask(shards, 0, spent=1.0)
+    assert unit.book_id == 1
+    assert elsewhere == 25.0
+    _, elsewhere = ask(shards, 1, spent=7.0)
+    assert elsewhere == 21.0
+
+
+def test_no_units_once_the_budget_is_spent():
+    shards = coordinator(UNITS, budget_usd=10.0)
+    assert ask(shards, 0, spent=4.0)[0] is not None
+    assert ask(shards, 1, spent=6.0) == (None, 4.0)
+    assert shards.stats["budget_stopped"]
+    # The unhanded units stay pending
+    assert shards.has_work()
+
+
+def test_idle_shard_takes_work_from_the_busiest():
+    shards = coordinator(UNITS)
+    assert [ask(shards, 0)[0].book_id for _ in range(3)] == [1, 2, 4]
+    assert shards.stats["stolen"] == 1
@@ -0,0 +1,88 @@
+"""Multi-row PCAP/HMSTS upserts (no database: the DB-API connection is faked)."""
+
+from decimal import Decimal
+
+from src.models.temporal import PCAPAssignment, EvidenceType
+from src.storage import postgres
+from src.storage.postgres import PostgresStorage
+
+
+class FakeCursor:
+    def __init__(self):
+        self.connection = type("Connection", (), {"encoding": "UTF8"})()
+        self.statements = []
+
+    def mogrify(self, template, row):
+        values = {k: "NULL" if v is None else repr(str(v)) for k, v in row.items()}
+        template = template.decode() if isinstance(template, bytes) else template
+        return (template % values).encode()
+
+    def execute(self, sql):
+        self.statements.append(sql.decode())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursor_ = FakeCursor()
+        self.committed = False
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def assignment(hadith_id: int, era_id: str = "E3.2") -> PCAPAssignment:
+    return PCAPAssignment(
+        hadith_id=hadith_id, version="v1.0", era_id=era_id, earliest_ah=Decimal(2), latest_ah=Decimal(3),
+        evidence_type=EvidenceType.EXPLICIT_EVENT, posterior_confidence=Decimal("0.8"), reasoning="x" * 60,
+    )
+
+
+def storage_with(connection: FakeConnection) -> PostgresStorage:
+    storage = PostgresStorage("postgresql://user@localhost/test")
+    storage.engine = type("Engine", (), {"raw_connection": lambda self: connection})()
+    return storage
+
+
+def test_one_statement_per_page(monkeypatch):
+    monkeypatch.setattr(postgres, "UPSERT_PAGE_SIZE", 100)
+    connection = FakeConnection()
+    written = storage_with(connection).save_pcap_assignments([assignment(i) for i in range(1, 251)])
+
+    statements = connection.cursor_.statements
+    assert written == 250
+    assert len(statements) == 3
+    assert all(s.startswith("INSERT INTO pcap_assignments") and "ON CONFLICT (hadith_id, version)" in s for s in statements)
+    assert statements[0].count("'E3.2'") == 100
+    assert connection.committed and connection.closed
+
+
+def test_rows_for_the_same_hadith_are_coalesced():
+    connection = FakeConnection()
+    written = storage_with(connection).save_pcap_assignments([assignment(1, "E3.1"), assignment(2), assignment(1, "E3.4")])
+
+    (statement,) = connection.cursor_.statements
+    assert written == 2
+    assert "'E3.4'" in statement and "'E3.1'" not in statement
+
+
+def test_jsonb_columns_are_cast():
+    sql, template = postgres._upsert_sql("hmsts_tags", postgres.HMSTS_COLUMNS, postgres.HMSTS_JSONB_COLUMNS)
+    assert "VALUES %s" in sql
+    assert "CAST(%(layer4_vectors)s AS JSONB)" in template
+    assert "%(hadith_id)s" in template
@@ -0,0 +1,100 @@
+"""RedisWorkQueue dedupe, leases and acknowledgement (on fakeredis)."""
+
+import time
+
+import fakeredis
+import pytest
+
+from src.models.processing import ProcessingStage
+from src.storage.redis_cache import RedisWorkQueue
+
+STAGE = ProcessingStage.PCAP_PROCESSING
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def queue(client, consumer, timeout=600.0):
+    return RedisWorkQueue(client, STAGE, consumer=consumer, visibility_timeout_seconds=timeout)
+
+
+def test_enqueue_deduplicates(client):
+    producer = queue(client, "producer")
+    assert producer.enqueue([1, 2, 3]) == 3
+    # Re-running the producer, or a second one, adds only new IDs
+    assert queue(client, "other").enqueue([2, 3, 4]) == 1
+    assert producer.status()["entries"] == 4
+
+
+def test_enqueue_skips_leased_and_done(client):
+    worker = queue(client, "worker")
+    worker.enqueue([1, 2])
+    leases = worker.claim(2)
+    assert worker.enqueue([1, 2]) == 0
+    worker.ack(leases)
+    assert worker.enqueue([1, 2]) == 0
+    assert worker.is_drained()
+
+
+def test_expired_lease_is_reclaimed(client):
+    crashed = queue(client, "crashed", timeout=0.05)
+    survivor = queue(client, "survivor", timeout=0.05)
+    crashed.enqueue([1, 2, 3])
+    assert [lease.hadith_id for lease in crashed.claim(2)] == [1, 2]
+
+    # Within the visibility timeout only the unleased entry is handed out
+    fresh = survivor.claim(10)
+    assert [lease.hadith_id for lease in fresh] == [3]
+    survivor.ack(fresh)
+    time.sleep(0.1)
+    reclaimed = survivor.claim(10)
+    assert sorted(lease.hadith_id for lease in reclaimed) == [1, 2]
+    assert survivor.stats["reclaimed"] == 2
+
+
+def test_renewed_lease_is_not_reclaimed(client):
+    owner = queue(client, "owner", timeout=0.2)
+    other = queue(client, "other", timeout=0.2)
+    owner.enqueue([1])
+    leases = owner.claim(1)
+    time.sleep(0.15)
+    owner.renew(leases)
+    time.sleep(0.1)
+    assert other.claim(1) == []
+
+
+def test_ack_marks_done(client):
+    worker = queue(client, "worker")
+    worker.enqueue([1, 2])
+    worker.ack(worker.claim(2))
+    status = worker.status()
+    assert (status["entries"], status["leased"], status["done"]) == (0, 0, 2)
+    assert worker.stats["acked"] == 2
+
+
+def test_drop_allows_requeue(client):
+    worker = queue(client, "worker")
+    worker.enqueue([1, 2])
+    leases = worker.claim(2)
+    worker.drop(leases[:1])
+    worker.ack(leases[1:])
+    assert worker.is_drained()
+    # A failed hadith is still pending in PostgreSQL; the next producer run re-queues it
+    assert worker.enqueue([1, 2]) == 1
+    assert [lease.hadith_id for lease in worker.claim(10)] == [1]
+
+
+def test_release_hands_entries_to_other_consumers(client):
+    first = queue(client, "first")
+    second = queue(client, "second")
+    first.enqueue([1, 2], contexts={1: '{"era": "tabiun"}'})
+    first.release(first.claim(2))
+    assert first.pending() == 0
+
+    leases = second.claim(10)
+    assert sorted(lease.hadith_id for lease in leases) == [1, 2]
+    assert {lease.hadith_id: lease.context for lease in leases}[1] == '{"era": "tabiun"}'
+    # Released entries stay deduplicated
+    assert second.enqueue([1, 2]) == 0
@@ -0,0 +1,71 @@
+"""Commit callbacks and backpressure of the write-behind writer."""
+
+import asyncio
+
+from pydantic import BaseModel
+
+from src.models.processing import ProcessingStage
+from src.storage.writer import WriteBehindWriter
+
+
+class Row(BaseModel):
+    hadith_id: int
+
+
+class FakeStorage:
+    def __init__(self):
+        self.down = False
+        self.saved = []
+
+    def save_assignments(self, stage, rows):
+        if self.down:
+            raise ConnectionError("database is down")
+        self.saved.extend(row.hadith_id for row in rows)
+
+
+STAGE = ProcessingStage.PCAP_PROCESSING
+
+
+def test_raising_callback_does_not_stop_the_others():
+    async def run():
+        writer = WriteBehindWriter(FakeStorage(), flush_interval_seconds=0.01)
+        seen = []
+
+        def broken(rows):
+            raise ValueError("checkpoint file is read-only")
+
+        writer.on_commit(STAGE, broken)
+        writer.on_commit(STAGE, lambda rows: seen.extend(r.hadith_id for r in rows))
+        writer.start()
+        writer.submit(STAGE, [Row(hadith_id=1)])
+        await asyncio.sleep(0.05)
+        # The background task survived the callback and keeps flushing
+        writer.submit(STAGE, [Row(hadith_id=2)])
+        await asyncio.sleep(0.05)
+        await writer.close()
+        return writer, seen
+
+    writer, seen = asyncio.run(run())
+    assert seen == [1, 2]
+    assert writer.stats["callback_errors"] == 2
+
+
+def test_full_buffer_blocks_producers_until_a_flush():
+    async def run():
+        storage = FakeStorage()
+        storage.down = True
+        writer = WriteBehindWriter(storage, batch_size=100, flush_interval_seconds=60, max_retries=1, max_buffered=2)
+        writer.submit(STAGE, [Row(hadith_id=1), Row(hadith_id=2)])
+        waiter = asyncio.create_task(writer.wait_for_room())
+        await asyncio.sleep(0.01)
+        blocked = not waiter.done()
+        storage.down = False
+        await writer.flush()
+        await asyncio.wait_for(waiter, 1)
+        await writer.close()
+        return writer, storage, blocked
+
+    writer, storage, blocked = asyncio.run(run())
+    assert blocked
+    assert storage.saved == [1, 2]
+    assert writer.stats["backpressure_waits"] == 1
@@ -0,0 +1,55 @@
+"""IdBitmap encoding and ProcessedSet persistence."""
+
+import pytest
+
+from src.utils.progress_tracker import IdBitmap, ProcessedSet
+
+
+@pytest.mark.parametrize("ids", [
+    [],
+    [0, 7, 65535, 65536, 1 << 20],
+    range(1, 50885),                      # contiguous corpus (runs)
+    range(3, 200_000, 7),                 # dense chunks (bitsets)
+    [5, 9, 70000, 70001, 70002, 140000],  # sparse (arrays)
+])
+def test_bitmap_round_trip(ids):
+    bitmap = IdBitmap(ids)
+    restored = IdBitmap.from_bytes(bitmap.to_bytes())
+    assert list(restored) == sorted(set(ids))
+    assert len(restored) == len(set(ids))
+
+
+def test_bitmap_discard():
+    bitmap = IdBitmap(range(10000))  # one bitset chunk
+    assert bitmap.discard(42)
+    assert not bitmap.discard(42)
+    assert 42 not in bitmap and 43 in bitmap
+    assert len(bitmap) == 9999
+    assert 42 not in IdBitmap.from_bytes(bitmap.to_bytes())
+
+
+def test_set_survives_reload(tmp_path):
+    processed = ProcessedSet(tmp_path / "processed.bm", compact_after=3)
+    for start in range(0, 50, 10):
+        processed.record(range(start, start + 10))
+    processed.discard([5])
+
+    reloaded = ProcessedSet(tmp_path / "processed.bm")
+    assert len(reloaded) == 49 and 5 not in reloaded and 49 in reloaded
+
+
+def test_records_after_a_torn_record_survive_the_next_restart(tmp_path):
+    path = tmp_path / "processed.bm"
+    ProcessedSet(path).record([1, 2, 3])
+    delta = path.with_suffix(".delta")
+    # Crash in the middle of appending the next record
+    intact = delta.read_bytes()
+    ProcessedSet(path).record([4, 5])
+    delta.write_bytes(delta.read_bytes()[:len(intact) + 5])
+
+    processed = ProcessedSet(path)
+    assert len(processed) == 3
+    processed.record([100, 101])
+
+    reloaded = ProcessedSet(path)
+    assert sorted(reloaded.ids) == [1, 2, 3, 100, 101]